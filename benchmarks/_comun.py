@@ -0,0 +1,58 @@
+"""Utilidades compartidas por los scripts de benchmark"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Los benchmarks se ejecutan desde la raíz del repositorio; el proyecto
+# Django vive en gestor_tareas/
+PROYECTO = Path(__file__).resolve().parent.parent / 'gestor_tareas'
+sys.path.insert(0, str(PROYECTO))
+
+
+def configurar_django(settings='gestor_tareas.settings'):
+    """Inicializa Django para poder importar los módulos de la app"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings)
+    import django
+    django.setup()
+
+
+@contextmanager
+def base_de_datos_de_prueba():
+    """Crea una base de datos de prueba migrada y la destruye al salir"""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    setup_test_environment()
+    nombre = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(nombre, verbosity=0)
+        teardown_test_environment()
+
+
+def cronometrar(funcion, repeticiones=1):
+    """Ejecuta ``funcion`` varias veces y retorna los segundos por llamada"""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones
+
+
+def percentil(muestras, p):
+    """Percentil ``p`` (0-100) de una lista de muestras"""
+    if not muestras:
+        return 0.0
+    ordenadas = sorted(muestras)
+    indice = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+    return ordenadas[indice]
+
+
+def formatear_tiempo(segundos):
+    """Formatea una duración con la unidad más legible"""
+    if segundos < 1e-3:
+        return f'{segundos * 1e6:8.2f} µs'
+    if segundos < 1:
+        return f'{segundos * 1e3:8.2f} ms'
+    return f'{segundos:8.2f} s '
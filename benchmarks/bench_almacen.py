@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark del almacenamiento en memoria.
+
+Compara la implementación original basada en una lista (búsquedas
+lineales) con el almacén indexado de ``tareas.storage``.
+
+Uso:
+    python benchmarks/bench_almacen.py [--tamanos 10000 100000 1000000]
+"""
+import argparse
+import random
+
+from _comun import configurar_django, cronometrar, formatear_tiempo
+
+
+class AlmacenLineal:
+    """Réplica de la implementación original basada en una lista"""
+
+    def __init__(self):
+        self.tareas = []
+        self.contador_id = 1
+
+    def agregar(self, titulo, descripcion, usuario):
+        tarea = {'id': self.contador_id, 'titulo': titulo, 'descripcion': descripcion,
+                 'usuario': usuario, 'completada': False}
+        self.tareas.append(tarea)
+        self.contador_id += 1
+        return tarea
+
+    def obtener(self, tarea_id):
+        for tarea in self.tareas:
+            if tarea['id'] == tarea_id:
+                return tarea
+        return None
+
+    def eliminar(self, tarea_id):
+        self.tareas = [t for t in self.tareas if t['id'] != tarea_id]
+
+    def de_usuario(self, username):
+        return [t for t in self.tareas if t['usuario'] == username]
+
+
+def medir(almacen, n, usuarios, repeticiones):
+    for i in range(n):
+        almacen.agregar(f'Tarea {i}', 'Descripción', f'usuario{i % usuarios}')
+    aleatorio = random.Random(42)
+    ids = [aleatorio.randint(1, n) for _ in range(repeticiones)]
+    nombres = [f'usuario{aleatorio.randrange(usuarios)}' for _ in range(repeticiones)]
+
+    iter_ids = iter(ids)
+    iter_nombres = iter(nombres)
+    obtener = cronometrar(lambda: almacen.obtener(next(iter_ids)), repeticiones)
+    listar = cronometrar(lambda: almacen.de_usuario(next(iter_nombres)), repeticiones)
+    iter_ids = iter(ids)
+    eliminar = cronometrar(lambda: almacen.eliminar(next(iter_ids)), repeticiones)
+    return obtener, listar, eliminar
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--usuarios', type=int, default=1_000)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    configurar_django()
+    from tareas.storage.memoria import AlmacenMemoria
+
+    print(f'{"tareas":>10} {"almacén":>10} {"obtener":>12} {"por usuario":>12} {"eliminar":>12}')
+    for n in args.tamanos:
+        for nombre, clase in (('lineal', AlmacenLineal), ('indexado', AlmacenMemoria)):
+            tiempos = medir(clase(), n, args.usuarios, args.repeticiones)
+            print(f'{n:>10} {nombre:>10} ' + ' '.join(formatear_tiempo(t).rjust(12) for t in tiempos))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Benchmark de la API JSON por lotes frente a las operaciones de a una.
+
+Crea, edita y elimina ``--tareas`` tareas de tres formas, con el cliente
+de pruebas de Django (requests completos, middleware incluido, sin red):
+
+    formulario   POST al formulario + redirect, una tarea por request
+    api x1       API JSON con lotes de un elemento
+    api xN       API JSON con lotes de ``--lote`` elementos
+
+y reporta tareas por segundo de cada operación.
+
+Uso:
+    python benchmarks/bench_api.py [--tareas 2000] [--lote 500]
+"""
+import argparse
+import json
+import time
+
+from _comun import base_de_datos_de_prueba, configurar_django
+
+
+def en_lotes(elementos, tamano):
+    for inicio in range(0, len(elementos), tamano):
+        yield elementos[inicio:inicio + tamano]
+
+
+def por_formulario(cliente, tareas):
+    from django.urls import reverse
+    inicio = time.perf_counter()
+    for i in range(tareas):
+        cliente.post(reverse('tareas:crear_tarea'), {'titulo': f'Tarea {i}', 'descripcion': 'Descripción'})
+    creadas = time.perf_counter() - inicio
+    ids = [t['id'] for t in storage_usuario()]
+
+    inicio = time.perf_counter()
+    for tarea_id in ids:
+        cliente.post(reverse('tareas:editar_tarea', args=[tarea_id]), {'titulo': 'Editada', 'descripcion': 'Nueva'})
+    editadas = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for tarea_id in ids:
+        cliente.post(reverse('tareas:eliminar_tarea', args=[tarea_id]))
+    eliminadas = time.perf_counter() - inicio
+    return creadas, editadas, eliminadas
+
+
+def por_api(cliente, tareas, lote):
+    from django.urls import reverse
+
+    def enviar(nombre, clave, elementos):
+        inicio = time.perf_counter()
+        for parte in en_lotes(elementos, lote):
+            cliente.post(reverse(f'tareas:{nombre}'), json.dumps({clave: parte}),
+                         content_type='application/json')
+        return time.perf_counter() - inicio
+
+    creadas = enviar('api_crear_tareas', 'tareas',
+                     [{'titulo': f'Tarea {i}', 'descripcion': 'Descripción'} for i in range(tareas)])
+    ids = [t['id'] for t in storage_usuario()]
+    editadas = enviar('api_editar_tareas', 'tareas',
+                      [{'id': i, 'titulo': 'Editada', 'descripcion': 'Nueva'} for i in ids])
+    eliminadas = enviar('api_eliminar_tareas', 'ids', ids)
+    return creadas, editadas, eliminadas
+
+
+def storage_usuario():
+    from tareas.storage import obtener_tareas_usuario
+    return obtener_tareas_usuario('bench')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tareas', type=int, default=2000)
+    parser.add_argument('--lote', type=int, default=500)
+    args = parser.parse_args()
+
+    configurar_django()
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    with base_de_datos_de_prueba():
+        User.objects.create_user(username='bench', password='bench-pass-123')
+        cliente = Client()
+        cliente.login(username='bench', password='bench-pass-123')
+
+        variantes = {
+            'formulario': lambda: por_formulario(cliente, args.tareas),
+            'api x1': lambda: por_api(cliente, args.tareas, 1),
+            f'api x{args.lote}': lambda: por_api(cliente, args.tareas, args.lote),
+        }
+        print(f'{"variante":>12} {"crear/s":>12} {"editar/s":>12} {"eliminar/s":>12}')
+        for nombre, variante in variantes.items():
+            tiempos = variante()
+            print(f'{nombre:>12} ' + ' '.join(f'{args.tareas / t:>12,.0f}' for t in tiempos))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""
+Benchmark de carga WSGI frente a ASGI.
+
+Levanta el proyecto con gunicorn (WSGI, worker gthread, vistas sync) y
+con uvicorn (ASGI, con las vistas async de ``tareas/views_async.py`` y,
+como referencia, con las vistas sync), un solo worker cada uno y el
+backend en memoria, y genera carga HTTP/1.1 con
+keep-alive sobre ``--ruta`` a varios niveles de concurrencia. Reporta
+requests por segundo y latencias p50/p99.
+
+El generador de carga corre en este proceso: en una máquina con pocos
+núcleos compite por CPU con el servidor, así que los números absolutos
+sirven solo para comparar entre sí.
+
+Requiere gunicorn y uvicorn (``pip install gunicorn uvicorn``).
+
+Uso:
+    python benchmarks/bench_asgi.py [--concurrencia 1 8 32 128] [--segundos 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from _comun import PROYECTO, configurar_django, formatear_tiempo, percentil
+
+CSRF = 'a' * 32
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def preparar_base(directorio):
+    """Crea la base de datos, el usuario y una sesión; retorna la cookie de sesión"""
+    configurar_django()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import Client
+    call_command('migrate', verbosity=0)
+    User.objects.create_user(username='bench', password='bench-pass-123')
+    cliente = Client()
+    cliente.login(username='bench', password='bench-pass-123')
+    return cliente.cookies['sessionid'].value
+
+
+def esperar_servidor(puerto, proceso, timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError('el servidor terminó al iniciar')
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('el servidor no respondió a tiempo')
+
+
+def cargar_tareas(puerto, cookies, tareas):
+    datos = json.dumps({'tareas': [{'titulo': f'Tarea {i}', 'descripcion': f'Descripción {i}'}
+                                   for i in range(tareas)]}).encode()
+    request = urllib.request.Request(
+        f'http://127.0.0.1:{puerto}/api/tareas/crear/', data=datos, method='POST',
+        headers={'Content-Type': 'application/json', 'Cookie': cookies, 'X-CSRFToken': CSRF},
+    )
+    with urllib.request.urlopen(request) as respuesta:
+        respuesta.read()
+
+
+async def cliente(puerto, peticion, hasta, muestras, errores):
+    lector, escritor = await asyncio.open_connection('127.0.0.1', puerto)
+    try:
+        while time.perf_counter() < hasta:
+            inicio = time.perf_counter()
+            escritor.write(peticion)
+            cabeceras = await lector.readuntil(b'\r\n\r\n')
+            if not cabeceras.startswith(b'HTTP/1.1 200'):
+                errores.append(cabeceras.split(b'\r\n', 1)[0])
+            largo = 0
+            for linea in cabeceras.split(b'\r\n'):
+                if linea.lower().startswith(b'content-length:'):
+                    largo = int(linea.split(b':')[1])
+            await lector.readexactly(largo)
+            muestras.append(time.perf_counter() - inicio)
+    finally:
+        escritor.close()
+
+
+async def generar_carga(puerto, ruta, cookies, concurrencia, segundos):
+    peticion = (f'GET {ruta} HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookies}\r\n'
+                'Connection: keep-alive\r\n\r\n').encode()
+    muestras, errores = [], []
+    hasta = time.perf_counter() + segundos
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(puerto, peticion, hasta, muestras, errores) for _ in range(concurrencia)))
+    if errores:
+        raise RuntimeError(f'{len(errores)} respuestas no 200, p. ej. {errores[0].decode()}')
+    return muestras, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrencia', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--segundos', type=float, default=5)
+    parser.add_argument('--tareas', type=int, default=200)
+    parser.add_argument('--ruta', default='/tareas/')
+    parser.add_argument('--hilos-wsgi', type=int, default=8, help='hilos del worker gthread de gunicorn')
+    args = parser.parse_args()
+
+    faltantes = [comando for comando in ('gunicorn', 'uvicorn') if shutil.which(comando) is None]
+    if faltantes:
+        sys.exit(f'Faltan {", ".join(faltantes)}: pip install gunicorn uvicorn')
+
+    directorio = tempfile.mkdtemp()
+    entorno = {**os.environ, 'DB_NAME': os.path.join(directorio, 'db.sqlite3'), 'DEBUG': 'False',
+               'ALLOWED_HOSTS': '127.0.0.1', 'TAREAS_STORAGE_BACKEND': 'tareas.storage.memoria.AlmacenMemoria'}
+    os.environ.update(entorno)
+    cookies = f'sessionid={preparar_base(directorio)}; csrftoken={CSRF}'
+
+    gunicorn = ['gunicorn', 'gestor_tareas.wsgi:application', '--workers', '1',
+                '--worker-class', 'gthread', '--threads', str(args.hilos_wsgi)]
+    uvicorn = ['uvicorn', 'gestor_tareas.asgi:application', '--workers', '1',
+               '--log-level', 'warning', '--no-access-log']
+    # (comando, DJANGO_SETTINGS_MODULE)
+    servidores = {
+        'WSGI': (gunicorn, 'gestor_tareas.settings'),
+        'ASGI': (uvicorn, 'gestor_tareas.settings_asgi'),
+        'ASGI (vistas sync)': (uvicorn, 'gestor_tareas.settings'),
+    }
+    print(f'{"servidor":>18} {"concurrencia":>12} {"req/s":>10} {"p50":>12} {"p99":>12}')
+    try:
+        for nombre, (comando, modulo) in servidores.items():
+            puerto = puerto_libre()
+            enlace = ['--bind', f'127.0.0.1:{puerto}'] if comando is gunicorn else ['--port', str(puerto)]
+            proceso = subprocess.Popen(comando + enlace, cwd=PROYECTO,
+                                       env={**entorno, 'DJANGO_SETTINGS_MODULE': modulo},
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                esperar_servidor(puerto, proceso)
+                cargar_tareas(puerto, cookies, args.tareas)
+                # Calentamiento: imports perezosos, plantillas y caché de fragmentos
+                asyncio.run(generar_carga(puerto, args.ruta, cookies, 4, 1))
+                for concurrencia in args.concurrencia:
+                    muestras, duracion = asyncio.run(
+                        generar_carga(puerto, args.ruta, cookies, concurrencia, args.segundos))
+                    print(f'{nombre:>18} {concurrencia:>12} {len(muestras) / duracion:>10,.0f} '
+                          f'{formatear_tiempo(percentil(muestras, 50))} {formatear_tiempo(percentil(muestras, 99))}')
+            finally:
+                proceso.terminate()
+                proceso.wait()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
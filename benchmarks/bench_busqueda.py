@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Benchmark de la búsqueda de texto completo por usuario: índice invertido
+en memoria frente a un recorrido lineal de las tareas, y FTS5 en SQLite.
+
+Se cargan ``--tareas`` tareas de un único usuario con palabras de un
+vocabulario sintético con distribución de Zipf (unas pocas palabras muy
+frecuentes y muchas raras, como en texto real) y se miden latencias
+(p50/p99) de consultas de una y dos palabras, con y sin prefijo.
+
+Uso:
+    python benchmarks/bench_busqueda.py [--tareas 100000] [--consultas 200]
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from _comun import configurar_django, percentil, formatear_tiempo
+
+TEMAS = [
+    'informe', 'reunión', 'canción', 'compras', 'factura', 'cliente', 'revisar',
+    'enviar', 'llamar', 'proyecto', 'presupuesto', 'diseño', 'pruebas', 'servidor',
+    'migración', 'documentar', 'equipo', 'contrato', 'entrega', 'campaña',
+]
+# 20 temas x 250 variantes; el rango de cada palabra fija su frecuencia
+VOCABULARIO = [f'{tema}{i}' if i else tema for i in range(250) for tema in TEMAS]
+PESOS = [1 / (rango + 1) for rango in range(len(VOCABULARIO))]
+CONSULTAS = ['informe', 'cancion', 'presu', 'cliente factura', 'migracion7 serv', 'equipo12 entrega']
+
+
+def texto(rng, palabras):
+    return ' '.join(rng.choices(VOCABULARIO, PESOS, k=palabras))
+
+
+def medir(buscar, consultas):
+    muestras = []
+    for i in range(consultas):
+        consulta = CONSULTAS[i % len(CONSULTAS)]
+        inicio = time.perf_counter()
+        buscar(consulta)
+        muestras.append(time.perf_counter() - inicio)
+    return muestras
+
+
+def recorrido_lineal(tareas):
+    from tareas.storage.busqueda import tokenizar
+
+    def buscar(consulta):
+        terminos = tokenizar(consulta)
+        encontradas = []
+        for tarea in tareas:
+            palabras = tokenizar(f"{tarea['titulo']} {tarea['descripcion']}")
+            if all(any(p.startswith(t) for p in palabras) for t in terminos):
+                encontradas.append(tarea)
+        return encontradas[-20:]
+    return buscar
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tareas', type=int, default=100_000)
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--sin-lineal', action='store_true', help='omite el recorrido lineal (lento)')
+    args = parser.parse_args()
+
+    configurar_django()
+    from tareas.storage.memoria import AlmacenMemoria
+    from tareas.storage.sqlite import AlmacenSQLite
+
+    rng = random.Random(42)
+    datos = [(texto(rng, 3), texto(rng, 12)) for _ in range(args.tareas)]
+
+    memoria = AlmacenMemoria()
+    for titulo, descripcion in datos:
+        memoria.agregar(titulo, descripcion, 'usuario')
+    inicio = time.perf_counter()
+    memoria.buscar_de_usuario('usuario', 'informe')
+    print(f'Construcción del índice ({args.tareas} tareas): {formatear_tiempo(time.perf_counter() - inicio)}')
+
+    with tempfile.TemporaryDirectory() as directorio:
+        sqlite = AlmacenSQLite(ruta=f'{directorio}/bench.sqlite3')
+        con = sqlite._conexion()
+        con.execute('BEGIN')
+        con.executemany('INSERT INTO tareas (titulo, descripcion, usuario) VALUES (?, ?, ?)',
+                        ((titulo, descripcion, 'usuario') for titulo, descripcion in datos))
+        con.execute('COMMIT')
+
+        variantes = {
+            'índice invertido': lambda consulta: memoria.buscar_de_usuario('usuario', consulta),
+            'SQLite FTS5': lambda consulta: sqlite.buscar_de_usuario('usuario', consulta),
+        }
+        if not args.sin_lineal:
+            variantes['recorrido lineal'] = recorrido_lineal(memoria.de_usuario('usuario'))
+
+        print(f'{"variante":>18} {"p50":>12} {"p99":>12}')
+        for nombre, buscar in variantes.items():
+            consultas = args.consultas if nombre != 'recorrido lineal' else min(args.consultas, 12)
+            muestras = medir(buscar, consultas)
+            print(f'{nombre:>18} {formatear_tiempo(percentil(muestras, 50))} '
+                  f'{formatear_tiempo(percentil(muestras, 99))}')
+        sqlite.cerrar()
+
+
+if __name__ == '__main__':
+    main()
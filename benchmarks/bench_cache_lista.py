@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Benchmark de lista_tareas con la caché de fragmentos y ETags.
+
+Mide latencia (p50/p99) de GET /tareas/ con ``--tareas`` tareas y
+``TAREAS_POR_PAGINA`` por página en tres casos:
+
+    sin caché      la caché de fragmentos reemplazada por DummyCache
+    fragmento      fragmento en caché, página completa sin ETag previo
+    304            el navegador ya tiene la página (If-None-Match)
+
+Uso:
+    python benchmarks/bench_cache_lista.py [--tareas 1000] [--requests 500]
+"""
+import argparse
+import time
+
+from _comun import base_de_datos_de_prueba, configurar_django, formatear_tiempo, percentil
+
+
+def medir(cliente, requests, **cabeceras):
+    from django.urls import reverse
+    url = reverse('tareas:lista_tareas')
+    muestras = []
+    for _ in range(requests):
+        inicio = time.perf_counter()
+        cliente.get(url, **cabeceras)
+        muestras.append(time.perf_counter() - inicio)
+    return muestras
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tareas', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    configurar_django()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from tareas import storage
+
+    with base_de_datos_de_prueba():
+        User.objects.create_user(username='bench', password='bench-pass-123')
+        cliente = Client()
+        cliente.login(username='bench', password='bench-pass-123')
+        for i in range(args.tareas):
+            storage.agregar_tarea(f'Tarea {i}', f'Descripción de la tarea {i} ' * 5, 'bench')
+
+        sin_cache = {**settings.CACHES, 'fragmentos': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=sin_cache):
+            resultados = {'sin caché': medir(cliente, args.requests)}
+        resultados['fragmento'] = medir(cliente, args.requests)
+        etag = cliente.get(reverse('tareas:lista_tareas'))['ETag']
+        resultados['304'] = medir(cliente, args.requests, HTTP_IF_NONE_MATCH=etag)
+
+        print(f'{"caso":>10} {"p50":>12} {"p99":>12} {"req/s":>10}')
+        for caso, muestras in resultados.items():
+            print(f'{caso:>10} {formatear_tiempo(percentil(muestras, 50))} '
+                  f'{formatear_tiempo(percentil(muestras, 99))} {len(muestras) / sum(muestras):>10,.0f}')
+
+
+if __name__ == '__main__':
+    main()
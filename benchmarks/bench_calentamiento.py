@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+Benchmark del arranque en frío de un worker, con y sin calentamiento.
+
+Cada corrida es un proceso nuevo con ``AlmacenDurable`` sobre una
+instantánea de ``--tareas`` tareas. Mide:
+
+    hasta 1ª respuesta   desde que arranca el proceso hasta que termina
+                         la primera request (incluye ``calentar()`` si se usa)
+    1ª request           duración de esa primera request
+    frío / tibio         por vista, la primera request frente a la mediana
+                         de las siguientes
+
+La creación de la base de prueba y del usuario no se cuenta (además deja
+el ORM y la conexión tibios en ambos modos).
+
+Uso:
+    python benchmarks/bench_calentamiento.py [--tareas 100000] [--corridas 5]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from _comun import base_de_datos_de_prueba, configurar_django, formatear_tiempo
+
+MODOS = ('frío', 'calentado')
+VISTAS = (
+    ('lista_tareas', ()),
+    ('detalle_tarea', (1,)),
+    ('editar_tarea', (1,)),
+    ('eliminar_tarea', (1,)),
+    ('crear_tarea', ()),
+    ('buscar_tareas', ()),
+    ('exportar_tareas', ()),
+    ('importar_tareas', ()),
+    ('login', ()),
+    ('registro', ()),
+)
+
+
+def sembrar(directorio, tareas):
+    configurar_django()
+    from tareas.storage.durable import AlmacenDurable
+    almacen = AlmacenDurable(directorio=directorio, sincronizar=False)
+    for inicio in range(0, tareas, 10_000):
+        almacen.aplicar_lote('bench', [('crear', f'Tarea {i}', f'Descripción de la tarea {i}')
+                                       for i in range(inicio, min(tareas, inicio + 10_000))])
+    almacen.instantanea()
+    almacen.cerrar()
+
+
+def hijo(modo, directorio, repeticiones, lanzado):
+    """Una corrida: imprime un JSON con los tiempos"""
+    configurar_django()
+    from django.conf import settings
+    from django.test import Client
+    from django.urls import reverse
+    settings.TAREAS_STORAGE = {
+        'BACKEND': 'tareas.storage.durable.AlmacenDurable',
+        'OPTIONS': {'directorio': directorio, 'sincronizar': False},
+    }
+    resultado = {'vistas': {}}
+    excluido = time.time()
+    with base_de_datos_de_prueba():
+        from django.contrib.auth.models import User
+        cliente = Client()
+        cliente.force_login(User.objects.create(username='bench'))
+        excluido = time.time() - excluido
+
+        calentar = 0.0
+        if modo == 'calentado':
+            from tareas.calentamiento import calentar as calentar_worker
+            inicio = time.perf_counter()
+            calentar_worker()
+            calentar = time.perf_counter() - inicio
+
+        for nombre, argumentos in VISTAS:
+            url = reverse(f'tareas:{nombre}', args=argumentos)
+            tiempos = []
+            for _ in range(repeticiones + 1):
+                inicio = time.perf_counter()
+                response = cliente.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                tiempos.append(time.perf_counter() - inicio)
+            if 'primera' not in resultado:
+                resultado['primera'] = tiempos[0]
+                resultado['hasta_primera'] = time.time() - lanzado - excluido - sum(tiempos[1:])
+            resultado['vistas'][nombre] = (tiempos[0], statistics.median(tiempos[1:]))
+    resultado['calentar'] = calentar
+    print(json.dumps(resultado))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tareas', type=int, default=100_000)
+    parser.add_argument('--corridas', type=int, default=5)
+    parser.add_argument('--repeticiones', type=int, default=10, help='requests tibias por vista')
+    parser.add_argument('--hijo', choices=MODOS, help=argparse.SUPPRESS)
+    parser.add_argument('--directorio', help=argparse.SUPPRESS)
+    parser.add_argument('--lanzado', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        hijo(args.hijo, args.directorio, args.repeticiones, args.lanzado)
+        return
+
+    with tempfile.TemporaryDirectory() as directorio:
+        sembrar(directorio, args.tareas)
+        corridas = {modo: [] for modo in MODOS}
+        # Se alternan los modos para repartir el ruido entre ambos
+        for _ in range(args.corridas):
+            for modo in MODOS:
+                salida = subprocess.run(
+                    [sys.executable, __file__, '--hijo', modo, '--directorio', directorio,
+                     '--repeticiones', str(args.repeticiones), '--lanzado', repr(time.time())],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                corridas[modo].append(json.loads(salida.splitlines()[-1]))
+
+    def mediana(modo, clave):
+        return statistics.median(corrida[clave] for corrida in corridas[modo])
+
+    print(f'{args.tareas:,} tareas, {args.corridas} corridas por modo (medianas)\n')
+    print(f'{"":>20} {"frío":>12} {"calentado":>12}')
+    for etiqueta, clave in (('calentar()', 'calentar'), ('1ª request', 'primera'),
+                            ('hasta 1ª respuesta', 'hasta_primera')):
+        print(f'{etiqueta:>20} {formatear_tiempo(mediana("frío", clave))} '
+              f'{formatear_tiempo(mediana("calentado", clave))}')
+
+    print(f'\n{"vista":<16} {"frío: 1ª":>12} {"calentado: 1ª":>14} {"tibia":>12}')
+    for nombre, _ in VISTAS:
+        frio = statistics.median(corrida['vistas'][nombre][0] for corrida in corridas['frío'])
+        calentado = statistics.median(corrida['vistas'][nombre][0] for corrida in corridas['calentado'])
+        tibia = statistics.median(corrida['vistas'][nombre][1] for modo in MODOS for corrida in corridas[modo])
+        print(f'{nombre:<16} {formatear_tiempo(frio)} {formatear_tiempo(calentado):>14} {formatear_tiempo(tibia)}')
+
+
+if __name__ == '__main__':
+    main()
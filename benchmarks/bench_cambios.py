@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+Benchmark del feed de cambios (SSE) con muchas conexiones en espera.
+
+Levanta uvicorn (1 worker, vistas async, backend en memoria) y para cada
+valor de ``--conexiones`` abre esa cantidad de conexiones a
+/tareas/cambios/ del mismo usuario. Con todas en espera mide:
+
+    RSS          memoria residente del worker
+    KiB/conexión RSS agregado por conexión respecto de cero conexiones
+    entrega      desde el POST que crea una tarea hasta que cada conexión
+                 recibe su evento (p50 y la última)
+    /tareas/     p50 de la lista con ``--concurrencia`` clientes mientras
+                 las conexiones siguen abiertas
+
+Requiere uvicorn (``pip install uvicorn``).
+
+Uso:
+    python benchmarks/bench_cambios.py [--conexiones 0 1000 5000] [--eventos 20]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from _comun import PROYECTO, formatear_tiempo, percentil
+from bench_asgi import CSRF, cargar_tareas, esperar_servidor, generar_carga, preparar_base, puerto_libre
+
+
+def rss(pid):
+    with open(f'/proc/{pid}/status') as archivo:
+        for linea in archivo:
+            if linea.startswith('VmRSS:'):
+                return int(linea.split()[1]) * 1024
+    return 0
+
+
+async def abrir(puerto, cookies):
+    lector, escritor = await asyncio.open_connection('127.0.0.1', puerto)
+    escritor.write((f'GET /tareas/cambios/ HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookies}\r\n'
+                    'Accept: text/event-stream\r\n\r\n').encode())
+    cabeceras = await lector.readuntil(b'\r\n\r\n')
+    if not cabeceras.startswith(b'HTTP/1.1 200'):
+        raise RuntimeError(cabeceras.split(b'\r\n', 1)[0].decode())
+    # Encabezado retry/id del flujo
+    await lector.readuntil(b'\n\n')
+    return lector, escritor
+
+
+async def esperar_evento(lector, llegadas):
+    await lector.readuntil(b'event: crear')
+    llegadas.append(time.perf_counter())
+
+
+async def crear_tarea(puerto, cookies):
+    # El POST va en un hilo: urllib bloquea y las conexiones deben seguir leyendo
+    await asyncio.to_thread(cargar_tareas, puerto, cookies, 1)
+
+
+async def medir(puerto, cookies, pid, conexiones, eventos, concurrencia, segundos, base):
+    abiertas = []
+    for inicio in range(0, conexiones, 500):
+        abiertas += await asyncio.gather(*(abrir(puerto, cookies) for _ in range(min(500, conexiones - inicio))))
+    await asyncio.sleep(0.5)
+    memoria = rss(pid)
+
+    entregas = []
+    for _ in range(eventos if conexiones else 0):
+        llegadas = []
+        esperas = [asyncio.ensure_future(esperar_evento(lector, llegadas)) for lector, _ in abiertas]
+        enviado = time.perf_counter()
+        await crear_tarea(puerto, cookies)
+        await asyncio.gather(*esperas)
+        entregas.append((percentil([t - enviado for t in llegadas], 50), max(llegadas) - enviado))
+
+    muestras, _ = await generar_carga(puerto, '/tareas/', cookies, concurrencia, segundos)
+    for _, escritor in abiertas:
+        escritor.close()
+
+    por_conexion = (memoria - base) / conexiones / 1024 if conexiones and base else 0
+    p50 = percentil([e[0] for e in entregas], 50) if entregas else None
+    ultima = percentil([e[1] for e in entregas], 50) if entregas else None
+    print(f'{conexiones:>11,} {memoria / 2**20:>8.1f} {por_conexion:>12.1f} '
+          f'{formatear_tiempo(p50) if p50 else "-":>12} {formatear_tiempo(ultima) if ultima else "-":>12} '
+          f'{formatear_tiempo(percentil(muestras, 50))}')
+    return memoria
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conexiones', type=int, nargs='+', default=[0, 1000, 5000])
+    parser.add_argument('--eventos', type=int, default=20, help='tareas creadas por medición de entrega')
+    parser.add_argument('--concurrencia', type=int, default=4, help='clientes de /tareas/')
+    parser.add_argument('--segundos', type=float, default=3)
+    args = parser.parse_args()
+
+    if shutil.which('uvicorn') is None:
+        sys.exit('Falta uvicorn: pip install uvicorn')
+
+    directorio = tempfile.mkdtemp()
+    entorno = {**os.environ, 'DB_NAME': os.path.join(directorio, 'db.sqlite3'), 'DEBUG': 'False',
+               'ALLOWED_HOSTS': '127.0.0.1', 'TAREAS_STORAGE_BACKEND': 'tareas.storage.memoria.AlmacenMemoria',
+               'DJANGO_SETTINGS_MODULE': 'gestor_tareas.settings_asgi', 'TAREAS_CAMBIOS_LATIDO': '60'}
+    os.environ.update(entorno)
+    cookies = f'sessionid={preparar_base(directorio)}; csrftoken={CSRF}'
+
+    puerto = puerto_libre()
+    proceso = subprocess.Popen(
+        ['uvicorn', 'gestor_tareas.asgi:application', '--port', str(puerto), '--log-level', 'warning',
+         '--no-access-log', '--backlog', '4096'],
+        cwd=PROYECTO, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    print(f'{"conexiones":>11} {"RSS MiB":>8} {"KiB/conexión":>12} {"entrega p50":>12} '
+          f'{"última":>12} {"/tareas/ p50":>12}')
+    try:
+        esperar_servidor(puerto, proceso)
+        cargar_tareas(puerto, cookies, 30)
+        asyncio.run(generar_carga(puerto, '/tareas/', cookies, 4, 1))
+        base = None
+        for conexiones in args.conexiones:
+            memoria = asyncio.run(medir(puerto, cookies, proceso.pid, conexiones, args.eventos,
+                                        args.concurrencia, args.segundos, base))
+            if conexiones == 0:
+                base = memoria
+    finally:
+        proceso.terminate()
+        proceso.wait()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+Benchmark del almacén durable (diario de escritura + instantáneas).
+
+1. Throughput de escritura con group commit según la cantidad de hilos,
+   con y sin fsync.
+2. Tiempo de recuperación al iniciar con un diario de millones de
+   operaciones, y con una instantánea más la cola del diario.
+
+Uso:
+    python benchmarks/bench_durabilidad.py [--hilos 1 4 16] [--operaciones 1000000 3000000]
+"""
+import argparse
+import gc
+import json
+import random
+import tempfile
+import threading
+import time
+
+from _comun import configurar_django, formatear_tiempo
+
+
+def throughput(AlmacenDurable, hilos, por_hilo, sincronizar):
+    with tempfile.TemporaryDirectory() as directorio:
+        almacen = AlmacenDurable(directorio=directorio, sincronizar=sincronizar,
+                                 operaciones_por_instantanea=10**9)
+        barrera = threading.Barrier(hilos + 1)
+
+        def trabajar(n):
+            barrera.wait()
+            for i in range(por_hilo):
+                almacen.agregar(f'Tarea {i}', 'Descripción', f'usuario{n}')
+
+        threads = [threading.Thread(target=trabajar, args=(n,)) for n in range(hilos)]
+        for t in threads:
+            t.start()
+        barrera.wait()
+        inicio = time.perf_counter()
+        for t in threads:
+            t.join()
+        duracion = time.perf_counter() - inicio
+        almacen.cerrar()
+        return hilos * por_hilo / duracion
+
+
+def generar_diario(ruta, operaciones, usuarios=1000):
+    """Escribe un diario sintético: 70% altas, 20% ediciones, 10% bajas"""
+    aleatorio = random.Random(42)
+    vivas = []
+    ultimo_id = 0
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        for _ in range(operaciones):
+            r = aleatorio.random()
+            if r < 0.7 or not vivas:
+                ultimo_id += 1
+                vivas.append(ultimo_id)
+                registro = ['a', ultimo_id, f'Tarea {ultimo_id}', 'Descripción de la tarea',
+                            f'usuario{ultimo_id % usuarios}', False]
+            elif r < 0.9:
+                tarea_id = aleatorio.choice(vivas)
+                registro = ['e', tarea_id, f'Tarea {tarea_id} editada', 'Otra descripción',
+                            f'usuario{tarea_id % usuarios}', False]
+            else:
+                indice = aleatorio.randrange(len(vivas))
+                vivas[indice], vivas[-1] = vivas[-1], vivas[indice]
+                registro = ['d', vivas.pop()]
+            archivo.write(json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+
+def recuperacion(AlmacenDurable, operaciones):
+    with tempfile.TemporaryDirectory() as directorio:
+        generar_diario(f'{directorio}/diario-00000001.log', operaciones)
+
+        inicio = time.perf_counter()
+        almacen = AlmacenDurable(directorio=directorio, sincronizar=False)
+        solo_diario = time.perf_counter() - inicio
+        tareas = len(almacen)
+
+        almacen.instantanea()
+        for i in range(operaciones // 10):
+            almacen.agregar(f'Cola {i}', 'Descripción', f'usuario{i % 1000}')
+        almacen.cerrar()
+        del almacen
+        gc.collect()
+
+        inicio = time.perf_counter()
+        AlmacenDurable(directorio=directorio).cerrar()
+        con_instantanea = time.perf_counter() - inicio
+        return tareas, solo_diario, con_instantanea
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hilos', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--escrituras', type=int, default=2000, help='escrituras por hilo')
+    parser.add_argument('--operaciones', type=int, nargs='+', default=[1_000_000, 3_000_000])
+    args = parser.parse_args()
+
+    configurar_django()
+    from tareas.storage.durable import AlmacenDurable
+
+    print('Escritura (group commit)')
+    print(f'{"hilos":>6} {"fsync":>6} {"escrituras/s":>14}')
+    for hilos in args.hilos:
+        for sincronizar in (True, False):
+            valor = throughput(AlmacenDurable, hilos, args.escrituras, sincronizar)
+            print(f'{hilos:>6} {"sí" if sincronizar else "no":>6} {valor:>14,.0f}')
+
+    print('\nRecuperación al iniciar')
+    print(f'{"operaciones":>12} {"tareas":>10} {"solo diario":>13} {"instantánea + 10%":>18}')
+    for operaciones in args.operaciones:
+        tareas, solo_diario, con_instantanea = recuperacion(AlmacenDurable, operaciones)
+        print(f'{operaciones:>12,} {tareas:>10,} {formatear_tiempo(solo_diario):>13} '
+              f'{formatear_tiempo(con_instantanea):>18}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Benchmark del almacén escalonado: memoria residente y latencia de carga
+desde disco con un acceso sesgado.
+
+Para ``AlmacenMemoria`` y ``AlmacenEscalonado`` (con ``--presupuesto``
+MiB) carga ``--usuarios`` usuarios con ``--tareas`` tareas cada uno, en
+un proceso nuevo para que el RSS de uno no afecte al otro, y luego hace
+``--accesos`` llamadas a ``de_usuario`` eligiendo al usuario con una ley
+de potencias: con ``--sesgo 4`` la mitad de los accesos va al ~6% de
+los usuarios. Mide:
+
+    RSS          memoria anónima residente (RssAnon) tras la carga y tras los
+                 accesos; no incluye las páginas del segmento leídas por mmap,
+                 que son caché del sistema y se pueden liberar
+    aciertos     accesos a usuarios que estaban en memoria
+    memoria      p50/p99 de de_usuario de un usuario en memoria
+    disco        p50/p99 de de_usuario de un usuario en disco (lo trae de vuelta)
+
+Uso:
+    python benchmarks/bench_escalonado.py [--usuarios 20000] [--tareas 50] [--presupuesto 32]
+"""
+import argparse
+import gc
+import multiprocessing
+import random
+import time
+
+from _comun import configurar_django, formatear_tiempo, percentil
+
+
+def rss():
+    with open('/proc/self/status') as archivo:
+        for linea in archivo:
+            if linea.startswith('RssAnon:'):
+                return int(linea.split()[1]) * 1024
+    return 0
+
+
+def medir(backend, args, resultados):
+    configurar_django()
+    from tareas.storage.escalonado import AlmacenEscalonado
+    from tareas.storage.memoria import AlmacenMemoria
+
+    if backend == 'escalonado':
+        almacen = AlmacenEscalonado(presupuesto=args.presupuesto * 2**20)
+    else:
+        almacen = AlmacenMemoria()
+    base = rss()
+    aleatorio = random.Random(0)
+    # Usuario por usuario, como una importación: intercalarlos cuando no
+    # caben en el presupuesto trae a cada uno de vuelta en cada alta
+    for i in range(args.usuarios * args.tareas):
+        almacen.agregar(f'Tarea {i}', 'Descripción de la tarea ' * aleatorio.randint(1, 6),
+                        f'usuario{i // args.tareas}')
+    gc.collect()
+    cargado = rss() - base
+
+    frios = getattr(almacen, '_frios', {})
+    latencias = {'memoria': [], 'disco': []}
+    for _ in range(args.accesos):
+        usuario = f'usuario{int(args.usuarios * aleatorio.random() ** args.sesgo)}'
+        nivel = 'disco' if usuario in frios else 'memoria'
+        inicio = time.perf_counter()
+        almacen.de_usuario(usuario)
+        latencias[nivel].append(time.perf_counter() - inicio)
+    resultados.put((backend, cargado, rss() - base, latencias))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=20_000)
+    parser.add_argument('--tareas', type=int, default=50, help='tareas por usuario')
+    parser.add_argument('--presupuesto', type=int, default=32, help='MiB del almacén escalonado')
+    parser.add_argument('--accesos', type=int, default=50_000)
+    parser.add_argument('--sesgo', type=float, default=4, help='exponente de la ley de potencias')
+    args = parser.parse_args()
+
+    contexto = multiprocessing.get_context('spawn')
+    resultados = contexto.Queue()
+    print(f'{"backend":<11} {"RSS carga":>10} {"RSS final":>10} {"aciertos":>9} '
+          f'{"memoria p50":>12} {"p99":>12} {"disco p50":>12} {"p99":>12}')
+    for backend in ('memoria', 'escalonado'):
+        proceso = contexto.Process(target=medir, args=(backend, args, resultados))
+        proceso.start()
+        nombre, cargado, final, latencias = resultados.get()
+        proceso.join()
+        calientes, frias = latencias['memoria'], latencias['disco']
+        aciertos = len(calientes) / (len(calientes) + len(frias))
+
+        def columnas(muestras):
+            if not muestras:
+                return f'{"-":>12} {"-":>12}'
+            return f'{formatear_tiempo(percentil(muestras, 50))} {formatear_tiempo(percentil(muestras, 99))}'
+
+        print(f'{nombre:<11} {cargado / 2**20:>7.0f} MiB {final / 2**20:>7.0f} MiB {aciertos:>9.1%} '
+              f'{columnas(calientes)} {columnas(frias)}')
+
+
+if __name__ == '__main__':
+    main()
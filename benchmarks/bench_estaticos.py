@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Benchmark de los estáticos propios y de la compresión del HTML.
+
+Corre ``collectstatic`` (nombres con hash y variantes .gz), levanta
+gunicorn (1 worker gthread) y para cada recurso de la lista de tareas
+mide:
+
+    bytes      tamaño del cuerpo sin y con ``Accept-Encoding: gzip``
+    p50 / req/s con ``--concurrencia`` clientes que aceptan gzip
+
+Al final resume los bytes de una primera visita (HTML y estáticos) y de
+una visita repetida, en la que los estáticos con hash salen de la caché
+del navegador (``Cache-Control: immutable``) y solo viaja el HTML.
+
+Requiere gunicorn (``pip install gunicorn``).
+
+Uso:
+    python benchmarks/bench_estaticos.py [--concurrencia 4] [--segundos 3] [--tareas 200]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from _comun import PROYECTO, formatear_tiempo, percentil
+from bench_asgi import CSRF, cargar_tareas, esperar_servidor, preparar_base, puerto_libre
+
+# Lo que baja un navegador al abrir la lista (de las fuentes, solo la woff2)
+ESTATICOS = (
+    'tareas/vendor/bootstrap/css/bootstrap.min.css',
+    'tareas/vendor/bootstrap-icons/bootstrap-icons.min.css',
+    'tareas/vendor/bootstrap-icons/fonts/bootstrap-icons.woff2',
+    'tareas/vendor/popper/popper.min.js',
+    'tareas/vendor/bootstrap/js/bootstrap.min.js',
+    'tareas/js/cambios.js',
+)
+
+
+def tamano(puerto, ruta, cookies, gzip):
+    encabezados = {'Cookie': cookies, **({'Accept-Encoding': 'gzip'} if gzip else {})}
+    request = urllib.request.Request(f'http://127.0.0.1:{puerto}{ruta}', headers=encabezados)
+    with urllib.request.urlopen(request) as respuesta:
+        return len(respuesta.read())
+
+
+async def cliente(puerto, peticion, hasta, muestras):
+    lector, escritor = await asyncio.open_connection('127.0.0.1', puerto)
+    try:
+        while time.perf_counter() < hasta:
+            inicio = time.perf_counter()
+            escritor.write(peticion)
+            cabeceras = await lector.readuntil(b'\r\n\r\n')
+            if not cabeceras.startswith(b'HTTP/1.1 200'):
+                raise RuntimeError(cabeceras.split(b'\r\n', 1)[0].decode())
+            for linea in cabeceras.split(b'\r\n'):
+                if linea.lower().startswith(b'content-length:'):
+                    await lector.readexactly(int(linea.split(b':')[1]))
+            muestras.append(time.perf_counter() - inicio)
+    finally:
+        escritor.close()
+
+
+async def generar_carga(puerto, ruta, cookies, concurrencia, segundos):
+    peticion = (f'GET {ruta} HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookies}\r\n'
+                'Accept-Encoding: gzip\r\nConnection: keep-alive\r\n\r\n').encode()
+    muestras = []
+    hasta = time.perf_counter() + segundos
+    await asyncio.gather(*(cliente(puerto, peticion, hasta, muestras) for _ in range(concurrencia)))
+    return muestras
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrencia', type=int, default=4)
+    parser.add_argument('--segundos', type=float, default=3)
+    parser.add_argument('--tareas', type=int, default=200)
+    parser.add_argument('--hilos', type=int, default=8, help='hilos del worker gthread')
+    args = parser.parse_args()
+
+    if shutil.which('gunicorn') is None:
+        sys.exit('Falta gunicorn: pip install gunicorn')
+
+    directorio = tempfile.mkdtemp()
+    raiz = os.path.join(directorio, 'static')
+    entorno = {**os.environ, 'DB_NAME': os.path.join(directorio, 'db.sqlite3'), 'DEBUG': 'False',
+               'ALLOWED_HOSTS': '127.0.0.1', 'TAREAS_STORAGE_BACKEND': 'tareas.storage.memoria.AlmacenMemoria',
+               'STATIC_ROOT': raiz}
+    os.environ.update(entorno)
+    cookies = f'sessionid={preparar_base(directorio)}; csrftoken={CSRF}'
+    subprocess.run([sys.executable, 'manage.py', 'collectstatic', '--noinput', '-v', '0'],
+                   cwd=PROYECTO, env=entorno, check=True)
+    with open(os.path.join(raiz, 'staticfiles.json')) as archivo:
+        manifest = json.load(archivo)['paths']
+
+    puerto = puerto_libre()
+    proceso = subprocess.Popen(
+        ['gunicorn', 'gestor_tareas.wsgi:application', '--workers', '1', '--worker-class', 'gthread',
+         '--threads', str(args.hilos), '--bind', f'127.0.0.1:{puerto}'],
+        cwd=PROYECTO, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        esperar_servidor(puerto, proceso)
+        cargar_tareas(puerto, cookies, args.tareas)
+        recursos = [('/tareas/', '/tareas/')] + [(nombre, f'/static/{manifest[nombre]}') for nombre in ESTATICOS]
+
+        print(f'{"recurso":<56} {"bytes":>9} {"gzip":>9} {"p50":>12} {"req/s":>8}')
+        totales = {}
+        for nombre, ruta in recursos:
+            identidad = tamano(puerto, ruta, cookies, gzip=False)
+            comprimido = tamano(puerto, ruta, cookies, gzip=True)
+            totales[nombre] = (identidad, comprimido)
+            asyncio.run(generar_carga(puerto, ruta, cookies, args.concurrencia, 0.5))
+            muestras = asyncio.run(generar_carga(puerto, ruta, cookies, args.concurrencia, args.segundos))
+            print(f'{nombre:<56} {identidad:>9,} {comprimido:>9,} {formatear_tiempo(percentil(muestras, 50))} '
+                  f'{len(muestras) / args.segundos:>8,.0f}')
+
+        primera = [sum(total[i] for total in totales.values()) for i in (0, 1)]
+        print(f'\nprimera visita: {primera[0]:,} bytes, {primera[1]:,} con gzip')
+        print(f'visita repetida (estáticos en caché): {totales["/tareas/"][1]:,} bytes con gzip')
+    finally:
+        proceso.terminate()
+        proceso.wait()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
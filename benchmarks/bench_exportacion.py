@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""
+Benchmark de la exportación en streaming: memoria pico y throughput de
+exportar las tareas de un usuario según cuántas tenga.
+
+Compara armar la respuesta completa en memoria (lista de tareas + CSV en
+un solo str) con el flujo por bloques de ``exportar_tareas`` (CSV, NDJSON
+y CSV comprimido con gzip). El pico se mide con tracemalloc y no incluye
+las tareas ya cargadas en el almacén; el throughput se mide en una
+pasada aparte, sin tracemalloc.
+
+Uso:
+    python benchmarks/bench_exportacion.py [--tamanos 10000 100000 1000000]
+"""
+import argparse
+import time
+import tracemalloc
+
+from _comun import configurar_django
+
+
+def medir(generar):
+    # tracemalloc encarece cada asignación: el tiempo se mide en otra pasada
+    inicio = time.perf_counter()
+    total = sum(len(bloque) for bloque in generar())
+    duracion = time.perf_counter() - inicio
+    tracemalloc.start()
+    sum(len(bloque) for bloque in generar())
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return total, duracion, pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    configurar_django()
+    from tareas import storage
+    from tareas.exportacion import comprimir_gzip, en_bloques, lineas_csv, lineas_ndjson
+
+    variantes = {
+        'lista completa': lambda: [''.join(lineas_csv(storage.obtener_tareas_usuario('bench'))).encode()],
+        'csv streaming': lambda: en_bloques(lineas_csv(storage.iterar_tareas_usuario('bench'))),
+        'ndjson streaming': lambda: en_bloques(lineas_ndjson(storage.iterar_tareas_usuario('bench'))),
+        'csv.gz streaming': lambda: comprimir_gzip(en_bloques(lineas_csv(storage.iterar_tareas_usuario('bench')))),
+    }
+    print(f'{"tareas":>10} {"variante":>18} {"salida":>10} {"pico":>10} {"tareas/s":>12}')
+    for tamano in args.tamanos:
+        storage.tareas_storage.clear()
+        for i in range(tamano):
+            storage.agregar_tarea(f'Tarea {i}', f'Descripción de la tarea {i}', 'bench')
+        for nombre, generar in variantes.items():
+            total, duracion, pico = medir(generar)
+            print(f'{tamano:>10} {nombre:>18} {total / 2**20:>7.1f} MB {pico / 2**20:>7.1f} MB '
+                  f'{tamano / duracion:>12,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""
+Benchmark de una ráfaga de logins frente al resto del tráfico.
+
+Levanta gunicorn (1 worker gthread) y mide la latencia de GET ``--ruta``
+con ``--concurrencia`` clientes en tres casos:
+
+    sin ráfaga       solo el tráfico normal
+    hash en línea    ``--rafaga`` clientes haciendo POST /login/ sin parar,
+                     con PBKDF2PasswordHasher en el hilo de la request
+    hash en pool     la misma ráfaga con PBKDF2EnProcesosHasher
+                     (tareas/contrasenas.py, 503 al saturarse)
+
+Para los logins reporta cuántos terminaron por segundo y cuántos se
+rechazaron con 503.
+
+Requiere gunicorn (``pip install gunicorn``).
+
+Uso:
+    python benchmarks/bench_logins.py [--rafaga 16] [--concurrencia 4] [--segundos 10]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+from _comun import PROYECTO, formatear_tiempo, percentil
+from bench_asgi import CSRF, cargar_tareas, esperar_servidor, preparar_base, puerto_libre
+
+# Settings del caso "hash en línea": el hasher de Django, sin pool
+SETTINGS_EN_LINEA = """
+from gestor_tareas.settings import *  # noqa: F401,F403
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.PBKDF2PasswordHasher']
+"""
+
+
+async def cliente(puerto, peticion, hasta, muestras, estados):
+    lector, escritor = await asyncio.open_connection('127.0.0.1', puerto)
+    try:
+        while time.perf_counter() < hasta:
+            inicio = time.perf_counter()
+            escritor.write(peticion)
+            cabeceras = await lector.readuntil(b'\r\n\r\n')
+            largo = 0
+            for linea in cabeceras.split(b'\r\n'):
+                if linea.lower().startswith(b'content-length:'):
+                    largo = int(linea.split(b':')[1])
+            await lector.readexactly(largo)
+            muestras.append(time.perf_counter() - inicio)
+            estados[int(cabeceras.split(b' ', 2)[1])] += 1
+    finally:
+        escritor.close()
+
+
+async def generar_carga(puerto, ruta, cookies, concurrencia, rafaga, segundos):
+    normal = (f'GET {ruta} HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookies}\r\n'
+              'Connection: keep-alive\r\n\r\n').encode()
+    cuerpo = urlencode({'username': 'bench', 'password': 'bench-pass-123'})
+    login = (f'POST /login/ HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: csrftoken={CSRF}\r\n'
+             f'X-CSRFToken: {CSRF}\r\nContent-Type: application/x-www-form-urlencoded\r\n'
+             f'Content-Length: {len(cuerpo)}\r\nConnection: keep-alive\r\n\r\n{cuerpo}').encode()
+    muestras, estados = [], Counter()
+    logins, estados_login = [], Counter()
+    hasta = time.perf_counter() + segundos
+    await asyncio.gather(
+        *(cliente(puerto, normal, hasta, muestras, estados) for _ in range(concurrencia)),
+        *(cliente(puerto, login, hasta, logins, estados_login) for _ in range(rafaga)),
+    )
+    return muestras, estados, estados_login
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rafaga', type=int, default=16, help='clientes haciendo login en paralelo')
+    parser.add_argument('--concurrencia', type=int, default=4, help='clientes de tráfico normal')
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--tareas', type=int, default=200)
+    parser.add_argument('--ruta', default='/tareas/')
+    parser.add_argument('--hilos', type=int, default=32, help='hilos del worker gthread')
+    args = parser.parse_args()
+
+    if shutil.which('gunicorn') is None:
+        sys.exit('Falta gunicorn: pip install gunicorn')
+
+    directorio = tempfile.mkdtemp()
+    with open(os.path.join(directorio, 'settings_hash_en_linea.py'), 'w') as archivo:
+        archivo.write(SETTINGS_EN_LINEA)
+    entorno = {**os.environ, 'DB_NAME': os.path.join(directorio, 'db.sqlite3'), 'DEBUG': 'False',
+               'ALLOWED_HOSTS': '127.0.0.1', 'TAREAS_STORAGE_BACKEND': 'tareas.storage.memoria.AlmacenMemoria',
+               'PYTHONPATH': directorio}
+    os.environ.update(entorno)
+    cookies = f'sessionid={preparar_base(directorio)}; csrftoken={CSRF}'
+
+    casos = (
+        ('sin ráfaga', 'gestor_tareas.settings', 0),
+        ('hash en línea', 'settings_hash_en_linea', args.rafaga),
+        ('hash en pool', 'gestor_tareas.settings', args.rafaga),
+    )
+    print(f'{"caso":>14} {"req/s":>8} {"p50":>12} {"p99":>12} {"logins/s":>9} {"503":>6}')
+    try:
+        for nombre, modulo, rafaga in casos:
+            puerto = puerto_libre()
+            proceso = subprocess.Popen(
+                ['gunicorn', 'gestor_tareas.wsgi:application', '--workers', '1', '--worker-class', 'gthread',
+                 '--threads', str(args.hilos), '--bind', f'127.0.0.1:{puerto}'],
+                cwd=PROYECTO, env={**entorno, 'DJANGO_SETTINGS_MODULE': modulo, 'TAREAS_CALENTAR_AL_INICIAR': 'True'},
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                esperar_servidor(puerto, proceso)
+                cargar_tareas(puerto, cookies, args.tareas)
+                asyncio.run(generar_carga(puerto, args.ruta, cookies, args.concurrencia, 0, 1))
+                muestras, estados, estados_login = asyncio.run(
+                    generar_carga(puerto, args.ruta, cookies, args.concurrencia, rafaga, args.segundos))
+                print(f'{nombre:>14} {len(muestras) / args.segundos:>8,.0f} '
+                      f'{formatear_tiempo(percentil(muestras, 50))} {formatear_tiempo(percentil(muestras, 99))} '
+                      f'{estados_login[302] / args.segundos:>9.1f} {estados_login[503]:>6}')
+            finally:
+                proceso.terminate()
+                proceso.wait()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
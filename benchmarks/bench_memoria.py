@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Benchmark de memoria por tarea: dict (representación original) frente a
+TareaCompacta (__slots__ + usuarios internados).
+
+Cada medición corre en un subproceso nuevo y reporta la memoria asignada
+según tracemalloc y, en otro subproceso sin tracemalloc (que tiene su
+propio costo de memoria), el crecimiento del RSS.
+
+Uso:
+    python benchmarks/bench_memoria.py [--tareas 1000000] [--usuarios 1000]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tracemalloc
+
+from _comun import configurar_django
+
+
+def rss_bytes():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * 4096
+
+
+def construir(disposicion, tareas, usuarios):
+    from tareas.storage.memoria import AlmacenMemoria, TareaCompacta
+    if disposicion == 'almacen':
+        almacen = AlmacenMemoria()
+        for i in range(tareas):
+            # Un str nuevo por tarea, como el que llega con cada request
+            almacen.agregar(f'Tarea {i}', f'Descripción de la tarea {i}', ''.join(('usuario', str(i % usuarios))))
+        return almacen
+    if disposicion == 'dict':
+        return [
+            {'id': i, 'titulo': f'Tarea {i}', 'descripcion': f'Descripción de la tarea {i}',
+             'usuario': ''.join(('usuario', str(i % usuarios))), 'completada': False}
+            for i in range(tareas)
+        ]
+    return [
+        TareaCompacta(i, f'Tarea {i}', f'Descripción de la tarea {i}', ''.join(('usuario', str(i % usuarios))))
+        for i in range(tareas)
+    ]
+
+
+def medir(disposicion, tareas, usuarios, con_tracemalloc):
+    configurar_django()
+    if con_tracemalloc:
+        tracemalloc.start()
+    rss_inicial = rss_bytes()
+    datos = construir(disposicion, tareas, usuarios)
+    medida = tracemalloc.get_traced_memory()[0] if con_tracemalloc else rss_bytes() - rss_inicial
+    del datos
+    return medida
+
+
+def en_subproceso(disposicion, args, con_tracemalloc):
+    comando = [sys.executable, __file__, '--medir', disposicion,
+               '--tareas', str(args.tareas), '--usuarios', str(args.usuarios)]
+    if con_tracemalloc:
+        comando.append('--tracemalloc')
+    salida = subprocess.run(comando, check=True, capture_output=True, text=True).stdout
+    return json.loads(salida.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tareas', type=int, default=1_000_000)
+    parser.add_argument('--usuarios', type=int, default=1_000)
+    parser.add_argument('--medir', choices=['dict', 'compacta', 'almacen'], help=argparse.SUPPRESS)
+    parser.add_argument('--tracemalloc', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(medir(args.medir, args.tareas, args.usuarios, args.tracemalloc)))
+        return
+
+    print(f'{"representación":>28} {"tracemalloc":>12} {"RSS":>10} {"bytes/tarea":>12}')
+    etiquetas = {
+        'dict': 'dict por tarea',
+        'compacta': 'TareaCompacta',
+        'almacen': 'AlmacenMemoria (+ índices)',
+    }
+    for disposicion, etiqueta in etiquetas.items():
+        asignado = en_subproceso(disposicion, args, con_tracemalloc=True)
+        rss = en_subproceso(disposicion, args, con_tracemalloc=False)
+        print(f'{etiqueta:>28} {asignado / 2**20:>9.1f} MB {rss / 2**20:>7.1f} MB '
+              f'{asignado / args.tareas:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
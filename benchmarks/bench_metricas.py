@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Benchmark del costo de las métricas (tareas/metricas.py).
+
+Mide:
+    observar         una observación de histograma, en 1 y en ``--hilos`` hilos
+    storage          obtener_tarea_por_id con y sin el decorador medir_storage
+    request          GET /tareas/ con y sin MetricasMiddleware (p50)
+    /metrics         generar el texto de Prometheus con las series acumuladas
+
+Uso:
+    python benchmarks/bench_metricas.py [--observaciones 1000000] [--hilos 4] [--requests 2000]
+"""
+import argparse
+import threading
+import time
+
+from _comun import base_de_datos_de_prueba, configurar_django, cronometrar, formatear_tiempo, percentil
+
+
+def por_observacion(histograma, observaciones, hilos):
+    def trabajar():
+        observar = histograma.observar
+        for i in range(observaciones // hilos):
+            observar(('vista', 'GET', 200), (i % 1000) / 1e5)
+
+    trabajadores = [threading.Thread(target=trabajar) for _ in range(hilos)]
+    inicio = time.perf_counter()
+    for hilo in trabajadores:
+        hilo.start()
+    for hilo in trabajadores:
+        hilo.join()
+    return (time.perf_counter() - inicio) / observaciones
+
+
+def latencias(cliente, url, requests):
+    muestras = []
+    for _ in range(requests):
+        inicio = time.perf_counter()
+        cliente.get(url)
+        muestras.append(time.perf_counter() - inicio)
+    return muestras
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--observaciones', type=int, default=1_000_000)
+    parser.add_argument('--hilos', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    configurar_django()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from tareas import metricas, storage
+
+    histograma = metricas.Histograma('bench', 'Bench.', ('vista', 'metodo', 'estado'), metricas.BUCKETS_DURACION)
+    print(f'observar, 1 hilo:      {formatear_tiempo(por_observacion(histograma, args.observaciones, 1))}')
+    print(f'observar, {args.hilos} hilos:     '
+          f'{formatear_tiempo(por_observacion(histograma, args.observaciones, args.hilos))}')
+
+    tarea = storage.agregar_tarea('T', 'D', 'bench')
+    sin_medir = storage.obtener_tarea_por_id.__wrapped__
+    directo = cronometrar(lambda: sin_medir(tarea['id']), args.observaciones)
+    medido = cronometrar(lambda: storage.obtener_tarea_por_id(tarea['id']), args.observaciones)
+    print(f'storage sin métricas:  {formatear_tiempo(directo)}')
+    print(f'storage con métricas:  {formatear_tiempo(medido)}  (+{formatear_tiempo(medido - directo).strip()})')
+
+    with base_de_datos_de_prueba():
+        User.objects.create_user(username='bench', password='bench-pass-123')
+        cliente = Client()
+        cliente.login(username='bench', password='bench-pass-123')
+        url = reverse('tareas:lista_tareas')
+        sin_middleware = [m for m in settings.MIDDLEWARE if m != 'tareas.middleware.MetricasMiddleware']
+        # Se alternan las rondas para que el ruido afecte a ambos casos por igual
+        con, sin = [], []
+        for _ in range(5):
+            with override_settings(MIDDLEWARE=sin_middleware):
+                sin += latencias(cliente, url, args.requests // 5)
+            con += latencias(cliente, url, args.requests // 5)
+        p50_sin, p50_con = percentil(sin, 50), percentil(con, 50)
+        print(f'request sin middleware: {formatear_tiempo(p50_sin)}')
+        print(f'request con middleware: {formatear_tiempo(p50_con)}  (+{formatear_tiempo(p50_con - p50_sin).strip()})')
+
+    print(f'/metrics:              {formatear_tiempo(cronometrar(metricas.exportar, 100))}')
+
+
+if __name__ == '__main__':
+    main()
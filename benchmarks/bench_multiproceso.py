@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Benchmark del backend compartido entre procesos (SQLite en modo WAL).
+
+Lanza N procesos worker contra el mismo archivo y mide lecturas y
+escrituras por segundo agregadas, primero con una carga solo de
+lectura y luego solo de escritura.
+
+Uso:
+    python benchmarks/bench_multiproceso.py [--workers 1 2 4 8] [--segundos 3]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from _comun import configurar_django
+
+
+def worker(ruta, modo, segundos, usuarios, total_tareas, inicio, resultados):
+    from tareas.storage.sqlite import AlmacenSQLite
+    almacen = AlmacenSQLite(ruta=ruta)
+    aleatorio = random.Random(os.getpid())
+    operaciones = 0
+    inicio.wait()
+    fin = time.perf_counter() + segundos
+    while time.perf_counter() < fin:
+        if modo == 'lectura':
+            if operaciones % 2:
+                almacen.obtener(aleatorio.randint(1, total_tareas))
+            else:
+                almacen.de_usuario(f'usuario{aleatorio.randrange(usuarios)}')
+        else:
+            almacen.agregar('Tarea', 'Descripción', f'usuario{aleatorio.randrange(usuarios)}')
+        operaciones += 1
+    resultados.put(operaciones)
+
+
+def ejecutar(ruta, modo, workers, segundos, usuarios, total_tareas):
+    contexto = multiprocessing.get_context('fork')
+    inicio = contexto.Barrier(workers + 1)
+    resultados = contexto.Queue()
+    procesos = [
+        contexto.Process(target=worker, args=(ruta, modo, segundos, usuarios, total_tareas, inicio, resultados))
+        for _ in range(workers)
+    ]
+    for p in procesos:
+        p.start()
+    inicio.wait()
+    total = sum(resultados.get() for _ in procesos)
+    for p in procesos:
+        p.join()
+    return total / segundos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--segundos', type=float, default=3)
+    parser.add_argument('--tareas', type=int, default=50_000, help='tareas precargadas')
+    parser.add_argument('--usuarios', type=int, default=500)
+    args = parser.parse_args()
+
+    configurar_django()
+    from tareas.storage.sqlite import AlmacenSQLite
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'tareas.sqlite3')
+        AlmacenSQLite(ruta=ruta)  # crea el esquema
+        with sqlite3.connect(ruta) as con:
+            con.executemany(
+                'INSERT INTO tareas (titulo, descripcion, usuario) VALUES (?, ?, ?)',
+                ((f'Tarea {i}', 'Descripción', f'usuario{i % args.usuarios}') for i in range(args.tareas))
+            )
+
+        print(f'{"workers":>8} {"lecturas/s":>12} {"escrituras/s":>13}')
+        for workers in args.workers:
+            lecturas = ejecutar(ruta, 'lectura', workers, args.segundos, args.usuarios, args.tareas)
+            escrituras = ejecutar(ruta, 'escritura', workers, args.segundos, args.usuarios, args.tareas)
+            print(f'{workers:>8} {lecturas:>12,.0f} {escrituras:>13,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Benchmark de las páginas ordenadas por título, estado y fecha de edición.
+
+Para un usuario con ``--tamanos`` tareas, en los almacenes en memoria y
+SQLite, y para cada orden de ``base.ORDENES`` compara:
+
+    ordenar      de_usuario + sorted + primeras --pagina (sin índice)
+    armar        primera página pedida en ese orden (memoria: arma el índice)
+    primera      primera página con el índice ya armado
+    cursor       página desde un cursor a mitad de la lista
+    escritura    editar una tarea (memoria: ajusta los índices armados)
+
+Uso:
+    python benchmarks/bench_ordenes.py [--tamanos 1000 10000 100000] [--pagina 20]
+"""
+import argparse
+import random
+import tempfile
+
+from _comun import configurar_django, cronometrar, formatear_tiempo
+
+
+def medir(almacen, n, pagina, repeticiones):
+    from tareas.storage.base import ORDENES, clave_orden, cursor_orden
+
+    aleatorio = random.Random(0)
+    ids = [almacen.agregar(f'Tarea {aleatorio.random():.8f}', 'Descripción', 'bench')['id'] for _ in range(n)]
+    for tarea_id in aleatorio.sample(ids, n // 3):
+        almacen.marcar(tarea_id, True)
+    filas = {}
+    for orden in ORDENES:
+        def ordenar():
+            tareas = almacen.de_usuario('bench')
+            return sorted(tareas, key=lambda t: clave_orden(orden, t[orden], t['id']))[:pagina]
+
+        armar = cronometrar(lambda: almacen.pagina_de_usuario('bench', None, pagina, orden=orden))
+        mitad = almacen.pagina_de_usuario('bench', None, n // 2, orden=orden)[-1]
+        filas[orden] = (
+            cronometrar(ordenar, max(1, repeticiones // 10)),
+            armar,
+            cronometrar(lambda: almacen.pagina_de_usuario('bench', None, pagina, orden=orden), repeticiones),
+            cronometrar(lambda: almacen.pagina_de_usuario('bench', cursor_orden(orden, mitad), pagina, orden=orden),
+                        repeticiones),
+        )
+    elegidos = iter(aleatorio.choices(ids, k=repeticiones))
+    escritura = cronometrar(lambda: almacen.editar(next(elegidos), f'Tarea {aleatorio.random():.8f}', 'D'),
+                            repeticiones)
+    return {orden: (*tiempos, escritura) for orden, tiempos in filas.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--pagina', type=int, default=20)
+    parser.add_argument('--repeticiones', type=int, default=200)
+    args = parser.parse_args()
+
+    configurar_django()
+    from tareas.storage.memoria import AlmacenMemoria
+    from tareas.storage.sqlite import AlmacenSQLite
+
+    columnas = ('ordenar', 'armar', 'primera', 'cursor', 'escritura')
+    print(f'{"tareas":>8} {"almacén":>8} {"orden":>12} ' + ' '.join(f'{c:>12}' for c in columnas))
+    for n in args.tamanos:
+        with tempfile.TemporaryDirectory() as directorio:
+            for nombre, almacen in (('memoria', AlmacenMemoria()),
+                                    ('sqlite', AlmacenSQLite(ruta=f'{directorio}/bench.sqlite3'))):
+                for orden, tiempos in medir(almacen, n, args.pagina, args.repeticiones).items():
+                    celdas = ' '.join(formatear_tiempo(t).rjust(12) for t in tiempos)
+                    print(f'{n:>8} {nombre:>8} {orden:>12} {celdas}')
+                almacen.cerrar()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Benchmark del almacenamiento particionado por usuario (particiones SQLite).
+
+Para cada valor de ``--particiones`` lanza ``--workers`` procesos que
+escriben a través de ``AlmacenParticionado`` (cada partición es un
+archivo SQLite) y mide las escrituras y lecturas por segundo agregadas.
+Con una sola partición todos los workers compiten por el lock de
+escritura del mismo archivo; con varias, solo los que escriben tareas de
+usuarios en la misma partición.
+
+Después precarga ``--tareas`` tareas, agrega una partición y mide el
+rebalanceo en línea: tiempo total, tareas movidas y latencia de las
+escrituras que un worker sigue haciendo mientras tanto.
+
+Uso:
+    python benchmarks/bench_particiones.py [--workers 4] [--particiones 1 2 4] [--tareas 50000]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+from _comun import configurar_django, formatear_tiempo, percentil
+
+
+def opciones(directorio, particiones, gracia=0.5):
+    return {
+        'particiones': {f'p{n}': {'BACKEND': 'tareas.storage.sqlite.AlmacenSQLite',
+                                  'OPTIONS': {'ruta': os.path.join(directorio, f'p{n}.sqlite3')}}
+                        for n in range(particiones)},
+        'mapa': os.path.join(directorio, 'particiones.json'),
+        'gracia': gracia,
+    }
+
+
+def worker(config, modo, segundos, usuarios, inicio, resultados):
+    from tareas.storage.particionado import AlmacenParticionado
+    almacen = AlmacenParticionado(**config)
+    aleatorio = random.Random(os.getpid())
+    operaciones = 0
+    inicio.wait()
+    fin = time.perf_counter() + segundos
+    while time.perf_counter() < fin:
+        usuario = f'usuario{aleatorio.randrange(usuarios)}'
+        if modo == 'lectura':
+            almacen.pagina_de_usuario(usuario, None, 30)
+        else:
+            almacen.agregar('Tarea', 'Descripción', usuario)
+        operaciones += 1
+    resultados.put(operaciones)
+
+
+def ejecutar(config, modo, workers, segundos, usuarios):
+    contexto = multiprocessing.get_context('fork')
+    inicio = contexto.Barrier(workers + 1)
+    resultados = contexto.Queue()
+    procesos = [contexto.Process(target=worker, args=(config, modo, segundos, usuarios, inicio, resultados))
+                for _ in range(workers)]
+    for p in procesos:
+        p.start()
+    inicio.wait()
+    total = sum(resultados.get() for _ in procesos)
+    for p in procesos:
+        p.join()
+    return total / segundos
+
+
+def rebalanceo(directorio, particiones, tareas, usuarios):
+    from tareas.storage.particionado import AlmacenParticionado
+    almacen = AlmacenParticionado(**opciones(directorio, particiones))
+    for inicio in range(0, tareas, 1000):
+        for i in range(inicio, min(tareas, inicio + 1000)):
+            almacen.agregar(f'Tarea {i}', 'Descripción', f'usuario{i % usuarios}')
+
+    ampliado = AlmacenParticionado(**opciones(directorio, particiones + 1))
+    latencias = []
+    terminado = threading.Event()
+
+    def escribir():
+        # Otro "worker": su propia instancia, que se entera del mapa por el archivo
+        otro = AlmacenParticionado(**opciones(directorio, particiones + 1))
+        aleatorio = random.Random(0)
+        while not terminado.is_set():
+            inicio = time.perf_counter()
+            otro.agregar('Durante', 'el rebalanceo', f'usuario{aleatorio.randrange(usuarios)}')
+            latencias.append(time.perf_counter() - inicio)
+            time.sleep(0.001)
+
+    hilo = threading.Thread(target=escribir)
+    hilo.start()
+    inicio = time.perf_counter()
+    ranuras, movidas = ampliado.rebalancear()
+    duracion = time.perf_counter() - inicio
+    terminado.set()
+    hilo.join()
+    print(f'\nrebalanceo {particiones} -> {particiones + 1} particiones: {ranuras} ranuras, '
+          f'{movidas:,} tareas en {duracion:.2f} s')
+    print(f'escrituras durante el rebalanceo: {len(latencias):,}, p50 {formatear_tiempo(percentil(latencias, 50))}, '
+          f'p99 {formatear_tiempo(percentil(latencias, 99))}, máx {formatear_tiempo(max(latencias))}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--particiones', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--segundos', type=float, default=3)
+    parser.add_argument('--usuarios', type=int, default=500)
+    parser.add_argument('--tareas', type=int, default=50_000, help='tareas precargadas antes del rebalanceo')
+    args = parser.parse_args()
+
+    configurar_django()
+
+    print(f'{"particiones":>11} {"escrituras/s":>13} {"lecturas/s":>12}')
+    for particiones in args.particiones:
+        with tempfile.TemporaryDirectory() as directorio:
+            config = opciones(directorio, particiones)
+            escrituras = ejecutar(config, 'escritura', args.workers, args.segundos, args.usuarios)
+            lecturas = ejecutar(config, 'lectura', args.workers, args.segundos, args.usuarios)
+            print(f'{particiones:>11} {escrituras:>13,.0f} {lecturas:>12,.0f}')
+
+    with tempfile.TemporaryDirectory() as directorio:
+        rebalanceo(directorio, max(args.particiones), args.tareas, args.usuarios)
+
+
+if __name__ == '__main__':
+    main()
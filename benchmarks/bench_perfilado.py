@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Benchmark del perfilado de requests (tareas/perfilado.py).
+
+Mide el p50 de GET /tareas/ de un usuario staff con ``--tareas`` tareas:
+
+    sin middleware   TAREAS_PERFILADO_DIR vacío (el middleware no se instala)
+    inactivo         middleware instalado, request sin X-Perfilar ni muestreo
+    perfilando       con X-Perfilar: cProfile, SQL y escritura de los archivos
+
+y el tamaño de los archivos de un perfil.
+
+Uso:
+    python benchmarks/bench_perfilado.py [--requests 1000] [--tareas 100]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from _comun import base_de_datos_de_prueba, configurar_django, formatear_tiempo, percentil
+
+
+def latencias(cliente, url, requests, **encabezados):
+    muestras = []
+    for _ in range(requests):
+        inicio = time.perf_counter()
+        cliente.get(url, **encabezados)
+        muestras.append(time.perf_counter() - inicio)
+    return muestras
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--tareas', type=int, default=100)
+    args = parser.parse_args()
+
+    configurar_django()
+    from django.contrib.auth.models import User
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from tareas import storage
+
+    with base_de_datos_de_prueba(), tempfile.TemporaryDirectory() as directorio:
+        usuario = User.objects.create_user(username='bench', password='bench-pass-123', is_staff=True)
+        for i in range(args.tareas):
+            storage.agregar_tarea(f'Tarea {i}', 'Descripción', 'bench')
+        url = reverse('tareas:lista_tareas')
+        # Un cliente por configuración: cada uno arma su cadena de middlewares al primer request
+        clientes = {}
+        for nombre, ruta in (('sin middleware', ''), ('inactivo', directorio)):
+            with override_settings(TAREAS_PERFILADO_DIR=ruta):
+                clientes[nombre] = Client()
+                clientes[nombre].force_login(usuario)
+                clientes[nombre].get(url)
+
+        # Se alternan las rondas para que el ruido afecte a ambos casos por igual
+        muestras = {nombre: [] for nombre in clientes}
+        for _ in range(5):
+            for nombre, cliente in clientes.items():
+                muestras[nombre] += latencias(cliente, url, args.requests // 5)
+        perfilando = latencias(clientes['inactivo'], url, max(1, args.requests // 20), HTTP_X_PERFILAR='1')
+
+        base = percentil(muestras['sin middleware'], 50)
+        for nombre, valores in (*muestras.items(), ('perfilando', perfilando)):
+            p50 = percentil(valores, 50)
+            print(f'{nombre:<15} {formatear_tiempo(p50)}  (+{formatear_tiempo(p50 - base).strip()})')
+
+        ultimo = max(os.scandir(directorio), key=lambda entrada: entrada.stat().st_mtime).name.split('.')[0]
+        for extension in ('.collapsed', '.sql.collapsed'):
+            ruta = os.path.join(directorio, ultimo + extension)
+            with open(ruta, encoding='utf-8') as archivo:
+                lineas = sum(1 for _ in archivo)
+            print(f'{extension:<15} {os.path.getsize(ruta):>9,} bytes, {lineas:,} pilas')
+
+
+if __name__ == '__main__':
+    main()
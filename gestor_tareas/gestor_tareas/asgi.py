@@ -11,6 +11,13 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gestor_tareas.settings')
+# Bajo ASGI se sirven las vistas async de tareas (ver settings_asgi.py)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gestor_tareas.settings_asgi')
 
 application = get_asgi_application()
+
+# Con TAREAS_CALENTAR_AL_INICIAR el worker precarga URLs, plantillas y
+# almacenamiento antes de aceptar tráfico (ver tareas/calentamiento.py)
+from tareas.calentamiento import al_iniciar_worker  # noqa: E402
+
+al_iniciar_worker()
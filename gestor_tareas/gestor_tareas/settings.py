@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from decouple import config, Csv
 
@@ -38,6 +39,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Los archivos de STATIC_ROOT se responden aquí, sin pasar por el resto (ver tareas/estaticos.py)
+    'tareas.middleware.EstaticosMiddleware',
+    # Para medir la request completa (ver tareas/metricas.py)
+    'tareas.middleware.MetricasMiddleware',
+    # Perfiles a pedido (X-Perfilar, staff) o por muestreo; ver tareas/perfilado.py
+    'tareas.middleware.PerfiladoMiddleware',
+    # Comprime las páginas HTML; antes de cualquier middleware que lea el cuerpo
+    'tareas.middleware.ComprimirHTMLMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -45,8 +54,11 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # 503 con Retry-After cuando el pool de hashing está lleno (ver tareas/contrasenas.py)
+    'tareas.middleware.HashingSaturadoMiddleware',
 ]
 
+# asgi.py carga settings_asgi, que usa gestor_tareas.urls_async
 ROOT_URLCONF = 'gestor_tareas.urls'
 
 TEMPLATES = [
@@ -83,6 +95,111 @@ DATABASES = {
 }
 
 
+# Almacenamiento de tareas
+# Backends disponibles:
+#   tareas.storage.memoria.AlmacenMemoria  (por proceso, se pierde al reiniciar)
+#   tareas.storage.durable.AlmacenDurable  (memoria + diario e instantáneas en disco,
+#                                           OPTIONS: directorio, operaciones_por_instantanea, sincronizar)
+#   tareas.storage.escalonado.AlmacenEscalonado
+#                                          (memoria con presupuesto: los usuarios inactivos se
+#                                           bajan a un segmento en disco, OPTIONS: presupuesto, directorio)
+#   tareas.storage.sqlite.AlmacenSQLite    (compartido entre workers, OPTIONS: ruta)
+#   tareas.storage.orm.AlmacenORM          (modelo Tarea en la base de datos de DATABASES)
+#   tareas.storage.particionado.AlmacenParticionado
+#                                          (tareas repartidas por usuario entre varias particiones,
+#                                           OPTIONS: particiones, ranuras, mapa, gracia)
+
+TAREAS_STORAGE = {
+    'BACKEND': config('TAREAS_STORAGE_BACKEND', default='tareas.storage.memoria.AlmacenMemoria'),
+    'OPTIONS': {},
+}
+
+# Particiones de AlmacenParticionado sin OPTIONS: nombre=ruta de un archivo
+# SQLite por partición. Los nombres deciden el reparto y no deben cambiar;
+# tras agregar una, python manage.py rebalancear_particiones
+TAREAS_PARTICIONES = config('TAREAS_PARTICIONES', default='', cast=Csv())
+
+# Presupuesto de memoria (MiB, estimado) de AlmacenEscalonado por worker
+TAREAS_MEMORIA_PRESUPUESTO_MB = config('TAREAS_MEMORIA_PRESUPUESTO_MB', default=256, cast=int)
+
+# Tareas por página en la lista de tareas
+TAREAS_POR_PAGINA = config('TAREAS_POR_PAGINA', default=30, cast=int)
+
+# Procesos que atienden requests (gunicorn lee WEB_CONCURRENCY). Con más de
+# uno, las sesiones y los usuarios cacheados necesitan una caché compartida
+TAREAS_WORKERS = config('TAREAS_WORKERS', default=config('WEB_CONCURRENCY', default=1, cast=int), cast=int)
+TAREAS_CACHE_SESIONES_BACKEND = config('TAREAS_CACHE_SESIONES_BACKEND', default='')
+
+# Caché de fragmentos renderizados de lista_tareas (LRU en memoria del proceso).
+# Las claves llevan la versión de las tareas del usuario, así que nunca se
+# sirve una página vieja; para compartirla entre workers puede usarse
+# django.core.cache.backends.filebased.FileBasedCache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Sesiones (SESSION_ENGINE cached_db) y usuarios autenticados. Sin
+    # TAREAS_CACHE_SESIONES_BACKEND es memoria del proceso, y solo se usa con
+    # un único worker: si no, un logout en un worker no cerraría la sesión
+    # cacheada en otro. Con varios, una caché compartida (Redis, Memcached,
+    # DatabaseCache, FileBasedCache); el check tareas.E001 lo verifica
+    'sesiones': {
+        'BACKEND': TAREAS_CACHE_SESIONES_BACKEND or 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': config('TAREAS_CACHE_SESIONES_LOCATION', default='sesiones-tareas'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'fragmentos': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragmentos-tareas',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': config('TAREAS_CACHE_MAX_FRAGMENTOS', default=1000, cast=int),
+            'CULL_FREQUENCY': 10,
+        },
+    },
+}
+
+# Máximo de operaciones por request en la API JSON por lotes
+TAREAS_API_MAX_LOTE = config('TAREAS_API_MAX_LOTE', default=1000, cast=int)
+
+# Calentar cada worker (URLs, plantillas, storage) al cargar wsgi.py/asgi.py
+TAREAS_CALENTAR_AL_INICIAR = config('TAREAS_CALENTAR_AL_INICIAR', default=False, cast=bool)
+
+# IPs que pueden leer /metrics (formato de texto de Prometheus)
+TAREAS_METRICAS_IPS = config('TAREAS_METRICAS_IPS', default='127.0.0.1,::1', cast=Csv())
+
+# Perfilado de requests (ver tareas/perfilado.py): directorio de los perfiles
+# (vacío: desactivado), fracción de requests perfiladas al azar además de las
+# de staff con X-Perfilar, y perfiles que se conservan
+TAREAS_PERFILADO_DIR = config('TAREAS_PERFILADO_DIR', default='')
+TAREAS_PERFILADO_MUESTREO = config('TAREAS_PERFILADO_MUESTREO', default=0.0, cast=float)
+TAREAS_PERFILADO_MAX_ARCHIVOS = config('TAREAS_PERFILADO_MAX_ARCHIVOS', default=200, cast=int)
+
+# Feed de cambios por SSE (ver tareas/cambios.py): eventos que se conservan por
+# usuario, usuarios con historial, conexiones abiertas por worker (más, 503),
+# segundos entre latidos y milisegundos que espera el navegador para reconectarse
+TAREAS_CAMBIOS_HISTORIAL = config('TAREAS_CAMBIOS_HISTORIAL', default=100, cast=int)
+TAREAS_CAMBIOS_MAX_USUARIOS = config('TAREAS_CAMBIOS_MAX_USUARIOS', default=10000, cast=int)
+TAREAS_CAMBIOS_MAX_CONEXIONES = config('TAREAS_CAMBIOS_MAX_CONEXIONES', default=10000, cast=int)
+TAREAS_CAMBIOS_LATIDO = config('TAREAS_CAMBIOS_LATIDO', default=15, cast=int)
+TAREAS_CAMBIOS_REINTENTO = config('TAREAS_CAMBIOS_REINTENTO', default=5000, cast=int)
+
+
+# Hash de contraseñas en un pool de procesos (ver tareas/contrasenas.py). Usa
+# el algoritmo y el formato de PBKDF2PasswordHasher, al que reemplaza: Django
+# elige un único hasher por algoritmo, el último de la lista
+PASSWORD_HASHERS = [
+    'tareas.contrasenas.PBKDF2EnProcesosHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+# Procesos del pool por worker, y hashes en cola o en curso antes de responder 503
+TAREAS_HASH_PROCESOS = config('TAREAS_HASH_PROCESOS', default=max(1, (os.cpu_count() or 2) // 2), cast=int)
+TAREAS_HASH_MAX_PENDIENTES = config('TAREAS_HASH_MAX_PENDIENTES', default=8, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -120,6 +237,17 @@ USE_TZ = True
 STATIC_URL = config('STATIC_URL', default='/static/')
 STATIC_ROOT = config('STATIC_ROOT', default=BASE_DIR / 'staticfiles')
 
+# collectstatic escribe nombres con hash y variantes .gz; EstaticosMiddleware los sirve
+# con caché inmutable (ver tareas/estaticos.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'tareas.estaticos.EstaticosComprimidos'},
+}
+# False si otro servidor (nginx, CDN) sirve STATIC_ROOT
+TAREAS_SERVIR_ESTATICOS = config('TAREAS_SERVIR_ESTATICOS', default=True, cast=bool)
+# Ahorro mínimo (fracción del tamaño) para guardar la variante .gz de un archivo
+TAREAS_ESTATICOS_GZIP_AHORRO = config('TAREAS_ESTATICOS_GZIP_AHORRO', default=0.05, cast=float)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -138,6 +266,18 @@ SESSION_COOKIE_SAMESITE = 'Lax'
 # Tiempo de expiración de sesión (opcional)
 SESSION_COOKIE_AGE = 3600  # 1 hora en segundos
 
+# Sesiones leídas de la caché 'sesiones' (la base de datos queda de respaldo)
+# cuando es compartida o hay un único worker; si no, directo de la base
+_CACHE_SESIONES_UTIL = bool(TAREAS_CACHE_SESIONES_BACKEND) or TAREAS_WORKERS == 1
+SESSION_ENGINE = ('django.contrib.sessions.backends.cached_db' if _CACHE_SESIONES_UTIL
+                  else 'django.contrib.sessions.backends.db')
+SESSION_CACHE_ALIAS = 'sesiones'
+
+# Usuarios autenticados en la caché 'sesiones' (ver tareas/autenticacion.py);
+# 0 los lee siempre de la base
+AUTHENTICATION_BACKENDS = ['tareas.autenticacion.BackendUsuariosEnCache']
+TAREAS_CACHE_USUARIOS_TTL = config('TAREAS_CACHE_USUARIOS_TTL', default=60 if _CACHE_SESIONES_UTIL else 0, cast=int)
+
 # Configuración de seguridad para desarrollo
 SESSION_COOKIE_SECURE = False  # En producción cambiar a True
 CSRF_COOKIE_SECURE = config('CSRF_COOKIE_SECURE', default=False, cast=bool)
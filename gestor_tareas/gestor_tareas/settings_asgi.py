@@ -0,0 +1,9 @@
+"""
+Settings del despliegue ASGI (los carga asgi.py): los de settings.py con
+las vistas async de la app tareas (ver tareas/views_async.py). Un
+despliegue ASGI con otros settings (p. ej. settings_prod) hace lo mismo:
+importa de ellos y cambia ``ROOT_URLCONF``.
+"""
+from .settings import *  # noqa: F401,F403
+
+ROOT_URLCONF = 'gestor_tareas.urls_async'
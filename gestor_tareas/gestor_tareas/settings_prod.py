@@ -42,6 +42,9 @@ SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)
 #         'PORT': os.environ.get('DB_PORT', '5432'),
 #     }
 # }
+#
+# Con PostgreSQL, guardar las tareas en la base de datos (durables e indexadas)
+# TAREAS_STORAGE['BACKEND'] = 'tareas.storage.orm.AlmacenORM'
 
 # Logging para producción
 LOGGING = {
@@ -0,0 +1,11 @@
+"""
+URLs del proyecto para el despliegue ASGI: iguales a ``urls.py`` pero
+con las vistas async de la app tareas.
+"""
+from django.contrib import admin
+from django.urls import path, include
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include('tareas.urls_async')),
+]
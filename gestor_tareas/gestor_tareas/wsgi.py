@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gestor_tareas.settings')
 
 application = get_wsgi_application()
+
+# Con TAREAS_CALENTAR_AL_INICIAR el worker precarga URLs, plantillas y
+# almacenamiento antes de aceptar tráfico (ver tareas/calentamiento.py)
+from tareas.calentamiento import al_iniciar_worker  # noqa: E402
+
+al_iniciar_worker()
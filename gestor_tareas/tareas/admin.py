@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Tarea
+
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'titulo', 'usuario', 'completada')
+    list_filter = ('completada',)
+    search_fields = ('titulo', 'usuario__username')
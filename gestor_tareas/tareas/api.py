@@ -0,0 +1,158 @@
+"""
+API JSON con endpoints por lotes.
+
+Cada endpoint recibe una lista de N elementos y los aplica con una sola
+llamada a ``aplicar_lote_usuario`` (una sección crítica o transacción en
+el backend) y una sola respuesta:
+
+    POST api/tareas/crear/      {"tareas": [{"titulo": ..., "descripcion": ...}, ...]}
+    POST api/tareas/editar/     {"tareas": [{"id": ..., "titulo": ..., "descripcion": ...}, ...]}
+    POST api/tareas/eliminar/   {"ids": [...]}
+    POST api/tareas/marcar/     {"ids": [...], "completada": true}
+
+La respuesta trae un resultado por elemento, en el mismo orden, con un
+código de estado propio (201, 200, 400, 403 o 404) y la tarea o los
+errores. Usan la sesión de Django, así que requieren el token CSRF
+(cabecera ``X-CSRFToken``) como cualquier POST.
+"""
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+from .forms import TareaForm
+from .storage import aplicar_lote_usuario
+from .storage.base import NO_EXISTE, OK, SIN_PERMISO
+
+ESTADOS = {NO_EXISTE: 404, SIN_PERMISO: 403}
+
+
+def _error(mensaje, status=400):
+    return JsonResponse({'error': mensaje}, status=status)
+
+
+def api_login_required(vista):
+    """Como ``login_required``, pero responde 401 en vez de redirigir al login"""
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error('Autenticación requerida.', status=401)
+        return vista(request, *args, **kwargs)
+    return envoltura
+
+
+def _leer_lista(request, clave):
+    """Retorna la lista ``clave`` del cuerpo JSON o una respuesta de error"""
+    try:
+        datos = json.loads(request.body)
+    except ValueError:
+        return _error('El cuerpo no es JSON válido.')
+    elementos = datos.get(clave) if isinstance(datos, dict) else None
+    if not isinstance(elementos, list):
+        return _error(f'Se esperaba una lista en "{clave}".')
+    if len(elementos) > settings.TAREAS_API_MAX_LOTE:
+        return _error(f'El lote supera el máximo de {settings.TAREAS_API_MAX_LOTE} operaciones.')
+    return elementos
+
+
+def _validar(elemento, con_id):
+    """Valida un elemento con TareaForm; retorna ``(datos, errores)``"""
+    if not isinstance(elemento, dict):
+        return None, {'__all__': ['Se esperaba un objeto.']}
+    form = TareaForm(elemento)
+    errores = {} if form.is_valid() else dict(form.errors)
+    if con_id and not _es_id(elemento.get('id')):
+        errores['id'] = ['Se requiere un ID entero.']
+    return (None, errores) if errores else (form.cleaned_data, None)
+
+
+def _es_id(valor):
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+def _responder(request, operaciones, resultados, status_ok):
+    """
+    Combina los resultados del almacenamiento con los elementos que no
+    llegaron a él (``resultados`` ya trae los errores de validación en su
+    posición, y None donde corresponde una operación aplicada).
+    """
+    aplicados = iter(aplicar_lote_usuario(request.user.username, operaciones) if operaciones else ())
+    salida = []
+    for resultado in resultados:
+        if resultado is None:
+            estado, tarea = next(aplicados)
+            resultado = {'status': status_ok, 'tarea': dict(tarea)} if estado == OK else {'status': ESTADOS[estado]}
+        salida.append(resultado)
+    return JsonResponse({'resultados': salida})
+
+
+@require_POST
+@api_login_required
+def crear_tareas(request):
+    elementos = _leer_lista(request, 'tareas')
+    if isinstance(elementos, JsonResponse):
+        return elementos
+    operaciones, resultados = [], []
+    for elemento in elementos:
+        datos, errores = _validar(elemento, con_id=False)
+        if errores:
+            resultados.append({'status': 400, 'errores': errores})
+        else:
+            operaciones.append(('crear', datos['titulo'], datos['descripcion']))
+            resultados.append(None)
+    return _responder(request, operaciones, resultados, 201)
+
+
+@require_POST
+@api_login_required
+def editar_tareas(request):
+    elementos = _leer_lista(request, 'tareas')
+    if isinstance(elementos, JsonResponse):
+        return elementos
+    operaciones, resultados = [], []
+    for elemento in elementos:
+        datos, errores = _validar(elemento, con_id=True)
+        if errores:
+            resultados.append({'status': 400, 'errores': errores})
+        else:
+            operaciones.append(('editar', elemento['id'], datos['titulo'], datos['descripcion']))
+            resultados.append(None)
+    return _responder(request, operaciones, resultados, 200)
+
+
+@require_POST
+@api_login_required
+def eliminar_tareas(request):
+    ids = _leer_lista(request, 'ids')
+    if isinstance(ids, JsonResponse):
+        return ids
+    operaciones, resultados = [], []
+    for tarea_id in ids:
+        if _es_id(tarea_id):
+            operaciones.append(('eliminar', tarea_id))
+            resultados.append(None)
+        else:
+            resultados.append({'status': 400, 'errores': {'id': ['Se requiere un ID entero.']}})
+    return _responder(request, operaciones, resultados, 200)
+
+
+@require_POST
+@api_login_required
+def marcar_tareas(request):
+    ids = _leer_lista(request, 'ids')
+    if isinstance(ids, JsonResponse):
+        return ids
+    # _leer_lista ya comprobó que el cuerpo es un objeto JSON
+    completada = json.loads(request.body).get('completada')
+    if not isinstance(completada, bool):
+        return _error('Se esperaba un booleano en "completada".')
+    operaciones, resultados = [], []
+    for tarea_id in ids:
+        if _es_id(tarea_id):
+            operaciones.append(('marcar', tarea_id, completada))
+            resultados.append(None)
+        else:
+            resultados.append({'status': 400, 'errores': {'id': ['Se requiere un ID entero.']}})
+    return _responder(request, operaciones, resultados, 200)
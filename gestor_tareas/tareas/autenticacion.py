@@ -0,0 +1,109 @@
+"""
+Backend de autenticación con caché de usuarios.
+
+``AuthenticationMiddleware`` carga el usuario de la sesión en cada
+request; con ``ModelBackend`` eso es una consulta a ``auth_user``. Este
+backend guarda los usuarios ya cargados durante ``TAREAS_CACHE_USUARIOS_TTL``
+segundos en la caché de las sesiones (``SESSION_CACHE_ALIAS``), así que
+junto con las sesiones ``cached_db`` una request autenticada con la caché
+tibia no toca la base de datos.
+
+Cada guardado o borrado de un usuario (cambio de contraseña, desactivarlo,
+el ``last_login`` del login) y cada logout lo quitan de esa caché. Con
+varios workers debe ser compartida (ver el check ``tareas.E001``) para que
+todos dejen de aceptar la sesión vieja a la vez; por defecto, sin caché
+compartida, ``TAREAS_CACHE_USUARIOS_TTL`` es 0 y no se cachea.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model, user_logged_out
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .contrasenas import amake_password, averificar
+
+
+class CacheUsuarios:
+    """Usuarios por ID en la caché de las sesiones, con vencimiento"""
+
+    @property
+    def _cache(self):
+        return caches[settings.SESSION_CACHE_ALIAS]
+
+    def _clave(self, user_id):
+        return f'tareas-usuario:{user_id}'
+
+    def obtener(self, user_id):
+        # Cada lectura deserializa una copia: las vistas pueden modificar request.user
+        return self._cache.get(self._clave(user_id))
+
+    async def aobtener(self, user_id):
+        return await self._cache.aget(self._clave(user_id))
+
+    def guardar(self, usuario):
+        if settings.TAREAS_CACHE_USUARIOS_TTL > 0:
+            self._cache.set(self._clave(usuario.pk), usuario, settings.TAREAS_CACHE_USUARIOS_TTL)
+
+    async def aguardar(self, usuario):
+        if settings.TAREAS_CACHE_USUARIOS_TTL > 0:
+            await self._cache.aset(self._clave(usuario.pk), usuario, settings.TAREAS_CACHE_USUARIOS_TTL)
+
+    def invalidar(self, user_id):
+        self._cache.delete(self._clave(user_id))
+
+
+usuarios_en_cache = CacheUsuarios()
+
+
+class BackendUsuariosEnCache(ModelBackend):
+    """
+    ``ModelBackend`` que resuelve ``get_user`` desde ``usuarios_en_cache``.
+    ``aauthenticate`` verifica la contraseña sin ocupar un hilo (ver
+    tareas/contrasenas.py).
+    """
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            usuario = await UserModel._default_manager.aget_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Igual que ModelBackend: se calcula un hash para no revelar
+            # por el tiempo de respuesta qué usuarios existen
+            await amake_password(password)
+            return None
+        if await averificar(usuario, password) and self.user_can_authenticate(usuario):
+            return usuario
+        return None
+
+    def get_user(self, user_id):
+        usuario = usuarios_en_cache.obtener(user_id)
+        if usuario is None:
+            usuario = super().get_user(user_id)
+            if usuario is not None:
+                usuarios_en_cache.guardar(usuario)
+        return usuario
+
+    async def aget_user(self, user_id):
+        usuario = await usuarios_en_cache.aobtener(user_id)
+        if usuario is None:
+            usuario = await super().aget_user(user_id)
+            if usuario is not None:
+                await usuarios_en_cache.aguardar(usuario)
+        return usuario
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def _usuario_modificado(sender, instance, **kwargs):
+    usuarios_en_cache.invalidar(instance.pk)
+
+
+@receiver(user_logged_out)
+def _usuario_salio(sender, request, user, **kwargs):
+    if user is not None:
+        usuarios_en_cache.invalidar(user.pk)
@@ -0,0 +1,90 @@
+"""
+Calentamiento de un worker antes de que reciba tráfico.
+
+Sin calentar, la primera request de cada worker paga el armado del
+resolver de URLs, la compilación de cada plantilla la primera vez que se
+usa y la carga del almacenamiento (en ``AlmacenDurable``, leer la
+instantánea y el diario), y el primer login, el arranque del pool de hash
+de contraseñas. ``calentar`` hace todo eso por adelantado.
+
+Con ``TAREAS_CALENTAR_AL_INICIAR`` lo llaman wsgi.py y asgi.py al cargar
+la aplicación, es decir, en cada worker antes de aceptar conexiones (o en
+el proceso maestro con ``gunicorn --preload``, y los workers lo heredan
+con el fork).
+"""
+import logging
+import time
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.template.loader import get_template
+from django.urls import get_resolver, reverse
+
+logger = logging.getLogger(__name__)
+
+
+def calentar_urls():
+    """Arma el resolver y las tablas de ``reverse`` resolviendo cada ruta de tareas"""
+    from .urls import urlpatterns
+    resolver = get_resolver()
+    resolver.reverse_dict
+    resolver.namespace_dict
+    for patron in urlpatterns:
+        argumentos = {nombre: 1 for nombre in patron.pattern.converters}
+        reverse(f'tareas:{patron.name}', kwargs=argumentos)
+    return len(urlpatterns)
+
+
+def calentar_plantillas():
+    """Compila todas las plantillas de tareas/templates/tareas en el loader con caché"""
+    from .fragmentos import huella_plantillas
+    directorio = Path(apps.get_app_config('tareas').path) / 'templates' / 'tareas'
+    nombres = sorted(ruta.name for ruta in directorio.glob('*.html'))
+    for nombre in nombres:
+        get_template(f'tareas/{nombre}')
+    huella_plantillas()
+    return len(nombres)
+
+
+def calentar_storage():
+    """Instancia el backend configurado (en AlmacenDurable, carga la instantánea)"""
+    from .storage import tareas_storage
+    return len(tareas_storage)
+
+
+def calentar_hashing():
+    """
+    Arranca los procesos del pool de hash de contraseñas (con ``--preload``
+    cada worker arranca el suyo en su primer login)
+    """
+    from .contrasenas import pool_hashing
+    return pool_hashing.iniciar()
+
+
+PASOS = (
+    ('urls', calentar_urls),
+    ('plantillas', calentar_plantillas),
+    ('storage', calentar_storage),
+    ('hashing', calentar_hashing),
+)
+
+
+def calentar():
+    """Ejecuta todos los pasos; retorna ``{paso: (elementos, segundos)}``"""
+    resultados = {}
+    for nombre, paso in PASOS:
+        inicio = time.perf_counter()
+        elementos = paso()
+        resultados[nombre] = (elementos, time.perf_counter() - inicio)
+    return resultados
+
+
+def al_iniciar_worker():
+    """Gancho de wsgi.py y asgi.py: calienta si ``TAREAS_CALENTAR_AL_INICIAR``"""
+    if not settings.TAREAS_CALENTAR_AL_INICIAR:
+        return
+    resultados = calentar()
+    logger.info('Worker calentado en %.1f ms (%s)',
+                sum(segundos for _, segundos in resultados.values()) * 1e3,
+                ', '.join(f'{nombre}: {segundos * 1e3:.1f} ms' for nombre, (_, segundos) in resultados.items()))
@@ -0,0 +1,249 @@
+"""
+Feed de cambios por usuario para mantener vivas las listas abiertas.
+
+Cada alta, edición, marca o baja que pasa por ``tareas.storage`` publica
+un evento en el historial de su dueño: una cola acotada de los últimos
+``TAREAS_CAMBIOS_HISTORIAL`` eventos, compartida por todas las conexiones
+de ese usuario. Cada conexión guarda solo su cursor (el ID del último
+evento enviado), así que la memoria crece con los usuarios activos y no
+con las conexiones. Se conservan a lo sumo ``TAREAS_CAMBIOS_MAX_USUARIOS``
+historiales (LRU, nunca el de un usuario con conexiones abiertas).
+
+Los IDs son ``<época>-<secuencia>``: la secuencia es global al proceso y
+la época cambia al reiniciarlo. Un cliente que retoma (``Last-Event-ID``)
+con un ID anterior a lo que el historial conserva recibe un evento
+``recargar`` en lugar de los eventos perdidos.
+
+El feed vive en el proceso: con varios workers sobre un backend
+compartido (SQLite, ORM) cada uno ve solo las escrituras que atiende. Un
+ID de otra época (otro worker, o este antes de reiniciarse) no dice qué
+se perdió; el cliente sigue desde el último ID de este proceso sin
+recargar, que con varios workers lo haría en cada reconexión.
+"""
+import asyncio
+import json
+import secrets
+import threading
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.utils.functional import LazyObject
+
+# Respuesta de ``pendientes`` cuando el cliente perdió eventos
+RECARGAR = 'recargar'
+
+# Claves de la tarea que viajan en los eventos crear/editar
+CAMPOS_EVENTO = ('id', 'titulo', 'descripcion', 'usuario', 'completada')
+
+CONTENT_TYPE = 'text/event-stream; charset=utf-8'
+
+
+class FeedSaturado(Exception):
+    """Ya hay ``TAREAS_CAMBIOS_MAX_CONEXIONES`` conexiones abiertas en el worker"""
+
+
+class Historial:
+    """Últimos eventos de un usuario y sus conexiones en espera"""
+    __slots__ = ('eventos', 'perdido_hasta', 'esperando', 'conexiones')
+
+    def __init__(self, tamano, perdido_hasta):
+        # Cada evento es (secuencia, tipo, tarea)
+        self.eventos = deque(maxlen=tamano)
+        # Los eventos con secuencia <= perdido_hasta ya no están
+        self.perdido_hasta = perdido_hasta
+        self.esperando = []
+        self.conexiones = 0
+
+
+class FeedCambios:
+    """Historiales por usuario, seguros entre hilos (se publica desde vistas sync y async)"""
+
+    def __init__(self, tamano_historial=None, max_usuarios=None, max_conexiones=None):
+        self.tamano_historial = tamano_historial or settings.TAREAS_CAMBIOS_HISTORIAL
+        self.max_usuarios = max_usuarios or settings.TAREAS_CAMBIOS_MAX_USUARIOS
+        self.max_conexiones = max_conexiones or settings.TAREAS_CAMBIOS_MAX_CONEXIONES
+        self.epoca = secrets.token_hex(4)
+        self.conexiones = 0
+        self._secuencia = 0
+        self._historiales = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _historial(self, usuario):
+        # Se llama con self._lock tomado
+        historial = self._historiales.get(usuario)
+        if historial is None:
+            historial = self._historiales[usuario] = Historial(self.tamano_historial, self._secuencia)
+            if len(self._historiales) > self.max_usuarios:
+                self._descartar_uno()
+        else:
+            self._historiales.move_to_end(usuario)
+        return historial
+
+    def _descartar_uno(self):
+        for usuario, historial in self._historiales.items():
+            if not historial.conexiones:
+                del self._historiales[usuario]
+                return
+
+    def publicar(self, usuario, eventos):
+        """
+        Agrega ``[(tipo, tarea), ...]`` al historial de ``usuario`` y
+        despierta a sus conexiones. Si son más de los que el historial
+        conserva, se publica un único ``recargar``.
+        """
+        if not eventos:
+            return
+        with self._lock:
+            historial = self._historial(usuario)
+            if len(eventos) >= self.tamano_historial:
+                eventos = [(RECARGAR, None)]
+            for tipo, tarea in eventos:
+                self._secuencia += 1
+                if len(historial.eventos) == historial.eventos.maxlen:
+                    historial.perdido_hasta = historial.eventos[0][0]
+                historial.eventos.append((self._secuencia, tipo, tarea))
+            esperando, historial.esperando = historial.esperando, []
+        for futuro in esperando:
+            # Las conexiones esperan en el event loop; se publica desde cualquier hilo
+            futuro.get_loop().call_soon_threadsafe(_resolver, futuro)
+
+    def ultimo_id(self, usuario):
+        """
+        ID del último evento publicado. Crea el historial del usuario si no
+        existe, así un cliente que parte de este ID puede retomar sin perder
+        nada posterior.
+        """
+        with self._lock:
+            self._historial(usuario)
+            return f'{self.epoca}-{self._secuencia}'
+
+    def propio(self, ultimo_id):
+        """``ultimo_id`` si es un ID válido de este proceso, si no None"""
+        epoca, _, secuencia = (ultimo_id or '').partition('-')
+        return ultimo_id if epoca == self.epoca and secuencia.isdigit() else None
+
+    def _leer(self, usuario, ultimo_id):
+        # Se llama con self._lock tomado; retorna (eventos o RECARGAR, historial)
+        historial = self._historial(usuario)
+        epoca, _, secuencia = (ultimo_id or '').partition('-')
+        if epoca != self.epoca or not secuencia.isdigit():
+            return RECARGAR, historial
+        secuencia = int(secuencia)
+        if secuencia < historial.perdido_hasta:
+            return RECARGAR, historial
+        return [evento for evento in historial.eventos if evento[0] > secuencia], historial
+
+    def pendientes(self, usuario, ultimo_id):
+        """Eventos posteriores a ``ultimo_id``, o ``RECARGAR`` si alguno ya se perdió"""
+        with self._lock:
+            return self._leer(usuario, ultimo_id)[0]
+
+    def suscribir(self, usuario, ultimo_id):
+        """Abre una ``Suscripcion`` (lanza FeedSaturado si no hay lugar)"""
+        with self._lock:
+            if self.conexiones >= self.max_conexiones:
+                raise FeedSaturado
+            self.conexiones += 1
+            self._historial(usuario).conexiones += 1
+        return Suscripcion(self, usuario, ultimo_id or self.ultimo_id(usuario))
+
+    async def _esperar(self, suscripcion, timeout):
+        with self._lock:
+            eventos, historial = self._leer(suscripcion.usuario, suscripcion.ultimo_id)
+            if eventos:
+                return eventos
+            # Se registra bajo el lock: una publicación posterior lo despierta
+            futuro = asyncio.get_running_loop().create_future()
+            historial.esperando.append(futuro)
+        try:
+            await asyncio.wait_for(futuro, timeout)
+        except asyncio.TimeoutError:
+            return []
+        finally:
+            if futuro.cancelled():
+                # Vencido o conexión cerrada: nadie lo va a despertar
+                with self._lock:
+                    if futuro in historial.esperando:
+                        historial.esperando.remove(futuro)
+        with self._lock:
+            return self._leer(suscripcion.usuario, suscripcion.ultimo_id)[0]
+
+    def _cerrar(self, suscripcion):
+        with self._lock:
+            self.conexiones -= 1
+            historial = self._historiales.get(suscripcion.usuario)
+            if historial is not None:
+                historial.conexiones -= 1
+
+
+def _resolver(futuro):
+    if not futuro.done():
+        futuro.set_result(None)
+
+
+class Suscripcion:
+    """Cursor de una conexión sobre el historial de su usuario"""
+    __slots__ = ('feed', 'usuario', 'ultimo_id')
+
+    def __init__(self, feed, usuario, ultimo_id):
+        self.feed = feed
+        self.usuario = usuario
+        self.ultimo_id = ultimo_id
+
+    async def siguientes(self, timeout):
+        """
+        Espera hasta ``timeout`` segundos por eventos nuevos y los retorna
+        (lista vacía si no hubo), o ``RECARGAR``. Avanza el cursor.
+        """
+        eventos = await self.feed._esperar(self, timeout)
+        if eventos == RECARGAR:
+            self.ultimo_id = self.feed.ultimo_id(self.usuario)
+        elif eventos:
+            self.ultimo_id = f'{self.feed.epoca}-{eventos[-1][0]}'
+        return eventos
+
+    def cerrar(self):
+        self.feed._cerrar(self)
+
+
+class FeedPorDefecto(LazyObject):
+    """Feed del proceso, creado la primera vez que se usa"""
+
+    def _setup(self):
+        self._wrapped = FeedCambios()
+
+
+feed_cambios = FeedPorDefecto()
+
+
+# Formato text/event-stream
+
+def evento_sse(tipo, datos, id_evento=None):
+    """Un evento SSE; con ``id_evento`` el navegador lo reenvía en Last-Event-ID al reconectarse"""
+    encabezado = f'id: {id_evento}\n' if id_evento else ''
+    return f'{encabezado}event: {tipo}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n'
+
+
+def a_sse(eventos, epoca):
+    """Eventos del historial en formato SSE"""
+    partes = []
+    for secuencia, tipo, tarea in eventos:
+        if tipo == RECARGAR:
+            datos = {}
+        elif tipo == 'eliminar':
+            datos = {'id': tarea['id']}
+        else:
+            datos = {campo: tarea[campo] for campo in CAMPOS_EVENTO}
+        partes.append(evento_sse(tipo, datos, f'{epoca}-{secuencia}'))
+    return ''.join(partes)
+
+
+def encabezado_sse(reintento, ultimo_id=None):
+    """Milisegundos de espera antes de reconectarse y, si no lo tenía, el cursor inicial del cliente"""
+    # Un campo id sin data actualiza Last-Event-ID sin disparar un evento
+    return f'retry: {reintento}\n\n' + (f'id: {ultimo_id}\n\n' if ultimo_id else '')
+
+
+def ultimo_evento(request):
+    """Cursor del cliente: Last-Event-ID al reconectarse o ``?ultimo=`` en la primera conexión"""
+    return request.headers.get('Last-Event-ID') or request.GET.get('ultimo')
@@ -0,0 +1,33 @@
+"""
+Checks de configuración propios (``manage.py check`` y al arrancar).
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+
+SESIONES_EN_CACHE = ('django.contrib.sessions.backends.cache', 'django.contrib.sessions.backends.cached_db')
+
+
+@register(Tags.caches)
+def revisar_caches_por_worker(app_configs, **kwargs):
+    """
+    Con varios workers, las sesiones y los usuarios cacheados no pueden
+    vivir en una caché de memoria del proceso: un logout o un cambio de
+    contraseña solo la limpiaría en el worker que lo atendió.
+    """
+    if settings.TAREAS_WORKERS <= 1:
+        return []
+    usos = []
+    if settings.SESSION_ENGINE in SESIONES_EN_CACHE:
+        usos.append(('las sesiones', settings.SESSION_CACHE_ALIAS))
+    if settings.TAREAS_CACHE_USUARIOS_TTL > 0:
+        usos.append(('los usuarios autenticados', settings.SESSION_CACHE_ALIAS))
+    return [
+        Error(f'CACHES[{alias!r}] es memoria de cada proceso y guarda {que} con '
+              f'TAREAS_WORKERS={settings.TAREAS_WORKERS}.',
+              hint='Definir TAREAS_CACHE_SESIONES_BACKEND con una caché compartida (Redis, Memcached, '
+                   'DatabaseCache) o TAREAS_CACHE_USUARIOS_TTL=0 y SESSION_ENGINE sin caché.',
+              id='tareas.E001')
+        for que, alias in usos if settings.CACHES[alias]['BACKEND'] == LOCMEM
+    ]
@@ -0,0 +1,156 @@
+"""
+Hash de contraseñas en un pool de procesos acotado.
+
+PBKDF2 con cientos de miles de iteraciones ocupa un núcleo durante cientos
+de milisegundos. Calculado en el hilo de la request, una ráfaga de logins
+se lleva todos los núcleos y las demás requests esperan detrás. Aquí el
+cálculo corre en ``TAREAS_HASH_PROCESOS`` procesos por worker, así que
+los logins compiten entre sí y no con el resto del tráfico.
+
+Con ``TAREAS_HASH_MAX_PENDIENTES`` hashes en cola o en curso, uno nuevo
+lanza ``HashingSaturado`` sin esperar, y ``HashingSaturadoMiddleware``
+(tareas/middleware.py) responde 503 con ``Retry-After`` en cualquier vista:
+login y registro, el login del admin, el cambio de contraseña o la
+actualización del hash en ``check_password``.
+
+El pool acota cuántos hashes corren a la vez, pero no libera al worker: el
+hilo de una request sync queda bloqueado esperando su resultado (solo las
+vistas async esperan sin ocupar un hilo).
+
+``PBKDF2EnProcesosHasher`` usa el mismo algoritmo y formato que
+``PBKDF2PasswordHasher``: los hashes existentes siguen valiendo en ambos
+sentidos. Las variantes async (``aencode``, ``averificar``,
+``amake_password``) esperan el resultado sin bloquear el event loop ni
+ocupar un hilo.
+"""
+import asyncio
+import base64
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hasher, identify_hasher
+from django.utils.crypto import constant_time_compare
+
+
+class HashingSaturado(Exception):
+    """El pool ya tiene ``TAREAS_HASH_MAX_PENDIENTES`` hashes pendientes"""
+
+
+class PoolHashing:
+    """
+    ``ProcessPoolExecutor`` creado la primera vez que se usa, con un tope
+    de trabajos pendientes. Tras un fork (``gunicorn --preload``) el hijo
+    crea su propio pool.
+    """
+
+    def __init__(self):
+        self._ejecutor = None
+        self._pid = None
+        self._pendientes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pendientes(self):
+        return self._pendientes
+
+    def _obtener_ejecutor(self, roto=False):
+        # Se llama con self._lock tomado
+        if self._pid != os.getpid():
+            # Los pendientes del padre no corren en este proceso
+            self._ejecutor = None
+            self._pendientes = 0
+        if self._ejecutor is None or roto:
+            # spawn: los procesos del pool no heredan los hilos ni los locks del worker
+            self._ejecutor = ProcessPoolExecutor(settings.TAREAS_HASH_PROCESOS,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            self._pid = os.getpid()
+        return self._ejecutor
+
+    def pbkdf2(self, algoritmo, password, salt, iteraciones):
+        """Encola un hash PBKDF2 y retorna su ``Future``; lanza HashingSaturado si no hay lugar"""
+        with self._lock:
+            if self._pendientes >= settings.TAREAS_HASH_MAX_PENDIENTES:
+                raise HashingSaturado
+            argumentos = (hashlib.pbkdf2_hmac, algoritmo, password, salt, iteraciones)
+            try:
+                futuro = self._obtener_ejecutor().submit(*argumentos)
+            except BrokenProcessPool:
+                # Murió un proceso del pool (p. ej. el OOM killer): se crea otro
+                futuro = self._obtener_ejecutor(roto=True).submit(*argumentos)
+            self._pendientes += 1
+        futuro.add_done_callback(self._terminado)
+        return futuro
+
+    def _terminado(self, futuro):
+        with self._lock:
+            self._pendientes -= 1
+
+    def iniciar(self):
+        """Arranca todos los procesos del pool (los inicia spawn, que tarda)"""
+        with self._lock:
+            ejecutor = self._obtener_ejecutor()
+        futuros = [ejecutor.submit(os.getpid) for _ in range(settings.TAREAS_HASH_PROCESOS)]
+        return len({futuro.result() for futuro in futuros})
+
+    def cerrar(self):
+        with self._lock:
+            if self._ejecutor is not None:
+                self._ejecutor.shutdown(cancel_futures=True)
+            self._ejecutor = None
+
+
+pool_hashing = PoolHashing()
+
+
+class PBKDF2EnProcesosHasher(PBKDF2PasswordHasher):
+    """``PBKDF2PasswordHasher`` que calcula el hash en ``pool_hashing``"""
+
+    def _enviar(self, password, salt, iterations):
+        self._check_encode_args(password, salt)
+        iterations = iterations or self.iterations
+        futuro = pool_hashing.pbkdf2(self.digest().name, str(password).encode(), str(salt).encode(), iterations)
+        return futuro, salt, iterations
+
+    def _formatear(self, resultado, salt, iterations):
+        resultado = base64.b64encode(resultado).decode('ascii').strip()
+        return '%s$%d$%s$%s' % (self.algorithm, iterations, salt, resultado)
+
+    def encode(self, password, salt, iterations=None):
+        futuro, salt, iterations = self._enviar(password, salt, iterations)
+        return self._formatear(futuro.result(), salt, iterations)
+
+    async def aencode(self, password, salt, iterations=None):
+        futuro, salt, iterations = self._enviar(password, salt, iterations)
+        return self._formatear(await asyncio.wrap_future(futuro), salt, iterations)
+
+
+async def amake_password(password):
+    """``make_password`` que no bloquea el event loop"""
+    hasher = get_hasher()
+    if isinstance(hasher, PBKDF2EnProcesosHasher):
+        return await hasher.aencode(password, hasher.salt())
+    return await sync_to_async(hasher.encode, thread_sensitive=False)(password, hasher.salt())
+
+
+async def averificar(usuario, password):
+    """
+    ``usuario.acheck_password`` sin bloquear el event loop: el de Django
+    calcula el hash en el propio loop. Si hay que actualizar el hash (otro
+    algoritmo o más iteraciones) se usa ``check_password`` en un hilo.
+    """
+    encoded = usuario.password
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False
+    if not isinstance(hasher, PBKDF2EnProcesosHasher) or hasher.must_update(encoded):
+        return await sync_to_async(usuario.check_password, thread_sensitive=False)(password)
+    decodificado = hasher.decode(encoded)
+    calculado = await hasher.aencode(password, decodificado['salt'], decodificado['iterations'])
+    return constant_time_compare(encoded, calculado)
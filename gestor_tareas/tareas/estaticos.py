@@ -0,0 +1,141 @@
+"""
+Archivos estáticos propios: nombres con hash, gzip precalculado y caché
+inmutable.
+
+``collectstatic`` con ``EstaticosComprimidos`` copia cada archivo con su
+hash en el nombre (``base.3f2a9c1e0b7d.css``, como
+``ManifestStaticFilesStorage``) y escribe al lado una variante ``.gz``
+cuando comprimirlo ahorra al menos ``TAREAS_ESTATICOS_GZIP_AHORRO``.
+
+``tareas.middleware.EstaticosMiddleware`` sirve ``STATIC_ROOT`` desde el
+propio worker: los nombres con hash van con ``Cache-Control: immutable``
+por un año (el contenido de esa URL no cambia nunca) y los demás se
+revalidan con ETag. Si el cliente acepta gzip se envía el ``.gz`` tal
+cual, sin comprimir en cada request. Bajo WSGI el archivo sale por
+``wsgi.file_wrapper`` (sendfile en gunicorn), sin pasar por Python.
+
+Cada worker indexa un archivo la primera vez que se pide (un ``stat``) y
+después responde desde memoria; tras un ``collectstatic`` con archivos
+que conservan su nombre hay que reiniciar los workers (con DEBUG se
+revisa el disco en cada request).
+"""
+import gzip
+import mimetypes
+import os
+import stat as tipos
+from hashlib import blake2b
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils._os import safe_join
+from django.utils.functional import LazyObject, empty
+
+# Extensiones que vale la pena comprimir (las imágenes y fuentes ya vienen comprimidas)
+COMPRIMIBLES = ('.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.xml', '.html')
+
+# Un año: la URL con hash nunca cambia de contenido
+INMUTABLE = 'public, max-age=31536000, immutable'
+
+# Sin hash: el navegador guarda el archivo pero revalida con ETag
+REVALIDAR = 'public, no-cache'
+
+
+class EstaticosComprimidos(ManifestStaticFilesStorage):
+    """``ManifestStaticFilesStorage`` que además deja un ``.gz`` junto a cada archivo comprimible"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        nombres = set(self.hashed_files) | set(self.hashed_files.values())
+        for nombre in sorted(nombres):
+            if nombre.endswith(COMPRIMIBLES) and self.exists(nombre):
+                comprimido = self._comprimir(nombre)
+                if comprimido:
+                    yield nombre, comprimido, True
+
+    def _comprimir(self, nombre):
+        with self.open(nombre) as archivo:
+            contenido = archivo.read()
+        # mtime=0: el mismo archivo da siempre los mismos bytes
+        comprimido = gzip.compress(contenido, compresslevel=9, mtime=0)
+        destino = f'{nombre}.gz'
+        if self.exists(destino):
+            self.delete(destino)
+        if len(comprimido) > len(contenido) * (1 - settings.TAREAS_ESTATICOS_GZIP_AHORRO):
+            return None
+        self._save(destino, ContentFile(comprimido))
+        return destino
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            # Sin manifest no se corrió collectstatic (tests, desarrollo): la URL
+            # sin hash, que se revalida. Con manifest, un archivo que falta en él
+            # es un error de despliegue y manifest_strict lo hace fallar
+            return name
+        return super().stored_name(name)
+
+
+class Archivo:
+    """Lo necesario para responder por un archivo de STATIC_ROOT sin tocar el disco"""
+    __slots__ = ('ruta', 'tamano', 'content_type', 'huella', 'inmutable', 'ruta_gz', 'tamano_gz')
+
+    def __init__(self, ruta, stat, inmutable):
+        self.ruta = ruta
+        self.tamano = stat.st_size
+        self.content_type = mimetypes.guess_type(ruta)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/javascript',
+                                                                         'application/json'):
+            self.content_type += '; charset=utf-8'
+        self.huella = blake2b(f'{stat.st_size}-{stat.st_mtime_ns}'.encode(), digest_size=8).hexdigest()
+        self.inmutable = inmutable
+        try:
+            self.tamano_gz = os.stat(f'{ruta}.gz').st_size
+            self.ruta_gz = f'{ruta}.gz'
+        except OSError:
+            self.tamano_gz = self.ruta_gz = None
+
+
+class IndiceEstaticos:
+    """``Archivo`` de cada ruta de STATIC_ROOT ya pedida"""
+
+    def __init__(self, raiz, manifest):
+        self.raiz = str(raiz)
+        self.con_hash = set(manifest.values())
+        self._archivos = {}
+
+    def buscar(self, nombre):
+        """``Archivo`` de ``nombre`` (relativo a STATIC_ROOT) o None si no existe"""
+        archivo = self._archivos.get(nombre)
+        if archivo is not None and not settings.DEBUG:
+            return archivo
+        try:
+            ruta = safe_join(self.raiz, nombre)
+            datos = os.stat(ruta)
+        except (SuspiciousFileOperation, ValueError, OSError):
+            # Fuera de STATIC_ROOT o inexistente; no se guarda: cualquier URL inventada ocuparía memoria
+            return None
+        if not tipos.S_ISREG(datos.st_mode):
+            return None
+        archivo = self._archivos[nombre] = Archivo(ruta, datos, nombre in self.con_hash)
+        return archivo
+
+
+class IndicePorDefecto(LazyObject):
+    """Índice de ``STATIC_ROOT`` del proceso, creado la primera vez que se usa"""
+
+    def _setup(self):
+        self._wrapped = IndiceEstaticos(settings.STATIC_ROOT, getattr(staticfiles_storage, 'hashed_files', {}))
+
+
+indice_estaticos = IndicePorDefecto()
+
+
+@receiver(setting_changed)
+def _reiniciar_indice(setting, **kwargs):
+    if setting in ('STATIC_ROOT', 'STATIC_URL', 'STORAGES'):
+        indice_estaticos._wrapped = empty
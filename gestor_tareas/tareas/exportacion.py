@@ -0,0 +1,87 @@
+"""
+Generadores para exportar tareas como CSV o NDJSON en streaming.
+
+Cada función consume un iterable y produce bytes, sin acumular más que
+un bloque de salida, así que se pueden encadenar sobre
+``iterar_tareas_usuario`` y pasar a ``StreamingHttpResponse``. Para las
+vistas async, ``abloques`` arma el mismo flujo sobre páginas async.
+"""
+import csv
+import json
+import zlib
+
+COLUMNAS = ('id', 'titulo', 'descripcion', 'completada')
+
+# Tamaño aproximado de cada bloque enviado al cliente
+TAMANO_BLOQUE = 64 * 1024
+
+
+class _Eco:
+    """Archivo falso para csv.writer: ``write`` retorna la línea en vez de guardarla"""
+
+    def write(self, valor):
+        return valor
+
+
+def lineas_csv(tareas, encabezado=True):
+    """Encabezado (opcional) y una línea CSV por tarea"""
+    escritor = csv.writer(_Eco())
+    if encabezado:
+        yield escritor.writerow(COLUMNAS)
+    for tarea in tareas:
+        yield escritor.writerow([tarea[columna] for columna in COLUMNAS])
+
+
+def lineas_ndjson(tareas, encabezado=True):
+    """Un objeto JSON por línea y por tarea (NDJSON no tiene encabezado)"""
+    codificar = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    for tarea in tareas:
+        yield codificar({columna: tarea[columna] for columna in COLUMNAS}) + '\n'
+
+
+def en_bloques(lineas, tamano=TAMANO_BLOQUE):
+    """Agrupa líneas de texto en bloques de bytes de ~``tamano``"""
+    pendientes = []
+    acumulado = 0
+    for linea in lineas:
+        pendientes.append(linea)
+        acumulado += len(linea)
+        if acumulado >= tamano:
+            yield ''.join(pendientes).encode()
+            pendientes.clear()
+            acumulado = 0
+    if pendientes:
+        yield ''.join(pendientes).encode()
+
+
+def _compresor_gzip(nivel):
+    return zlib.compressobj(nivel, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+
+def comprimir_gzip(bloques, nivel=6):
+    """Comprime un flujo de bytes como un único archivo gzip"""
+    compresor = _compresor_gzip(nivel)
+    for bloque in bloques:
+        comprimido = compresor.compress(bloque)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+async def abloques(paginas, lineas, comprimir=False, nivel=6):
+    """
+    Versión async de ``comprimir_gzip(en_bloques(lineas(tareas)))``:
+    ``paginas`` es un iterable async de listas de tareas y cada página
+    formateada es un bloque.
+    """
+    compresor = _compresor_gzip(nivel) if comprimir else None
+    encabezado = True
+    async for pagina in paginas:
+        bloque = ''.join(lineas(pagina, encabezado)).encode()
+        encabezado = False
+        if compresor is not None:
+            bloque = compresor.compress(bloque)
+        if bloque:
+            yield bloque
+    if compresor is not None:
+        yield compresor.flush()
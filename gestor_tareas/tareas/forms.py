@@ -18,6 +18,19 @@ class TareaForm(forms.Form):
         })
     )
 
+class ImportarForm(forms.Form):
+    archivo = forms.FileField(
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'form-control',
+            'accept': '.csv,.ndjson,.jsonl,.gz'
+        })
+    )
+    formato = forms.ChoiceField(
+        required=False,
+        choices=[('', 'Según la extensión'), ('csv', 'CSV'), ('ndjson', 'NDJSON')],
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+
 class RegistroForm(UserCreationForm):
     email = forms.EmailField(
         required=True,
@@ -0,0 +1,103 @@
+"""
+Caché de fragmentos renderizados y ETags de ``lista_tareas``.
+
+La clave de cada página combina la versión de las tareas del usuario
+(``version_tareas_usuario``, que cambia con cada escritura), el orden,
+el cursor, el tamaño de página y una huella de las plantillas. Nada se invalida a
+mano: tras una escritura la clave es otra y la entrada vieja queda sin
+uso hasta que el LRU de la caché ``fragmentos`` la descarta.
+
+La versión se lee antes que las tareas, así que un fragmento nunca es más
+viejo que su clave: a lo sumo trae una escritura concurrente posterior,
+y la próxima request (con la versión nueva) ya no lo usa.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.middleware.csrf import get_token
+from django.template.loader import get_template
+from django.utils.cache import quote_etag
+
+from .storage import aversion_tareas_usuario, version_tareas_usuario
+
+PLANTILLAS = ('tareas/base.html', 'tareas/lista_tareas.html', 'tareas/lista_tareas_contenido.html',
+              'tareas/tarjeta_tarea.html')
+
+
+def _calcular_huella():
+    huella = hashlib.blake2b(digest_size=8)
+    for nombre in PLANTILLAS:
+        huella.update(get_template(nombre).template.source.encode())
+    # Las URLs de los estáticos (con hash) van en la página: un collectstatic nuevo cambia el ETag
+    huella.update(getattr(staticfiles_storage, 'manifest_hash', '').encode())
+    return huella.hexdigest()
+
+
+_huella_en_cache = lru_cache(maxsize=None)(_calcular_huella)
+
+
+def huella_plantillas():
+    """Hash de las plantillas de la lista y de los estáticos: un deploy que los cambie invalida caché y ETags"""
+    # Con DEBUG las plantillas se recargan al editarlas
+    return _calcular_huella() if settings.DEBUG else _huella_en_cache()
+
+
+def clave_lista(username, despues_de, orden=None):
+    """Clave (y ETag) de una página de la lista, o None si el backend no tiene versiones"""
+    return _clave(username, despues_de, orden, version_tareas_usuario(username))
+
+
+async def aclave_lista(username, despues_de, orden=None):
+    return _clave(username, despues_de, orden, await aversion_tareas_usuario(username))
+
+
+def _clave(username, despues_de, orden, version):
+    if version is None:
+        return None
+    datos = f'{huella_plantillas()}|{version}|{username}|{orden}|{despues_de!r}|{settings.TAREAS_POR_PAGINA}'
+    return hashlib.blake2b(datos.encode(), digest_size=16).hexdigest()
+
+
+def etag_lista(request, clave):
+    """
+    ETag de una página de la lista: la clave más una huella del secreto CSRF.
+    La página lleva el token del formulario de marcar tareas, y tras un
+    login (que rota el secreto) la copia del navegador ya no sirve.
+    """
+    # Crea el secreto si la request aún no lo trae, como lo haría la plantilla
+    get_token(request)
+    secreto = hashlib.blake2b(request.META['CSRF_COOKIE'].encode(), digest_size=4).hexdigest()
+    return quote_etag(f'{clave}.{secreto}')
+
+
+def obtener_fragmento(clave, renderizar):
+    """Retorna el fragmento cacheado bajo ``clave`` o lo genera con ``renderizar()``"""
+    if clave is None:
+        return renderizar()
+    fragmentos = caches['fragmentos']
+    contenido = fragmentos.get(clave)
+    if contenido is None:
+        contenido = renderizar()
+        fragmentos.set(clave, contenido)
+    return contenido
+
+
+async def aobtener_fragmento(clave, renderizar):
+    """Versión async de ``obtener_fragmento``; ``renderizar`` es una corrutina"""
+    if clave is None:
+        return await renderizar()
+    fragmentos = caches['fragmentos']
+    # LocMemCache no hace E/S, pero su aget/aset pasan por sync_to_async
+    en_memoria = isinstance(fragmentos, LocMemCache)
+    contenido = fragmentos.get(clave) if en_memoria else await fragmentos.aget(clave)
+    if contenido is None:
+        contenido = await renderizar()
+        if en_memoria:
+            fragmentos.set(clave, contenido)
+        else:
+            await fragmentos.aset(clave, contenido)
+    return contenido
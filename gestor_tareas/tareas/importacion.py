@@ -0,0 +1,116 @@
+"""
+Importación masiva de tareas desde CSV o NDJSON.
+
+Los archivos se leen fila a fila (nunca completos en memoria), cada fila
+se valida con los mismos campos de ``TareaForm`` y las válidas se
+insertan de a lotes con ``aplicar_lote_usuario``. Lo usan la vista
+``importar_tareas`` y el comando ``manage.py importar_tareas``.
+"""
+import codecs
+import csv
+import gzip
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+
+from .forms import TareaForm
+from .storage import aplicar_lote_usuario
+
+FORMATOS = ('csv', 'ndjson')
+TAMANO_LOTE = 1000
+
+# Errores que se guardan con detalle; del resto solo se cuentan
+MAX_ERRORES = 100
+
+
+@dataclass
+class ResultadoImportacion:
+    importadas: int = 0
+    rechazadas: int = 0
+    errores: list = field(default_factory=list)
+
+    def rechazar(self, fila, errores):
+        self.rechazadas += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append((fila, errores))
+
+
+def detectar_formato(nombre):
+    """Formato según la extensión (``tareas.csv``, ``tareas.ndjson.gz``...) o None"""
+    partes = nombre.lower().split('.')
+    if partes[-1] == 'gz':
+        partes.pop()
+    extension = partes[-1] if len(partes) > 1 else ''
+    return {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}.get(extension)
+
+
+def abrir(archivo, nombre=''):
+    """Envuelve un archivo binario para leerlo como texto, descomprimiéndolo si es .gz"""
+    if nombre.lower().endswith('.gz'):
+        archivo = gzip.GzipFile(fileobj=archivo)
+    return codecs.getreader('utf-8-sig')(archivo)
+
+
+def filas_csv(texto):
+    """Itera ``(numero_de_fila, datos)``; la primera fila es el encabezado"""
+    lector = csv.DictReader(texto)
+    for datos in lector:
+        yield lector.line_num, datos
+
+
+def filas_ndjson(texto):
+    """Itera ``(numero_de_linea, datos)``; datos es None si la línea no es un objeto JSON"""
+    decodificar = json.JSONDecoder().decode
+    for numero, linea in enumerate(texto, start=1):
+        if not linea.strip():
+            continue
+        try:
+            datos = decodificar(linea)
+        except ValueError:
+            datos = None
+        yield numero, datos if isinstance(datos, dict) else None
+
+
+LECTORES = {'csv': filas_csv, 'ndjson': filas_ndjson}
+
+
+def leer(archivo, formato, nombre=''):
+    """Itera las filas de un archivo binario en el formato indicado"""
+    return LECTORES[formato](abrir(archivo, nombre))
+
+
+def _validadores():
+    # Los campos de TareaForm: mismas reglas y mensajes que el formulario,
+    # sin el costo de instanciar un form por fila
+    return [(nombre, campo.clean) for nombre, campo in TareaForm.base_fields.items()]
+
+
+def importar(usuario, filas, tamano_lote=TAMANO_LOTE):
+    """
+    Valida e inserta las tareas de ``filas`` (pares ``(numero, datos)``)
+    para ``usuario``. Retorna un ``ResultadoImportacion``.
+    """
+    resultado = ResultadoImportacion()
+    validadores = _validadores()
+    lote = []
+    for numero, datos in filas:
+        if datos is None:
+            resultado.rechazar(numero, {'__all__': ['La fila no es un objeto JSON válido.']})
+            continue
+        limpios, errores = {}, {}
+        for nombre, limpiar in validadores:
+            try:
+                limpios[nombre] = limpiar(datos.get(nombre))
+            except ValidationError as error:
+                errores[nombre] = error.messages
+        if errores:
+            resultado.rechazar(numero, errores)
+            continue
+        lote.append(('crear', limpios['titulo'], limpios['descripcion']))
+        if len(lote) >= tamano_lote:
+            resultado.importadas += len(aplicar_lote_usuario(usuario, lote))
+            lote = []
+    if lote:
+        resultado.importadas += len(aplicar_lote_usuario(usuario, lote))
+    return resultado
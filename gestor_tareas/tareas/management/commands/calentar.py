@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from tareas.calentamiento import calentar
+
+
+class Command(BaseCommand):
+    help = ('Precarga URLs, plantillas y almacenamiento, y muestra cuánto tarda cada paso. '
+            'Solo calienta su propio proceso: sirve para verificar un deploy (una plantilla '
+            'rota falla aquí) y medir el arranque. Los workers se calientan con '
+            'TAREAS_CALENTAR_AL_INICIAR.')
+
+    def handle(self, **options):
+        total = 0
+        for nombre, (elementos, segundos) in calentar().items():
+            total += segundos
+            self.stdout.write(f'{nombre:<12} {elementos:>10,} {segundos * 1e3:>10.1f} ms')
+        self.stdout.write(self.style.SUCCESS(f'Calentamiento completo en {total * 1e3:.1f} ms'))
@@ -0,0 +1,50 @@
+import csv
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tareas.importacion import FORMATOS, TAMANO_LOTE, detectar_formato, importar, leer
+
+
+class Command(BaseCommand):
+    help = 'Importa tareas de un usuario desde un archivo CSV o NDJSON (opcionalmente .gz)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help='Nombre del usuario dueño de las tareas')
+        parser.add_argument('archivo', help='Ruta del archivo, o - para leer de la entrada estándar')
+        parser.add_argument('--formato', choices=FORMATOS,
+                            help='Formato del archivo (por defecto, según la extensión)')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help=f'Tareas por inserción (por defecto {TAMANO_LOTE})')
+
+    def handle(self, usuario, archivo, formato, lote, **options):
+        if not User.objects.filter(username=usuario).exists():
+            raise CommandError(f'El usuario "{usuario}" no existe.')
+        formato = formato or detectar_formato(archivo)
+        if formato is None:
+            raise CommandError('No se reconoce el formato del archivo; usa --formato.')
+
+        inicio = time.perf_counter()
+        try:
+            if archivo == '-':
+                resultado = importar(usuario, leer(sys.stdin.buffer, formato), lote)
+            else:
+                with open(archivo, 'rb') as entrada:
+                    resultado = importar(usuario, leer(entrada, formato, archivo), lote)
+        except (UnicodeDecodeError, OSError, csv.Error) as error:
+            raise CommandError(f'No se pudo leer el archivo: {error}')
+        duracion = time.perf_counter() - inicio
+
+        for fila, errores in resultado.errores:
+            detalle = '; '.join(f'{campo}: {" ".join(mensajes)}' for campo, mensajes in errores.items())
+            self.stderr.write(f'Fila {fila}: {detalle}')
+        if resultado.rechazadas > len(resultado.errores):
+            self.stderr.write(f'... y {resultado.rechazadas - len(resultado.errores)} filas rechazadas más')
+
+        filas = resultado.importadas + resultado.rechazadas
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.importadas} tareas importadas, {resultado.rechazadas} rechazadas '
+            f'en {duracion:.2f} s ({filas / duracion if duracion else 0:,.0f} filas/s)'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tareas.storage import tareas_storage
+from tareas.storage.particionado import AlmacenParticionado, RebalanceoEnCurso
+
+
+class Command(BaseCommand):
+    help = ('Mueve a su partición las ranuras de usuarios que el anillo de hash consistente '
+            'asigna a otra (por ejemplo, tras agregar una partición a TAREAS_PARTICIONES). '
+            'Se ejecuta con la aplicación en marcha: las escrituras de cada lote esperan '
+            'mientras se copia.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=64, help='Ranuras que se mueven a la vez.')
+        parser.add_argument('--simular', action='store_true', help='Solo muestra qué ranuras se moverían.')
+
+    def handle(self, **options):
+        if not isinstance(tareas_storage, AlmacenParticionado):
+            raise CommandError('TAREAS_STORAGE no es un AlmacenParticionado.')
+        if options['simular']:
+            for (origen, destino), ranuras in tareas_storage.pendientes().items():
+                self.stdout.write(f'{origen} -> {destino}: {len(ranuras)} ranuras')
+            return
+
+        def progreso(origen, destino, ranuras, tareas):
+            self.stdout.write(f'{origen} -> {destino}: {ranuras} ranuras, {tareas:,} tareas')
+
+        try:
+            ranuras, tareas = tareas_storage.rebalancear(options['lote'], progreso)
+        except RebalanceoEnCurso:
+            raise CommandError('Ya hay un rebalanceo en curso.') from None
+        self.stdout.write(self.style.SUCCESS(f'Rebalanceo completo: {ranuras} ranuras y {tareas:,} tareas movidas'))
@@ -0,0 +1,236 @@
+"""
+Métricas de la aplicación en el formato de texto de Prometheus.
+
+Los histogramas y contadores no usan locks: cada hilo acumula en su
+propia porción (``threading.local``) y ``exportar`` suma las porciones
+al responder ``/metrics``. Registrar una observación es un bisect y dos
+sumas sobre una lista del propio hilo. Las corrutinas del event loop comparten hilo,
+pero no hay ``await`` entre esas sumas, así que tampoco se pisan. Cuando un
+hilo termina su porción se suma a un total compartido (con lock), así que
+los servidores que crean y descartan hilos no acumulan una porción por hilo.
+"""
+import threading
+import weakref
+from bisect import bisect_left
+from functools import wraps
+from inspect import iscoroutinefunction
+from time import perf_counter
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Límites superiores de los buckets
+BUCKETS_DURACION = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                    0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_TAMANO = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatear(numero):
+    return repr(float(numero)) if isinstance(numero, float) else str(numero)
+
+
+def _etiquetas(nombres, valores):
+    return ','.join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores))
+
+
+class _Centinela:
+    """Vive en el ``threading.local`` de un hilo: se recolecta cuando el hilo termina"""
+    __slots__ = ('__weakref__',)
+
+
+class PorHilo:
+    """Métrica con un dict ``{valores de las etiquetas: ...}`` por hilo"""
+
+    def __init__(self, nombre, ayuda, etiquetas):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._local = threading.local()
+        # id -> porción de cada hilo vivo, y la suma de las de hilos terminados
+        self._porciones = {}
+        self._terminados = {}
+        self._lock = threading.Lock()
+
+    def _porcion(self):
+        try:
+            return self._local.porcion
+        except AttributeError:
+            porcion = self._local.porcion = {}
+            self._local.centinela = centinela = _Centinela()
+            weakref.finalize(centinela, self._retirar, porcion)
+            with self._lock:
+                self._porciones[id(porcion)] = porcion
+            return porcion
+
+    def _retirar(self, porcion):
+        """Suma la porción de un hilo que terminó al total compartido"""
+        with self._lock:
+            self._sumar(self._terminados, porcion)
+            del self._porciones[id(porcion)]
+
+    def _sumar(self, total, porcion):
+        raise NotImplementedError
+
+    def valores(self):
+        """Suma las porciones de todos los hilos, vivos y terminados"""
+        total = {}
+        with self._lock:
+            self._sumar(total, self._terminados)
+            for porcion in self._porciones.values():
+                self._sumar(total, porcion)
+        return total
+
+
+class Contador(PorHilo):
+    """Contador con etiquetas; ``incrementar`` recibe la tupla de valores"""
+
+    def incrementar(self, valores=(), cantidad=1):
+        porcion = self._porcion()
+        porcion[valores] = porcion.get(valores, 0) + cantidad
+
+    def _sumar(self, total, porcion):
+        for valores, cantidad in list(porcion.items()):
+            total[valores] = total.get(valores, 0) + cantidad
+
+    def exportar(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} counter']
+        for valores, cantidad in sorted(self.valores().items()):
+            lineas.append(f'{self.nombre}{{{_etiquetas(self.etiquetas, valores)}}} {cantidad}')
+        return '\n'.join(lineas)
+
+
+class Medidor:
+    """Valores que se leen al exportar: ``leer()`` retorna ``{valores de las etiquetas: valor}``"""
+
+    def __init__(self, nombre, ayuda, etiquetas, leer):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.leer = leer
+
+    def exportar(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} gauge']
+        for valores, valor in sorted(self.leer().items()):
+            lineas.append(f'{self.nombre}{{{_etiquetas(self.etiquetas, valores)}}} {_formatear(valor)}')
+        return '\n'.join(lineas)
+
+
+class Histograma(PorHilo):
+    """
+    Histograma acumulativo con etiquetas, como el de los clientes de
+    Prometheus. ``observar`` recibe la tupla de valores de las etiquetas.
+    """
+
+    def __init__(self, nombre, ayuda, etiquetas, limites):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.limites = limites
+
+    def observar(self, valores, valor):
+        porcion = self._porcion()
+        fila = porcion.get(valores)
+        if fila is None:
+            # Un contador por bucket (el último es +Inf) y la suma
+            fila = porcion[valores] = [0] * (len(self.limites) + 1) + [0]
+        fila[bisect_left(self.limites, valor)] += 1
+        fila[-1] += valor
+
+    def _sumar(self, total, porcion):
+        """Suma ``porcion`` a ``total``: ``{valores: [buckets..., suma]}``"""
+        # list(dict.items()) no suelta el GIL: copia consistente
+        for valores, fila in list(porcion.items()):
+            acumulada = total.get(valores)
+            if acumulada is None:
+                total[valores] = list(fila)
+            else:
+                for i, cantidad in enumerate(fila):
+                    acumulada[i] += cantidad
+
+    def exportar(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} histogram']
+        for valores, fila in sorted(self.valores().items()):
+            etiquetas = _etiquetas(self.etiquetas, valores)
+            prefijo = etiquetas + ',' if etiquetas else ''
+            acumulado = 0
+            for limite, cantidad in zip(self.limites + ('+Inf',), fila):
+                acumulado += cantidad
+                lineas.append(f'{self.nombre}_bucket{{{prefijo}le="{limite}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_sum{{{etiquetas}}} {_formatear(fila[-1])}')
+            lineas.append(f'{self.nombre}_count{{{etiquetas}}} {acumulado}')
+        return '\n'.join(lineas)
+
+
+DURACION_VISTAS = Histograma(
+    'tareas_vista_duracion_segundos', 'Duración de las requests por vista.',
+    ('vista', 'metodo', 'estado'), BUCKETS_DURACION)
+TAMANO_RESPUESTAS = Histograma(
+    'tareas_respuesta_tamano_bytes', 'Tamaño del cuerpo de las respuestas (no streaming) por vista.',
+    ('vista',), BUCKETS_TAMANO)
+DURACION_STORAGE = Histograma(
+    'tareas_storage_duracion_segundos', 'Llamadas y duración de las operaciones de tareas.storage.',
+    ('operacion',), BUCKETS_DURACION)
+
+# Almacén escalonado (ver tareas/storage/escalonado.py)
+ACCESOS_ALMACEN = Contador(
+    'tareas_almacen_accesos_total',
+    'Accesos a las tareas de un usuario según dónde estaban (memoria: acierto, disco: fallo).', ('nivel',))
+DESALOJOS_ALMACEN = Contador(
+    'tareas_almacen_desalojos_total', 'Usuarios y tareas bajados de memoria a disco.', ('tipo',))
+
+
+def _niveles_almacen(clave):
+    def leer():
+        from .storage import tareas_storage
+        niveles = getattr(tareas_storage, 'niveles', None)
+        return {(nivel,): datos[clave] for nivel, datos in niveles().items()} if niveles else {}
+    return leer
+
+
+NIVELES_BYTES = Medidor('tareas_almacen_bytes', 'Bytes de tareas en cada nivel del almacén escalonado.',
+                        ('nivel',), _niveles_almacen('bytes'))
+NIVELES_USUARIOS = Medidor('tareas_almacen_usuarios', 'Usuarios en cada nivel del almacén escalonado.',
+                           ('nivel',), _niveles_almacen('usuarios'))
+
+METRICAS = (DURACION_VISTAS, TAMANO_RESPUESTAS, DURACION_STORAGE, ACCESOS_ALMACEN, DESALOJOS_ALMACEN,
+            NIVELES_BYTES, NIVELES_USUARIOS)
+
+
+def exportar():
+    """Todas las métricas en el formato de texto de Prometheus"""
+    return '\n'.join(metrica.exportar() for metrica in METRICAS) + '\n'
+
+
+def registrar_request(request, response, duracion):
+    coincidencia = request.resolver_match
+    # Sin ruta (404) no se usa el path: cada URL inventada sería una serie nueva
+    vista = coincidencia.view_name if coincidencia is not None else '<sin_ruta>'
+    DURACION_VISTAS.observar((vista, request.method, response.status_code), duracion)
+    if not response.streaming:
+        TAMANO_RESPUESTAS.observar((vista,), len(response.content))
+
+
+def medir_storage(funcion):
+    """Decorador: registra cada llamada a ``funcion`` en DURACION_STORAGE"""
+    operacion = (funcion.__name__,)
+    observar = DURACION_STORAGE.observar
+
+    if iscoroutinefunction(funcion):
+        @wraps(funcion)
+        async def envoltura(*args, **kwargs):
+            inicio = perf_counter()
+            try:
+                return await funcion(*args, **kwargs)
+            finally:
+                observar(operacion, perf_counter() - inicio)
+        return envoltura
+
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        inicio = perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            observar(operacion, perf_counter() - inicio)
+    return envoltura
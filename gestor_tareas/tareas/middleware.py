@@ -1,25 +1,278 @@
-from django.shortcuts import redirect
-from django.urls import reverse
+import os
+from random import random
+from time import perf_counter
+from urllib.parse import urlsplit
 
-class AuthenticationMiddleware:
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.http import FileResponse, HttpResponse
+from django.middleware.gzip import GZipMiddleware, re_accepts_gzip
+from django.utils.cache import get_conditional_response, patch_vary_headers, quote_etag
+
+from .contrasenas import HashingSaturado
+from .estaticos import INMUTABLE, REVALIDAR, indice_estaticos
+from .metricas import registrar_request
+from .perfilado import Perfil, instalar
+
+
+class MetricasMiddleware:
     """
-    Middleware personalizado para manejar la autenticación
+    Middleware que mide la duración y el tamaño de cada respuesta por vista
+    (ver tareas/metricas.py). Va primero en MIDDLEWARE para medir la
+    request completa.
+
+    Soporta modo sync y async de forma nativa: bajo ASGI no agrega saltos
+    a hilos. En respuestas streaming la duración llega hasta que la vista
+    retorna, no hasta que se envía el último bloque.
     """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        # URLs públicas que no requieren autenticación
-        public_urls = [
-            reverse('tareas:login'),
-            reverse('tareas:registro'),
-        ]
-        
-        # Si el usuario no está autenticado y no está en una URL pública
-        if not request.user.is_authenticated and request.path not in public_urls:
-            # Verificar si está intentando acceder a una vista protegida
-            if not request.path.startswith('/admin/'):
-                return redirect('tareas:login')
-        
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        inicio = perf_counter()
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        registrar_request(request, response, perf_counter() - inicio)
+        return response
+
+    async def __acall__(self, request):
+        inicio = perf_counter()
+        response = await self.get_response(request)
+        registrar_request(request, response, perf_counter() - inicio)
+        return response
+
+
+class HashingSaturadoMiddleware:
+    """
+    Responde 503 con ``Retry-After`` cuando una vista lanza
+    ``HashingSaturado`` (ver tareas/contrasenas.py): el pool de hashing ya
+    tiene ``TAREAS_HASH_MAX_PENDIENTES`` trabajos. Cubre todas las vistas que
+    calculan un hash, también las de Django (admin, cambio de contraseña).
+
+    Acota los hashes en curso, no los hilos: hasta el rechazo, una vista
+    sync que hashea tiene su hilo bloqueado esperando al pool.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # process_exception es siempre sync, también bajo ASGI
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, HashingSaturado):
+            return None
+        response = HttpResponse('Hay demasiados inicios de sesión en curso. Intenta de nuevo en unos segundos.',
+                                status=503, content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = '1'
+        return response
+
+
+class PerfiladoMiddleware:
+    """
+    Perfila con cProfile las requests de staff con el encabezado
+    ``X-Perfilar`` y una muestra de ``TAREAS_PERFILADO_MUESTREO`` del resto
+    (ver tareas/perfilado.py). Va después de MetricasMiddleware para que el
+    perfil de una muestra incluya sesión, autenticación, mensajes y la
+    compresión del HTML.
+
+    El encabezado se atiende en ``process_view``, con el usuario ya
+    resuelto por AuthenticationMiddleware, y solo si es staff: nadie más
+    puede hacer que el worker perfile. Ese perfil empieza en la vista
+    (no incluye la sesión ni la autenticación de la ida); el muestreo
+    no depende del cliente y empieza antes.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.TAREAS_PERFILADO_DIR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.directorio = settings.TAREAS_PERFILADO_DIR
+        self.muestreo = settings.TAREAS_PERFILADO_MUESTREO
+        os.makedirs(self.directorio, exist_ok=True)
+        connection_created.connect(instalar, dispatch_uid='tareas.perfilado')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django pasaría un process_view sync a un hilo, y el perfil es del hilo de la request
+            self.process_view = self._aprocess_view
+
+    def _iniciar(self, request):
+        perfil = Perfil()
+        if perfil.iniciar():
+            request._perfil = perfil
+
+    def _muestrear(self, request):
+        request._perfil = None
+        request._perfil_pedido = False
+        if self.muestreo > 0 and random() < self.muestreo:
+            self._iniciar(request)
+
+    def _pedir(self, request):
+        """Perfil a pedido de un usuario staff (si ya sale en la muestra, es el mismo)"""
+        request._perfil_pedido = True
+        if request._perfil is None:
+            self._iniciar(request)
+
+    def _detener(self, request):
+        perfil = getattr(request, '_perfil', None)
+        if perfil is not None:
+            perfil.detener()
+        return perfil
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self._muestrear(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            perfil = self._detener(request)
+        if perfil is not None:
+            self._guardar(request, response, perfil)
+        return response
+
+    async def __acall__(self, request):
+        self._muestrear(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            perfil = self._detener(request)
+        if perfil is not None:
+            # Armar las pilas y escribir los archivos puede tardar: fuera del event loop
+            await sync_to_async(self._guardar, thread_sensitive=False)(request, response, perfil)
+        return response
+
+    def process_view(self, request, vista, args, kwargs):
+        if 'HTTP_X_PERFILAR' in request.META:
+            usuario = getattr(request, 'user', None)
+            if usuario is not None and usuario.is_staff:
+                self._pedir(request)
+
+    async def _aprocess_view(self, request, vista, args, kwargs):
+        if 'HTTP_X_PERFILAR' in request.META and hasattr(request, 'auser') and (await request.auser()).is_staff:
+            self._pedir(request)
+
+    def _guardar(self, request, response, perfil):
+        coincidencia = request.resolver_match
+        vista = coincidencia.view_name if coincidencia is not None else 'sin_ruta'
+        nombre = perfil.guardar(self.directorio, vista, settings.TAREAS_PERFILADO_MAX_ARCHIVOS)
+        if request._perfil_pedido:
+            response['X-Perfil'] = nombre
+
+
+class EstaticosMiddleware:
+    """
+    Sirve STATIC_ROOT desde el worker (ver tareas/estaticos.py). Va primero
+    en MIDDLEWARE: un archivo estático no pasa por sesión, autenticación
+    ni métricas. Lo que no está en STATIC_ROOT sigue de largo (en
+    desarrollo lo atiende ``runserver`` desde las apps).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        url = urlsplit(settings.STATIC_URL or '')
+        if not settings.TAREAS_SERVIR_ESTATICOS or not settings.STATIC_ROOT or url.netloc:
+            # Con STATIC_URL en otro dominio (CDN, nginx) no hay nada que servir aquí
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefijo = url.path
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _buscar(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefijo):
+            return None
+        return indice_estaticos.buscar(request.path[len(self.prefijo):])
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        archivo = self._buscar(request)
+        if archivo is None:
+            return self.get_response(request)
+        response, ruta = self._preparar(request, archivo)
+        if ruta is not None:
+            # FileResponse: bajo WSGI el servidor lo envía con wsgi.file_wrapper (sendfile)
+            response = self._completar(FileResponse(open(ruta, 'rb'), content_type=archivo.content_type), response)
+            del response['Content-Disposition']
+        return response
+
+    async def __acall__(self, request):
+        archivo = self._buscar(request)
+        if archivo is None:
+            return await self.get_response(request)
+        response, ruta = self._preparar(request, archivo)
+        if ruta is not None:
+            # Bajo ASGI un FileResponse se lee bloque a bloque en hilos; los estáticos son chicos
+            contenido = await sync_to_async(_leer, thread_sensitive=False)(ruta)
+            response = self._completar(HttpResponse(contenido, content_type=archivo.content_type), response)
+        return response
+
+    def _preparar(self, request, archivo):
+        """
+        Respuesta sin cuerpo (304 o HEAD) con sus encabezados, y la ruta del
+        archivo a enviar (None si no hay cuerpo).
+        """
+        gzip = archivo.ruta_gz is not None and re_accepts_gzip.search(request.headers.get('Accept-Encoding', ''))
+        ruta, tamano = (archivo.ruta_gz, archivo.tamano_gz) if gzip else (archivo.ruta, archivo.tamano)
+        # Cada variante es otra representación: su propio ETag
+        etag = quote_etag(f'{archivo.huella}-gz' if gzip else archivo.huella)
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            # 304
+            ruta = None
+        else:
+            response = HttpResponse(content_type=archivo.content_type)
+            if request.method == 'HEAD':
+                response['Content-Length'] = tamano
+                ruta = None
+        response['ETag'] = etag
+        response['Cache-Control'] = INMUTABLE if archivo.inmutable else REVALIDAR
+        response['X-Content-Type-Options'] = 'nosniff'
+        if archivo.ruta_gz is not None:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        if gzip and response.status_code == 200:
+            response['Content-Encoding'] = 'gzip'
+        return response, ruta
+
+    @staticmethod
+    def _completar(response, encabezados):
+        for nombre in ('ETag', 'Cache-Control', 'X-Content-Type-Options', 'Vary', 'Content-Encoding'):
+            if encabezados.has_header(nombre):
+                response[nombre] = encabezados[nombre]
+        return response
+
+
+def _leer(ruta):
+    with open(ruta, 'rb') as archivo:
+        return archivo.read()
+
+
+class ComprimirHTMLMiddleware(GZipMiddleware):
+    """
+    ``GZipMiddleware`` solo para páginas HTML. Los estáticos ya vienen
+    comprimidos, el feed de cambios debe salir evento por evento y las
+    exportaciones son streams largos. Django agrega bytes al azar a cada
+    respuesta comprimida, lo que mitiga BREACH sobre el token CSRF.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or not response.get('Content-Type', '').startswith('text/html'):
+            return response
+        return super().process_response(request, response)
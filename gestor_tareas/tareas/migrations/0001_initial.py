@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titulo', models.CharField(max_length=200)),
+                ('descripcion', models.TextField()),
+                ('completada', models.BooleanField(default=False)),
+                ('usuario', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='tareas', to=settings.AUTH_USER_MODEL, to_field='username')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'id'], name='tarea_usuario_id_idx'), models.Index(fields=['completada'], name='tarea_completada_idx')],
+            },
+        ),
+    ]
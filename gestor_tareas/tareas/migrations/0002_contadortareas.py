@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def calcular_contadores(apps, schema_editor):
+    """Llena los contadores a partir de las tareas existentes"""
+    Tarea = apps.get_model('tareas', 'Tarea')
+    ContadorTareas = apps.get_model('tareas', 'ContadorTareas')
+    filas = (Tarea.objects.values('usuario_id')
+             .annotate(total=Count('id'), completadas=Count('id', filter=Q(completada=True))))
+    ContadorTareas.objects.bulk_create(
+        ContadorTareas(usuario_id=fila['usuario_id'], total=fila['total'], completadas=fila['completadas'])
+        for fila in filas
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tareas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorTareas',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='contador_tareas', serialize=False, to=settings.AUTH_USER_MODEL, to_field='username')),
+                ('total', models.IntegerField(default=0)),
+                ('completadas', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:37
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tareas', '0002_contadortareas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarea',
+            name='actualizada',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tarea',
+            name='creada',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(models.F('usuario'), django.db.models.functions.text.Lower('titulo'), models.F('id'), name='tarea_usuario_titulo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['usuario', 'completada', 'id'], name='tarea_usuario_completada_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['usuario', '-actualizada', 'id'], name='tarea_usuario_actualizada_idx'),
+        ),
+    ]
@@ -1,3 +1,52 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
 
-# Create your models here.
+
+class Tarea(models.Model):
+    """Tarea persistida en la base de datos (backend ``tareas.storage.orm``)"""
+    titulo = models.CharField(max_length=200)
+    descripcion = models.TextField()
+    # Se referencia por username: la capa de almacenamiento identifica
+    # al dueño por su nombre de usuario y así evita un JOIN con auth_user
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        to_field='username',
+        on_delete=models.CASCADE,
+        related_name='tareas',
+        db_index=False,
+    )
+    completada = models.BooleanField(default=False)
+    # Segundos desde epoch, como en los demás backends (0: tarea anterior a las fechas)
+    creada = models.FloatField(default=0)
+    actualizada = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'id'], name='tarea_usuario_id_idx'),
+            models.Index(fields=['completada'], name='tarea_completada_idx'),
+            # Uno por orden de storage.base.ORDENES: la página es un recorrido del índice
+            models.Index(F('usuario'), Lower('titulo'), F('id'), name='tarea_usuario_titulo_idx'),
+            models.Index(fields=['usuario', 'completada', 'id'], name='tarea_usuario_completada_idx'),
+            models.Index(fields=['usuario', '-actualizada', 'id'], name='tarea_usuario_actualizada_idx'),
+        ]
+
+    def __str__(self):
+        return self.titulo
+
+
+class ContadorTareas(models.Model):
+    """Totales de tareas de un usuario (backend ``tareas.storage.orm``), ajustados en cada escritura"""
+    usuario = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        to_field='username',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='contador_tareas',
+    )
+    total = models.IntegerField(default=0)
+    completadas = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.usuario_id}: {self.completadas}/{self.total}'
@@ -0,0 +1,202 @@
+"""
+Perfilado de requests a pedido, con salida lista para un flame graph.
+
+Con ``TAREAS_PERFILADO_DIR`` definido, ``tareas.middleware.PerfiladoMiddleware``
+perfila con cProfile:
+
+- las requests de usuarios staff que traen el encabezado ``X-Perfilar``,
+  desde la vista: el encabezado se mira con el usuario ya autenticado
+  (la respuesta indica el archivo en ``X-Perfil``), y
+- una fracción ``TAREAS_PERFILADO_MUESTREO`` de todas las requests.
+
+Cada perfil son dos archivos en formato de pilas colapsadas (``a;b;c
+microsegundos``, el de ``flamegraph.pl`` y speedscope): ``<nombre>.collapsed``
+con el tiempo propio de cada función por camino de llamadas y
+``<nombre>.sql.collapsed`` con el tiempo de cada consulta SQL (alias;
+consulta). Se conservan los ``TAREAS_PERFILADO_MAX_ARCHIVOS`` más recientes.
+
+cProfile guarda llamador y llamado, no pilas completas: el tiempo de una
+función con varios llamadores se reparte entre ellos en proporción a lo
+que cada uno le dedicó, como en gprof. Perfila solo el hilo de la request;
+bajo ASGI ese hilo es el del event loop, así que el perfil incluye las
+corrutinas de otras requests que corrieron mientras tanto, y no el ORM
+que corre en hilos (sus consultas sí quedan en el archivo SQL).
+
+Sin perfil en curso el costo por request es buscar un encabezado y, con
+muestreo, un número al azar; sin ``TAREAS_PERFILADO_DIR`` el middleware
+no se instala.
+"""
+import cProfile
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from django.db import connections
+
+# Consultas del perfil en curso en este contexto (None: no se perfila)
+_consultas = ContextVar('tareas_perfilado_consultas', default=None)
+
+# Un solo cProfile por hilo: un segundo reemplazaría al primero
+_hilo = threading.local()
+
+_secuencia = itertools.count()
+
+# Caminos con menos de esta fracción del total no se escriben
+MINIMO = 1e-4
+
+
+def medir_consulta(execute, sql, params, many, context):
+    """``execute_wrapper`` que anota la duración de cada consulta del perfil en curso"""
+    consultas = _consultas.get()
+    if consultas is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        consultas.append((context['connection'].alias, sql, time.perf_counter() - inicio))
+
+
+def instalar(connection, **kwargs):
+    """Agrega ``medir_consulta`` a una conexión (receptor de ``connection_created``)"""
+    if medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_consulta)
+
+
+class Perfil:
+    """Perfil de una request: cProfile del hilo actual y consultas SQL del contexto"""
+
+    def __init__(self):
+        self.perfilador = None
+        self.consultas = []
+        self.duracion = 0
+
+    def iniciar(self):
+        """Empieza a perfilar; False si este hilo ya tiene un perfil en curso"""
+        if getattr(_hilo, 'activo', False):
+            return False
+        _hilo.activo = True
+        for conexion in connections.all(initialized_only=True):
+            instalar(conexion)
+        self._token = _consultas.set(self.consultas)
+        self.perfilador = cProfile.Profile()
+        self._inicio = time.perf_counter()
+        self.perfilador.enable()
+        return True
+
+    def detener(self):
+        self.perfilador.disable()
+        self.duracion = time.perf_counter() - self._inicio
+        _consultas.reset(self._token)
+        _hilo.activo = False
+
+    def pilas(self):
+        """Pilas colapsadas: camino de llamadas -> segundos propios de la última función"""
+        self.perfilador.create_stats()
+        return pilas(self.perfilador.stats)
+
+    def guardar(self, directorio, vista, maximo):
+        """Escribe los dos archivos del perfil, rota el directorio y devuelve el nombre base"""
+        vista = re.sub(r'[^\w.-]', '_', vista)
+        nombre = (f'{time.strftime("%Y%m%d-%H%M%S")}-{vista}-{self.duracion * 1000:.0f}ms-'
+                  f'{os.getpid()}-{next(_secuencia)}')
+        ruta = os.path.join(directorio, nombre)
+        _escribir(f'{ruta}.collapsed',
+                  ((';'.join(map(_nombre_funcion, camino)), segundos) for camino, segundos in self.pilas().items()))
+        sql = Counter()
+        veces = Counter()
+        for alias, consulta, segundos in self.consultas:
+            clave = (alias, ' '.join(consulta.split()).replace(';', ','))
+            sql[clave] += segundos
+            veces[clave] += 1
+        _escribir(f'{ruta}.sql.collapsed',
+                  ((f'{alias};{consulta} (x{veces[alias, consulta]})', segundos)
+                   for (alias, consulta), segundos in sql.items()))
+        rotar(directorio, maximo)
+        return nombre
+
+
+def pilas(estadisticas):
+    """
+    Reconstruye pilas colapsadas desde las estadísticas de cProfile
+    (``función -> (cc, nc, propio, acumulado, llamadores)``), repartiendo
+    el tiempo de cada función entre sus llamadores.
+    """
+    llamados = defaultdict(list)
+    raices = []
+    for funcion, (primitivas, llamadas, _, acumulado, llamadores) in estadisticas.items():
+        for llamador, (veces, _, _, tiempo) in llamadores.items():
+            llamados[llamador].append((funcion, tiempo))
+            llamadas -= veces
+        # Llamadas sin llamador: las hizo la función que estaba corriendo al
+        # activar cProfile. No alcanza con buscar funciones sin llamadores: la
+        # cadena de middlewares es recursiva (inner -> __call__ -> inner)
+        if llamadas > 0:
+            raices.append((funcion, acumulado * min(1, llamadas / primitivas)))
+    minimo = sum(acumulado for _, acumulado in raices) * MINIMO
+    resultado = Counter()
+    pendientes = [((funcion,), acumulado) for funcion, acumulado in raices]
+    while pendientes:
+        camino, tiempo = pendientes.pop()
+        _, _, propio, acumulado, _ = estadisticas[camino[-1]]
+        fraccion = min(1, tiempo / acumulado) if acumulado else 0
+        if propio * fraccion > 0:
+            resultado[camino] += propio * fraccion
+        for llamado, tiempo_llamado in llamados[camino[-1]]:
+            # Las llamadas recursivas ya están dentro del acumulado del camino
+            if llamado not in camino and tiempo_llamado * fraccion >= minimo:
+                pendientes.append((camino + (llamado,), tiempo_llamado * fraccion))
+    return resultado
+
+
+def rotar(directorio, maximo):
+    """Borra los perfiles más antiguos hasta dejar ``maximo``"""
+    perfiles = []
+    with os.scandir(directorio) as entradas:
+        for entrada in entradas:
+            if entrada.name.endswith('.collapsed') and not entrada.name.endswith('.sql.collapsed'):
+                try:
+                    perfiles.append((entrada.stat().st_mtime, entrada.name[:-len('.collapsed')]))
+                except FileNotFoundError:
+                    # Lo borró otro worker
+                    pass
+    perfiles.sort()
+    for _, nombre in perfiles[:max(0, len(perfiles) - maximo)]:
+        for extension in ('.collapsed', '.sql.collapsed'):
+            try:
+                os.remove(os.path.join(directorio, nombre + extension))
+            except FileNotFoundError:
+                pass
+
+
+def _escribir(ruta, lineas):
+    # Se escribe aparte y se renombra: quien lee el directorio no ve archivos a medias
+    temporal = f'{ruta}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        for pila, segundos in lineas:
+            microsegundos = round(segundos * 1e6)
+            if microsegundos:
+                archivo.write(f'{pila} {microsegundos}\n')
+    os.replace(temporal, ruta)
+
+
+def _nombre_funcion(clave):
+    archivo, linea, funcion = clave
+    if archivo == '~':
+        # Funciones en C: "<method 'execute' of 'sqlite3.Cursor' objects>"
+        return funcion.replace(';', ',')
+    return f'{funcion} ({_ruta_corta(archivo)}:{linea})'.replace(';', ',')
+
+
+def _ruta_corta(archivo):
+    """Ruta relativa a la entrada de sys.path más larga que la contiene"""
+    mejor = archivo
+    for base in sys.path:
+        if base and archivo.startswith(base + os.sep) and len(archivo) - len(base) - 1 < len(mejor):
+            mejor = archivo[len(base) + 1:]
+    return mejor
@@ -0,0 +1,61 @@
+// Actualiza la lista con el feed de cambios (ver tareas/cambios.py). La URL del
+// feed, con el cursor de la página, viene en el atributo data-feed del <script>.
+(() => {
+    if (!window.EventSource) return;
+    const lista = document.getElementById('tareas');
+    const plantilla = document.getElementById('plantilla-tarea');
+    const fuente = new EventSource(document.currentScript.dataset.feed);
+
+    const tarjeta = id => lista && lista.querySelector(`[data-tarea-id="${id}"]`);
+    const resumir = texto => {
+        const palabras = texto.split(/\s+/).filter(Boolean);
+        return palabras.length > 20 ? palabras.slice(0, 20).join(' ') + ' …' : texto;
+    };
+
+    function pintar(nodo, tarea) {
+        nodo.dataset.tareaId = tarea.id;
+        nodo.querySelector('.tarea-titulo').textContent = tarea.titulo;
+        nodo.querySelector('.tarea-descripcion').textContent = resumir(tarea.descripcion);
+        nodo.querySelector('.tarea-usuario').textContent = tarea.usuario;
+        nodo.querySelector('input[name="ids"]').value = tarea.id;
+        nodo.querySelectorAll('.solo-completada').forEach(e => e.hidden = !tarea.completada);
+        nodo.querySelectorAll('.solo-pendiente').forEach(e => e.hidden = tarea.completada);
+        const boton = nodo.querySelector('.tarea-marcar');
+        boton.value = tarea.completada ? '0' : '1';
+        boton.title = tarea.completada ? 'Marcar como pendiente' : 'Marcar como completada';
+        nodo.querySelectorAll('[href], [formaction]').forEach(e => {
+            const atributo = e.hasAttribute('href') ? 'href' : 'formaction';
+            e.setAttribute(atributo, e.getAttribute(atributo).replace(/\/\d+\/$/, `/${tarea.id}/`));
+        });
+    }
+
+    function guardar(evento) {
+        const tarea = JSON.parse(evento.data);
+        const nodo = tarjeta(tarea.id);
+        if (nodo) {
+            pintar(nodo, tarea);
+        } else if (evento.type === 'crear') {
+            // Las altas van al final: solo se ven en la última página
+            if (!lista || !plantilla) return location.reload();
+            if (lista.dataset.ultimaPagina !== '1') return;
+            const nueva = plantilla.content.firstElementChild.cloneNode(true);
+            pintar(nueva, tarea);
+            lista.append(nueva);
+        }
+    }
+
+    fuente.addEventListener('crear', guardar);
+    fuente.addEventListener('editar', guardar);
+    fuente.addEventListener('eliminar', evento => {
+        const nodo = tarjeta(JSON.parse(evento.data).id);
+        if (nodo) nodo.remove();
+    });
+    fuente.addEventListener('estadisticas', evento => {
+        const estadisticas = JSON.parse(evento.data);
+        document.querySelectorAll('[data-estadistica]').forEach(e => {
+            e.textContent = estadisticas[e.dataset.estadistica];
+        });
+    });
+    // Se perdieron eventos (reinicio del worker, historial desbordado)
+    fuente.addEventListener('recargar', () => location.reload());
+})();
@@ -0,0 +1,260 @@
+"""
+Capa de almacenamiento de tareas.
+
+Las vistas usan únicamente las funciones de este módulo, que delegan en
+el backend configurado en ``settings.TAREAS_STORAGE``:
+
+    TAREAS_STORAGE = {
+        'BACKEND': 'tareas.storage.memoria.AlmacenMemoria',
+        'OPTIONS': {},
+    }
+"""
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.functional import LazyObject, empty
+from django.utils.module_loading import import_string
+
+from ..cambios import feed_cambios
+from ..metricas import medir_storage
+from .base import OK, cursor_orden
+
+
+def crear_backend(config=None):
+    """Instancia el backend descrito por ``config`` (por defecto, el de settings)"""
+    config = config or settings.TAREAS_STORAGE
+    clase = import_string(config['BACKEND'])
+    return clase(**config.get('OPTIONS', {}))
+
+
+class BackendPorDefecto(LazyObject):
+    """Backend configurado, instanciado la primera vez que se usa"""
+
+    def _setup(self):
+        backend = crear_backend()
+        backend.al_cambiar = _publicar
+        self._wrapped = backend
+
+
+tareas_storage = BackendPorDefecto()
+
+
+@receiver(setting_changed)
+def _reiniciar_backend(setting, **kwargs):
+    if setting == 'TAREAS_STORAGE':
+        if tareas_storage._wrapped is not empty:
+            tareas_storage.cerrar()
+        tareas_storage._wrapped = empty
+
+
+def _publicar(usuario, eventos):
+    # El backend lo llama desde su sección crítica (ver BackendTareas._publicar)
+    feed_cambios.publicar(usuario, eventos)
+
+
+# Cada llamada a estas funciones queda en la métrica
+# tareas_storage_duracion_segundos (ver tareas/metricas.py). El backend
+# publica cada escritura en el feed de cambios de su dueño (ver tareas/cambios.py)
+
+@medir_storage
+def obtener_todas_tareas():
+    """Retorna todas las tareas"""
+    return tareas_storage.todas()
+
+@medir_storage
+def obtener_tarea_por_id(tarea_id):
+    """Obtiene una tarea específica por su ID"""
+    return tareas_storage.obtener(tarea_id)
+
+@medir_storage
+def agregar_tarea(titulo, descripcion, usuario):
+    """Agrega una nueva tarea"""
+    return tareas_storage.agregar(titulo, descripcion, usuario)
+
+@medir_storage
+def editar_tarea(tarea_id, titulo, descripcion):
+    """Edita una tarea existente"""
+    return tareas_storage.editar(tarea_id, titulo, descripcion)
+
+@medir_storage
+def eliminar_tarea(tarea_id):
+    """Elimina una tarea por su ID"""
+    tareas_storage.eliminar(tarea_id)
+
+@medir_storage
+def marcar_tarea(tarea_id, completada):
+    """Marca una tarea como completada o pendiente"""
+    return tareas_storage.marcar(tarea_id, completada)
+
+@medir_storage
+def marcar_tareas_usuario(username, ids, completada):
+    """
+    Marca varias tareas de un usuario como completadas o pendientes de una
+    sola vez. Las que no existen o son de otro usuario se ignoran; retorna
+    las tareas marcadas.
+    """
+    operaciones = [('marcar', i, completada) for i in ids]
+    resultados = tareas_storage.aplicar_lote(username, operaciones)
+    return [tarea for estado, tarea in resultados if estado == OK]
+
+@medir_storage
+def obtener_tareas_usuario(username, campos=None):
+    """Obtiene todas las tareas de un usuario específico"""
+    return tareas_storage.de_usuario(username, campos)
+
+def iterar_tareas_usuario(username, campos=None, tamano_bloque=1000):
+    """
+    Itera las tareas de un usuario ordenadas por ID, de a bloques.
+
+    A diferencia de ``obtener_tareas_usuario`` nunca arma la lista completa:
+    pide páginas de ``tamano_bloque`` tareas con el cursor de la anterior,
+    así que la memoria usada no depende de cuántas tareas tenga el usuario.
+    """
+    despues_de = None
+    while True:
+        bloque = tareas_storage.pagina_de_usuario(username, despues_de, tamano_bloque, campos)
+        yield from bloque
+        if len(bloque) < tamano_bloque:
+            return
+        despues_de = bloque[-1]['id']
+
+@medir_storage
+def obtener_pagina_usuario(username, despues_de=None, limite=None, campos=None, orden=None):
+    """
+    Obtiene una página de tareas de un usuario, ordenadas por ID o por
+    uno de los órdenes de ``base.ORDENES``.
+
+    Retorna ``(tareas, siguiente)``, donde ``siguiente`` es el cursor
+    (``despues_de``) de la página siguiente o None si es la última: el
+    ID, o ``(valor, id)`` de la última tarea si hay ``orden``.
+    """
+    limite = limite or settings.TAREAS_POR_PAGINA
+    campos = _campos_con_orden(campos, orden)
+    # Se pide una tarea extra para saber si hay otra página
+    tareas = tareas_storage.pagina_de_usuario(username, despues_de, limite + 1, campos, orden)
+    return _separar_pagina(tareas, limite, orden)
+
+def _campos_con_orden(campos, orden):
+    # El cursor necesita el campo del orden aunque no se haya pedido
+    if campos and orden and orden not in campos:
+        return (*campos, orden)
+    return campos
+
+def _separar_pagina(tareas, limite, orden):
+    if len(tareas) > limite:
+        return tareas[:limite], cursor_orden(orden, tareas[limite - 1])
+    return tareas, None
+
+@medir_storage
+def contar_tareas_usuario(username):
+    """Cuenta las tareas de un usuario"""
+    return tareas_storage.contar_de_usuario(username)
+
+@medir_storage
+def estadisticas_tareas_usuario(username):
+    """Retorna ``{'total', 'completadas', 'pendientes'}`` de un usuario, sin recorrer sus tareas"""
+    return tareas_storage.estadisticas_de_usuario(username)
+
+@medir_storage
+def version_tareas_usuario(username):
+    """
+    Versión de las tareas de un usuario: cambia con cada alta, edición o
+    baja. None si el backend no la soporta.
+    """
+    return tareas_storage.version_de_usuario(username)
+
+@medir_storage
+def buscar_tareas_usuario(username, consulta, limite=20):
+    """Busca en el título y la descripción de las tareas de un usuario"""
+    return tareas_storage.buscar_de_usuario(username, consulta, limite)
+
+@medir_storage
+def aplicar_lote_usuario(username, operaciones):
+    """
+    Aplica varias altas, ediciones y bajas de un usuario de una sola vez.
+
+    Retorna una lista ``(estado, tarea)`` por operación; ver
+    ``BackendTareas.aplicar_lote``.
+    """
+    return tareas_storage.aplicar_lote(username, operaciones)
+
+
+# API async: mismas operaciones para las vistas async (ver BackendTareas)
+
+@medir_storage
+async def aobtener_tarea_por_id(tarea_id):
+    """Obtiene una tarea específica por su ID"""
+    return await tareas_storage.aobtener(tarea_id)
+
+@medir_storage
+async def aagregar_tarea(titulo, descripcion, usuario):
+    """Agrega una nueva tarea"""
+    return await tareas_storage.aagregar(titulo, descripcion, usuario)
+
+@medir_storage
+async def aeditar_tarea(tarea_id, titulo, descripcion):
+    """Edita una tarea existente"""
+    return await tareas_storage.aeditar(tarea_id, titulo, descripcion)
+
+@medir_storage
+async def aeliminar_tarea(tarea_id):
+    """Elimina una tarea por su ID"""
+    await tareas_storage.aeliminar(tarea_id)
+
+@medir_storage
+async def aobtener_pagina_usuario(username, despues_de=None, limite=None, campos=None, orden=None):
+    """Versión async de ``obtener_pagina_usuario``"""
+    limite = limite or settings.TAREAS_POR_PAGINA
+    campos = _campos_con_orden(campos, orden)
+    tareas = await tareas_storage.apagina_de_usuario(username, despues_de, limite + 1, campos, orden)
+    return _separar_pagina(tareas, limite, orden)
+
+async def apaginas_tareas_usuario(username, campos=None, tamano_bloque=1000):
+    """
+    Itera (async) las tareas de un usuario de a páginas de ``tamano_bloque``.
+    Siempre produce al menos una página, aunque sea vacía.
+    """
+    despues_de = None
+    while True:
+        bloque = await tareas_storage.apagina_de_usuario(username, despues_de, tamano_bloque, campos)
+        yield bloque
+        if len(bloque) < tamano_bloque:
+            return
+        despues_de = bloque[-1]['id']
+
+@medir_storage
+async def acontar_tareas_usuario(username):
+    """Cuenta las tareas de un usuario"""
+    return await tareas_storage.acontar_de_usuario(username)
+
+@medir_storage
+async def aversion_tareas_usuario(username):
+    """Versión de las tareas de un usuario (ver ``version_tareas_usuario``)"""
+    return await tareas_storage.aversion_de_usuario(username)
+
+@medir_storage
+async def abuscar_tareas_usuario(username, consulta, limite=20):
+    """Busca en el título y la descripción de las tareas de un usuario"""
+    return await tareas_storage.abuscar_de_usuario(username, consulta, limite)
+
+@medir_storage
+async def aaplicar_lote_usuario(username, operaciones):
+    """Versión async de ``aplicar_lote_usuario``"""
+    return await tareas_storage.aaplicar_lote(username, operaciones)
+
+@medir_storage
+async def amarcar_tarea(tarea_id, completada):
+    """Marca una tarea como completada o pendiente"""
+    return await tareas_storage.amarcar(tarea_id, completada)
+
+@medir_storage
+async def amarcar_tareas_usuario(username, ids, completada):
+    """Versión async de ``marcar_tareas_usuario``"""
+    operaciones = [('marcar', i, completada) for i in ids]
+    resultados = await tareas_storage.aaplicar_lote(username, operaciones)
+    return [tarea for estado, tarea in resultados if estado == OK]
+
+@medir_storage
+async def aestadisticas_tareas_usuario(username):
+    """Versión async de ``estadisticas_tareas_usuario``"""
+    return await tareas_storage.aestadisticas_de_usuario(username)
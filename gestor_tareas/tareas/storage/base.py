@@ -0,0 +1,292 @@
+from hashlib import blake2b
+
+from asgiref.sync import sync_to_async
+
+from .busqueda import IndiceInvertido
+
+# Estados de cada operación de aplicar_lote
+OK = 'ok'
+NO_EXISTE = 'no_existe'
+SIN_PERMISO = 'sin_permiso'
+
+# Tipo de evento del feed de cambios de cada operación de aplicar_lote
+TIPOS_EVENTO = {'crear': 'crear', 'editar': 'editar', 'marcar': 'editar', 'eliminar': 'eliminar'}
+
+
+# Órdenes de las páginas de un usuario además del de ID: campo -> descendente.
+# El empate se desempata por ID ascendente
+ORDENES = {'titulo': False, 'completada': False, 'actualizada': True}
+
+
+def clave_orden(orden, valor, tarea_id):
+    """
+    Clave con la que se ordena una tarea en ``orden`` dado el valor de ese
+    campo. Los títulos no distinguen mayúsculas y lo más reciente va primero.
+    """
+    if orden == 'titulo':
+        return (valor.casefold(), tarea_id)
+    if ORDENES[orden]:
+        return (-valor, tarea_id)
+    return (valor, tarea_id)
+
+
+def cursor_orden(orden, tarea):
+    """Cursor (``despues_de``) de la página que sigue a ``tarea`` en ``orden``"""
+    return tarea['id'] if orden is None else (tarea[orden], tarea['id'])
+
+
+def estadisticas(total, completadas):
+    """Diccionario con los contadores de tareas de un usuario"""
+    return {'total': total, 'completadas': completadas, 'pendientes': total - completadas}
+
+
+def ranura(usuario, ranuras):
+    """
+    Ranura (0 a ``ranuras - 1``) de un usuario para el almacenamiento
+    particionado: un hash estable entre procesos, a diferencia de ``hash()``
+    """
+    return int.from_bytes(blake2b(usuario.encode(), digest_size=8).digest(), 'big') % ranuras
+
+
+def siguiente_id(ultimo, usuario, ranuras):
+    """
+    ID de la próxima tarea de ``usuario`` si el último asignado fue ``ultimo``.
+
+    Sin ``ranuras`` es ``ultimo + 1``; con ``ranuras`` es el menor número
+    mayor que ``ultimo`` cuyo resto es la ranura del usuario, de modo que
+    ``tarea_id % ranuras`` dice en qué ranura (y partición) está la tarea.
+    """
+    if not ranuras:
+        return ultimo + 1
+    return (ultimo // ranuras + 1) * ranuras + ranura(usuario, ranuras)
+
+
+class BackendTareas:
+    """
+    Interfaz común de los backends de almacenamiento de tareas.
+
+    Las tareas se representan como diccionarios con las claves ``id``,
+    ``titulo``, ``descripcion``, ``usuario``, ``completada``, ``creada`` y
+    ``actualizada`` (segundos desde epoch del alta y de la última edición o
+    marca; 0 en tareas anteriores a esos campos).
+
+    Los métodos con prefijo ``a`` son la API async que usan las vistas
+    async. Por defecto ejecutan la versión sync en un hilo con
+    ``sync_to_async``; con ``hilo_compartido`` (el default de Django, que
+    el ORM necesita) todas esas llamadas comparten un único hilo. Los
+    backends sin estado atado a ese hilo lo desactivan. Los que pueden
+    atender una llamada sin E/S y sin esperar un lock la sobrescriben para
+    ejecutarla directamente en el event loop.
+    """
+
+    hilo_compartido = True
+
+    # Recibe ``(usuario, [(tipo, tarea), ...])`` por cada escritura aplicada;
+    # ``tareas.storage`` lo conecta al feed de cambios (ver tareas/cambios.py)
+    al_cambiar = None
+
+    def _publicar(self, usuario, eventos):
+        """
+        Pasa a ``al_cambiar`` las escrituras aplicadas ('crear', 'editar' o
+        'eliminar'). Los backends la llaman mientras la escritura sigue
+        serializada con las demás (lock, transacción), así los eventos salen
+        en el orden en que se aplicaron; ``AlmacenSQLite`` y ``AlmacenDurable``
+        además esperan el COMMIT o el fsync, y si fallan no publican. Lo que
+        no cambió nada no se publica.
+        """
+        if eventos and self.al_cambiar is not None:
+            self.al_cambiar(usuario, eventos)
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def clear(self):
+        """Elimina todas las tareas y reinicia el contador de IDs"""
+        raise NotImplementedError
+
+    def cerrar(self):
+        """Libera los recursos del backend (archivos, conexiones)"""
+
+    def todas(self):
+        """Retorna todas las tareas"""
+        raise NotImplementedError
+
+    def obtener(self, tarea_id):
+        """Retorna la tarea con ese ID o None"""
+        raise NotImplementedError
+
+    def agregar(self, titulo, descripcion, usuario):
+        """Crea una tarea y la retorna"""
+        raise NotImplementedError
+
+    def editar(self, tarea_id, titulo, descripcion):
+        """Actualiza una tarea y la retorna, o None si no existe"""
+        raise NotImplementedError
+
+    def eliminar(self, tarea_id):
+        """Elimina una tarea y la retorna, o None si no existía"""
+        raise NotImplementedError
+
+    def marcar(self, tarea_id, completada):
+        """Marca una tarea como completada o pendiente y la retorna, o None si no existe"""
+        raise NotImplementedError
+
+    def de_usuario(self, username, campos=None):
+        """
+        Retorna las tareas de un usuario ordenadas por ID.
+
+        ``campos`` indica las claves que el llamador necesita; los backends
+        con columnas en disco pueden leer solo esas, los demás lo ignoran.
+        """
+        raise NotImplementedError
+
+    def pagina_de_usuario(self, username, despues_de=None, limite=None, campos=None, orden=None):
+        """
+        Retorna hasta ``limite`` tareas del usuario con ID mayor que
+        ``despues_de``, ordenadas por ID (paginación por cursor/keyset).
+
+        Con ``orden`` (una clave de ``ORDENES``) las tareas van en ese orden
+        y ``despues_de`` es ``(valor del campo, id)`` de la última tarea de
+        la página anterior (ver ``cursor_orden``).
+
+        La implementación por defecto recorre y ordena todas las tareas del
+        usuario; los backends deben sobrescribirla con una búsqueda indexada.
+        """
+        tareas = self.de_usuario(username, campos)
+        if orden is None:
+            tareas = [t for t in tareas if despues_de is None or t['id'] > despues_de]
+        else:
+            tareas.sort(key=lambda t: clave_orden(orden, t[orden], t['id']))
+            if despues_de is not None:
+                cursor = clave_orden(orden, *despues_de)
+                tareas = [t for t in tareas if clave_orden(orden, t[orden], t['id']) > cursor]
+        return tareas[:limite] if limite is not None else tareas
+
+    def contar_de_usuario(self, username):
+        """Retorna la cantidad de tareas de un usuario"""
+        return len(self.de_usuario(username))
+
+    def estadisticas_de_usuario(self, username):
+        """
+        Retorna ``{'total', 'completadas', 'pendientes'}`` de un usuario.
+
+        La implementación por defecto recorre las tareas del usuario; los
+        backends deben sobrescribirla con contadores que se actualicen en
+        cada escritura, en O(1).
+        """
+        tareas = self.de_usuario(username, ('completada',))
+        return estadisticas(len(tareas), sum(1 for t in tareas if t['completada']))
+
+    def buscar_de_usuario(self, username, consulta, limite=20):
+        """
+        Busca ``consulta`` en el título y la descripción de las tareas del
+        usuario (sin distinguir tildes ni mayúsculas, con prefijos) y
+        retorna hasta ``limite`` tareas ordenadas por relevancia.
+
+        La implementación por defecto indexa todas las tareas del usuario
+        en cada llamada; los backends deben sobrescribirla con un índice
+        persistente.
+        """
+        tareas = {t['id']: t for t in self.de_usuario(username)}
+        return [tareas[i] for i in IndiceInvertido(tareas.values()).buscar(consulta, limite)]
+
+    def version_de_usuario(self, username):
+        """
+        Retorna un str que cambia con cada escritura sobre las tareas del
+        usuario (y nunca vuelve a un valor anterior, ni tras reiniciar o
+        vaciar el almacén), o None si el backend no puede garantizarlo;
+        en ese caso no se cachea nada derivado de sus tareas.
+        """
+        return None
+
+    def usuarios(self):
+        """Retorna los usuarios que tienen al menos una tarea"""
+        return sorted({t['usuario'] for t in self.todas()})
+
+    def restaurar(self, tareas):
+        """
+        Inserta o reemplaza tareas conservando sus IDs (``AlmacenParticionado``
+        la usa para copiar las tareas de una partición a otra). Los IDs que
+        se asignen después son mayores que los restaurados.
+        """
+        raise NotImplementedError
+
+    def ultimo_id(self):
+        """Retorna el mayor ID asignado hasta ahora (0 si ninguno), aunque esa tarea ya no exista"""
+        raise NotImplementedError
+
+    def reservar_ids(self, hasta):
+        """Hace que los IDs que se asignen después sean mayores que ``hasta``"""
+        raise NotImplementedError
+
+    def aplicar_lote(self, usuario, operaciones):
+        """
+        Aplica en orden una lista de operaciones sobre las tareas de ``usuario``:
+
+            ('crear', titulo, descripcion)
+            ('editar', tarea_id, titulo, descripcion)
+            ('eliminar', tarea_id)
+            ('marcar', tarea_id, completada)
+
+        Retorna una lista ``(estado, tarea)`` por operación, con estado
+        ``OK``, ``NO_EXISTE`` o ``SIN_PERMISO`` (la tarea es de otro
+        usuario; en ese caso no se retorna). Cada operación es independiente:
+        un rechazo no deshace las demás.
+
+        La implementación por defecto aplica una operación a la vez; los
+        backends deben sobrescribirla para hacerlo en una sola sección
+        crítica o transacción.
+        """
+        resultados = []
+        for operacion, *argumentos in operaciones:
+            if operacion == 'crear':
+                resultados.append((OK, self.agregar(*argumentos, usuario)))
+                continue
+            tarea = self.obtener(argumentos[0])
+            if tarea is None:
+                resultados.append((NO_EXISTE, None))
+            elif tarea['usuario'] != usuario:
+                resultados.append((SIN_PERMISO, None))
+            else:
+                metodo = {'editar': self.editar, 'marcar': self.marcar}.get(operacion, self.eliminar)
+                tarea = metodo(*argumentos)
+                resultados.append((OK, tarea) if tarea is not None else (NO_EXISTE, None))
+        return resultados
+
+    # API async
+
+    def _en_hilo(self, metodo):
+        return sync_to_async(metodo, thread_sensitive=self.hilo_compartido)
+
+    async def aobtener(self, tarea_id):
+        return await self._en_hilo(self.obtener)(tarea_id)
+
+    async def aagregar(self, titulo, descripcion, usuario):
+        return await self._en_hilo(self.agregar)(titulo, descripcion, usuario)
+
+    async def aeditar(self, tarea_id, titulo, descripcion):
+        return await self._en_hilo(self.editar)(tarea_id, titulo, descripcion)
+
+    async def aeliminar(self, tarea_id):
+        return await self._en_hilo(self.eliminar)(tarea_id)
+
+    async def amarcar(self, tarea_id, completada):
+        return await self._en_hilo(self.marcar)(tarea_id, completada)
+
+    async def apagina_de_usuario(self, username, despues_de=None, limite=None, campos=None, orden=None):
+        return await self._en_hilo(self.pagina_de_usuario)(username, despues_de, limite, campos, orden)
+
+    async def acontar_de_usuario(self, username):
+        return await self._en_hilo(self.contar_de_usuario)(username)
+
+    async def aestadisticas_de_usuario(self, username):
+        return await self._en_hilo(self.estadisticas_de_usuario)(username)
+
+    async def abuscar_de_usuario(self, username, consulta, limite=20):
+        return await self._en_hilo(self.buscar_de_usuario)(username, consulta, limite)
+
+    async def aversion_de_usuario(self, username):
+        return await self._en_hilo(self.version_de_usuario)(username)
+
+    async def aaplicar_lote(self, usuario, operaciones):
+        return await self._en_hilo(self.aplicar_lote)(usuario, operaciones)
@@ -0,0 +1,132 @@
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left, insort
+
+_PALABRA = re.compile(r'\w+')
+
+# Parámetros de BM25
+K1 = 1.2
+B = 0.75
+# Las palabras del título cuentan doble
+PESO_TITULO = 2
+
+
+def normalizar(texto):
+    """Pasa a minúsculas y quita tildes y diéresis ('Canción' -> 'cancion')"""
+    descompuesto = unicodedata.normalize('NFKD', texto.casefold())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    """Divide un texto en palabras normalizadas"""
+    return _PALABRA.findall(normalizar(texto))
+
+
+def _frecuencias(tarea):
+    frecuencias = {}
+    for token in tokenizar(tarea['titulo']):
+        frecuencias[token] = frecuencias.get(token, 0) + PESO_TITULO
+    for token in tokenizar(tarea['descripcion']):
+        frecuencias[token] = frecuencias.get(token, 0) + 1
+    return frecuencias
+
+
+class IndiceInvertido:
+    """
+    Índice invertido de las tareas de un usuario sobre título y descripción.
+
+    Guarda por cada palabra las tareas que la contienen y su frecuencia,
+    y un vocabulario ordenado para resolver prefijos con bisect. Una
+    consulta solo recorre las listas de las palabras que coinciden, nunca
+    todas las tareas. Todos los términos de la consulta deben aparecer
+    (como palabra o prefijo de palabra); el orden es por BM25.
+
+    No es seguro entre hilos: el almacén lo protege con el lock de la
+    franja del usuario.
+    """
+
+    def __init__(self, tareas=()):
+        self._postings = {}
+        self._vocabulario = []
+        self._longitudes = {}
+        self._longitud_total = 0
+        for tarea in tareas:
+            self.agregar(tarea)
+
+    def __len__(self):
+        return len(self._longitudes)
+
+    def agregar(self, tarea):
+        frecuencias = _frecuencias(tarea)
+        for token, frecuencia in frecuencias.items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = {}
+                insort(self._vocabulario, token)
+            posting[tarea['id']] = frecuencia
+        longitud = sum(frecuencias.values())
+        self._longitudes[tarea['id']] = longitud
+        self._longitud_total += longitud
+
+    def quitar(self, tarea):
+        """Quita una tarea; ``tarea`` debe ser la versión que se indexó"""
+        for token in _frecuencias(tarea):
+            posting = self._postings[token]
+            del posting[tarea['id']]
+            if not posting:
+                del self._postings[token]
+                del self._vocabulario[bisect_left(self._vocabulario, token)]
+        self._longitud_total -= self._longitudes.pop(tarea['id'])
+
+    def _con_prefijo(self, prefijo):
+        vocabulario = self._vocabulario
+        for i in range(bisect_left(vocabulario, prefijo), len(vocabulario)):
+            if not vocabulario[i].startswith(prefijo):
+                break
+            yield vocabulario[i]
+
+    def buscar(self, consulta, limite=20):
+        """Retorna hasta ``limite`` IDs de tareas ordenados por relevancia"""
+        terminos = tokenizar(consulta)
+        if not terminos or not self._longitudes:
+            return []
+        total = len(self._longitudes)
+        promedio = self._longitud_total / total
+
+        # Los términos más selectivos primero: los siguientes solo puntúan
+        # las tareas que siguen siendo candidatas
+        por_termino = sorted(
+            (([(token, self._postings[token]) for token in self._con_prefijo(termino)], termino)
+             for termino in dict.fromkeys(terminos)),
+            key=lambda par: sum(len(posting) for _, posting in par[0])
+        )
+
+        longitudes = self._longitudes
+        fija, por_longitud = K1 * (1 - B), K1 * B / promedio
+        puntajes = None
+        for coincidencias, termino in por_termino:
+            del_termino = {}
+            for token, posting in coincidencias:
+                idf = math.log(1 + (total - len(posting) + 0.5) / (len(posting) + 0.5))
+                # Un prefijo pesa la mitad que la palabra completa
+                peso = (idf if token == termino else idf / 2) * (K1 + 1)
+                if puntajes is None:
+                    candidatas = posting.items()
+                elif len(posting) <= len(puntajes):
+                    candidatas = [(i, f) for i, f in posting.items() if i in puntajes]
+                else:
+                    candidatas = [(i, posting[i]) for i in puntajes if i in posting]
+                for tarea_id, frecuencia in candidatas:
+                    puntaje = peso * frecuencia / (frecuencia + fija + por_longitud * longitudes[tarea_id])
+                    if puntaje > del_termino.get(tarea_id, 0):
+                        del_termino[tarea_id] = puntaje
+            if puntajes is None:
+                puntajes = del_termino
+            else:
+                puntajes = {i: p + del_termino[i] for i, p in puntajes.items() if i in del_termino}
+            if not puntajes:
+                return []
+        # A igual puntaje, primero las más recientes
+        return heapq.nlargest(limite, puntajes, key=lambda i: (puntajes[i], i))
@@ -0,0 +1,261 @@
+import gc
+import json
+import os
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+from .memoria import AlmacenMemoria, TareaCompacta
+
+
+_decodificar = json.JSONDecoder().decode
+
+
+def _codificar(registro):
+    return json.dumps(registro, ensure_ascii=False, separators=(',', ':')).encode() + b'\n'
+
+
+def _numero(ruta):
+    # diario-00000012.log -> 12
+    return int(ruta.stem.rsplit('-', 1)[1])
+
+
+class Diario:
+    """
+    Segmento del log de escritura (write-ahead log), append-only.
+
+    Cada registro es una línea JSON compacta. Las escrituras concurrentes
+    se agrupan (group commit): el primer hilo que necesita persistir su
+    registro escribe y sincroniza con un único fsync todo lo pendiente,
+    y los demás solo esperan a que termine.
+    """
+
+    def __init__(self, ruta, sincronizar=True):
+        self.ruta = ruta
+        self.sincronizar = sincronizar
+        self._archivo = open(ruta, 'ab')
+        self._cond = threading.Condition()
+        self._pendientes = []
+        self._encolados = 0
+        self._en_disco = 0
+        self._escribiendo = False
+
+    def encolar(self, registro):
+        """Agrega un registro al lote pendiente y retorna su número de secuencia"""
+        linea = _codificar(registro)
+        with self._cond:
+            self._pendientes.append(linea)
+            self._encolados += 1
+            return self._encolados
+
+    def esperar(self, secuencia):
+        """Bloquea hasta que el registro ``secuencia`` esté en disco"""
+        with self._cond:
+            while self._en_disco < secuencia:
+                if self._escribiendo:
+                    self._cond.wait()
+                else:
+                    self._escribir_lote()
+
+    def _escribir_lote(self):
+        # Se llama con self._cond tomado; lo suelta mientras dura la E/S
+        lote, self._pendientes = self._pendientes, []
+        hasta = self._encolados
+        self._escribiendo = True
+        self._cond.release()
+        try:
+            self._archivo.write(b''.join(lote))
+            self._archivo.flush()
+            if self.sincronizar:
+                os.fsync(self._archivo.fileno())
+        except BaseException:
+            self._cond.acquire()
+            # Se devuelven al lote para que el próximo hilo los reintente
+            self._pendientes[:0] = lote
+            self._escribiendo = False
+            self._cond.notify_all()
+            raise
+        self._cond.acquire()
+        self._en_disco = hasta
+        self._escribiendo = False
+        self._cond.notify_all()
+
+    def cerrar(self):
+        """Persiste lo pendiente y cierra el archivo"""
+        with self._cond:
+            while self._escribiendo:
+                self._cond.wait()
+            if self._pendientes:
+                self._escribir_lote()
+            self._archivo.close()
+
+
+class AlmacenDurable(AlmacenMemoria):
+    """
+    Almacenamiento en memoria con durabilidad opcional en disco.
+
+    Las lecturas son idénticas a las de ``AlmacenMemoria``. Cada escritura
+    se anota en un diario append-only y ``agregar``/``editar``/``marcar``/
+    ``eliminar`` retornan cuando el registro está en disco (con fsync
+    compartido entre escrituras concurrentes si ``sincronizar`` es True).
+    La espera ocurre con la franja del usuario tomada y el cambio se
+    publica recién después: el feed solo recibe lo que ya está en disco,
+    en orden. El fsync se comparte entre escrituras de distintas franjas.
+
+    Cada ``operaciones_por_instantanea`` escrituras se rota el diario a un
+    segmento nuevo y un hilo en segundo plano vuelca el estado completo a
+    una instantánea; luego se borran los segmentos anteriores. Al iniciar
+    se carga la última instantánea y se reaplican los segmentos posteriores.
+
+    Archivos en ``directorio``:
+        instantanea-N.jsonl   estado completo antes del segmento N
+        diario-N.log          escrituras del segmento N
+    """
+
+    def __init__(self, directorio=None, operaciones_por_instantanea=100_000,
+                 sincronizar=True, franjas=64, ranuras=None):
+        super().__init__(franjas=franjas, ranuras=ranuras)
+        self.directorio = Path(directorio or settings.BASE_DIR / 'datos_tareas')
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self.operaciones_por_instantanea = operaciones_por_instantanea
+        self.sincronizar = sincronizar
+        self._lock_instantanea = threading.Lock()
+        self._operaciones = 0
+        self._segmento = self._recuperar() + 1
+        self._diario = Diario(self._ruta('diario', self._segmento), sincronizar)
+
+    def _ruta(self, tipo, numero):
+        extension = 'jsonl' if tipo == 'instantanea' else 'log'
+        return self.directorio / f'{tipo}-{numero:08d}.{extension}'
+
+    # Recuperación
+
+    def _recuperar(self):
+        """Reconstruye el estado desde disco y retorna el último segmento leído"""
+        inicio = 0
+        instantaneas = sorted(self.directorio.glob('instantanea-*.jsonl'), key=_numero)
+        segmentos = sorted(self.directorio.glob('diario-*.log'), key=_numero)
+        # Crear millones de dicts dispara el GC cíclico una y otra vez (y cada
+        # pasada recorre todo lo ya cargado); las tareas no forman ciclos
+        gc_activo = gc.isenabled()
+        gc.disable()
+        try:
+            if instantaneas:
+                inicio = _numero(instantaneas[-1])
+                self._cargar_instantanea(instantaneas[-1])
+            segmentos = [ruta for ruta in segmentos if _numero(ruta) >= inicio]
+            for ruta in segmentos:
+                self._reaplicar(ruta)
+        finally:
+            if gc_activo:
+                gc.enable()
+        return max([inicio] + [_numero(ruta) for ruta in segmentos])
+
+    def _cargar_instantanea(self, ruta):
+        with open(ruta, 'rb') as archivo:
+            self._ultimo_id = _decodificar(archivo.readline().decode())['ultimo_id']
+            for linea in archivo:
+                self._insertar(TareaCompacta(*_decodificar(linea.decode())))
+
+    def _reaplicar(self, ruta):
+        with open(ruta, 'r+b') as archivo:
+            valido = 0
+            for linea in archivo:
+                if not linea.endswith(b'\n'):
+                    # Una caída durante la escritura puede dejar la última línea
+                    # incompleta; esa escritura nunca se confirmó al llamador.
+                    # Se recorta del archivo: al reiniciar se abre un segmento
+                    # nuevo y este deja de ser el último del diario
+                    archivo.truncate(valido)
+                    if self.sincronizar:
+                        os.fsync(archivo.fileno())
+                    break
+                valido += len(linea)
+                registro = _decodificar(linea.decode())
+                if registro[0] == 'd':
+                    self._quitar(registro[1])
+                    continue
+                tarea = TareaCompacta(*registro[1:])
+                self._insertar(tarea)
+                self._ultimo_id = max(self._ultimo_id, tarea.id)
+
+    # Ganchos de AlmacenMemoria
+
+    def _registrar(self, operacion, tarea):
+        if operacion == 'd':
+            registro = ('d', tarea.id)
+        else:
+            registro = (operacion, *tarea.como_tupla())
+        # El diario se captura aquí: una rotación posterior no lo afecta
+        return self._diario, self._diario.encolar(registro)
+
+    def _confirmar(self, registro):
+        diario, secuencia = registro
+        diario.esperar(secuencia)
+        # Contador aproximado entre hilos: solo decide cuándo compactar
+        self._operaciones += 1
+        if self._operaciones >= self.operaciones_por_instantanea and self._lock_instantanea.acquire(blocking=False):
+            threading.Thread(target=self._instantanea_en_segundo_plano, name='tareas-instantanea',
+                             daemon=True).start()
+
+    # Instantáneas
+
+    def instantanea(self):
+        """Vuelca el estado completo a disco y compacta el diario"""
+        with self._lock_instantanea:
+            self._instantanea()
+
+    def _instantanea_en_segundo_plano(self):
+        # El lock lo tomó el hilo que disparó la instantánea
+        try:
+            self._instantanea()
+        finally:
+            self._lock_instantanea.release()
+
+    def _instantanea(self):
+        with self._todas_las_franjas():
+            # Las tareas no se modifican en sitio, basta copiar las referencias
+            tareas = self.todas()
+            ultimo_id = self._ultimo_id
+            anterior = self._diario
+            self._segmento += 1
+            segmento = self._segmento
+            self._diario = Diario(self._ruta('diario', segmento), self.sincronizar)
+            self._operaciones = 0
+        anterior.cerrar()
+
+        ruta = self._ruta('instantanea', segmento)
+        temporal = ruta.with_suffix('.tmp')
+        with open(temporal, 'wb') as archivo:
+            archivo.write(_codificar({'ultimo_id': ultimo_id}))
+            archivo.writelines(_codificar(tarea.como_tupla()) for tarea in tareas)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, ruta)
+        self._sincronizar_directorio()
+
+        for viejo in self.directorio.glob('*-*.*'):
+            if viejo.suffix in ('.log', '.jsonl') and _numero(viejo) < segmento:
+                viejo.unlink()
+
+    def _sincronizar_directorio(self):
+        descriptor = os.open(self.directorio, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def clear(self):
+        with self._lock_instantanea, self._todas_las_franjas():
+            self._vaciar()
+            self._diario.cerrar()
+            for archivo in self.directorio.glob('*-*.*'):
+                if archivo.suffix in ('.log', '.jsonl', '.tmp'):
+                    archivo.unlink()
+            self._segmento = 1
+            self._operaciones = 0
+            self._diario = Diario(self._ruta('diario', self._segmento), self.sincronizar)
+
+    def cerrar(self):
+        self._diario.cerrar()
@@ -0,0 +1,531 @@
+"""
+Almacenamiento en memoria con un presupuesto: los usuarios inactivos se
+bajan a disco.
+
+``AlmacenEscalonado`` tiene dos niveles. Las tareas de los usuarios
+usados hace poco viven en memoria, como en ``AlmacenMemoria``. Cuando
+superan ``presupuesto`` bytes (una estimación), la llamada que lo
+superó baja a disco, al terminar y sin locks tomados, a los usuarios
+usados hace más tiempo (LRU), de a un usuario entero, hasta quedar en
+el 90% del presupuesto. No se hace en un hilo aparte: los bloques que
+ese hilo reserva y libera fragmentan la memoria del proceso, que
+terminaba ocupando más que sin desalojar.
+
+En disco cada usuario es un bloque (``marshal`` de sus tareas) en un
+archivo de segmento append-only que se lee por ``mmap``. En memoria
+quedan, por usuario frío, dónde está su bloque y sus IDs (8 bytes por
+tarea), además de sus contadores y su versión, así que
+``estadisticas_de_usuario``, ``contar_de_usuario`` y
+``version_de_usuario`` no tocan el disco. Un índice ID -> usuario
+(arrays ordenados, 16 bytes por tarea) permite encontrar una tarea fría
+por su ID.
+
+El primer acceso a las tareas de un usuario frío (``de_usuario``,
+``pagina_de_usuario``, ``obtener`` y las escrituras) lo carga entero de
+vuelta a memoria. La API async hace esa carga en un hilo, para que un
+fallo de página no bloquee el event loop.
+
+El segmento es una caché del proceso, no un respaldo: se crea sin nombre
+(borrado apenas se abre) y se pierde al reiniciar, como todo
+``AlmacenMemoria``. Cuando más de la mitad del segmento son bloques que
+ya volvieron a memoria se compacta en uno nuevo.
+
+Aciertos, fallos y desalojos quedan en ``/metrics`` (ver
+``tareas/metricas.py``).
+"""
+import asyncio
+import heapq
+import marshal
+import mmap
+import os
+import sys
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import islice, repeat
+
+from django.conf import settings
+
+from ..metricas import ACCESOS_ALMACEN, DESALOJOS_ALMACEN
+from .base import SIN_PERMISO, BackendTareas
+from .memoria import AlmacenMemoria, TareaCompacta
+
+# Bytes de una tarea en memoria además de sus textos: el objeto
+# TareaCompacta, el int del ID, el float de sus fechas y sus entradas en
+# los índices
+TAMANO_FIJO = 200
+
+# Se desaloja hasta quedar en esta fracción del presupuesto
+HOLGURA = 0.9
+
+# Usuarios que el desalojo revisa por vuelta, desde el menos reciente
+CANDIDATOS = 32
+
+# Tamaño mínimo del segmento para compactarlo
+COMPACTAR_DESDE = 4 * 2**20
+
+
+def _tamano(tarea):
+    return TAMANO_FIJO + sys.getsizeof(tarea.titulo) + sys.getsizeof(tarea.descripcion)
+
+
+class Segmento:
+    """Archivo append-only de bloques, leído por mmap"""
+
+    def __init__(self, directorio):
+        descriptor, ruta = tempfile.mkstemp(prefix='tareas-frias-', suffix='.seg', dir=directorio)
+        # Sin nombre: el espacio se libera al cerrarlo o al terminar el proceso
+        os.unlink(ruta)
+        self._descriptor = descriptor
+        self._lock = threading.Lock()
+        self._mapa = None
+        self._capacidad = 0
+        self.tamano = 0
+        self.basura = 0
+        self.pid = os.getpid()
+
+    def agregar(self, datos):
+        """Escribe un bloque al final y retorna su posición"""
+        with self._lock:
+            posicion = self.tamano
+            if posicion + len(datos) > self._capacidad:
+                # Se reserva el doble: el mmap se rehace solo al crecer
+                self._capacidad = max(2 * self._capacidad, posicion + len(datos), mmap.PAGESIZE * 16)
+                os.ftruncate(self._descriptor, self._capacidad)
+                self._mapa = mmap.mmap(self._descriptor, self._capacidad, access=mmap.ACCESS_READ)
+            os.pwrite(self._descriptor, datos, posicion)
+            self.tamano += len(datos)
+            return posicion
+
+    def leer(self, posicion, longitud):
+        # El mmap es compartido: ve lo escrito con pwrite sin volver a mapear
+        return self._mapa[posicion:posicion + longitud]
+
+    def liberar(self, longitud):
+        """Un bloque ya no se usa (su usuario volvió a memoria)"""
+        with self._lock:
+            self.basura += longitud
+
+    def cerrar(self):
+        with self._lock:
+            if self._mapa is not None:
+                self._mapa.close()
+            os.close(self._descriptor)
+
+
+class Frio:
+    """Dónde está el bloque de un usuario en disco y qué IDs tiene"""
+    __slots__ = ('segmento', 'posicion', 'longitud', 'ids')
+
+    def __init__(self, segmento, posicion, longitud, ids):
+        self.segmento = segmento
+        self.posicion = posicion
+        self.longitud = longitud
+        self.ids = ids
+
+
+class IndiceFrio:
+    """
+    ID -> usuario de las tareas en disco.
+
+    Los desalojos van a un dict chico; cuando crece se rearman dos
+    arrays ordenados (ID y número de usuario). Las entradas de usuarios
+    que ya volvieron a memoria no se borran (quien consulta verifica), así
+    que al volver a bajar un usuario solo se agregan sus IDs nuevos.
+    """
+
+    def __init__(self):
+        self._tabla = (array('q'), array('l'))
+        self._recientes = {}
+        self._nombres = []
+        self._numeros = {}
+        # Mayor ID ya indexado de cada usuario (sus IDs crecen con cada alta)
+        self._hasta = {}
+
+    def _numero(self, usuario):
+        numero = self._numeros.get(usuario)
+        if numero is None:
+            numero = self._numeros[usuario] = len(self._nombres)
+            self._nombres.append(usuario)
+        return numero
+
+    def agregar(self, ids, usuario):
+        """Indexa ``ids`` (ordenados) como tareas en disco de ``usuario``"""
+        nuevos = ids[bisect_right(ids, self._hasta.get(usuario, -1)):]
+        if nuevos:
+            self._recientes.update(dict.fromkeys(nuevos, self._numero(usuario)))
+            self._hasta[usuario] = ids[-1]
+
+    def olvidar(self, usuario):
+        """El usuario recibió IDs menores que los ya indexados: la próxima vez se indexan todos"""
+        self._hasta.pop(usuario, None)
+
+    def debe_reconstruirse(self):
+        return len(self._recientes) > max(4096, len(self._tabla[0]) // 8)
+
+    def reconstruir(self, frios):
+        """Rearma los arrays con los usuarios fríos ``[(usuario, Frio), ...]``"""
+        # Los IDs de cada usuario ya están ordenados: se mezclan sin listas
+        # intermedias, que dejarían la memoria fragmentada
+        ids = array('q')
+        duenos = array('l')
+        ordenados = (zip(frio.ids, repeat(self._numero(usuario))) for usuario, frio in frios)
+        for tarea_id, numero in heapq.merge(*ordenados):
+            ids.append(tarea_id)
+            duenos.append(numero)
+        # Tupla: un lector nunca ve los IDs nuevos con los dueños viejos
+        self._tabla = (ids, duenos)
+        self._recientes = {}
+        self._hasta = {usuario: frio.ids[-1] for usuario, frio in frios if frio.ids}
+
+    def usuario(self, tarea_id):
+        """Usuario que tenía en disco la tarea ``tarea_id``, o None"""
+        numero = self._recientes.get(tarea_id)
+        if numero is None:
+            ids, duenos = self._tabla
+            i = bisect_left(ids, tarea_id)
+            if i == len(ids) or ids[i] != tarea_id:
+                return None
+            numero = duenos[i]
+        return self._nombres[numero]
+
+    def __len__(self):
+        return len(self._tabla[0]) + len(self._recientes)
+
+
+class AlmacenEscalonado(AlmacenMemoria):
+    """
+    ``AlmacenMemoria`` con un presupuesto de memoria: los usuarios menos
+    recientes se bajan a un segmento en disco y vuelven en su próximo
+    acceso.
+
+    OPTIONS: ``presupuesto`` en bytes (por defecto
+    ``TAREAS_MEMORIA_PRESUPUESTO_MB``) y ``directorio`` del segmento (el
+    temporal del sistema).
+    """
+
+    def __init__(self, presupuesto=None, directorio=None, franjas=64, ranuras=None):
+        super().__init__(franjas=franjas, ranuras=ranuras)
+        if presupuesto is None:
+            presupuesto = settings.TAREAS_MEMORIA_PRESUPUESTO_MB * 2**20
+        self.presupuesto = presupuesto
+        self.directorio = directorio
+        self._lock_lru = threading.Lock()
+        self._lock_desalojo = threading.Lock()
+        self._iniciar_niveles()
+
+    def _iniciar_niveles(self):
+        self._recientes = OrderedDict()
+        self._bytes = {}
+        self._residente = 0
+        self._frios = {}
+        self._indice_frio = IndiceFrio()
+        self._tareas_frias = 0
+        self._segmento = None
+
+    # Contabilidad
+
+    def _contabilizar(self, usuario, delta):
+        with self._lock_lru:
+            self._bytes[usuario] = self._bytes.get(usuario, 0) + delta
+            self._residente += delta
+            self._recientes[usuario] = None
+            self._recientes.move_to_end(usuario)
+
+    def _tocar(self, usuario):
+        # Sin esperar (también se llama desde el event loop): si otro hilo
+        # tiene el lock se omite, el orden LRU es aproximado
+        if not self._lock_lru.acquire(blocking=False):
+            return
+        try:
+            if usuario in self._recientes:
+                self._recientes.move_to_end(usuario)
+        finally:
+            self._lock_lru.release()
+
+    def _insertar(self, tarea):
+        anterior = self._por_id.get(tarea.id)
+        super()._insertar(tarea)
+        self._contabilizar(tarea.usuario, _tamano(tarea) - (_tamano(anterior) if anterior is not None else 0))
+
+    def _quitar(self, tarea_id):
+        tarea = super()._quitar(tarea_id)
+        if tarea is not None:
+            self._contabilizar(tarea.usuario, -_tamano(tarea))
+        return tarea
+
+    def niveles(self):
+        """Usuarios, tareas y bytes en cada nivel (para /metrics)"""
+        return {
+            'memoria': {'usuarios': len(self._por_usuario), 'tareas': len(self._por_id), 'bytes': self._residente},
+            'disco': {'usuarios': len(self._frios), 'tareas': self._tareas_frias,
+                      'bytes': sum(frio.longitud for frio in list(self._frios.values()))},
+        }
+
+    # Traslados entre niveles
+
+    def _calentar(self, usuario):
+        """Trae a memoria las tareas de ``usuario`` si están en disco (requiere el lock de su franja)"""
+        frio = self._frios.get(usuario)
+        if frio is None:
+            ACCESOS_ALMACEN.incrementar(('memoria',))
+            self._tocar(usuario)
+            return
+        tareas = [TareaCompacta(*tupla) for tupla in marshal.loads(frio.segmento.leer(frio.posicion, frio.longitud))]
+        por_id = self._por_id
+        for tarea in tareas:
+            por_id[tarea.id] = tarea
+        self._por_usuario[usuario] = list(frio.ids)
+        # Recién ahora deja de estar en disco: un lector sin lock la encuentra en algún nivel
+        del self._frios[usuario]
+        frio.segmento.liberar(frio.longitud)
+        self._tareas_frias -= len(tareas)
+        self._contabilizar(usuario, sum(map(_tamano, tareas)))
+        ACCESOS_ALMACEN.incrementar(('disco',))
+
+    def _enfriar(self, usuario):
+        """Baja a disco las tareas de ``usuario`` (requiere el lock de su franja)"""
+        ids = self._por_usuario.get(usuario)
+        if not ids:
+            with self._lock_lru:
+                self._recientes.pop(usuario, None)
+            return False
+        por_id = self._por_id
+        tareas = [por_id[i] for i in ids]
+        datos = marshal.dumps([tarea.como_tupla() for tarea in tareas])
+        segmento = self._segmento_actual()
+        frio = Frio(segmento, segmento.agregar(datos), len(datos), array('q', ids))
+        self._frios[usuario] = frio
+        self._indice_frio.agregar(frio.ids, usuario)
+        self._tareas_frias += len(ids)
+        del self._por_usuario[usuario]
+        for i in ids:
+            del por_id[i]
+        self._indices.pop(usuario, None)
+        self._ordenes.pop(usuario, None)
+        with self._lock_lru:
+            self._residente -= self._bytes.pop(usuario, 0)
+            self._recientes.pop(usuario, None)
+        DESALOJOS_ALMACEN.incrementar(('usuarios',))
+        DESALOJOS_ALMACEN.incrementar(('tareas',), len(ids))
+        return True
+
+    def _segmento_actual(self):
+        if self._segmento is None or self._segmento.pid != os.getpid():
+            # Tras un fork el segmento heredado solo se lee: cada proceso escribe en el suyo
+            self._segmento = Segmento(self.directorio)
+        return self._segmento
+
+    def desalojar(self):
+        """Baja usuarios a disco, del menos reciente al más, hasta quedar dentro del presupuesto"""
+        if not self._lock_desalojo.acquire(blocking=False):
+            return
+        try:
+            objetivo = self.presupuesto * HOLGURA
+            while self._residente > objetivo:
+                with self._lock_lru:
+                    # El más reciente no se baja: es el que se está usando
+                    candidatos = list(islice(self._recientes, max(0, min(CANDIDATOS, len(self._recientes) - 1))))
+                avance = False
+                for usuario in candidatos:
+                    lock = self._franja(usuario)
+                    if not lock.acquire(blocking=False):
+                        continue
+                    try:
+                        avance = self._enfriar(usuario) or avance
+                    finally:
+                        lock.release()
+                    if self._residente <= objetivo:
+                        break
+                if not avance:
+                    break
+            if self._indice_frio.debe_reconstruirse():
+                self._indice_frio.reconstruir(list(self._frios.items()))
+            segmento = self._segmento
+            if segmento is not None and segmento.tamano > COMPACTAR_DESDE and segmento.basura > segmento.tamano / 2:
+                self._compactar()
+        finally:
+            self._lock_desalojo.release()
+
+    def _compactar(self):
+        """Copia los bloques vigentes a un segmento nuevo y cierra los anteriores"""
+        nuevo = Segmento(self.directorio)
+        anteriores = {frio.segmento for frio in list(self._frios.values())} | {self._segmento}
+        self._segmento = nuevo
+        for usuario in list(self._frios):
+            with self._franja(usuario):
+                frio = self._frios.get(usuario)
+                if frio is None or frio.segmento is nuevo:
+                    continue
+                datos = frio.segmento.leer(frio.posicion, frio.longitud)
+                self._frios[usuario] = Frio(nuevo, nuevo.agregar(datos), frio.longitud, frio.ids)
+        for segmento in anteriores:
+            if segmento.pid == os.getpid():
+                segmento.cerrar()
+
+    def _avisar(self):
+        """
+        Desaloja si se superó el presupuesto (se llama sin locks tomados).
+        Desde el event loop el desalojo escribe a disco, así que va en un hilo.
+        """
+        if self._residente <= self.presupuesto:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.desalojar()
+        else:
+            loop.run_in_executor(None, self.desalojar)
+
+    def _dueno_frio(self, tarea_id):
+        """Usuario en disco que tiene la tarea ``tarea_id``, o None"""
+        usuario = self._indice_frio.usuario(tarea_id)
+        frio = self._frios.get(usuario)
+        if frio is None:
+            return None
+        i = bisect_left(frio.ids, tarea_id)
+        return usuario if i < len(frio.ids) and frio.ids[i] == tarea_id else None
+
+    def _dueno(self, tarea_id):
+        tarea = self._por_id.get(tarea_id)
+        return tarea.usuario if tarea is not None else self._dueno_frio(tarea_id)
+
+    # AlmacenMemoria
+
+    def __len__(self):
+        return len(self._por_id) + self._tareas_frias
+
+    def _vaciar(self):
+        super()._vaciar()
+        segmentos = ({frio.segmento for frio in self._frios.values()} | {self._segmento}) - {None}
+        self._iniciar_niveles()
+        for segmento in segmentos:
+            if segmento.pid == os.getpid():
+                segmento.cerrar()
+
+    def cerrar(self):
+        # Sin el segmento las tareas en disco no se pueden leer: se descarta todo
+        with self._todas_las_franjas():
+            self._vaciar()
+
+    def todas(self):
+        # Sin traer a memoria a los usuarios fríos: se leen sus bloques
+        tareas = super().todas()
+        for usuario in list(self._frios):
+            with self._franja(usuario):
+                frio = self._frios.get(usuario)
+                if frio is not None:
+                    tuplas = marshal.loads(frio.segmento.leer(frio.posicion, frio.longitud))
+                    tareas.extend(TareaCompacta(*tupla) for tupla in tuplas)
+        return tareas
+
+    def usuarios(self):
+        return list(set(self._por_usuario) | set(self._frios))
+
+    def _obtener_en_memoria(self, tarea_id):
+        tarea = self._por_id.get(tarea_id)
+        if tarea is not None:
+            ACCESOS_ALMACEN.incrementar(('memoria',))
+            self._tocar(tarea.usuario)
+        return tarea
+
+    def obtener(self, tarea_id):
+        tarea = self._obtener_en_memoria(tarea_id)
+        if tarea is not None:
+            return tarea
+        usuario = self._dueno_frio(tarea_id)
+        if usuario is None:
+            return None
+        with self._franja(usuario):
+            self._calentar(usuario)
+            tarea = self._por_id.get(tarea_id)
+        self._avisar()
+        return tarea
+
+    def agregar(self, titulo, descripcion, usuario):
+        with self._franja(usuario):
+            self._calentar(usuario)
+            tarea = super().agregar(titulo, descripcion, usuario)
+        self._avisar()
+        return tarea
+
+    def _por_dueno(self, metodo, tarea_id, *argumentos):
+        usuario = self._dueno(tarea_id)
+        if usuario is None:
+            return None
+        with self._franja(usuario):
+            self._calentar(usuario)
+            tarea = metodo(tarea_id, *argumentos)
+        self._avisar()
+        return tarea
+
+    def editar(self, tarea_id, titulo, descripcion):
+        return self._por_dueno(super().editar, tarea_id, titulo, descripcion)
+
+    def eliminar(self, tarea_id):
+        return self._por_dueno(super().eliminar, tarea_id)
+
+    def marcar(self, tarea_id, completada):
+        return self._por_dueno(super().marcar, tarea_id, completada)
+
+    def restaurar(self, tareas):
+        grupos = {}
+        for tarea in tareas:
+            grupos.setdefault(tarea['usuario'], []).append(tarea)
+        for usuario, grupo in grupos.items():
+            with self._franja(usuario):
+                self._calentar(usuario)
+                super().restaurar(grupo)
+            self._indice_frio.olvidar(usuario)
+        self._avisar()
+
+    def aplicar_lote(self, usuario, operaciones):
+        # Las tareas en disco de otros usuarios se rechazan sin traerlas a memoria
+        ajenas = {i for i, (operacion, *argumentos) in enumerate(operaciones)
+                  if operacion != 'crear' and argumentos[0] not in self._por_id
+                  and self._dueno_frio(argumentos[0]) not in (None, usuario)}
+        with self._franja(usuario):
+            self._calentar(usuario)
+            aplicados = iter(super().aplicar_lote(usuario, [operacion for i, operacion in enumerate(operaciones)
+                                                            if i not in ajenas]))
+        self._avisar()
+        return [(SIN_PERMISO, None) if i in ajenas else next(aplicados) for i in range(len(operaciones))]
+
+    def de_usuario(self, username, campos=None):
+        with self._franja(username):
+            self._calentar(username)
+            tareas = super().de_usuario(username, campos)
+        self._avisar()
+        return tareas
+
+    def pagina_de_usuario(self, username, despues_de=None, limite=None, campos=None, orden=None):
+        with self._franja(username):
+            self._calentar(username)
+            tareas = super().pagina_de_usuario(username, despues_de, limite, campos, orden)
+        self._avisar()
+        return tareas
+
+    def buscar_de_usuario(self, username, consulta, limite=20):
+        with self._franja(username):
+            self._calentar(username)
+            tareas = super().buscar_de_usuario(username, consulta, limite)
+        self._avisar()
+        return tareas
+
+    def contar_de_usuario(self, username):
+        return self._contadores.get(username, (0, 0))[0]
+
+    # API async: las lecturas de AlmacenMemoria, que en el event loop
+    # solo atienden a usuarios en memoria; cargar a uno desde disco y las
+    # escrituras van en un hilo (como en BackendTareas)
+
+    def _en_memoria(self, usuario):
+        return usuario not in self._frios
+
+    async def aobtener(self, tarea_id):
+        tarea = self._obtener_en_memoria(tarea_id)
+        if tarea is not None:
+            return tarea
+        return await BackendTareas.aobtener(self, tarea_id)
@@ -0,0 +1,469 @@
+import secrets
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+from .base import NO_EXISTE, OK, SIN_PERMISO, BackendTareas, clave_orden, estadisticas, siguiente_id
+from .busqueda import IndiceInvertido
+
+
+class TareaCompacta(Mapping):
+    """
+    Registro de una tarea en memoria.
+
+    Con ``__slots__`` cada tarea ocupa un objeto de tamaño fijo sin
+    diccionario propio (~88 bytes frente a ~272 de un dict de siete
+    claves). Se comporta como un mapeo de solo lectura, así que
+    ``tarea['titulo']``, ``tarea.titulo`` (también en plantillas) y
+    ``dict(tarea)`` siguen funcionando. Los nombres de usuario se
+    internan: todas las tareas de un usuario comparten el mismo str.
+    Hasta la primera edición ``creada`` y ``actualizada`` son el mismo
+    float.
+    """
+    __slots__ = ('id', 'titulo', 'descripcion', 'usuario', 'completada', 'creada', 'actualizada')
+    _claves = frozenset(__slots__)
+
+    def __init__(self, id, titulo, descripcion, usuario, completada=False, creada=0.0, actualizada=None):
+        self.id = id
+        self.titulo = titulo
+        self.descripcion = descripcion
+        self.usuario = sys.intern(usuario)
+        self.completada = completada
+        self.creada = creada
+        self.actualizada = creada if actualizada is None else actualizada
+
+    def __getitem__(self, clave):
+        if clave not in self._claves:
+            raise KeyError(clave)
+        return getattr(self, clave)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __repr__(self):
+        return f'TareaCompacta({dict(self)!r})'
+
+    def __reduce__(self):
+        return (TareaCompacta, self.como_tupla())
+
+    def como_tupla(self):
+        return (self.id, self.titulo, self.descripcion, self.usuario, self.completada, self.creada, self.actualizada)
+
+    def reemplazar(self, **cambios):
+        """Retorna una copia con los campos indicados cambiados"""
+        campos = dict(self)
+        campos.update(cambios)
+        return TareaCompacta(**campos)
+
+
+class AlmacenMemoria(BackendTareas):
+    """
+    Almacenamiento en memoria de las tareas, seguro entre hilos.
+
+    Es el backend por defecto; los datos viven en el proceso actual y se
+    pierden al reiniciarlo.
+
+    Mantiene un índice primario ``id -> tarea`` y un índice secundario
+    ``usuario -> [ids ordenados]``, de modo que buscar por ID cuesta O(1),
+    listar las tareas de un usuario cuesta O(k) (k = tareas del usuario),
+    una página de ``n`` tareas cuesta O(log k + n) y eliminar cuesta
+    O(log k) más un memmove de la lista de IDs del usuario.
+
+    La búsqueda usa un índice invertido por usuario que se construye la
+    primera vez que ese usuario busca y desde entonces se actualiza en
+    cada escritura; los usuarios que nunca buscan no pagan su costo.
+
+    Cada usuario tiene un contador de versión que sube en cada escritura
+    sobre sus tareas, prefijado con una época aleatoria que cambia al
+    crear o vaciar el almacén.
+
+    Los contadores ``(total, completadas)`` de cada usuario se ajustan en
+    ``_insertar`` y ``_quitar``, así que leerlos cuesta O(1) sin recorrer
+    sus tareas.
+
+    Las páginas en otro orden (ver ``base.ORDENES``) salen de una lista
+    ordenada de claves ``(valor, id)`` por usuario y orden: la primera
+    página pedida en ese orden la arma en O(k log k) y desde entonces
+    cada escritura la ajusta con bisect, así que una página de ``n``
+    tareas cuesta O(log k + n). Como el índice de búsqueda, solo existe
+    para los usuarios que usan ese orden.
+
+    Las escrituras se serializan con un lock por franja de usuarios
+    (lock striping): dos usuarios en franjas distintas nunca compiten.
+    Las tareas publicadas no se modifican en sitio (copy-on-write), así
+    que una lista obtenida con ``de_usuario`` es una instantánea
+    consistente aunque otro hilo edite o elimine tareas después.
+
+    Con ``ranuras`` (como partición de ``AlmacenParticionado``) los IDs
+    llevan la ranura del usuario; ver ``base.siguiente_id``.
+    """
+
+    # Sin estado atado a un hilo: lo que la API async no hace en el event
+    # loop va a un hilo propio (ver más abajo)
+    hilo_compartido = False
+
+    def __init__(self, franjas=64, ranuras=None):
+        self._por_id = {}
+        self._por_usuario = {}
+        self._indices = {}
+        self._ordenes = {}
+        self._versiones = {}
+        self._contadores = {}
+        self._epoca = secrets.token_hex(4)
+        # Reentrantes: la API async toma la franja sin esperar y luego llama al método sync
+        self._franjas = [threading.RLock() for _ in range(franjas)]
+        self._lock_ids = threading.Lock()
+        self._ultimo_id = 0
+        self.ranuras = ranuras
+
+    def __len__(self):
+        return len(self._por_id)
+
+    def __iter__(self):
+        return iter(self.todas())
+
+    def _franja(self, usuario):
+        return self._franjas[hash(usuario) % len(self._franjas)]
+
+    def _siguiente_id(self, usuario):
+        with self._lock_ids:
+            self._ultimo_id = siguiente_id(self._ultimo_id, usuario, self.ranuras)
+            return self._ultimo_id
+
+    @contextmanager
+    def _todas_las_franjas(self):
+        """Bloquea todas las escrituras (siempre en el mismo orden, sin deadlocks)"""
+        for lock in self._franjas:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in self._franjas:
+                lock.release()
+
+    def clear(self):
+        """Elimina todas las tareas y reinicia el contador de IDs"""
+        with self._todas_las_franjas():
+            self._vaciar()
+
+    def _vaciar(self):
+        """Vacía los índices y el contador (requiere todas las franjas)"""
+        self._por_id.clear()
+        self._por_usuario.clear()
+        self._indices.clear()
+        self._ordenes.clear()
+        self._versiones.clear()
+        self._contadores.clear()
+        self._epoca = secrets.token_hex(4)
+        with self._lock_ids:
+            self._ultimo_id = 0
+
+    def _insertar(self, tarea):
+        """Inserta o reemplaza una tarea en los índices (requiere el lock de su franja)"""
+        anterior = self._por_id.get(tarea.id)
+        total, completadas = self._contadores.get(tarea.usuario, (0, 0))
+        if anterior is None:
+            ids = self._por_usuario.setdefault(tarea.usuario, [])
+            if not ids or ids[-1] < tarea.id:
+                ids.append(tarea.id)
+            else:
+                insort(ids, tarea.id)
+            # Se reemplaza la tupla entera: un lector sin lock nunca ve medio cambio
+            self._contadores[tarea.usuario] = (total + 1, completadas + tarea.completada)
+        elif anterior.completada != tarea.completada:
+            self._contadores[tarea.usuario] = (total, completadas + tarea.completada - anterior.completada)
+        self._por_id[tarea.id] = tarea
+        self._versiones[tarea.usuario] = self._versiones.get(tarea.usuario, 0) + 1
+        indice = self._indices.get(tarea.usuario)
+        if indice is not None:
+            if anterior is not None:
+                indice.quitar(anterior)
+            indice.agregar(tarea)
+        for orden, claves in self._ordenes.get(tarea.usuario, {}).items():
+            clave = clave_orden(orden, getattr(tarea, orden), tarea.id)
+            if anterior is not None:
+                vieja = clave_orden(orden, getattr(anterior, orden), anterior.id)
+                if vieja == clave:
+                    continue
+                del claves[bisect_left(claves, vieja)]
+            insort(claves, clave)
+
+    def _quitar(self, tarea_id):
+        """Quita una tarea de los índices (requiere el lock de su franja)"""
+        tarea = self._por_id.pop(tarea_id, None)
+        if tarea is not None:
+            ids = self._por_usuario[tarea.usuario]
+            del ids[bisect_left(ids, tarea_id)]
+            for orden, claves in self._ordenes.get(tarea.usuario, {}).items():
+                del claves[bisect_left(claves, clave_orden(orden, getattr(tarea, orden), tarea_id))]
+            if ids:
+                total, completadas = self._contadores[tarea.usuario]
+                self._contadores[tarea.usuario] = (total - 1, completadas - tarea.completada)
+            else:
+                del self._por_usuario[tarea.usuario]
+                del self._contadores[tarea.usuario]
+                self._ordenes.pop(tarea.usuario, None)
+            self._versiones[tarea.usuario] += 1
+            indice = self._indices.get(tarea.usuario)
+            if indice is not None:
+                indice.quitar(tarea)
+        return tarea
+
+    def _registrar(self, operacion, tarea):
+        """
+        Gancho para subclases, invocado dentro de la sección crítica de cada
+        escritura ('a' agregar, 'e' editar o marcar, 'd' eliminar). Lo que retorne se
+        pasa a ``_confirmar``.
+        """
+        return None
+
+    def _confirmar(self, registro):
+        """
+        Gancho para subclases que deja firme lo anotado en ``_registrar``.
+        Las escrituras lo invocan dentro de la sección crítica y antes de
+        publicar: si falla, el cambio no llega al feed.
+        """
+
+    def todas(self):
+        # list(dict.values()) se ejecuta sin soltar el GIL
+        return list(self._por_id.values())
+
+    def obtener(self, tarea_id):
+        return self._por_id.get(tarea_id)
+
+    def agregar(self, titulo, descripcion, usuario):
+        with self._franja(usuario):
+            # El ID se asigna dentro del lock para que las tareas de un mismo
+            # usuario se inserten siempre en orden creciente de ID
+            tarea = TareaCompacta(self._siguiente_id(usuario), titulo, descripcion, usuario, False, time.time())
+            self._insertar(tarea)
+            registro = self._registrar('a', tarea)
+            self._confirmar(registro)
+            self._publicar(usuario, [('crear', tarea)])
+        return tarea
+
+    def editar(self, tarea_id, titulo, descripcion):
+        tarea = self._por_id.get(tarea_id)
+        if tarea is None:
+            return None
+        with self._franja(tarea.usuario):
+            # Otro hilo pudo eliminarla mientras esperábamos el lock
+            if tarea_id not in self._por_id:
+                return None
+            tarea = self._por_id[tarea_id].reemplazar(titulo=titulo, descripcion=descripcion,
+                                                      actualizada=time.time())
+            self._insertar(tarea)
+            registro = self._registrar('e', tarea)
+            self._confirmar(registro)
+            self._publicar(tarea.usuario, [('editar', tarea)])
+        return tarea
+
+    def eliminar(self, tarea_id):
+        tarea = self._por_id.get(tarea_id)
+        if tarea is None:
+            return None
+        with self._franja(tarea.usuario):
+            tarea = self._quitar(tarea_id)
+            if tarea is None:
+                return None
+            registro = self._registrar('d', tarea)
+            self._confirmar(registro)
+            self._publicar(tarea.usuario, [('eliminar', tarea)])
+        return tarea
+
+    def marcar(self, tarea_id, completada):
+        tarea = self._por_id.get(tarea_id)
+        if tarea is None:
+            return None
+        with self._franja(tarea.usuario):
+            tarea = self._por_id.get(tarea_id)
+            if tarea is None:
+                return None
+            if tarea.completada == completada:
+                # Sin cambios: no se toca la versión ni el diario
+                return tarea
+            tarea = tarea.reemplazar(completada=completada, actualizada=time.time())
+            self._insertar(tarea)
+            registro = self._registrar('e', tarea)
+            self._confirmar(registro)
+            self._publicar(tarea.usuario, [('editar', tarea)])
+        return tarea
+
+    def usuarios(self):
+        return list(self._por_usuario)
+
+    def restaurar(self, tareas):
+        registros = []
+        for tarea in tareas:
+            tarea = TareaCompacta(*(tarea[clave] for clave in TareaCompacta.__slots__))
+            with self._lock_ids:
+                self._ultimo_id = max(self._ultimo_id, tarea.id)
+            with self._franja(tarea.usuario):
+                self._insertar(tarea)
+                registros.append(self._registrar('a', tarea))
+        for registro in registros:
+            self._confirmar(registro)
+
+    def ultimo_id(self):
+        return self._ultimo_id
+
+    def reservar_ids(self, hasta):
+        with self._lock_ids:
+            self._ultimo_id = max(self._ultimo_id, hasta)
+
+    def aplicar_lote(self, usuario, operaciones):
+        resultados = []
+        registros = []
+        eventos = []
+        ahora = time.time()
+        # Todas las tareas del usuario viven en su franja: un solo lock
+        # para todo el lote
+        with self._franja(usuario):
+            for operacion, *argumentos in operaciones:
+                if operacion == 'crear':
+                    tarea = TareaCompacta(self._siguiente_id(usuario), *argumentos, usuario, False, ahora)
+                    self._insertar(tarea)
+                    registros.append(self._registrar('a', tarea))
+                    eventos.append(('crear', tarea))
+                    resultados.append((OK, tarea))
+                    continue
+                tarea = self._por_id.get(argumentos[0])
+                if tarea is None:
+                    resultados.append((NO_EXISTE, None))
+                elif tarea.usuario != usuario:
+                    resultados.append((SIN_PERMISO, None))
+                elif operacion == 'editar':
+                    tarea = tarea.reemplazar(titulo=argumentos[1], descripcion=argumentos[2], actualizada=ahora)
+                    self._insertar(tarea)
+                    registros.append(self._registrar('e', tarea))
+                    eventos.append(('editar', tarea))
+                    resultados.append((OK, tarea))
+                elif operacion == 'marcar':
+                    if tarea.completada != argumentos[1]:
+                        tarea = tarea.reemplazar(completada=argumentos[1], actualizada=ahora)
+                        self._insertar(tarea)
+                        registros.append(self._registrar('e', tarea))
+                        eventos.append(('editar', tarea))
+                    resultados.append((OK, tarea))
+                else:
+                    self._quitar(tarea.id)
+                    registros.append(self._registrar('d', tarea))
+                    eventos.append(('eliminar', tarea))
+                    resultados.append((OK, tarea))
+            for registro in registros:
+                self._confirmar(registro)
+            self._publicar(usuario, eventos)
+        return resultados
+
+    def de_usuario(self, username, campos=None):
+        por_id = self._por_id
+        with self._franja(username):
+            return [por_id[i] for i in self._por_usuario.get(username, ())]
+
+    def pagina_de_usuario(self, username, despues_de=None, limite=None, campos=None, orden=None):
+        por_id = self._por_id
+        with self._franja(username):
+            if orden is not None:
+                claves = self._claves_en_orden(username, orden)
+                inicio = bisect_right(claves, clave_orden(orden, *despues_de)) if despues_de is not None else 0
+                fin = inicio + limite if limite is not None else None
+                return [por_id[clave[-1]] for clave in claves[inicio:fin]]
+            ids = self._por_usuario.get(username, ())
+            inicio = bisect_right(ids, despues_de) if despues_de is not None else 0
+            fin = inicio + limite if limite is not None else None
+            return [por_id[i] for i in ids[inicio:fin]]
+
+    def _claves_en_orden(self, username, orden):
+        """
+        Claves ordenadas de las tareas del usuario en ``orden``; la primera
+        vez arma el índice (requiere el lock de su franja)
+        """
+        ordenes = self._ordenes.get(username)
+        if ordenes is not None and orden in ordenes:
+            return ordenes[orden]
+        ids = self._por_usuario.get(username)
+        if not ids:
+            return ()
+        por_id = self._por_id
+        claves = sorted(clave_orden(orden, getattr(por_id[i], orden), i) for i in ids)
+        self._ordenes.setdefault(username, {})[orden] = claves
+        return claves
+
+    def contar_de_usuario(self, username):
+        return len(self._por_usuario.get(username, ()))
+
+    def estadisticas_de_usuario(self, username):
+        return estadisticas(*self._contadores.get(username, (0, 0)))
+
+    def version_de_usuario(self, username):
+        return f'{self._epoca}.{self._versiones.get(username, 0)}'
+
+    def buscar_de_usuario(self, username, consulta, limite=20):
+        por_id = self._por_id
+        with self._franja(username):
+            indice = self._indices.get(username)
+            if indice is None:
+                ids = self._por_usuario.get(username, ())
+                indice = self._indices[username] = IndiceInvertido(por_id[i] for i in ids)
+            return [por_id[i] for i in indice.buscar(consulta, limite)]
+
+    # API async. Las lecturas sin lock van directo en el event loop; las
+    # que toman la franja del usuario, solo si está libre (si no, en un
+    # hilo). Las escrituras van siempre en un hilo: además de la franja
+    # toman el lock de IDs y el del feed de cambios, y las subclases
+    # escriben a disco.
+
+    def _leer_sin_esperar(self, usuario, metodo, *argumentos):
+        """
+        Ejecuta ``metodo`` si la franja de ``usuario`` está libre y retorna
+        ``(True, resultado)``; si otro hilo la tiene, ``(False, None)`` sin
+        esperarla
+        """
+        lock = self._franja(usuario)
+        if not lock.acquire(blocking=False):
+            return False, None
+        try:
+            if not self._en_memoria(usuario):
+                return False, None
+            return True, metodo(*argumentos)
+        finally:
+            lock.release()
+
+    def _en_memoria(self, usuario):
+        """Si las lecturas de ``usuario`` no tocan el disco (requiere el lock de su franja)"""
+        return True
+
+    async def aobtener(self, tarea_id):
+        return self.obtener(tarea_id)
+
+    async def apagina_de_usuario(self, username, despues_de=None, limite=None, campos=None, orden=None):
+        # Como el de búsqueda, armar el índice de otro orden para un usuario grande puede tardar
+        if orden is None or orden in self._ordenes.get(username, ()):
+            listo, tareas = self._leer_sin_esperar(username, self.pagina_de_usuario,
+                                                   username, despues_de, limite, campos, orden)
+            if listo:
+                return tareas
+        return await super().apagina_de_usuario(username, despues_de, limite, campos, orden)
+
+    async def acontar_de_usuario(self, username):
+        return self.contar_de_usuario(username)
+
+    async def aestadisticas_de_usuario(self, username):
+        return self.estadisticas_de_usuario(username)
+
+    async def abuscar_de_usuario(self, username, consulta, limite=20):
+        # Construir el índice de un usuario grande puede tardar segundos
+        if username in self._indices:
+            listo, tareas = self._leer_sin_esperar(username, self.buscar_de_usuario, username, consulta, limite)
+            if listo:
+                return tareas
+        return await super().abuscar_de_usuario(username, consulta, limite)
+
+    async def aversion_de_usuario(self, username):
+        return self.version_de_usuario(username)
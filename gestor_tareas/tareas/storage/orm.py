@@ -0,0 +1,219 @@
+import time
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Lower
+
+from .base import NO_EXISTE, OK, ORDENES, SIN_PERMISO, TIPOS_EVENTO, BackendTareas, estadisticas
+
+CAMPOS = ('id', 'titulo', 'descripcion', 'usuario', 'completada', 'creada', 'actualizada')
+
+
+def _como_dict(tarea):
+    return {
+        'id': tarea.id,
+        'titulo': tarea.titulo,
+        'descripcion': tarea.descripcion,
+        'usuario': tarea.usuario_id,
+        'completada': tarea.completada,
+        'creada': tarea.creada,
+        'actualizada': tarea.actualizada,
+    }
+
+
+def _pagina_ordenada(consulta, orden, despues_de, limite, campos):
+    """Página en ``orden`` (con el id de desempate) desde el cursor ``(valor, id)``"""
+    campo = orden
+    if orden == 'titulo':
+        # La misma expresión que indexa tarea_usuario_titulo_idx
+        consulta = consulta.annotate(titulo_orden=Lower('titulo'))
+        campo = 'titulo_orden'
+    descendente = ORDENES[orden]
+    ordenada = consulta.order_by(f'-{campo}' if descendente else campo, 'id').values(*campos)
+    if despues_de is None:
+        return _hasta(ordenada, limite)
+    valor, tarea_id = despues_de
+    if orden == 'titulo':
+        valor = Lower(Value(valor))
+    # Como en el backend SQLite: el resto del grupo del valor del cursor y
+    # luego los valores siguientes, dos recorridos acotados del índice
+    tareas = _hasta(consulta.filter(**{campo: valor}, id__gt=tarea_id).order_by('id').values(*campos), limite)
+    if limite is None or len(tareas) < limite:
+        siguientes = ordenada.filter(**{f'{campo}__{"lt" if descendente else "gt"}': valor})
+        tareas += _hasta(siguientes, None if limite is None else limite - len(tareas))
+    return tareas
+
+
+def _hasta(consulta, limite):
+    return list(consulta[:limite] if limite is not None else consulta)
+
+
+class AlmacenORM(BackendTareas):
+    """
+    Almacenamiento durable en la base de datos configurada en DATABASES.
+
+    Usa el modelo ``tareas.models.Tarea``; las consultas por usuario se
+    resuelven con el índice compuesto (usuario, id). Las tareas se
+    retornan como diccionarios (``values()``), igual que en los demás
+    backends. ``clear`` no reinicia la secuencia de IDs. Cada orden de
+    ``base.ORDENES`` tiene su índice (usuario, campo, id) en el modelo.
+
+    Los totales por usuario viven en ``ContadorTareas`` y se ajustan con
+    ``F()`` en la misma transacción que cada escritura. Los eventos del feed
+    de cambios también se publican dentro de la transacción, mientras las
+    filas escritas siguen bloqueadas.
+    """
+
+    @property
+    def _tareas(self):
+        # Importación diferida: el backend puede instanciarse antes de que
+        # el registro de apps esté listo
+        from ..models import Tarea
+        return Tarea.objects
+
+    @property
+    def _contadores(self):
+        from ..models import ContadorTareas
+        return ContadorTareas.objects
+
+    def _ajustar(self, usuario, total, completadas):
+        """Suma ``total`` y ``completadas`` a los contadores del usuario (dentro de una transacción)"""
+        if not (total or completadas):
+            return
+        cambios = {'total': F('total') + total, 'completadas': F('completadas') + completadas}
+        if self._contadores.filter(usuario_id=usuario).update(**cambios):
+            return
+        try:
+            with transaction.atomic():
+                self._contadores.create(usuario_id=usuario, total=total, completadas=completadas)
+        except IntegrityError:
+            # Otra transacción creó la fila entre el UPDATE y el INSERT
+            self._contadores.filter(usuario_id=usuario).update(**cambios)
+
+    def __len__(self):
+        return self._tareas.count()
+
+    def clear(self):
+        with transaction.atomic():
+            self._tareas.all().delete()
+            self._contadores.all().delete()
+
+    def todas(self):
+        return list(self._tareas.order_by('id').values(*CAMPOS))
+
+    def obtener(self, tarea_id):
+        return self._tareas.filter(id=tarea_id).values(*CAMPOS).first()
+
+    def agregar(self, titulo, descripcion, usuario):
+        with transaction.atomic():
+            ahora = time.time()
+            tarea = _como_dict(self._tareas.create(titulo=titulo, descripcion=descripcion, usuario_id=usuario,
+                                                   creada=ahora, actualizada=ahora))
+            self._ajustar(usuario, 1, 0)
+            self._publicar(usuario, [('crear', tarea)])
+        return tarea
+
+    def editar(self, tarea_id, titulo, descripcion):
+        with transaction.atomic():
+            if not self._tareas.filter(id=tarea_id).update(titulo=titulo, descripcion=descripcion,
+                                                           actualizada=time.time()):
+                return None
+            tarea = self.obtener(tarea_id)
+            self._publicar(tarea['usuario'], [('editar', tarea)])
+        return tarea
+
+    def eliminar(self, tarea_id):
+        with transaction.atomic():
+            tarea = self._tareas.select_for_update().filter(id=tarea_id).values(*CAMPOS).first()
+            if tarea is not None:
+                self._tareas.filter(id=tarea_id).delete()
+                self._ajustar(tarea['usuario'], -1, -tarea['completada'])
+                self._publicar(tarea['usuario'], [('eliminar', tarea)])
+        return tarea
+
+    def marcar(self, tarea_id, completada):
+        with transaction.atomic():
+            tarea = self._tareas.select_for_update().filter(id=tarea_id).values(*CAMPOS).first()
+            if tarea is not None and tarea['completada'] != completada:
+                tarea['actualizada'] = time.time()
+                self._tareas.filter(id=tarea_id).update(completada=completada, actualizada=tarea['actualizada'])
+                self._ajustar(tarea['usuario'], 0, completada - tarea['completada'])
+                tarea['completada'] = completada
+                self._publicar(tarea['usuario'], [('editar', tarea)])
+        return tarea
+
+    def aplicar_lote(self, usuario, operaciones):
+        from ..models import Tarea
+        resultados = [None] * len(operaciones)
+        nuevas = []
+        # Posiciones de las operaciones que cambiaron algo, para el feed de cambios
+        cambios = []
+        # Cambio neto de los contadores del usuario: se aplica una sola vez
+        total = completadas = 0
+        ahora = time.time()
+        with transaction.atomic():
+            # Dueño de cada tarea referenciada, en una sola consulta
+            ids = [argumentos[0] for operacion, *argumentos in operaciones if operacion != 'crear']
+            duenos = dict(self._tareas.select_for_update().filter(id__in=ids)
+                          .values_list('id', 'usuario_id')) if ids else {}
+            for posicion, (operacion, *argumentos) in enumerate(operaciones):
+                if operacion == 'crear':
+                    nuevas.append((posicion, Tarea(titulo=argumentos[0], descripcion=argumentos[1],
+                                                   usuario_id=usuario, creada=ahora, actualizada=ahora)))
+                    continue
+                tarea_id = argumentos[0]
+                if tarea_id not in duenos:
+                    resultados[posicion] = (NO_EXISTE, None)
+                elif duenos[tarea_id] != usuario:
+                    resultados[posicion] = (SIN_PERMISO, None)
+                elif operacion == 'editar':
+                    self._tareas.filter(id=tarea_id).update(titulo=argumentos[1], descripcion=argumentos[2],
+                                                            actualizada=ahora)
+                    resultados[posicion] = (OK, self.obtener(tarea_id))
+                    cambios.append(posicion)
+                elif operacion == 'marcar':
+                    tarea = self.obtener(tarea_id)
+                    if tarea['completada'] != argumentos[1]:
+                        self._tareas.filter(id=tarea_id).update(completada=argumentos[1], actualizada=ahora)
+                        completadas += argumentos[1] - tarea['completada']
+                        tarea['completada'] = argumentos[1]
+                        tarea['actualizada'] = ahora
+                        cambios.append(posicion)
+                    resultados[posicion] = (OK, tarea)
+                else:
+                    tarea = self.obtener(tarea_id)
+                    self._tareas.filter(id=tarea_id).delete()
+                    total -= 1
+                    completadas -= tarea['completada']
+                    resultados[posicion] = (OK, tarea)
+                    cambios.append(posicion)
+                    del duenos[tarea_id]
+            # Las altas no dependen de las demás operaciones: un solo INSERT
+            self._tareas.bulk_create([tarea for _, tarea in nuevas])
+            self._ajustar(usuario, total + len(nuevas), completadas)
+            for posicion, tarea in nuevas:
+                resultados[posicion] = (OK, _como_dict(tarea))
+                cambios.append(posicion)
+            self._publicar(usuario, [(TIPOS_EVENTO[operaciones[posicion][0]], resultados[posicion][1])
+                                     for posicion in sorted(cambios)])
+        return resultados
+
+    def de_usuario(self, username, campos=None):
+        return list(
+            self._tareas.filter(usuario_id=username).order_by('id').values(*(campos or CAMPOS))
+        )
+
+    def pagina_de_usuario(self, username, despues_de=None, limite=None, campos=None, orden=None):
+        consulta = self._tareas.filter(usuario_id=username)
+        if orden is not None:
+            return _pagina_ordenada(consulta, orden, despues_de, limite, campos or CAMPOS)
+        if despues_de is not None:
+            consulta = consulta.filter(id__gt=despues_de)
+        return _hasta(consulta.order_by('id').values(*(campos or CAMPOS)), limite)
+
+    def contar_de_usuario(self, username):
+        return self.estadisticas_de_usuario(username)['total']
+
+    def estadisticas_de_usuario(self, username):
+        fila = self._contadores.filter(usuario_id=username).values_list('total', 'completadas').first()
+        return estadisticas(*(fila or (0, 0)))
@@ -0,0 +1,453 @@
+"""
+Almacenamiento particionado por usuario.
+
+``AlmacenParticionado`` reparte las tareas entre varios backends
+(particiones) según su dueño. Cada usuario cae en una de ``ranuras``
+ranuras virtuales (un hash de su nombre) y cada ranura vive en una
+partición: la lista, las páginas, los contadores, la búsqueda, la
+versión y los lotes de un usuario los atiende su partición sola, con sus
+propios locks o su propio archivo.
+
+El ID de cada tarea lleva su ranura (``tarea_id % ranuras``, ver
+``base.siguiente_id``), así que ``obtener``, ``editar``, ``eliminar`` y
+``marcar`` van directo a la partición correcta sin preguntar a las demás.
+
+El mapa ranura -> partición sale de un anillo de hash consistente sobre
+los nombres de las particiones y se guarda en un archivo JSON que leen
+todos los procesos (cada ``REVISION`` segundos). Al agregar una
+partición el anillo le asigna alrededor de ``ranuras / n`` ranuras, y
+solo esas cambian de lugar; ``rebalancear`` (o ``manage.py
+rebalancear_particiones``) las mueve en línea, de a lotes:
+
+1. congela las ranuras del lote en el mapa: sus escrituras esperan y
+   las lecturas siguen yendo a la partición de origen;
+2. espera ``gracia`` segundos, a que todos los procesos relean el mapa
+   y terminen las escrituras que ya estaban en curso;
+3. copia las tareas de esos usuarios al destino, con sus IDs, y sube
+   su contador de IDs al último ID asignado en el origen;
+4. reasigna las ranuras al destino y las descongela;
+5. espera ``gracia`` otra vez y borra las tareas del origen.
+
+El mapa guarda además, por cada ranura movida, esa marca de agua: el
+destino no vuelve a asignar los IDs de tareas que se borraron en el
+origen antes del movimiento, y cada proceso la vuelve a aplicar a sus
+particiones al arrancar (el contador de ``AlmacenDurable`` solo se
+recupera a partir de los IDs que quedaron en su diario).
+
+Si se interrumpe, volver a ejecutarlo retoma el movimiento y borra las
+copias que hayan quedado en la partición equivocada. Quitar particiones
+no está soportado.
+
+Las particiones pueden ser ``AlmacenSQLite`` (un archivo por partición,
+compartido entre workers), ``AlmacenDurable`` o ``AlmacenMemoria``; con
+estas dos últimas los datos son del proceso, así que ``rebalancear`` se
+llama desde el mismo proceso (en tests, por ejemplo). ``AlmacenORM`` no
+sirve como partición: sus IDs los asigna la base de datos.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import threading
+import time
+from bisect import bisect
+from contextlib import contextmanager
+from hashlib import blake2b
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from . import crear_backend
+from .base import NO_EXISTE, SIN_PERMISO, BackendTareas, ranura
+
+# Cada cuántos segundos relee un proceso el archivo del mapa; ``gracia``
+# debe ser bastante mayor
+REVISION = 0.25
+
+# Pausa entre revisiones de una escritura que espera a que se mueva su ranura
+PAUSA = 0.01
+
+# Puntos de cada partición en el anillo: más puntos, reparto más parejo
+PUNTOS_POR_PARTICION = 128
+
+
+class RanuraOcupada(Exception):
+    """Una escritura esperó más de ``espera`` segundos a que se moviera su ranura"""
+
+
+class RebalanceoEnCurso(Exception):
+    """Otro proceso está rebalanceando las mismas particiones"""
+
+
+def _hash(texto):
+    return int.from_bytes(blake2b(texto.encode(), digest_size=8).digest(), 'big')
+
+
+def anillo(nombres, ranuras, puntos=PUNTOS_POR_PARTICION):
+    """
+    Partición de cada ranura según un anillo de hash consistente: agregar
+    una partición solo le pasa ranuras a ella, las demás no se mueven
+    """
+    nodos = sorted((_hash(f'{nombre}#{i}'), nombre) for nombre in nombres for i in range(puntos))
+    claves = [clave for clave, _ in nodos]
+    return [nodos[bisect(claves, _hash(f'ranura-{r}')) % len(nodos)][1] for r in range(ranuras)]
+
+
+def _particiones_de_settings():
+    # TAREAS_PARTICIONES = nombre=ruta,nombre=ruta: una partición SQLite por archivo
+    particiones = {}
+    for particion in settings.TAREAS_PARTICIONES:
+        nombre, _, ruta = particion.partition('=')
+        particiones[nombre.strip()] = {'BACKEND': 'tareas.storage.sqlite.AlmacenSQLite',
+                                       'OPTIONS': {'ruta': ruta.strip()}}
+    return particiones
+
+
+class AlmacenParticionado(BackendTareas):
+    """
+    Enruta cada operación a la partición de su usuario o de su ID.
+
+    ``particiones`` es un dict nombre -> config (como ``TAREAS_STORAGE``);
+    por defecto, las de ``TAREAS_PARTICIONES``. Los nombres, no el orden,
+    deciden el reparto: no deben cambiar una vez que hay datos. ``mapa``
+    es el archivo JSON compartido con el mapa de ranuras.
+
+    Las escrituras sobre una ranura que se está moviendo esperan hasta
+    ``espera`` segundos y luego lanzan ``RanuraOcupada``.
+    """
+
+    def __init__(self, particiones=None, ranuras=1024, mapa=None, gracia=1.0, espera=10.0):
+        particiones = particiones if particiones is not None else _particiones_de_settings()
+        if not particiones:
+            raise ImproperlyConfigured('AlmacenParticionado necesita al menos una partición.')
+        self.ranuras = ranuras
+        self.gracia = gracia
+        self.espera = espera
+        self.ruta_mapa = str(mapa or settings.BASE_DIR / 'particiones.json')
+        self.particiones = {
+            nombre: crear_backend({**config, 'OPTIONS': {**config.get('OPTIONS', {}), 'ranuras': ranuras}})
+            for nombre, config in particiones.items()
+        }
+        for nombre, particion in self.particiones.items():
+            particion.al_cambiar = self._reenviar(nombre)
+        self._lock = threading.Lock()
+        self._mapa = None
+        self._congeladas = frozenset()
+        self._marcas = {}
+        self._revisar_en = 0
+        self._recargar()
+        if self._mapa is None:
+            # Primer arranque: todos los procesos calculan el mismo anillo
+            self._guardar(anillo(self.particiones, ranuras), ())
+        for nombre, particion in self.particiones.items():
+            marcas = [marca for r, marca in self._marcas.items() if self._mapa[r] == nombre]
+            if marcas:
+                particion.reservar_ids(max(marcas))
+
+    # Mapa de ranuras
+
+    def _recargar(self):
+        try:
+            with open(self.ruta_mapa) as archivo:
+                datos = json.load(archivo)
+        except FileNotFoundError:
+            return
+        if datos['ranuras'] != self.ranuras:
+            raise ImproperlyConfigured(f'{self.ruta_mapa} tiene {datos["ranuras"]} ranuras y la '
+                                       f'configuración {self.ranuras}.')
+        desconocidas = set(datos['mapa']) - set(self.particiones)
+        if desconocidas:
+            raise ImproperlyConfigured(f'{self.ruta_mapa} usa particiones que no están configuradas: '
+                                       f'{", ".join(sorted(desconocidas))}.')
+        # Primero el mapa: quien vea una ranura ya descongelada ve también su destino
+        self._mapa = datos['mapa']
+        self._congeladas = frozenset(datos['congeladas'])
+        self._marcas = {int(r): marca for r, marca in datos.get('marcas', {}).items()}
+        self._revisar_en = time.monotonic() + REVISION
+
+    def _refrescar(self):
+        # Releer el JSON (unos KB) cuesta ~100 µs: se hace a lo sumo cada
+        # REVISION segundos por proceso, también desde el event loop
+        if time.monotonic() >= self._revisar_en and self._lock.acquire(blocking=False):
+            try:
+                self._recargar()
+            finally:
+                self._lock.release()
+
+    def _guardar(self, mapa, congeladas, marcas=None):
+        marcas = self._marcas if marcas is None else marcas
+        temporal = f'{self.ruta_mapa}.{os.getpid()}.tmp'
+        with open(temporal, 'w') as archivo:
+            json.dump({'ranuras': self.ranuras, 'mapa': mapa, 'congeladas': sorted(congeladas),
+                       'marcas': {str(r): marca for r, marca in sorted(marcas.items())}}, archivo)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, self.ruta_mapa)
+        self._mapa = list(mapa)
+        self._congeladas = frozenset(congeladas)
+        self._marcas = dict(marcas)
+
+    def particion_de_ranura(self, r):
+        """Nombre de la partición que tiene la ranura ``r``"""
+        self._refrescar()
+        return self._mapa[r]
+
+    # Ruteo
+
+    def _de_usuario(self, usuario):
+        return self.particiones[self.particion_de_ranura(ranura(usuario, self.ranuras))]
+
+    def _de_id(self, tarea_id):
+        return self.particiones[self.particion_de_ranura(tarea_id % self.ranuras)]
+
+    def _para_escribir(self, r):
+        """Partición de la ranura ``r`` una vez que no se está moviendo"""
+        limite = time.monotonic() + self.espera
+        while True:
+            self._refrescar()
+            if r not in self._congeladas:
+                return self.particiones[self._mapa[r]]
+            if time.monotonic() >= limite:
+                raise RanuraOcupada(r)
+            time.sleep(PAUSA)
+
+    async def _apara_escribir(self, r):
+        limite = time.monotonic() + self.espera
+        while True:
+            self._refrescar()
+            if r not in self._congeladas:
+                return self.particiones[self._mapa[r]]
+            if time.monotonic() >= limite:
+                raise RanuraOcupada(r)
+            await asyncio.sleep(PAUSA)
+
+    def _reenviar(self, nombre):
+        """``al_cambiar`` de la partición ``nombre``: publica lo que escribe en sus propias ranuras"""
+        def reenviar(usuario, eventos):
+            # Las bajas de las copias que deja un rebalanceo no son cambios del usuario
+            if self.al_cambiar is not None and self._mapa[ranura(usuario, self.ranuras)] == nombre:
+                self.al_cambiar(usuario, eventos)
+        return reenviar
+
+    def _propias(self, tareas, nombre):
+        # Durante un rebalanceo una tarea puede estar en dos particiones:
+        # vale la copia de la partición que tiene su ranura
+        return [t for t in tareas if self._mapa[t['id'] % self.ranuras] == nombre]
+
+    # BackendTareas
+
+    def __len__(self):
+        # Aproximado durante un rebalanceo (cuenta las copias dos veces)
+        return sum(len(particion) for particion in self.particiones.values())
+
+    def clear(self):
+        for particion in self.particiones.values():
+            particion.clear()
+
+    def cerrar(self):
+        for particion in self.particiones.values():
+            particion.cerrar()
+
+    def todas(self):
+        self._refrescar()
+        tareas = [t for nombre, particion in self.particiones.items()
+                  for t in self._propias(particion.todas(), nombre)]
+        return sorted(tareas, key=lambda t: t['id'])
+
+    def usuarios(self):
+        self._refrescar()
+        return sorted({u for nombre, particion in self.particiones.items() for u in particion.usuarios()
+                       if self._mapa[ranura(u, self.ranuras)] == nombre})
+
+    def restaurar(self, tareas):
+        grupos = {}
+        for tarea in tareas:
+            grupos.setdefault(tarea['id'] % self.ranuras, []).append(tarea)
+        for r, grupo in grupos.items():
+            self._para_escribir(r).restaurar(grupo)
+
+    def obtener(self, tarea_id):
+        return self._de_id(tarea_id).obtener(tarea_id)
+
+    def agregar(self, titulo, descripcion, usuario):
+        return self._para_escribir(ranura(usuario, self.ranuras)).agregar(titulo, descripcion, usuario)
+
+    def editar(self, tarea_id, titulo, descripcion):
+        return self._para_escribir(tarea_id % self.ranuras).editar(tarea_id, titulo, descripcion)
+
+    def eliminar(self, tarea_id):
+        return self._para_escribir(tarea_id % self.ranuras).eliminar(tarea_id)
+
+    def marcar(self, tarea_id, completada):
+        return self._para_escribir(tarea_id % self.ranuras).marcar(tarea_id, completada)
+
+    def de_usuario(self, username, campos=None):
+        return self._de_usuario(username).de_usuario(username, campos)
+
+    def pagina_de_usuario(self, username, despues_de=None, limite=None, campos=None, orden=None):
+        return self._de_usuario(username).pagina_de_usuario(username, despues_de, limite, campos, orden)
+
+    def contar_de_usuario(self, username):
+        return self._de_usuario(username).contar_de_usuario(username)
+
+    def estadisticas_de_usuario(self, username):
+        return self._de_usuario(username).estadisticas_de_usuario(username)
+
+    def buscar_de_usuario(self, username, consulta, limite=20):
+        return self._de_usuario(username).buscar_de_usuario(username, consulta, limite)
+
+    def version_de_usuario(self, username):
+        return self._de_usuario(username).version_de_usuario(username)
+
+    def _separar_lote(self, usuario, operaciones):
+        """Índices de las operaciones que puede resolver la partición del usuario y de las demás"""
+        r = ranura(usuario, self.ranuras)
+        propias, ajenas = [], []
+        for i, operacion in enumerate(operaciones):
+            if operacion[0] == 'crear' or operacion[1] % self.ranuras == r:
+                propias.append(i)
+            else:
+                ajenas.append(i)
+        return r, propias, ajenas
+
+    def aplicar_lote(self, usuario, operaciones):
+        r, propias, ajenas = self._separar_lote(usuario, operaciones)
+        resultados = [None] * len(operaciones)
+        if propias:
+            aplicados = self._para_escribir(r).aplicar_lote(usuario, [operaciones[i] for i in propias])
+            for i, resultado in zip(propias, aplicados):
+                resultados[i] = resultado
+        for i in ajenas:
+            # Un ID de otra ranura nunca es de este usuario
+            existe = self.obtener(operaciones[i][1]) is not None
+            resultados[i] = (SIN_PERMISO if existe else NO_EXISTE, None)
+        return resultados
+
+    # API async: cada partición usa la suya (en el event loop o en un hilo)
+
+    async def aobtener(self, tarea_id):
+        return await self._de_id(tarea_id).aobtener(tarea_id)
+
+    async def aagregar(self, titulo, descripcion, usuario):
+        particion = await self._apara_escribir(ranura(usuario, self.ranuras))
+        return await particion.aagregar(titulo, descripcion, usuario)
+
+    async def aeditar(self, tarea_id, titulo, descripcion):
+        particion = await self._apara_escribir(tarea_id % self.ranuras)
+        return await particion.aeditar(tarea_id, titulo, descripcion)
+
+    async def aeliminar(self, tarea_id):
+        particion = await self._apara_escribir(tarea_id % self.ranuras)
+        return await particion.aeliminar(tarea_id)
+
+    async def amarcar(self, tarea_id, completada):
+        particion = await self._apara_escribir(tarea_id % self.ranuras)
+        return await particion.amarcar(tarea_id, completada)
+
+    async def apagina_de_usuario(self, username, despues_de=None, limite=None, campos=None, orden=None):
+        return await self._de_usuario(username).apagina_de_usuario(username, despues_de, limite, campos, orden)
+
+    async def acontar_de_usuario(self, username):
+        return await self._de_usuario(username).acontar_de_usuario(username)
+
+    async def aestadisticas_de_usuario(self, username):
+        return await self._de_usuario(username).aestadisticas_de_usuario(username)
+
+    async def abuscar_de_usuario(self, username, consulta, limite=20):
+        return await self._de_usuario(username).abuscar_de_usuario(username, consulta, limite)
+
+    async def aversion_de_usuario(self, username):
+        return await self._de_usuario(username).aversion_de_usuario(username)
+
+    async def aaplicar_lote(self, usuario, operaciones):
+        r, propias, ajenas = self._separar_lote(usuario, operaciones)
+        resultados = [None] * len(operaciones)
+        if propias:
+            particion = await self._apara_escribir(r)
+            aplicados = await particion.aaplicar_lote(usuario, [operaciones[i] for i in propias])
+            for i, resultado in zip(propias, aplicados):
+                resultados[i] = resultado
+        for i in ajenas:
+            existe = await self.aobtener(operaciones[i][1]) is not None
+            resultados[i] = (SIN_PERMISO if existe else NO_EXISTE, None)
+        return resultados
+
+    # Rebalanceo
+
+    @contextmanager
+    def _exclusivo(self):
+        with open(f'{self.ruta_mapa}.lock', 'w') as archivo:
+            try:
+                fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise RebalanceoEnCurso(self.ruta_mapa) from None
+            yield
+
+    def pendientes(self):
+        """Ranuras cuya partición no es la que indica el anillo, por (origen, destino)"""
+        self._recargar()
+        movimientos = {}
+        for r, (actual, destino) in enumerate(zip(self._mapa, anillo(self.particiones, self.ranuras))):
+            if actual != destino:
+                movimientos.setdefault((actual, destino), []).append(r)
+        return movimientos
+
+    def rebalancear(self, lote=64, progreso=None):
+        """
+        Mueve a su partición según el anillo las ranuras que estén en otra,
+        de a ``lote`` ranuras, y borra las copias que sobren. Llama a
+        ``progreso(origen, destino, ranuras, tareas)`` tras cada lote y
+        retorna ``(ranuras, tareas)`` movidas.
+        """
+        with self._exclusivo():
+            movimientos = self.pendientes()
+            if self._congeladas:
+                # Un rebalanceo interrumpido: sus ranuras se vuelven a mover abajo
+                self._guardar(self._mapa, ())
+            ranuras = tareas = 0
+            for (origen, destino), pendientes in movimientos.items():
+                for inicio in range(0, len(pendientes), lote):
+                    grupo = pendientes[inicio:inicio + lote]
+                    movidas = self._mover(origen, destino, grupo)
+                    ranuras += len(grupo)
+                    tareas += movidas
+                    if progreso:
+                        progreso(origen, destino, len(grupo), movidas)
+            self._limpiar()
+        return ranuras, tareas
+
+    def _mover(self, origen, destino, grupo):
+        self._guardar(self._mapa, grupo)
+        time.sleep(self.gracia)
+        conjunto = set(grupo)
+        fuente = self.particiones[origen]
+        usuarios = [u for u in fuente.usuarios() if ranura(u, self.ranuras) in conjunto]
+        cantidad = 0
+        for usuario in usuarios:
+            tareas = fuente.de_usuario(usuario)
+            self.particiones[destino].restaurar(tareas)
+            cantidad += len(tareas)
+        # El contador del origen acota todos los IDs que asignó en estas
+        # ranuras, también los de tareas ya borradas
+        marca = max([fuente.ultimo_id()] + [self._marcas.get(r, 0) for r in grupo])
+        self.particiones[destino].reservar_ids(marca)
+        mapa = list(self._mapa)
+        marcas = dict(self._marcas)
+        for r in grupo:
+            mapa[r] = destino
+            marcas[r] = marca
+        self._guardar(mapa, (), marcas)
+        # Las lecturas que todavía usan el mapa anterior siguen encontrando las tareas
+        time.sleep(self.gracia)
+        self._borrar(fuente, usuarios)
+        return cantidad
+
+    def _limpiar(self):
+        """Borra las tareas que quedaron en una partición que ya no tiene su ranura"""
+        for nombre, particion in self.particiones.items():
+            self._borrar(particion, [u for u in particion.usuarios()
+                                     if self._mapa[ranura(u, self.ranuras)] != nombre])
+
+    def _borrar(self, particion, usuarios):
+        for usuario in usuarios:
+            particion.aplicar_lote(usuario, [('eliminar', t['id']) for t in particion.de_usuario(usuario, ('id',))])
@@ -0,0 +1,439 @@
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+from .base import NO_EXISTE, OK, ORDENES, SIN_PERMISO, TIPOS_EVENTO, BackendTareas, estadisticas, ranura
+from .busqueda import PESO_TITULO, tokenizar
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tareas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    titulo TEXT NOT NULL,
+    descripcion TEXT NOT NULL,
+    usuario TEXT NOT NULL,
+    completada INTEGER NOT NULL DEFAULT 0,
+    creada REAL NOT NULL DEFAULT 0,
+    actualizada REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tareas_usuario_id ON tareas (usuario, id);
+"""
+
+# Bases creadas antes de las fechas: sus tareas quedan con 0
+ESQUEMA_FECHAS = """
+ALTER TABLE tareas ADD COLUMN creada REAL NOT NULL DEFAULT 0;
+ALTER TABLE tareas ADD COLUMN actualizada REAL NOT NULL DEFAULT 0;
+"""
+
+# Expresión por la que se ordena cada orden de base.ORDENES (la misma que
+# indexa su índice) y los índices (usuario, expresión, id)
+ORDENES_SQL = {'titulo': 'titulo COLLATE NOCASE', 'completada': 'completada', 'actualizada': '-actualizada'}
+ESQUEMA_ORDENES = ''.join(f'CREATE INDEX IF NOT EXISTS tareas_usuario_{orden} ON tareas (usuario, {expresion}, id);\n'
+                          for orden, expresion in ORDENES_SQL.items())
+
+# Índice de texto completo (FTS5) sincronizado con triggers
+ESQUEMA_BUSQUEDA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tareas_busqueda USING fts5(
+    titulo, descripcion, content='tareas', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS tareas_busqueda_ai AFTER INSERT ON tareas BEGIN
+    INSERT INTO tareas_busqueda (rowid, titulo, descripcion)
+    VALUES (new.id, new.titulo, new.descripcion);
+END;
+CREATE TRIGGER IF NOT EXISTS tareas_busqueda_ad AFTER DELETE ON tareas BEGIN
+    INSERT INTO tareas_busqueda (tareas_busqueda, rowid, titulo, descripcion)
+    VALUES ('delete', old.id, old.titulo, old.descripcion);
+END;
+CREATE TRIGGER IF NOT EXISTS tareas_busqueda_au AFTER UPDATE OF titulo, descripcion ON tareas BEGIN
+    INSERT INTO tareas_busqueda (tareas_busqueda, rowid, titulo, descripcion)
+    VALUES ('delete', old.id, old.titulo, old.descripcion);
+    INSERT INTO tareas_busqueda (rowid, titulo, descripcion)
+    VALUES (new.id, new.titulo, new.descripcion);
+END;
+"""
+
+# Versión por usuario (ver BackendTareas.version_de_usuario): los triggers
+# la suben en cada escritura, también las de otros procesos, y la época
+# distingue este archivo de uno recreado desde cero
+ESQUEMA_VERSIONES = """
+CREATE TABLE IF NOT EXISTS tareas_versiones (
+    usuario TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tareas_meta (
+    clave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO tareas_meta VALUES ('epoca', lower(hex(randomblob(4))));
+CREATE TRIGGER IF NOT EXISTS tareas_versiones_ai AFTER INSERT ON tareas BEGIN
+    INSERT INTO tareas_versiones VALUES (new.usuario, 1)
+    ON CONFLICT (usuario) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS tareas_versiones_au AFTER UPDATE ON tareas BEGIN
+    INSERT INTO tareas_versiones VALUES (new.usuario, 1)
+    ON CONFLICT (usuario) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS tareas_versiones_ad AFTER DELETE ON tareas BEGIN
+    INSERT INTO tareas_versiones VALUES (old.usuario, 1)
+    ON CONFLICT (usuario) DO UPDATE SET version = version + 1;
+END;
+"""
+
+# Contadores (total, completadas) por usuario, ajustados por triggers en
+# cada escritura: leerlos no recorre las tareas del usuario
+ESQUEMA_CONTADORES = """
+CREATE TABLE IF NOT EXISTS tareas_contadores (
+    usuario TEXT PRIMARY KEY,
+    total INTEGER NOT NULL,
+    completadas INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS tareas_contadores_ai AFTER INSERT ON tareas BEGIN
+    INSERT INTO tareas_contadores VALUES (new.usuario, 1, new.completada)
+    ON CONFLICT (usuario) DO UPDATE SET total = total + 1, completadas = completadas + excluded.completadas;
+END;
+CREATE TRIGGER IF NOT EXISTS tareas_contadores_au AFTER UPDATE OF completada ON tareas
+WHEN new.completada != old.completada BEGIN
+    UPDATE tareas_contadores SET completadas = completadas + new.completada - old.completada
+    WHERE usuario = new.usuario;
+END;
+CREATE TRIGGER IF NOT EXISTS tareas_contadores_ad AFTER DELETE ON tareas BEGIN
+    UPDATE tareas_contadores SET total = total - 1, completadas = completadas - old.completada
+    WHERE usuario = old.usuario;
+END;
+"""
+
+COLUMNAS = 'id, titulo, descripcion, usuario, completada, creada, actualizada'
+
+# Con ranuras el ID se calcula en el propio INSERT (ver base.siguiente_id):
+# BEGIN IMMEDIATE serializa a los escritores, así que leer sqlite_sequence
+# ahí es seguro, y AUTOINCREMENT la actualiza con el ID insertado
+ID_CON_RANURA = ("(coalesce((SELECT seq FROM sqlite_sequence WHERE name = 'tareas'), 0) / :ranuras + 1)"
+                 ' * :ranuras + :ranura')
+
+
+def _fila_a_tarea(cursor, fila):
+    return {
+        'id': fila[0],
+        'titulo': fila[1],
+        'descripcion': fila[2],
+        'usuario': fila[3],
+        'completada': bool(fila[4]),
+        'creada': fila[5],
+        'actualizada': fila[6],
+    }
+
+
+class AlmacenSQLite(BackendTareas):
+    """
+    Almacenamiento compartido entre procesos sobre un archivo SQLite.
+
+    Todos los workers que apunten al mismo archivo ven los mismos datos.
+    La base se abre en modo WAL: los lectores no bloquean al escritor ni
+    entre sí, y cada escritura es una transacción corta. Cada hilo (y cada
+    proceso tras un fork) usa su propia conexión.
+
+    Los cambios se publican después del COMMIT. Entre los hilos de un
+    proceso, ``_lock_escritura`` abarca la transacción y la publicación, así
+    el feed (que es de cada proceso) los recibe en el orden en que se
+    aplicaron.
+
+    La búsqueda usa un índice FTS5; la versión y las estadísticas por
+    usuario, tablas de contadores. Todos se mantienen con triggers. Cada
+    orden de ``base.ORDENES`` tiene su índice (usuario, campo, id): una
+    página es una búsqueda en ese índice desde el cursor.
+
+    Con ``ranuras`` (como partición de ``AlmacenParticionado``) los IDs
+    llevan la ranura del usuario; ver ``base.siguiente_id``.
+
+    Requiere SQLite 3.35 o superior (``RETURNING``) compilado con FTS5.
+    """
+
+    # Cada hilo abre su conexión: la API async puede usar cualquier hilo
+    hilo_compartido = False
+
+    def __init__(self, ruta=None, timeout=5.0, ranuras=None):
+        self.ruta = str(ruta or settings.BASE_DIR / 'tareas.sqlite3')
+        self.timeout = timeout
+        self.ranuras = ranuras
+        if ranuras:
+            self._sql_alta = ('INSERT INTO tareas (id, titulo, descripcion, usuario, creada, actualizada) '
+                              f'VALUES ({ID_CON_RANURA}, :titulo, :descripcion, :usuario, :ahora, :ahora) '
+                              f'RETURNING {COLUMNAS}')
+        else:
+            self._sql_alta = ('INSERT INTO tareas (titulo, descripcion, usuario, creada, actualizada) '
+                              f'VALUES (:titulo, :descripcion, :usuario, :ahora, :ahora) RETURNING {COLUMNAS}')
+        self._local = threading.local()
+        self._lock_escritura = threading.Lock()
+        con = self._conexion()
+        con.executescript(ESQUEMA)
+        if not self._escalar("SELECT count(*) FROM pragma_table_info('tareas') WHERE name = 'creada'"):
+            con.executescript(ESQUEMA_FECHAS)
+        con.executescript(ESQUEMA_ORDENES)
+        existia = self._escalar("SELECT count(*) FROM sqlite_master WHERE name = 'tareas_busqueda'")
+        con.executescript(ESQUEMA_BUSQUEDA)
+        if not existia:
+            # Bases creadas antes del índice de búsqueda
+            con.execute("INSERT INTO tareas_busqueda (tareas_busqueda) VALUES ('rebuild')")
+        con.executescript(ESQUEMA_VERSIONES)
+        existia = self._escalar("SELECT count(*) FROM sqlite_master WHERE name = 'tareas_contadores'")
+        con.executescript(ESQUEMA_CONTADORES)
+        if not existia:
+            # Bases creadas antes de los contadores
+            con.execute('INSERT OR REPLACE INTO tareas_contadores '
+                        'SELECT usuario, count(*), sum(completada) FROM tareas GROUP BY usuario')
+        self._epoca = self._escalar("SELECT valor FROM tareas_meta WHERE clave = 'epoca'")
+
+    def _conexion(self):
+        con = getattr(self._local, 'conexion', None)
+        if con is None or self._local.pid != os.getpid():
+            con = sqlite3.connect(self.ruta, timeout=self.timeout, isolation_level=None,
+                                  check_same_thread=False)
+            con.execute('PRAGMA journal_mode=WAL')
+            # En modo WAL, NORMAL solo arriesga la última transacción ante un corte de energía
+            con.execute('PRAGMA synchronous=NORMAL')
+            con.row_factory = _fila_a_tarea
+            self._local.conexion = con
+            self._local.pid = os.getpid()
+        return con
+
+    def _escribir(self, sql, parametros, tipo):
+        """
+        Ejecuta una sentencia en su propia transacción y retorna la primera
+        fila; si hay fila la publica como evento ``tipo``
+        """
+        con = self._conexion()
+        with self._lock_escritura:
+            con.execute('BEGIN IMMEDIATE')
+            try:
+                fila = con.execute(sql, parametros).fetchone()
+                con.execute('COMMIT')
+            except BaseException:
+                con.execute('ROLLBACK')
+                raise
+            # Solo lo confirmado llega al feed
+            if fila is not None:
+                self._publicar(fila['usuario'], [(tipo, fila)])
+        return fila
+
+    def _escalar(self, sql, parametros=()):
+        """Ejecuta una consulta que retorna un único valor"""
+        cursor = self._conexion().cursor()
+        cursor.row_factory = None
+        return cursor.execute(sql, parametros).fetchone()[0]
+
+    def cerrar(self):
+        con = getattr(self._local, 'conexion', None)
+        if con is not None:
+            con.close()
+            self._local.conexion = None
+
+    def __len__(self):
+        return self._escalar('SELECT count(*) FROM tareas')
+
+    def clear(self):
+        con = self._conexion()
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            con.execute('DELETE FROM tareas')
+            con.execute('DELETE FROM tareas_contadores')
+            con.execute("DELETE FROM sqlite_sequence WHERE name = 'tareas'")
+            con.execute('COMMIT')
+        except BaseException:
+            con.execute('ROLLBACK')
+            raise
+
+    def todas(self):
+        return self._conexion().execute(f'SELECT {COLUMNAS} FROM tareas ORDER BY id').fetchall()
+
+    def obtener(self, tarea_id):
+        return self._conexion().execute(
+            f'SELECT {COLUMNAS} FROM tareas WHERE id = ?', (tarea_id,)
+        ).fetchone()
+
+    def _parametros_alta(self, titulo, descripcion, usuario):
+        parametros = {'titulo': titulo, 'descripcion': descripcion, 'usuario': usuario, 'ahora': time.time()}
+        if self.ranuras:
+            parametros.update(ranuras=self.ranuras, ranura=ranura(usuario, self.ranuras))
+        return parametros
+
+    def agregar(self, titulo, descripcion, usuario):
+        return self._escribir(self._sql_alta, self._parametros_alta(titulo, descripcion, usuario), 'crear')
+
+    def editar(self, tarea_id, titulo, descripcion):
+        return self._escribir(
+            f'UPDATE tareas SET titulo = ?, descripcion = ?, actualizada = ? WHERE id = ? RETURNING {COLUMNAS}',
+            (titulo, descripcion, time.time(), tarea_id), 'editar'
+        )
+
+    def eliminar(self, tarea_id):
+        return self._escribir(f'DELETE FROM tareas WHERE id = ? RETURNING {COLUMNAS}', (tarea_id,), 'eliminar')
+
+    def marcar(self, tarea_id, completada):
+        # Sin cambios no hay UPDATE: no se sube la versión del usuario
+        fila = self._escribir(
+            f'UPDATE tareas SET completada = ?, actualizada = ? WHERE id = ? AND completada != ? '
+            f'RETURNING {COLUMNAS}',
+            (completada, time.time(), tarea_id, completada), 'editar'
+        )
+        return fila or self.obtener(tarea_id)
+
+    def aplicar_lote(self, usuario, operaciones):
+        resultados = []
+        eventos = []
+        ahora = time.time()
+        con = self._conexion()
+        with self._lock_escritura:
+            con.execute('BEGIN IMMEDIATE')
+            try:
+                for operacion, *argumentos in operaciones:
+                    cambio = None
+                    if operacion == 'crear':
+                        fila = cambio = con.execute(
+                            self._sql_alta, self._parametros_alta(*argumentos, usuario)
+                        ).fetchone()
+                    elif operacion == 'editar':
+                        tarea_id, titulo, descripcion = argumentos
+                        fila = cambio = con.execute(
+                            f'UPDATE tareas SET titulo = ?, descripcion = ?, actualizada = ? '
+                            f'WHERE id = ? AND usuario = ? RETURNING {COLUMNAS}',
+                            (titulo, descripcion, ahora, tarea_id, usuario)
+                        ).fetchone()
+                    elif operacion == 'marcar':
+                        tarea_id, completada = argumentos
+                        cambio = con.execute(
+                            f'UPDATE tareas SET completada = ?, actualizada = ? WHERE id = ? AND usuario = ? '
+                            f'AND completada != ? RETURNING {COLUMNAS}',
+                            (completada, ahora, tarea_id, usuario, completada)
+                        ).fetchone()
+                        fila = cambio or con.execute(
+                            f'SELECT {COLUMNAS} FROM tareas WHERE id = ? AND usuario = ?', (tarea_id, usuario)
+                        ).fetchone()
+                    else:
+                        fila = cambio = con.execute(
+                            f'DELETE FROM tareas WHERE id = ? AND usuario = ? RETURNING {COLUMNAS}',
+                            (argumentos[0], usuario)
+                        ).fetchone()
+                    if cambio is not None:
+                        eventos.append((TIPOS_EVENTO[operacion], cambio))
+                    if fila is not None:
+                        resultados.append((OK, fila))
+                    elif self._escalar('SELECT count(*) FROM tareas WHERE id = ?', (argumentos[0],)):
+                        resultados.append((SIN_PERMISO, None))
+                    else:
+                        resultados.append((NO_EXISTE, None))
+                con.execute('COMMIT')
+            except BaseException:
+                con.execute('ROLLBACK')
+                raise
+            self._publicar(usuario, eventos)
+        return resultados
+
+    def usuarios(self):
+        cursor = self._conexion().cursor()
+        cursor.row_factory = None
+        return [fila[0] for fila in cursor.execute('SELECT usuario FROM tareas_contadores WHERE total > 0')]
+
+    def restaurar(self, tareas):
+        # UPSERT y no INSERT OR REPLACE: el REPLACE borra la fila sin disparar
+        # los triggers de DELETE y desajustaría los contadores
+        con = self._conexion()
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            con.executemany(
+                f'INSERT INTO tareas ({COLUMNAS}) VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET '
+                'titulo = excluded.titulo, descripcion = excluded.descripcion, '
+                'completada = excluded.completada, creada = excluded.creada, actualizada = excluded.actualizada',
+                [(t['id'], t['titulo'], t['descripcion'], t['usuario'], t['completada'], t['creada'],
+                  t['actualizada']) for t in tareas]
+            )
+            con.execute('COMMIT')
+        except BaseException:
+            con.execute('ROLLBACK')
+            raise
+
+    def ultimo_id(self):
+        # AUTOINCREMENT guarda en sqlite_sequence el mayor ID insertado alguna vez
+        return self._escalar("SELECT coalesce(max(seq), 0) FROM sqlite_sequence WHERE name = 'tareas'")
+
+    def reservar_ids(self, hasta):
+        con = self._conexion()
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            if not con.execute("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'tareas'",
+                               (hasta,)).rowcount:
+                con.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('tareas', ?)", (hasta,))
+            con.execute('COMMIT')
+        except BaseException:
+            con.execute('ROLLBACK')
+            raise
+
+    def de_usuario(self, username, campos=None):
+        return self._conexion().execute(
+            f'SELECT {COLUMNAS} FROM tareas WHERE usuario = ? ORDER BY id', (username,)
+        ).fetchall()
+
+    def pagina_de_usuario(self, username, despues_de=None, limite=None, campos=None, orden=None):
+        limite = -1 if limite is None else limite
+        if orden is None:
+            return self._conexion().execute(
+                f'SELECT {COLUMNAS} FROM tareas WHERE usuario = ? AND id > ? ORDER BY id LIMIT ?',
+                (username, despues_de or 0, limite)
+            ).fetchall()
+        expresion = ORDENES_SQL[orden]
+        if despues_de is None:
+            return self._conexion().execute(
+                f'SELECT {COLUMNAS} FROM tareas WHERE usuario = ? ORDER BY {expresion}, id LIMIT ?',
+                (username, limite)
+            ).fetchall()
+        valor, tarea_id = despues_de
+        valor = -valor if ORDENES[orden] else valor
+        # Dos búsquedas en el índice: el resto del grupo del valor del cursor
+        # y los valores siguientes. SQLite acota una fila (valor, id) > (?, ?)
+        # solo por el valor, y con pocos valores distintos (completada)
+        # recorrería todo el grupo del cursor. Van en una sola consulta: la
+        # página (y la tarea extra que decide si hay otra) sale de una misma
+        # lectura aunque otro hilo escriba entre medio
+        return self._conexion().execute(
+            f'SELECT {COLUMNAS} FROM ('
+            f'SELECT * FROM (SELECT {COLUMNAS}, 0 AS tramo FROM tareas '
+            f'WHERE usuario = ? AND {expresion} = ? AND id > ? ORDER BY id LIMIT ?) '
+            f'UNION ALL '
+            f'SELECT * FROM (SELECT {COLUMNAS}, 1 AS tramo FROM tareas '
+            f'WHERE usuario = ? AND {expresion} > ? ORDER BY {expresion}, id LIMIT ?)'
+            f') ORDER BY tramo, {expresion}, id LIMIT ?',
+            (username, valor, tarea_id, limite, username, valor, limite, limite)
+        ).fetchall()
+
+    def buscar_de_usuario(self, username, consulta, limite=20):
+        # Cada término se busca como prefijo y todos deben aparecer
+        terminos = tokenizar(consulta)
+        if not terminos:
+            return []
+        expresion = ' AND '.join(f'"{termino}"*' for termino in terminos)
+        columnas = ', '.join(f't.{columna}' for columna in COLUMNAS.split(', '))
+        return self._conexion().execute(
+            f'SELECT {columnas} FROM tareas_busqueda JOIN tareas t ON t.id = tareas_busqueda.rowid '
+            'WHERE tareas_busqueda MATCH ? AND t.usuario = ? '
+            f'ORDER BY bm25(tareas_busqueda, {PESO_TITULO}, 1), t.id DESC LIMIT ?',
+            (expresion, username, limite)
+        ).fetchall()
+
+    def contar_de_usuario(self, username):
+        return self.estadisticas_de_usuario(username)['total']
+
+    def estadisticas_de_usuario(self, username):
+        cursor = self._conexion().cursor()
+        cursor.row_factory = None
+        fila = cursor.execute(
+            'SELECT total, completadas FROM tareas_contadores WHERE usuario = ?', (username,)
+        ).fetchone()
+        return estadisticas(*(fila or (0, 0)))
+
+    def version_de_usuario(self, username):
+        version = self._escalar(
+            'SELECT coalesce(max(version), 0) FROM tareas_versiones WHERE usuario = ?', (username,)
+        )
+        return f'{self._epoca}.{version}'
@@ -1,7 +1,9 @@
-from django.test import TestCase, Client
+import json
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
 from tareas import storage
+from tareas.models import Tarea
 
 class AuthenticationTests(TestCase):
     """Pruebas para el sistema de autenticación"""
@@ -11,7 +13,6 @@ class AuthenticationTests(TestCase):
         self.client = Client()
         # Limpiar almacenamiento
         storage.tareas_storage.clear()
-        storage.contador_id = 1
         
         self.user = User.objects.create_user(
             username='testuser',
@@ -69,7 +70,6 @@ class TareaTests(TestCase):
         self.client = Client()
         # Limpiar almacenamiento antes de cada prueba
         storage.tareas_storage.clear()
-        storage.contador_id = 1
         
         self.user1 = User.objects.create_user(
             username='user1',
@@ -193,7 +193,6 @@ class FormularioTests(TestCase):
         self.client = Client()
         # Limpiar almacenamiento
         storage.tareas_storage.clear()
-        storage.contador_id = 1
         
         self.user = User.objects.create_user(
             username='testuser',
@@ -229,7 +228,6 @@ class IntegrationTests(TestCase):
     def setUp(self):
         """Limpiar almacenamiento antes de cada prueba"""
         storage.tareas_storage.clear()
-        storage.contador_id = 1
     
     def test_flujo_completo_usuario(self):
         """Prueba del flujo completo: registro, login, crear, editar, ver, eliminar"""
@@ -289,3 +287,2093 @@ class IntegrationTests(TestCase):
         # 10. Logout
         response = client.get(reverse('tareas:logout'))
         self.assertEqual(response.status_code, 302)
+
+
+class AlmacenTests(TestCase):
+    """Pruebas para los índices del almacenamiento en memoria"""
+
+    def setUp(self):
+        storage.tareas_storage.clear()
+
+    def test_indices_tras_agregar_y_eliminar(self):
+        """Los índices por ID y por usuario se mantienen consistentes"""
+        t1 = storage.agregar_tarea('T1', 'D1', 'ana')
+        t2 = storage.agregar_tarea('T2', 'D2', 'luis')
+        t3 = storage.agregar_tarea('T3', 'D3', 'ana')
+
+        self.assertEqual([t['id'] for t in storage.obtener_tareas_usuario('ana')], [t1['id'], t3['id']])
+        storage.eliminar_tarea(t1['id'])
+        self.assertIsNone(storage.obtener_tarea_por_id(t1['id']))
+        self.assertEqual(storage.obtener_tareas_usuario('ana'), [t3])
+        self.assertEqual(storage.obtener_tareas_usuario('luis'), [t2])
+        self.assertEqual(len(storage.obtener_todas_tareas()), 2)
+
+    def test_eliminar_inexistente(self):
+        """Eliminar un ID que no existe no altera el almacenamiento"""
+        storage.agregar_tarea('T1', 'D1', 'ana')
+        storage.eliminar_tarea(999)
+        self.assertEqual(len(storage.tareas_storage), 1)
+
+    def test_ids_no_se_reutilizan(self):
+        """Un ID eliminado no vuelve a asignarse"""
+        t1 = storage.agregar_tarea('T1', 'D1', 'ana')
+        storage.eliminar_tarea(t1['id'])
+        t2 = storage.agregar_tarea('T2', 'D2', 'ana')
+        self.assertNotEqual(t1['id'], t2['id'])
+
+
+class ConcurrenciaTests(TestCase):
+    """Pruebas de estrés del almacenamiento con varios hilos"""
+
+    def setUp(self):
+        storage.tareas_storage.clear()
+
+    def test_ids_unicos_con_hilos(self):
+        """Hilos concurrentes nunca obtienen IDs duplicados ni pierden escrituras"""
+        import threading
+
+        hilos, por_hilo = 8, 500
+        ids = [[] for _ in range(hilos)]
+
+        def trabajar(n):
+            for i in range(por_hilo):
+                tarea = storage.agregar_tarea(f'T{i}', 'D', f'usuario{n % 3}')
+                ids[n].append(tarea['id'])
+                if i % 5 == 0:
+                    storage.editar_tarea(tarea['id'], 'Editada', 'D')
+
+        threads = [threading.Thread(target=trabajar, args=(n,)) for n in range(hilos)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        todos = [i for lista in ids for i in lista]
+        self.assertEqual(len(set(todos)), hilos * por_hilo)
+        self.assertEqual(len(storage.tareas_storage), hilos * por_hilo)
+        total_usuarios = sum(len(storage.obtener_tareas_usuario(f'usuario{n}')) for n in range(3))
+        self.assertEqual(total_usuarios, hilos * por_hilo)
+
+    def test_instantanea_no_cambia_al_editar(self):
+        """Una lista ya obtenida no refleja ediciones posteriores"""
+        tarea = storage.agregar_tarea('Original', 'D', 'ana')
+        instantanea = storage.obtener_tareas_usuario('ana')
+        storage.editar_tarea(tarea['id'], 'Editada', 'D')
+        self.assertEqual(instantanea[0]['titulo'], 'Original')
+        self.assertEqual(storage.obtener_tarea_por_id(tarea['id'])['titulo'], 'Editada')
+
+
+class AlmacenSQLiteTests(TestCase):
+    """Pruebas del backend compartido entre procesos (SQLite en modo WAL)"""
+
+    def setUp(self):
+        import tempfile
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.ruta = f'{directorio.name}/tareas.sqlite3'
+        configuracion = self.settings(TAREAS_STORAGE={
+            'BACKEND': 'tareas.storage.sqlite.AlmacenSQLite',
+            'OPTIONS': {'ruta': self.ruta},
+        })
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+    def test_workers_comparten_datos(self):
+        """Una tarea creada por un worker es visible para otro"""
+        from tareas.storage.sqlite import AlmacenSQLite
+        otro_worker = AlmacenSQLite(ruta=self.ruta)
+
+        tarea = storage.agregar_tarea('Compartida', 'Descripción', 'ana')
+        self.assertEqual(otro_worker.obtener(tarea['id'])['titulo'], 'Compartida')
+        otro_worker.editar(tarea['id'], 'Editada', 'Otra')
+        self.assertEqual(storage.obtener_tarea_por_id(tarea['id'])['titulo'], 'Editada')
+        otro_worker.eliminar(tarea['id'])
+        self.assertIsNone(storage.obtener_tarea_por_id(tarea['id']))
+
+    def test_api_del_almacen(self):
+        """El backend SQLite respeta la misma API que el de memoria"""
+        t1 = storage.agregar_tarea('T1', 'D1', 'ana')
+        storage.agregar_tarea('T2', 'D2', 'luis')
+        t3 = storage.agregar_tarea('T3', 'D3', 'ana')
+        self.assertEqual(storage.obtener_tareas_usuario('ana'), [t1, t3])
+        self.assertIs(t1['completada'], False)
+        self.assertIsNone(storage.editar_tarea(999, 'X', 'Y'))
+        storage.tareas_storage.clear()
+        self.assertEqual(len(storage.tareas_storage), 0)
+        self.assertEqual(storage.agregar_tarea('T', 'D', 'ana')['id'], 1)
+
+    def test_clear_fallido_revierte(self):
+        """Si un DELETE de clear falla se revierte todo y la conexión queda usable"""
+        import sqlite3
+        from unittest import mock
+        from tareas.storage.sqlite import AlmacenSQLite
+        almacen = AlmacenSQLite(ruta=self.ruta)
+        almacen.agregar('T', 'D', 'ana')
+        con = almacen._conexion()
+
+        class FallaAlVaciarContadores:
+            def execute(self, sql, *argumentos):
+                if sql == 'DELETE FROM tareas_contadores':
+                    raise sqlite3.OperationalError('database is locked')
+                return con.execute(sql, *argumentos)
+
+        with mock.patch.object(almacen, '_conexion', return_value=FallaAlVaciarContadores()):
+            with self.assertRaises(sqlite3.OperationalError):
+                almacen.clear()
+        self.assertFalse(con.in_transaction)
+        self.assertEqual(len(almacen), 1)
+        self.assertEqual(almacen.contar_de_usuario('ana'), 1)
+        almacen.agregar('T2', 'D', 'ana')
+        almacen.cerrar()
+
+    def test_vistas_con_backend_sqlite(self):
+        """Las vistas funcionan sin cambios sobre el backend SQLite"""
+        User.objects.create_user(username='ana', password='pass123')
+        self.client.login(username='ana', password='pass123')
+        self.client.post(reverse('tareas:crear_tarea'), {
+            'titulo': 'Desde la vista',
+            'descripcion': 'Descripción'
+        })
+        response = self.client.get(reverse('tareas:lista_tareas'))
+        self.assertContains(response, 'Desde la vista')
+
+
+@override_settings(TAREAS_STORAGE={'BACKEND': 'tareas.storage.orm.AlmacenORM'})
+class AlmacenORMTests(TestCase):
+    """Pruebas del backend respaldado por el modelo Tarea"""
+
+    def setUp(self):
+        self.ana = User.objects.create_user(username='ana', password='pass123')
+        User.objects.create_user(username='luis', password='pass123')
+
+    def test_api_del_almacen(self):
+        """El backend ORM respeta la misma API que el de memoria"""
+        t1 = storage.agregar_tarea('T1', 'D1', 'ana')
+        storage.agregar_tarea('T2', 'D2', 'luis')
+        t3 = storage.agregar_tarea('T3', 'D3', 'ana')
+
+        self.assertEqual(storage.obtener_tareas_usuario('ana'), [t1, t3])
+        self.assertEqual(storage.editar_tarea(t1['id'], 'Editada', 'D')['titulo'], 'Editada')
+        self.assertIsNone(storage.editar_tarea(999, 'X', 'Y'))
+        storage.eliminar_tarea(t3['id'])
+        self.assertIsNone(storage.obtener_tarea_por_id(t3['id']))
+        self.assertTrue(Tarea.objects.filter(id=t1['id'], usuario=self.ana).exists())
+
+    def test_lista_no_cuenta_tareas(self):
+        """La lista lee una sola página de tareas y el total de ContadorTareas, sin COUNT"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        storage.agregar_tarea('Mi tarea', 'Descripción', 'ana')
+        self.client.login(username='ana', password='pass123')
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('tareas:lista_tareas'))
+        self.assertContains(response, 'Mi tarea')
+        self.assertEqual(response.context['total_tareas'], 1)
+        sql = [q['sql'] for q in consultas.captured_queries if 'tareas_tarea' in q['sql']]
+        self.assertEqual(len(sql), 1)
+        self.assertNotIn('COUNT', sql[0])
+
+    def test_indices_del_modelo(self):
+        """El modelo declara los índices por (usuario, id) y por completada"""
+        indices = {tuple(indice.fields) for indice in Tarea._meta.indexes}
+        self.assertIn(('usuario', 'id'), indices)
+        self.assertIn(('completada',), indices)
+
+
+class AlmacenDurableTests(TestCase):
+    """Pruebas del diario de escritura e instantáneas del almacén en memoria"""
+
+    def setUp(self):
+        import tempfile
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+
+    def abrir(self, **opciones):
+        from tareas.storage.durable import AlmacenDurable
+        almacen = AlmacenDurable(directorio=self.directorio, **opciones)
+        self.addCleanup(almacen.cerrar)
+        return almacen
+
+    def test_recupera_tras_reinicio(self):
+        """Un almacén nuevo sobre el mismo directorio recupera todas las escrituras"""
+        almacen = self.abrir()
+        t1 = almacen.agregar('T1', 'D1', 'ana')
+        t2 = almacen.agregar('T2', 'D2', 'ana')
+        editada = almacen.editar(t1['id'], 'Editada', 'D1')
+        almacen.eliminar(t2['id'])
+        almacen.cerrar()
+
+        recuperado = self.abrir()
+        self.assertEqual(recuperado.de_usuario('ana'), [dict(editada)])
+        # Los IDs no se reutilizan tras reiniciar
+        self.assertEqual(recuperado.agregar('T3', 'D3', 'ana')['id'], 3)
+
+    def test_instantanea_compacta_el_diario(self):
+        """La instantánea reemplaza a los segmentos anteriores y se combina con el resto del diario"""
+        import os
+        almacen = self.abrir()
+        for i in range(10):
+            almacen.agregar(f'T{i}', 'D', 'ana')
+        almacen.instantanea()
+        almacen.eliminar(1)
+        almacen.cerrar()
+
+        archivos = sorted(os.listdir(self.directorio))
+        self.assertEqual(archivos, ['diario-00000002.log', 'instantanea-00000002.jsonl'])
+        recuperado = self.abrir()
+        self.assertEqual([t['id'] for t in recuperado.de_usuario('ana')], list(range(2, 11)))
+
+    def test_instantanea_automatica(self):
+        """Se compacta en segundo plano al superar operaciones_por_instantanea"""
+        import os
+        import time
+        almacen = self.abrir(operaciones_por_instantanea=5)
+        for i in range(6):
+            almacen.agregar(f'T{i}', 'D', 'ana')
+        for _ in range(200):
+            if 'instantanea-00000002.jsonl' in os.listdir(self.directorio):
+                break
+            time.sleep(0.01)
+        almacen.instantanea()  # espera a que termine la que está en curso
+        almacen.cerrar()
+        self.assertEqual(len(self.abrir().todas()), 6)
+
+    def test_ignora_registro_incompleto_al_final(self):
+        """Una línea truncada por una caída al final del diario se descarta"""
+        almacen = self.abrir()
+        almacen.agregar('T1', 'D1', 'ana')
+        almacen.cerrar()
+        with open(f'{self.directorio}/diario-00000001.log', 'ab') as diario:
+            diario.write(b'["a",2,"T2"')
+
+        recuperado = self.abrir()
+        self.assertEqual(len(recuperado), 1)
+
+    def test_registro_incompleto_sobrevive_a_varios_reinicios(self):
+        """La línea truncada se recorta al recuperar y no rompe reinicios posteriores"""
+        import os
+        almacen = self.abrir()
+        almacen.agregar('T1', 'D1', 'ana')
+        almacen.cerrar()
+        ruta = f'{self.directorio}/diario-00000001.log'
+        tamano = os.path.getsize(ruta)
+        with open(ruta, 'ab') as diario:
+            diario.write(b'["a",2,"T2"')
+
+        primero = self.abrir()
+        self.assertEqual(os.path.getsize(ruta), tamano)
+        primero.agregar('T3', 'D3', 'ana')
+        primero.cerrar()
+
+        segundo = self.abrir()
+        self.assertEqual([t['titulo'] for t in segundo.de_usuario('ana')], ['T1', 'T3'])
+        segundo.cerrar()
+        self.assertEqual(len(self.abrir()), 2)
+
+
+class TareaCompactaTests(TestCase):
+    """Pruebas de la representación compacta de las tareas en memoria"""
+
+    def setUp(self):
+        storage.tareas_storage.clear()
+
+    def test_compatible_con_diccionarios(self):
+        """Las tareas se leen como dict y como objeto, y no tienen __dict__"""
+        tarea = storage.agregar_tarea('Título', 'Descripción', 'ana')
+        self.assertEqual(tarea['titulo'], tarea.titulo)
+        self.assertEqual(dict(tarea), {
+            'id': tarea.id,
+            'titulo': 'Título',
+            'descripcion': 'Descripción',
+            'usuario': 'ana',
+            'completada': False,
+            'creada': tarea.creada,
+            'actualizada': tarea.creada,
+        })
+        self.assertFalse(hasattr(tarea, '__dict__'))
+        with self.assertRaises(KeyError):
+            tarea['keys']
+
+    def test_usuarios_internados(self):
+        """Todas las tareas de un usuario comparten el mismo str de usuario"""
+        t1 = storage.agregar_tarea('T1', 'D', ''.join(['a', 'na']))
+        t2 = storage.agregar_tarea('T2', 'D', ''.join(['an', 'a']))
+        self.assertIs(t1.usuario, t2.usuario)
+
+    def test_plantilla_lee_atributos(self):
+        """Las plantillas siguen accediendo a tarea.titulo"""
+        from django.template import Context, Template
+        tarea = storage.agregar_tarea('Título visible', 'Descripción', 'ana')
+        html = Template('{{ tarea.titulo }}|{{ tarea.usuario }}').render(Context({'tarea': tarea}))
+        self.assertEqual(html, 'Título visible|ana')
+
+
+@override_settings(TAREAS_POR_PAGINA=2)
+class PaginacionTests(TestCase):
+    """Pruebas de la paginación por cursor de la lista de tareas"""
+
+    def setUp(self):
+        storage.tareas_storage.clear()
+        User.objects.create_user(username='ana', password='pass123')
+        self.client.login(username='ana', password='pass123')
+        self.ids = [storage.agregar_tarea(f'T{i}', 'D', 'ana')['id'] for i in range(5)]
+        storage.agregar_tarea('Ajena', 'D', 'luis')
+
+    def ids_de(self, response):
+        return [t['id'] for t in response.context['tareas']]
+
+    def test_recorre_todas_las_paginas(self):
+        """Siguiendo el cursor se recorren todas las tareas sin repetir"""
+        url = reverse('tareas:lista_tareas')
+        response = self.client.get(url)
+        self.assertEqual(self.ids_de(response), self.ids[:2])
+        self.assertEqual(response.context['total_tareas'], 5)
+
+        response = self.client.get(url, {'despues': response.context['siguiente']})
+        self.assertEqual(self.ids_de(response), self.ids[2:4])
+        response = self.client.get(url, {'despues': response.context['siguiente']})
+        self.assertEqual(self.ids_de(response), self.ids[4:])
+        self.assertIsNone(response.context['siguiente'])
+
+    def test_estable_ante_cambios_concurrentes(self):
+        """Insertar o eliminar tareas no desplaza la página siguiente"""
+        url = reverse('tareas:lista_tareas')
+        siguiente = self.client.get(url).context['siguiente']
+        storage.eliminar_tarea(self.ids[0])
+        storage.agregar_tarea('Nueva', 'D', 'ana')
+        response = self.client.get(url, {'despues': siguiente})
+        self.assertEqual(self.ids_de(response), self.ids[2:4])
+
+    def test_cursor_invalido(self):
+        """Un cursor que no es un número muestra la primera página"""
+        response = self.client.get(reverse('tareas:lista_tareas'), {'despues': 'x'})
+        self.assertEqual(self.ids_de(response), self.ids[:2])
+
+    def test_paginacion_en_todos_los_backends(self):
+        """Los backends SQLite y ORM paginan igual que el de memoria"""
+        import tempfile
+        from tareas.storage.orm import AlmacenORM
+        from tareas.storage.sqlite import AlmacenSQLite
+
+        User.objects.create_user(username='luis', password='pass123')
+        with tempfile.TemporaryDirectory() as directorio:
+            for almacen in (AlmacenSQLite(ruta=f'{directorio}/t.sqlite3'), AlmacenORM()):
+                ids = [almacen.agregar(f'T{i}', 'D', 'ana')['id'] for i in range(5)]
+                almacen.agregar('Ajena', 'D', 'luis')
+                pagina = almacen.pagina_de_usuario('ana', despues_de=ids[1], limite=2)
+                self.assertEqual([t['id'] for t in pagina], ids[2:4])
+                self.assertEqual(almacen.contar_de_usuario('ana'), 5)
+                almacen.cerrar()
+
+
+class BusquedaTests(TestCase):
+    """Pruebas de la búsqueda de texto completo"""
+
+    def setUp(self):
+        storage.tareas_storage.clear()
+
+    def cargar(self):
+        return {
+            'cancion': storage.agregar_tarea('Ensayar la canción', 'Guitarra y voz', 'ana'),
+            'compras': storage.agregar_tarea('Compras', 'Comprar pan y leche para la canción', 'ana'),
+            'informe': storage.agregar_tarea('Informe', 'Redactar el informe trimestral', 'ana'),
+            'ajena': storage.agregar_tarea('Canción ajena', 'De otro usuario', 'luis'),
+        }
+
+    def test_sin_tildes_con_prefijos_y_ranking(self):
+        """La búsqueda ignora tildes, acepta prefijos y prioriza el título"""
+        tareas = self.cargar()
+        resultado = storage.buscar_tareas_usuario('ana', 'CANCION')
+        self.assertEqual([t['id'] for t in resultado], [tareas['cancion']['id'], tareas['compras']['id']])
+        self.assertEqual(storage.buscar_tareas_usuario('ana', 'trimes'), [tareas['informe']])
+        self.assertEqual(storage.buscar_tareas_usuario('ana', 'canción leche'), [tareas['compras']])
+        self.assertEqual(storage.buscar_tareas_usuario('ana', 'inexistente'), [])
+
+    def test_indice_se_actualiza_en_cada_escritura(self):
+        """Editar o eliminar una tarea actualiza el índice ya construido"""
+        tareas = self.cargar()
+        storage.buscar_tareas_usuario('ana', 'informe')  # construye el índice
+        storage.editar_tarea(tareas['informe']['id'], 'Reporte', 'Redactar el reporte anual')
+        storage.eliminar_tarea(tareas['cancion']['id'])
+        nueva = storage.agregar_tarea('Informe nuevo', 'Otro', 'ana')
+
+        self.assertEqual(storage.buscar_tareas_usuario('ana', 'informe'), [nueva])
+        self.assertEqual([t['id'] for t in storage.buscar_tareas_usuario('ana', 'reporte')],
+                         [tareas['informe']['id']])
+        self.assertEqual([t['id'] for t in storage.buscar_tareas_usuario('ana', 'cancion')],
+                         [tareas['compras']['id']])
+
+    def test_busqueda_en_todos_los_backends(self):
+        """SQLite (FTS5) y ORM retornan los mismos resultados que memoria"""
+        import tempfile
+        from tareas.storage.orm import AlmacenORM
+        from tareas.storage.sqlite import AlmacenSQLite
+
+        User.objects.create_user(username='ana', password='pass123')
+        User.objects.create_user(username='luis', password='pass123')
+        with tempfile.TemporaryDirectory() as directorio:
+            for almacen in (AlmacenSQLite(ruta=f'{directorio}/t.sqlite3'), AlmacenORM()):
+                cancion = almacen.agregar('Ensayar la canción', 'Guitarra', 'ana')
+                compras = almacen.agregar('Compras', 'Pan para la cancion', 'ana')
+                almacen.agregar('Canción ajena', 'Otro', 'luis')
+                resultado = almacen.buscar_de_usuario('ana', 'canc')
+                self.assertEqual([t['id'] for t in resultado], [cancion['id'], compras['id']])
+                almacen.editar(cancion['id'], 'Ensayar', 'Guitarra')
+                self.assertEqual(almacen.buscar_de_usuario('ana', 'cancion'), [compras])
+                almacen.cerrar()
+
+    def test_sqlite_busca_con_fts(self):
+        """SQLite resuelve la búsqueda con una consulta MATCH sobre el índice FTS5, sin recorrer las tareas"""
+        import tempfile
+        from tareas.storage.sqlite import AlmacenSQLite
+
+        with tempfile.TemporaryDirectory() as directorio:
+            almacen = AlmacenSQLite(ruta=f'{directorio}/t.sqlite3')
+            tarea = almacen.agregar('Ensayar la canción', 'Guitarra', 'ana')
+            almacen.agregar('Compras', 'Pan', 'ana')
+            consultas = []
+            almacen._conexion().set_trace_callback(consultas.append)
+            self.assertEqual(almacen.buscar_de_usuario('ana', 'canc'), [tarea])
+            # Las lecturas internas de FTS5 se trazan con el prefijo '--'
+            sentencias = [consulta for consulta in consultas if not consulta.startswith('--')]
+            self.assertEqual(len(sentencias), 1)
+            self.assertIn('tareas_busqueda MATCH', sentencias[0])
+            almacen.cerrar()
+
+    def test_vista_de_busqueda(self):
+        """La vista solo muestra resultados del usuario autenticado"""
+        self.cargar()
+        User.objects.create_user(username='ana', password='pass123')
+        self.client.login(username='ana', password='pass123')
+        response = self.client.get(reverse('tareas:buscar_tareas'), {'q': 'cancion'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Ensayar la canción')
+        self.assertNotContains(response, 'Canción ajena')
+
+
+class APILotesTests(TestCase):
+    """Pruebas de la API JSON por lotes"""
+
+    def setUp(self):
+        storage.tareas_storage.clear()
+        User.objects.create_user(username='ana', password='pass123')
+        self.client.login(username='ana', password='pass123')
+
+    def post(self, nombre, datos):
+        return self.client.post(reverse(f'tareas:{nombre}'), json.dumps(datos),
+                                content_type='application/json')
+
+    def test_crear_lote_con_elemento_invalido(self):
+        """Los elementos válidos se crean aunque otro del lote sea inválido"""
+        response = self.post('api_crear_tareas', {'tareas': [
+            {'titulo': 'Uno', 'descripcion': 'Primera'},
+            {'titulo': '', 'descripcion': 'Sin título'},
+            {'titulo': 'Dos', 'descripcion': 'Segunda'},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        resultados = response.json()['resultados']
+        self.assertEqual([r['status'] for r in resultados], [201, 400, 201])
+        self.assertIn('titulo', resultados[1]['errores'])
+        self.assertEqual(resultados[2]['tarea']['usuario'], 'ana')
+        self.assertEqual([t['titulo'] for t in storage.obtener_tareas_usuario('ana')], ['Uno', 'Dos'])
+
+    def test_editar_y_eliminar_respetan_al_dueno(self):
+        """Las tareas ajenas dan 403 y las inexistentes 404, sin modificarse"""
+        propia = storage.agregar_tarea('Propia', 'Desc', 'ana')
+        ajena = storage.agregar_tarea('Ajena', 'Desc', 'luis')
+
+        response = self.post('api_editar_tareas', {'tareas': [
+            {'id': propia['id'], 'titulo': 'Editada', 'descripcion': 'Nueva'},
+            {'id': ajena['id'], 'titulo': 'Robada', 'descripcion': 'X'},
+            {'id': 999, 'titulo': 'Nada', 'descripcion': 'X'},
+            {'titulo': 'Sin ID', 'descripcion': 'X'},
+        ]})
+        self.assertEqual([r['status'] for r in response.json()['resultados']], [200, 403, 404, 400])
+        self.assertEqual(storage.obtener_tarea_por_id(propia['id'])['titulo'], 'Editada')
+        self.assertEqual(storage.obtener_tarea_por_id(ajena['id'])['titulo'], 'Ajena')
+
+        response = self.post('api_eliminar_tareas', {'ids': [ajena['id'], propia['id'], propia['id']]})
+        self.assertEqual([r['status'] for r in response.json()['resultados']], [403, 200, 404])
+        self.assertIsNone(storage.obtener_tarea_por_id(propia['id']))
+        self.assertIsNotNone(storage.obtener_tarea_por_id(ajena['id']))
+
+    def test_requests_invalidos(self):
+        """Sin sesión, JSON inválido, GET o lote demasiado grande"""
+        self.assertEqual(self.client.get(reverse('tareas:api_crear_tareas')).status_code, 405)
+        response = self.client.post(reverse('tareas:api_crear_tareas'), 'no es json',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post('api_eliminar_tareas', {'ids': 3}).status_code, 400)
+        with self.settings(TAREAS_API_MAX_LOTE=2):
+            self.assertEqual(self.post('api_eliminar_tareas', {'ids': [1, 2, 3]}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.post('api_eliminar_tareas', {'ids': [1]}).status_code, 401)
+
+    def test_aplicar_lote_en_todos_los_backends(self):
+        """Todos los backends retornan los mismos estados"""
+        import tempfile
+        from tareas.storage.base import NO_EXISTE, OK, SIN_PERMISO
+        from tareas.storage.durable import AlmacenDurable
+        from tareas.storage.orm import AlmacenORM
+        from tareas.storage.sqlite import AlmacenSQLite
+
+        User.objects.create_user(username='luis', password='pass123')
+        with tempfile.TemporaryDirectory() as directorio:
+            almacenes = [
+                storage.tareas_storage,
+                AlmacenDurable(directorio=directorio, sincronizar=False),
+                AlmacenSQLite(ruta=f'{directorio}/t.sqlite3'),
+                AlmacenORM(),
+            ]
+            for almacen in almacenes:
+                ajena = almacen.agregar('Ajena', 'Desc', 'luis')
+                propia = almacen.agregar('Propia', 'Desc', 'ana')
+                resultados = almacen.aplicar_lote('ana', [
+                    ('crear', 'Nueva', 'Desc'),
+                    ('editar', propia['id'], 'Editada', 'Desc'),
+                    ('editar', ajena['id'], 'Robada', 'Desc'),
+                    ('eliminar', propia['id']),
+                    ('eliminar', propia['id']),
+                ])
+                self.assertEqual([estado for estado, _ in resultados],
+                                 [OK, OK, SIN_PERMISO, OK, NO_EXISTE])
+                self.assertEqual(resultados[1][1]['titulo'], 'Editada')
+                self.assertEqual([t['titulo'] for t in almacen.de_usuario('ana')], ['Nueva'])
+                self.assertEqual(almacen.obtener(ajena['id'])['titulo'], 'Ajena')
+                almacen.cerrar()
+            # El lote quedó en el diario
+            recuperado = AlmacenDurable(directorio=directorio, sincronizar=False)
+            self.assertEqual([t['titulo'] for t in recuperado.de_usuario('ana')], ['Nueva'])
+            recuperado.cerrar()
+
+
+class ExportacionTests(TestCase):
+    """Pruebas de la exportación en streaming"""
+
+    def setUp(self):
+        storage.tareas_storage.clear()
+        User.objects.create_user(username='ana', password='pass123')
+        self.client.login(username='ana', password='pass123')
+        storage.agregar_tarea('Compras', 'Pan, leche y "queso"\nsegunda línea', 'ana')
+        storage.agregar_tarea('Canción', 'Ensayar', 'ana')
+        storage.agregar_tarea('Ajena', 'De otro usuario', 'luis')
+
+    def exportar(self, **parametros):
+        response = self.client.get(reverse('tareas:exportar_tareas'), parametros)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv(self):
+        import csv
+        import io
+        response, contenido = self.exportar(formato='csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="tareas-ana.csv"', response['Content-Disposition'])
+        filas = list(csv.reader(io.StringIO(contenido.decode())))
+        self.assertEqual(filas[0], ['id', 'titulo', 'descripcion', 'completada'])
+        self.assertEqual([fila[1] for fila in filas[1:]], ['Compras', 'Canción'])
+        self.assertEqual(filas[1][2], 'Pan, leche y "queso"\nsegunda línea')
+
+    def test_ndjson_comprimido(self):
+        import gzip
+        response, contenido = self.exportar(formato='ndjson', gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lineas = gzip.decompress(contenido).decode().splitlines()
+        self.assertEqual([json.loads(linea)['titulo'] for linea in lineas], ['Compras', 'Canción'])
+
+    def test_formato_desconocido(self):
+        response = self.client.get(reverse('tareas:exportar_tareas'), {'formato': 'xml'})
+        self.assertRedirects(response, reverse('tareas:lista_tareas'))
+
+    def test_iterador_por_bloques(self):
+        """El iterador recorre todas las tareas en orden pidiendo páginas"""
+        from unittest import mock
+        from tareas.exportacion import en_bloques
+        for i in range(7):
+            storage.agregar_tarea(f'Extra {i}', 'Desc', 'ana')
+        esperadas = [t['id'] for t in storage.obtener_tareas_usuario('ana')]
+        with mock.patch.object(storage.tareas_storage, 'pagina_de_usuario',
+                               wraps=storage.tareas_storage.pagina_de_usuario) as pagina:
+            iterador = storage.iterar_tareas_usuario('ana', tamano_bloque=3)
+            self.assertEqual([t['id'] for t in iterador], esperadas)
+        # 9 tareas: tres bloques completos y una última consulta vacía
+        self.assertEqual(pagina.call_count, 4)
+        self.assertEqual(list(en_bloques(['ab', 'cd', 'e'], tamano=4)), [b'abcd', b'e'])
+
+
+class ImportacionTests(TestCase):
+    """Pruebas de la importación masiva"""
+
+    def setUp(self):
+        storage.tareas_storage.clear()
+        User.objects.create_user(username='ana', password='pass123')
+        self.client.login(username='ana', password='pass123')
+
+    def subir(self, nombre, contenido, **datos):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return self.client.post(reverse('tareas:importar_tareas'),
+                                {'archivo': SimpleUploadedFile(nombre, contenido), **datos})
+
+    def test_csv_valido(self):
+        contenido = 'titulo,descripcion\nUno,"Con, coma"\nDos,"Dos\nlíneas"\n'.encode()
+        response = self.subir('tareas.csv', contenido)
+        self.assertRedirects(response, reverse('tareas:lista_tareas'))
+        tareas = storage.obtener_tareas_usuario('ana')
+        self.assertEqual([(t['titulo'], t['descripcion']) for t in tareas],
+                         [('Uno', 'Con, coma'), ('Dos', 'Dos\nlíneas')])
+
+    def test_errores_por_fila(self):
+        """Las filas inválidas se reportan con su número y el resto se importa"""
+        lineas = [
+            json.dumps({'titulo': 'Válida', 'descripcion': 'Ok'}),
+            json.dumps({'titulo': 'x' * 201, 'descripcion': 'Título largo'}),
+            'no es json',
+            json.dumps({'titulo': 'Sin descripción'}),
+        ]
+        response = self.subir('tareas.txt', '\n'.join(lineas).encode(), formato='ndjson')
+        self.assertEqual(response.status_code, 200)
+        resultado = response.context['resultado']
+        self.assertEqual((resultado.importadas, resultado.rechazadas), (1, 3))
+        self.assertEqual([fila for fila, _ in resultado.errores], [2, 3, 4])
+        self.assertIn('titulo', resultado.errores[0][1])
+        self.assertIn('descripcion', resultado.errores[2][1])
+        self.assertEqual([t['titulo'] for t in storage.obtener_tareas_usuario('ana')], ['Válida'])
+
+    def test_exportar_e_importar_gzip(self):
+        """Un archivo exportado con gzip se puede volver a importar"""
+        storage.agregar_tarea('Compras', 'Pan, leche', 'ana')
+        storage.agregar_tarea('Canción', 'Ensayar', 'ana')
+        response = self.client.get(reverse('tareas:exportar_tareas'), {'formato': 'csv', 'gzip': '1'})
+        exportado = b''.join(response.streaming_content)
+        self.subir('tareas-ana.csv.gz', exportado)
+        titulos = [t['titulo'] for t in storage.obtener_tareas_usuario('ana')]
+        self.assertEqual(titulos, ['Compras', 'Canción', 'Compras', 'Canción'])
+
+    def test_comando(self):
+        import tempfile
+        from io import StringIO
+        from django.core.management import CommandError, call_command
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8') as archivo:
+            archivo.write('titulo,descripcion\n' + ''.join(f'Tarea {i},Desc\n' for i in range(25)) + ',Sin título\n')
+            archivo.flush()
+            salida, errores = StringIO(), StringIO()
+            call_command('importar_tareas', 'ana', archivo.name, lote=10, stdout=salida, stderr=errores)
+            self.assertIn('25 tareas importadas, 1 rechazadas', salida.getvalue())
+            self.assertIn('Fila 27: titulo:', errores.getvalue())
+            self.assertEqual(storage.contar_tareas_usuario('ana'), 25)
+            with self.assertRaises(CommandError):
+                call_command('importar_tareas', 'nadie', archivo.name)
+
+
+class CacheListaTests(TestCase):
+    """Pruebas de la caché de fragmentos y los ETags de lista_tareas"""
+
+    def setUp(self):
+        storage.tareas_storage.clear()
+        User.objects.create_user(username='ana', password='pass123')
+        self.client.login(username='ana', password='pass123')
+        self.tarea = storage.agregar_tarea('Primera', 'Desc', 'ana')
+        self.url = reverse('tareas:lista_tareas')
+
+    def test_etag_y_304(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        # Otra página u otro usuario no comparten ETag
+        otra = self.client.get(self.url, {'despues': self.tarea['id']}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(otra.status_code, 200)
+
+    def test_escritura_invalida_exactamente(self):
+        """Tras cualquier escritura la página se vuelve a renderizar"""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url)
+        self.assertTemplateNotUsed(response, 'tareas/lista_tareas_contenido.html')
+        self.assertContains(response, 'Primera')
+
+        for escribir in (
+            lambda: storage.editar_tarea(self.tarea['id'], 'Editada', 'Desc'),
+            lambda: storage.agregar_tarea('Segunda', 'Desc', 'ana'),
+            lambda: storage.eliminar_tarea(self.tarea['id']),
+        ):
+            escribir()
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertTemplateUsed(response, 'tareas/lista_tareas_contenido.html')
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+        self.assertNotContains(response, 'Editada')
+        self.assertContains(response, 'Segunda')
+
+        # Las escrituras de otro usuario no invalidan esta lista
+        storage.agregar_tarea('Ajena', 'Desc', 'luis')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_mensajes_pendientes_sin_304(self):
+        """Con un mensaje pendiente la lista se renderiza aunque no haya cambios"""
+        etag = self.client.get(self.url)['ETag']
+        # Tarea inexistente: mensaje de error y redirect, sin escrituras
+        self.client.get(reverse('tareas:detalle_tarea', args=[999]))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'La tarea que buscas no existe.')
+        self.assertFalse(response.has_header('ETag'))
+        # Consumido el mensaje, vuelve el 304
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_versiones_de_los_backends(self):
+        """Las versiones cambian con cada escritura, entre instancias y tras vaciar"""
+        import tempfile
+        from tareas.storage.memoria import AlmacenMemoria
+        from tareas.storage.orm import AlmacenORM
+        from tareas.storage.sqlite import AlmacenSQLite
+
+        memoria = AlmacenMemoria()
+        vistas = {memoria.version_de_usuario('ana')}
+        tarea = memoria.agregar('T', 'D', 'ana')
+        vistas.add(memoria.version_de_usuario('ana'))
+        memoria.clear()
+        vistas.add(memoria.version_de_usuario('ana'))
+        self.assertEqual(len(vistas), 3)
+
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = f'{directorio}/t.sqlite3'
+            lector, escritor = AlmacenSQLite(ruta=ruta), AlmacenSQLite(ruta=ruta)
+            vistas = [lector.version_de_usuario('ana')]
+            tarea = escritor.agregar('T', 'D', 'ana')
+            vistas.append(lector.version_de_usuario('ana'))
+            escritor.editar(tarea['id'], 'T2', 'D')
+            vistas.append(lector.version_de_usuario('ana'))
+            escritor.clear()
+            vistas.append(lector.version_de_usuario('ana'))
+            self.assertEqual(len(set(vistas)), 4)
+            self.assertEqual(lector.version_de_usuario('luis'), vistas[0])
+            lector.cerrar()
+            escritor.cerrar()
+
+        self.assertIsNone(AlmacenORM().version_de_usuario('ana'))
+
+
+@override_settings(ROOT_URLCONF='gestor_tareas.urls_async')
+class VistasAsyncTests(TestCase):
+    """Pruebas de las vistas async (despliegue ASGI)"""
+
+    def setUp(self):
+        storage.tareas_storage.clear()
+        User.objects.create_user(username='ana', password='pass123')
+        User.objects.create_user(username='luis', password='pass123')
+
+    async def test_flujo_completo(self):
+        await self.async_client.alogin(username='ana', password='pass123')
+        response = await self.async_client.post(reverse('tareas:crear_tarea'),
+                                                {'titulo': 'Async', 'descripcion': 'Desc'})
+        self.assertRedirects(response, reverse('tareas:lista_tareas'), fetch_redirect_response=False)
+        tarea = (await storage.aobtener_pagina_usuario('ana'))[0][0]
+
+        response = await self.async_client.get(reverse('tareas:lista_tareas'))
+        self.assertContains(response, 'Async')
+        self.assertContains(response, 'ha sido creada exitosamente')
+        self.assertFalse(response.has_header('ETag'))
+        etag = (await self.async_client.get(reverse('tareas:lista_tareas')))['ETag']
+        response = await self.async_client.get(reverse('tareas:lista_tareas'), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        await self.async_client.post(reverse('tareas:editar_tarea', args=[tarea['id']]),
+                                     {'titulo': 'Editada', 'descripcion': 'Nueva'})
+        response = await self.async_client.get(reverse('tareas:detalle_tarea', args=[tarea['id']]))
+        self.assertContains(response, 'Editada')
+        response = await self.async_client.get(reverse('tareas:buscar_tareas'), {'q': 'edit'})
+        self.assertContains(response, 'Editada')
+
+        await self.async_client.post(reverse('tareas:eliminar_tarea', args=[tarea['id']]))
+        self.assertIsNone(await storage.aobtener_tarea_por_id(tarea['id']))
+
+    async def test_permisos_y_login(self):
+        ajena = await storage.aagregar_tarea('Ajena', 'Desc', 'luis')
+        response = await self.async_client.get(reverse('tareas:lista_tareas'))
+        self.assertRedirects(response, f"{reverse('tareas:login')}?next={reverse('tareas:lista_tareas')}",
+                             fetch_redirect_response=False)
+
+        await self.async_client.alogin(username='ana', password='pass123')
+        for nombre in ('detalle_tarea', 'editar_tarea', 'eliminar_tarea'):
+            response = await self.async_client.post(reverse(f'tareas:{nombre}', args=[ajena['id']]),
+                                                    {'titulo': 'Robada', 'descripcion': 'X'})
+            self.assertRedirects(response, reverse('tareas:lista_tareas'), fetch_redirect_response=False)
+        tarea = await storage.aobtener_tarea_por_id(ajena['id'])
+        self.assertEqual(tarea['titulo'], 'Ajena')
+
+    async def test_exportacion_async(self):
+        import gzip
+        for i in range(5):
+            await storage.aagregar_tarea(f'Tarea {i}', 'Desc', 'ana')
+        await self.async_client.alogin(username='ana', password='pass123')
+        response = await self.async_client.get(reverse('tareas:exportar_tareas'), {'formato': 'csv', 'gzip': '1'})
+        self.assertTrue(response.is_async)
+        contenido = b''.join([bloque async for bloque in response.streaming_content])
+        lineas = gzip.decompress(contenido).decode().splitlines()
+        self.assertEqual(lineas[0], 'id,titulo,descripcion,completada')
+        self.assertEqual(len(lineas), 6)
+
+    def test_settings_asgi(self):
+        """asgi.py carga settings_asgi: los mismos settings con las rutas async, sin depender del entorno"""
+        import importlib
+        from gestor_tareas import settings as base
+        modulo = importlib.import_module('gestor_tareas.settings_asgi')
+        self.assertEqual(modulo.ROOT_URLCONF, 'gestor_tareas.urls_async')
+        self.assertEqual(base.ROOT_URLCONF, 'gestor_tareas.urls')
+        self.assertEqual(modulo.MIDDLEWARE, base.MIDDLEWARE)
+
+    async def test_memoria_no_espera_en_el_loop(self):
+        """
+        El backend en memoria lee en el event loop solo si no tiene que
+        esperar un lock; las escrituras van a un hilo no compartido
+        """
+        import asyncio
+        import tempfile
+        import threading
+        from unittest import mock
+        from tareas.storage.sqlite import AlmacenSQLite
+        from tareas.storage import base
+
+        tarea = await storage.aagregar_tarea('T', 'D', 'ana')
+        with mock.patch.object(base, 'sync_to_async', wraps=base.sync_to_async) as en_hilo:
+            await storage.aobtener_tarea_por_id(tarea['id'])
+            await storage.aobtener_pagina_usuario('ana')
+            await storage.acontar_tareas_usuario('ana')
+            await storage.aversion_tareas_usuario('ana')
+            self.assertEqual(en_hilo.call_count, 0)
+
+            await storage.aeditar_tarea(tarea['id'], 'T2', 'D')
+            en_hilo.assert_called_once_with(mock.ANY, thread_sensitive=False)
+
+            # Con la franja tomada por otro hilo, la lectura espera en un hilo
+            franja = storage.tareas_storage._franja('ana')
+            tomada, soltar = threading.Event(), threading.Event()
+
+            def sostener():
+                with franja:
+                    tomada.set()
+                    soltar.wait()
+
+            hilo = threading.Thread(target=sostener)
+            hilo.start()
+            tomada.wait()
+            en_hilo.reset_mock()
+            lectura = asyncio.ensure_future(storage.aobtener_pagina_usuario('ana'))
+            await asyncio.sleep(0.05)
+            self.assertFalse(lectura.done())
+            soltar.set()
+            tareas, _ = await lectura
+            hilo.join()
+            self.assertEqual(tareas[0]['titulo'], 'T2')
+            en_hilo.assert_called_once_with(mock.ANY, thread_sensitive=False)
+
+            with tempfile.TemporaryDirectory() as directorio:
+                almacen = AlmacenSQLite(ruta=f'{directorio}/t.sqlite3')
+                tarea = await almacen.aagregar('T', 'D', 'ana')
+                self.assertEqual((await almacen.aobtener(tarea['id']))['titulo'], 'T')
+                en_hilo.assert_called_with(mock.ANY, thread_sensitive=False)
+                almacen.cerrar()
+
+
+class MetricasTests(TestCase):
+    """Pruebas del middleware de métricas y de /metrics"""
+
+    def setUp(self):
+        storage.tareas_storage.clear()
+        self.user = User.objects.create_user(username='ana', password='pass123')
+        self.client.login(username='ana', password='pass123')
+
+    def _metricas(self):
+        response = self.client.get(reverse('tareas:metricas'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        return response.content.decode()
+
+    def _valor(self, texto, serie):
+        for linea in texto.splitlines():
+            if linea.startswith(serie + ' '):
+                return float(linea.rsplit(' ', 1)[1])
+        return 0
+
+    def test_histograma(self):
+        from tareas.metricas import Histograma
+        histograma = Histograma('prueba_segundos', 'Prueba.', ('vista',), (0.1, 1))
+        histograma.observar(('a',), 0.05)
+        histograma.observar(('a',), 0.1)
+        histograma.observar(('a',), 3)
+        lineas = histograma.exportar().splitlines()
+        self.assertEqual(lineas[:2], ['# HELP prueba_segundos Prueba.', '# TYPE prueba_segundos histogram'])
+        self.assertEqual(lineas[2:], [
+            'prueba_segundos_bucket{vista="a",le="0.1"} 2',
+            'prueba_segundos_bucket{vista="a",le="1"} 2',
+            'prueba_segundos_bucket{vista="a",le="+Inf"} 3',
+            'prueba_segundos_sum{vista="a"} 3.15',
+            'prueba_segundos_count{vista="a"} 3',
+        ])
+
+    def test_suma_las_porciones_de_todos_los_hilos(self):
+        import threading
+        from tareas.metricas import Histograma
+        histograma = Histograma('prueba', 'Prueba.', ('vista',), (1,))
+
+        def observar():
+            for _ in range(1000):
+                histograma.observar(('"x"\n',), 0.5)
+
+        hilos = [threading.Thread(target=observar) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertIn('prueba_count{vista="\\"x\\"\\n"} 4000', histograma.exportar())
+
+    def test_hilos_terminados_no_dejan_porciones(self):
+        """La porción de un hilo que termina se suma al total y se suelta"""
+        import threading
+        from tareas.metricas import Contador, Histograma
+        contador = Contador('prueba_total', 'Prueba.', ('tipo',))
+        histograma = Histograma('prueba', 'Prueba.', (), (1,))
+
+        def registrar():
+            contador.incrementar(('a',))
+            histograma.observar((), 2)
+
+        registrar()
+        for _ in range(50):
+            hilo = threading.Thread(target=registrar)
+            hilo.start()
+            hilo.join()
+        self.assertEqual(len(contador._porciones), 1)
+        self.assertEqual(len(histograma._porciones), 1)
+        self.assertEqual(contador.valores(), {('a',): 51})
+        self.assertEqual(histograma.valores(), {(): [0, 51, 102]})
+
+    def test_requests_por_vista(self):
+        serie = 'tareas_vista_duracion_segundos_count{vista="tareas:lista_tareas",metodo="GET",estado="200"}'
+        antes = self._valor(self._metricas(), serie)
+        self.client.get(reverse('tareas:lista_tareas'))
+        self.client.get(reverse('tareas:lista_tareas'))
+        self.client.get('/no-existe/')
+        texto = self._metricas()
+        self.assertEqual(self._valor(texto, serie), antes + 2)
+        self.assertIn('vista="<sin_ruta>",metodo="GET",estado="404"', texto)
+        self.assertIn('tareas_respuesta_tamano_bytes_count{vista="tareas:lista_tareas"}', texto)
+
+    def test_operaciones_del_storage(self):
+        serie = 'tareas_storage_duracion_segundos_count{operacion="agregar_tarea"}'
+        antes = self._valor(self._metricas(), serie)
+        for i in range(3):
+            storage.agregar_tarea(f'T{i}', 'D', 'ana')
+        self.assertEqual(self._valor(self._metricas(), serie), antes + 3)
+
+    async def test_middleware_async(self):
+        """Bajo ASGI el middleware mide sin pasar por un hilo"""
+        await storage.aagregar_tarea('T', 'D', 'ana')
+        await self.async_client.get(reverse('tareas:metricas'))
+        texto = (await self.async_client.get(reverse('tareas:metricas'))).content.decode()
+        self.assertIn('tareas_storage_duracion_segundos_count{operacion="aagregar_tarea"}', texto)
+        self.assertIn('{vista="tareas:metricas",metodo="GET",estado="200"}', texto)
+
+    @override_settings(TAREAS_METRICAS_IPS=['10.0.0.1'])
+    def test_solo_ips_permitidas(self):
+        response = self.client.get(reverse('tareas:metricas'))
+        self.assertEqual(response.status_code, 403)
+
+
+class SesionRapidaTests(TestCase):
+    """Pruebas de las sesiones en caché y la caché de usuarios"""
+
+    def setUp(self):
+        storage.tareas_storage.clear()
+        self.user = User.objects.create_user(username='ana', password='pass123')
+        self.client.login(username='ana', password='pass123')
+        self.tarea = storage.agregar_tarea('Tarea', 'Descripción', 'ana')
+
+    def test_lista_tibia_sin_consultas(self):
+        url = reverse('tareas:lista_tareas')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Tarea')
+
+    def test_detalle_tibio_sin_consultas(self):
+        url = reverse('tareas:detalle_tarea', args=[self.tarea['id']])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Descripción')
+
+    def test_cambio_de_contrasena_cierra_la_sesion(self):
+        url = reverse('tareas:lista_tareas')
+        self.client.get(url)
+        self.user.set_password('otra-clave-456')
+        self.user.save()
+        response = self.client.get(url)
+        self.assertRedirects(response, f"{reverse('tareas:login')}?next={url}", fetch_redirect_response=False)
+
+    def test_logout_invalida_el_usuario(self):
+        from tareas.autenticacion import usuarios_en_cache
+        self.client.get(reverse('tareas:lista_tareas'))
+        self.assertIsNotNone(usuarios_en_cache.obtener(self.user.pk))
+        self.client.post(reverse('tareas:logout'))
+        self.assertIsNone(usuarios_en_cache.obtener(self.user.pk))
+
+    @override_settings(TAREAS_CACHE_USUARIOS_TTL=0)
+    def test_ttl_vencido_consulta_la_base(self):
+        url = reverse('tareas:lista_tareas')
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+    def test_cache_compartida_entre_workers(self):
+        """La caché vive en SESSION_CACHE_ALIAS: lo que invalida un worker deja de verse en los demás"""
+        from tareas.autenticacion import CacheUsuarios
+        worker1, worker2 = CacheUsuarios(), CacheUsuarios()
+        worker1.guardar(self.user)
+        self.assertEqual(worker2.obtener(self.user.pk).username, 'ana')
+        self.assertIsNot(worker2.obtener(self.user.pk), worker2.obtener(self.user.pk))
+        worker2.invalidar(self.user.pk)
+        self.assertIsNone(worker1.obtener(self.user.pk))
+
+    def test_check_caches_por_worker(self):
+        """Con varios workers, sesiones o usuarios en LocMemCache son un error de configuración"""
+        from django.conf import settings
+        from tareas.checks import revisar_caches_por_worker
+        self.assertEqual(revisar_caches_por_worker(None), [])
+        with self.settings(TAREAS_WORKERS=4):
+            self.assertEqual([error.id for error in revisar_caches_por_worker(None)], ['tareas.E001'] * 2)
+        with self.settings(TAREAS_WORKERS=4, SESSION_ENGINE='django.contrib.sessions.backends.db',
+                           TAREAS_CACHE_USUARIOS_TTL=0):
+            self.assertEqual(revisar_caches_por_worker(None), [])
+        compartida = {**settings.CACHES, 'sesiones': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/sesiones'}}
+        with self.settings(TAREAS_WORKERS=4, CACHES=compartida):
+            self.assertEqual(revisar_caches_por_worker(None), [])
+
+
+class CalentamientoTests(TestCase):
+    """Pruebas del calentamiento de workers"""
+
+    def test_compila_todas_las_plantillas(self):
+        from django.template import engines
+        from tareas.calentamiento import calentar
+        cargador = engines['django'].engine.template_loaders[0]
+        cargador.reset()
+        resultados = calentar()
+        self.assertEqual(set(resultados), {'urls', 'plantillas', 'storage', 'hashing'})
+        self.assertIn('tareas/lista_tareas_contenido.html', cargador.get_template_cache)
+        self.assertEqual(resultados['plantillas'][0], len(cargador.get_template_cache))
+
+    def test_carga_el_storage(self):
+        from django.utils.functional import empty
+        from tareas.calentamiento import calentar_storage
+        storage.tareas_storage._wrapped = empty
+        calentar_storage()
+        self.assertIsNot(storage.tareas_storage._wrapped, empty)
+
+    def test_comando(self):
+        from io import StringIO
+        from django.core.management import call_command
+        salida = StringIO()
+        call_command('calentar', stdout=salida)
+        self.assertIn('plantillas', salida.getvalue())
+        self.assertIn('Calentamiento completo', salida.getvalue())
+
+    def test_gancho_segun_setting(self):
+        from unittest import mock
+        from tareas import calentamiento
+        with mock.patch.object(calentamiento, 'calentar', return_value={}) as calentar:
+            with override_settings(TAREAS_CALENTAR_AL_INICIAR=False):
+                calentamiento.al_iniciar_worker()
+            calentar.assert_not_called()
+            with override_settings(TAREAS_CALENTAR_AL_INICIAR=True):
+                calentamiento.al_iniciar_worker()
+            calentar.assert_called_once()
+
+
+class ContrasenasTests(TestCase):
+    """Pruebas del hash de contraseñas en el pool de procesos"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='pass123')
+
+    def test_compatible_con_pbkdf2_de_django(self):
+        from unittest import mock
+        from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+        from tareas.contrasenas import pool_hashing
+        with mock.patch.object(pool_hashing, 'pbkdf2', wraps=pool_hashing.pbkdf2) as pbkdf2:
+            encoded = make_password('secreta')
+            self.assertTrue(encoded.startswith('pbkdf2_sha256$'))
+            self.assertTrue(PBKDF2PasswordHasher().verify('secreta', encoded))
+            self.assertTrue(check_password('secreta', PBKDF2PasswordHasher().encode('secreta', 'sal')))
+            self.assertFalse(check_password('otra', encoded))
+            self.assertEqual(pbkdf2.call_count, 3)
+
+    @override_settings(TAREAS_HASH_MAX_PENDIENTES=0)
+    def test_saturado_responde_503(self):
+        response = self.client.post(reverse('tareas:login'), {'username': 'ana', 'password': 'pass123'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        response = self.client.post(reverse('tareas:registro'), {
+            'username': 'nuevo', 'email': 'nuevo@example.com',
+            'password1': 'clave-segura-123', 'password2': 'clave-segura-123',
+        })
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(User.objects.filter(username='nuevo').exists())
+
+    def test_saturado_en_vistas_de_django(self):
+        """El middleware cubre también las vistas que no son de la app, como el login del admin"""
+        User.objects.create_superuser(username='admin', password='clave-admin-123')
+        with self.settings(TAREAS_HASH_MAX_PENDIENTES=0):
+            response = self.client.post(reverse('admin:login'), {'username': 'admin', 'password': 'clave-admin-123'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    @override_settings(ROOT_URLCONF='gestor_tareas.urls_async', TAREAS_HASH_MAX_PENDIENTES=0)
+    async def test_saturado_async(self):
+        response = await self.async_client.post(reverse('tareas:login'), {'username': 'ana', 'password': 'pass123'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    @override_settings(ROOT_URLCONF='gestor_tareas.urls_async')
+    async def test_login_async_sin_hilos(self):
+        """El hash se espera sin bloquear el loop (acheck_password de Django lo calcula en él)"""
+        from unittest import mock
+        from django.contrib.auth import hashers
+        with mock.patch.object(hashers, 'verify_password', wraps=hashers.verify_password) as en_loop:
+            response = await self.async_client.post(reverse('tareas:login'),
+                                                    {'username': 'ana', 'password': 'incorrecta'})
+            self.assertEqual(response.status_code, 200)
+            response = await self.async_client.post(reverse('tareas:login'),
+                                                    {'username': 'ana', 'password': 'pass123'})
+            self.assertRedirects(response, reverse('tareas:lista_tareas'), fetch_redirect_response=False)
+            en_loop.assert_not_called()
+        response = await self.async_client.get(reverse('tareas:lista_tareas'))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(ROOT_URLCONF='gestor_tareas.urls_async')
+    async def test_registro_async(self):
+        response = await self.async_client.post(reverse('tareas:registro'), {
+            'username': 'nuevo', 'email': 'nuevo@example.com',
+            'password1': 'clave-segura-123', 'password2': 'clave-segura-123',
+        })
+        self.assertRedirects(response, reverse('tareas:lista_tareas'), fetch_redirect_response=False)
+        nuevo = await User.objects.aget(username='nuevo')
+        self.assertEqual(nuevo.email, 'nuevo@example.com')
+        self.assertTrue(await nuevo.acheck_password('clave-segura-123'))
+
+
+class MarcarTareasTests(TestCase):
+    """Pruebas de marcar tareas como completadas y de los contadores por usuario"""
+
+    def setUp(self):
+        storage.tareas_storage.clear()
+        User.objects.create_user(username='ana', password='pass123')
+        User.objects.create_user(username='luis', password='pass123')
+        self.client.login(username='ana', password='pass123')
+
+    def ejercitar(self, almacen):
+        """Altas, ediciones, marcas y bajas; los contadores deben coincidir con recorrer las tareas"""
+        tareas = [almacen.agregar(f'T{i}', 'D', 'ana') for i in range(6)]
+        almacen.agregar('Ajena', 'D', 'luis')
+        almacen.marcar(tareas[0]['id'], True)
+        almacen.marcar(tareas[0]['id'], True)
+        almacen.editar(tareas[0]['id'], 'Editada', 'D')
+        resultados = almacen.aplicar_lote('ana', [
+            ('marcar', tareas[1]['id'], True), ('marcar', tareas[2]['id'], True),
+            ('marcar', 999, True), ('crear', 'Nueva', 'D'), ('eliminar', tareas[2]['id']),
+        ])
+        self.assertEqual([estado for estado, _ in resultados], ['ok', 'ok', 'no_existe', 'ok', 'ok'])
+        self.assertIs(resultados[0][1]['completada'], True)
+        almacen.marcar(tareas[1]['id'], False)
+        almacen.marcar(tareas[0]['id'], True)
+        almacen.eliminar(tareas[3]['id'])
+        self.assertIsNone(almacen.marcar(999, True))
+
+        esperado = {'total': 5, 'completadas': 1, 'pendientes': 4}
+        self.assertEqual(almacen.estadisticas_de_usuario('ana'), esperado)
+        completadas = sum(1 for t in almacen.de_usuario('ana') if t['completada'])
+        self.assertEqual(completadas, 1)
+        self.assertEqual(almacen.estadisticas_de_usuario('luis'), {'total': 1, 'completadas': 0, 'pendientes': 1})
+        self.assertEqual(almacen.estadisticas_de_usuario('nadie'), {'total': 0, 'completadas': 0, 'pendientes': 0})
+
+    def test_contadores_en_memoria(self):
+        from tareas.storage.memoria import AlmacenMemoria
+        almacen = AlmacenMemoria()
+        self.ejercitar(almacen)
+        almacen.clear()
+        self.assertEqual(almacen.estadisticas_de_usuario('ana')['total'], 0)
+
+    def test_contadores_durable_tras_reiniciar(self):
+        """El diario reaplica las marcas y reconstruye los contadores"""
+        import tempfile
+        from tareas.storage.durable import AlmacenDurable
+        with tempfile.TemporaryDirectory() as directorio:
+            almacen = AlmacenDurable(directorio=directorio, sincronizar=False)
+            self.ejercitar(almacen)
+            almacen.cerrar()
+            reabierto = AlmacenDurable(directorio=directorio, sincronizar=False)
+            self.assertEqual(reabierto.estadisticas_de_usuario('ana')['completadas'], 1)
+            self.assertEqual(reabierto.estadisticas_de_usuario('ana')['total'], 5)
+            reabierto.cerrar()
+
+    def test_contadores_sqlite(self):
+        """Los triggers mantienen los contadores y una base anterior a ellos se completa al abrirla"""
+        import sqlite3
+        import tempfile
+        from tareas.storage.sqlite import AlmacenSQLite
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = f'{directorio}/tareas.sqlite3'
+            almacen = AlmacenSQLite(ruta=ruta)
+            self.ejercitar(almacen)
+            almacen.cerrar()
+            con = sqlite3.connect(ruta)
+            con.executescript('DROP TABLE tareas_contadores; DROP TRIGGER tareas_contadores_ai;'
+                               'DROP TRIGGER tareas_contadores_au; DROP TRIGGER tareas_contadores_ad;')
+            con.close()
+            reabierto = AlmacenSQLite(ruta=ruta)
+            self.assertEqual(reabierto.estadisticas_de_usuario('ana'), {'total': 5, 'completadas': 1, 'pendientes': 4})
+            reabierto.cerrar()
+
+    def test_contadores_orm(self):
+        from tareas.models import ContadorTareas
+        from tareas.storage.orm import AlmacenORM
+        almacen = AlmacenORM()
+        self.ejercitar(almacen)
+        with self.assertNumQueries(1):
+            almacen.estadisticas_de_usuario('ana')
+        almacen.clear()
+        self.assertFalse(ContadorTareas.objects.exists())
+
+    def test_marcar_desde_la_lista(self):
+        tarea = storage.agregar_tarea('Mi tarea', 'D', 'ana')
+        response = self.client.post(reverse('tareas:marcar_tarea', args=[tarea['id']]), {'completada': '1'},
+                                    follow=True)
+        self.assertRedirects(response, reverse('tareas:lista_tareas'))
+        self.assertIs(storage.obtener_tarea_por_id(tarea['id'])['completada'], True)
+        self.assertEqual(response.context['tareas_completadas'], 1)
+        self.assertEqual(response.context['tareas_pendientes'], 0)
+        self.assertContains(response, 'quedó completada')
+
+        response = self.client.post(reverse('tareas:marcar_tarea', args=[tarea['id']]),
+                                    {'completada': '0', 'volver': 'detalle'})
+        self.assertRedirects(response, reverse('tareas:detalle_tarea', args=[tarea['id']]))
+        self.assertIs(storage.obtener_tarea_por_id(tarea['id'])['completada'], False)
+
+    def test_marcar_requiere_post_y_permiso(self):
+        ajena = storage.agregar_tarea('Ajena', 'D', 'luis')
+        url = reverse('tareas:marcar_tarea', args=[ajena['id']])
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.client.post(url, {'completada': '1'})
+        self.assertIs(storage.obtener_tarea_por_id(ajena['id'])['completada'], False)
+
+    def test_marcar_varias(self):
+        """Las tareas ajenas o inexistentes del lote se ignoran"""
+        propias = [storage.agregar_tarea(f'T{i}', 'D', 'ana') for i in range(3)]
+        ajena = storage.agregar_tarea('Ajena', 'D', 'luis')
+        ids = [propias[0]['id'], propias[2]['id'], ajena['id'], 999, 'x']
+        response = self.client.post(reverse('tareas:marcar_tareas'), {'ids': ids, 'completada': '1'}, follow=True)
+        self.assertContains(response, 'Tareas marcadas como completada: 2.')
+        self.assertEqual(storage.estadisticas_tareas_usuario('ana'), {'total': 3, 'completadas': 2, 'pendientes': 1})
+        self.assertIs(storage.obtener_tarea_por_id(ajena['id'])['completada'], False)
+
+        response = self.client.post(reverse('tareas:marcar_tareas'), {'completada': '1'}, follow=True)
+        self.assertContains(response, 'No seleccionaste ninguna tarea.')
+
+    def test_api_marcar(self):
+        import json
+        tarea = storage.agregar_tarea('T', 'D', 'ana')
+        url = reverse('tareas:api_marcar_tareas')
+        response = self.client.post(url, json.dumps({'ids': [tarea['id'], 999, 'x'], 'completada': True}),
+                                    content_type='application/json')
+        self.assertEqual([r['status'] for r in response.json()['resultados']], [200, 404, 400])
+        self.assertIs(response.json()['resultados'][0]['tarea']['completada'], True)
+        response = self.client.post(url, json.dumps({'ids': [tarea['id']]}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(ROOT_URLCONF='gestor_tareas.urls_async')
+    async def test_marcar_async(self):
+        await self.async_client.alogin(username='ana', password='pass123')
+        tareas = [await storage.aagregar_tarea(f'T{i}', 'D', 'ana') for i in range(2)]
+        response = await self.async_client.post(reverse('tareas:marcar_tareas'),
+                                                {'ids': [t['id'] for t in tareas], 'completada': '1'})
+        self.assertRedirects(response, reverse('tareas:lista_tareas'), fetch_redirect_response=False)
+        response = await self.async_client.post(reverse('tareas:marcar_tarea', args=[tareas[0]['id']]),
+                                                {'completada': '0'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(await storage.aestadisticas_tareas_usuario('ana'),
+                         {'total': 2, 'completadas': 1, 'pendientes': 1})
+
+
+class CambiosTests(TestCase):
+    """Pruebas del feed de cambios por usuario y de sus vistas SSE"""
+
+    def setUp(self):
+        from tareas.cambios import FeedCambios
+        storage.tareas_storage.clear()
+        User.objects.create_user(username='ana', password='pass123')
+        self.client.login(username='ana', password='pass123')
+        self.feed = FeedCambios(tamano_historial=4, max_usuarios=2, max_conexiones=10)
+
+    def test_historial_acotado(self):
+        """Un cursor anterior a lo que el historial conserva pide recargar"""
+        from tareas.cambios import RECARGAR
+        cursor = self.feed.ultimo_id('ana')
+        for i in range(3):
+            self.feed.publicar('ana', [('crear', {'id': i})])
+        self.assertEqual([tarea['id'] for _, _, tarea in self.feed.pendientes('ana', cursor)], [0, 1, 2])
+        medio = self.feed.ultimo_id('ana')
+        for i in range(3, 6):
+            self.feed.publicar('ana', [('crear', {'id': i})])
+        self.assertEqual(self.feed.pendientes('ana', cursor), RECARGAR)
+        self.assertEqual([tarea['id'] for _, _, tarea in self.feed.pendientes('ana', medio)], [3, 4, 5])
+        # Un lote más grande que el historial es un único recargar
+        antes = self.feed.ultimo_id('ana')
+        self.feed.publicar('ana', [('crear', {'id': i}) for i in range(10)])
+        self.assertEqual([tipo for _, tipo, _ in self.feed.pendientes('ana', antes)], [RECARGAR])
+        self.assertIsNone(self.feed.propio('otraepoca-3'))
+
+    def test_lru_no_descarta_usuarios_conectados(self):
+        suscripcion = self.feed.suscribir('ana', None)
+        self.feed.publicar('luis', [('crear', {'id': 1})])
+        self.feed.publicar('eva', [('crear', {'id': 2})])
+        self.assertIn('ana', self.feed._historiales)
+        self.assertNotIn('luis', self.feed._historiales)
+        suscripcion.cerrar()
+        self.assertEqual(self.feed.conexiones, 0)
+
+    def test_storage_publica_escrituras(self):
+        from tareas.cambios import feed_cambios
+        cursor = feed_cambios.ultimo_id('ana')
+        tarea = storage.agregar_tarea('T', 'D', 'ana')
+        storage.marcar_tarea(tarea['id'], True)
+        storage.aplicar_lote_usuario('ana', [('crear', 'T2', 'D'), ('eliminar', 999)])
+        storage.eliminar_tarea(tarea['id'])
+        eventos = feed_cambios.pendientes('ana', cursor)
+        self.assertEqual([tipo for _, tipo, _ in eventos], ['crear', 'editar', 'crear', 'eliminar'])
+        self.assertIs(eventos[1][2]['completada'], True)
+
+    def test_marcar_sin_cambios_no_publica(self):
+        from tareas.cambios import feed_cambios
+        tarea = storage.agregar_tarea('T', 'D', 'ana')
+        cursor = feed_cambios.ultimo_id('ana')
+        storage.marcar_tarea(tarea['id'], False)
+        storage.marcar_tareas_usuario('ana', [tarea['id']], False)
+        self.assertEqual(feed_cambios.pendientes('ana', cursor), [])
+
+    def test_publica_dentro_de_la_seccion_critica(self):
+        """El evento sale con el lock de la escritura tomado (el feed respeta el orden) y ya confirmado"""
+        import tempfile
+        import threading
+        from tareas.storage.durable import AlmacenDurable
+        from tareas.storage.memoria import AlmacenMemoria
+        from tareas.storage.sqlite import AlmacenSQLite
+
+        def tomada(lock):
+            # Las franjas son reentrantes: se prueba desde otro hilo
+            libre = []
+
+            def probar():
+                if lock.acquire(blocking=False):
+                    lock.release()
+                    libre.append(True)
+
+            hilo = threading.Thread(target=probar)
+            hilo.start()
+            hilo.join()
+            return not libre
+
+        almacen = AlmacenMemoria()
+        bloqueado = []
+        almacen.al_cambiar = lambda usuario, eventos: bloqueado.append(tomada(almacen._franja(usuario)))
+        tarea = almacen.agregar('T', 'D', 'ana')
+        almacen.marcar(tarea['id'], True)
+        almacen.aplicar_lote('ana', [('editar', tarea['id'], 'T2', 'D')])
+        self.assertEqual(bloqueado, [True, True, True])
+
+        # En SQLite, después del COMMIT y con el lock de escritura todavía tomado
+        with tempfile.TemporaryDirectory() as directorio:
+            almacen = AlmacenSQLite(ruta=f'{directorio}/tareas.sqlite3')
+            estados = []
+            almacen.al_cambiar = lambda usuario, eventos: estados.append(
+                (almacen._conexion().in_transaction, almacen._lock_escritura.locked()))
+            tarea = almacen.agregar('T', 'D', 'ana')
+            almacen.marcar(tarea['id'], False)
+            almacen.aplicar_lote('ana', [('marcar', tarea['id'], True)])
+            almacen.cerrar()
+        self.assertEqual(estados, [(False, True), (False, True)])
+
+        # En el almacén durable, con el registro ya en disco y la franja tomada
+        with tempfile.TemporaryDirectory() as directorio:
+            almacen = AlmacenDurable(directorio=directorio)
+            estados = []
+            almacen.al_cambiar = lambda usuario, eventos: estados.append(
+                (almacen._diario._en_disco == almacen._diario._encolados, tomada(almacen._franja(usuario))))
+            tarea = almacen.agregar('T', 'D', 'ana')
+            almacen.editar(tarea['id'], 'T2', 'D')
+            almacen.aplicar_lote('ana', [('marcar', tarea['id'], True), ('crear', 'T3', 'D')])
+            almacen.cerrar()
+        self.assertEqual(estados, [(True, True)] * 3)
+
+    def test_no_publica_si_la_escritura_falla(self):
+        """Un COMMIT o un fsync que falla no deja eventos en el feed"""
+        import sqlite3
+        import tempfile
+        from unittest import mock
+        from tareas.storage.durable import AlmacenDurable
+        from tareas.storage.sqlite import AlmacenSQLite
+
+        class FallaAlConfirmar:
+            # sqlite3.Connection no admite reemplazar métodos: se envuelve
+            def __init__(self, con):
+                self.con = con
+
+            def execute(self, sql, *argumentos):
+                if sql == 'COMMIT':
+                    raise sqlite3.OperationalError('disk I/O error')
+                return self.con.execute(sql, *argumentos)
+
+        with tempfile.TemporaryDirectory() as directorio:
+            almacen = AlmacenSQLite(ruta=f'{directorio}/tareas.sqlite3')
+            publicados = []
+            almacen.al_cambiar = lambda usuario, eventos: publicados.extend(eventos)
+            tarea = almacen.agregar('T', 'D', 'ana')
+            con = almacen._conexion()
+            with mock.patch.object(almacen, '_conexion', return_value=FallaAlConfirmar(con)):
+                with self.assertRaises(sqlite3.OperationalError):
+                    almacen.editar(tarea['id'], 'T2', 'D')
+                with self.assertRaises(sqlite3.OperationalError):
+                    almacen.aplicar_lote('ana', [('crear', 'T3', 'D')])
+            self.assertEqual([tipo for tipo, _ in publicados], ['crear'])
+            self.assertEqual(almacen.obtener(tarea['id'])['titulo'], 'T')
+            self.assertEqual(len(almacen), 1)
+            almacen.cerrar()
+
+        with tempfile.TemporaryDirectory() as directorio:
+            almacen = AlmacenDurable(directorio=directorio)
+            publicados = []
+            almacen.al_cambiar = lambda usuario, eventos: publicados.extend(eventos)
+            with mock.patch('tareas.storage.durable.os.fsync', side_effect=OSError('disco lleno')):
+                with self.assertRaises(OSError):
+                    almacen.agregar('T', 'D', 'ana')
+                with self.assertRaises(OSError):
+                    almacen.aplicar_lote('ana', [('crear', 'T2', 'D')])
+            self.assertEqual(publicados, [])
+            almacen.cerrar()
+
+    def test_sondeo_sync(self):
+        """Bajo WSGI la vista envía lo pendiente y cierra"""
+        url = reverse('tareas:cambios_tareas')
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream; charset=utf-8')
+        contenido = response.content.decode()
+        self.assertIn('retry: ', contenido)
+        cursor = contenido.split('id: ')[1].split('\n')[0]
+
+        tarea = storage.agregar_tarea('Nueva', 'D', 'ana')
+        contenido = self.client.get(url, headers={'Last-Event-ID': cursor}).content.decode()
+        self.assertIn('event: crear\n', contenido)
+        self.assertIn(f'"id": {tarea["id"]}', contenido)
+        self.assertIn('event: estadisticas\ndata: {"total": 1, "completadas": 0, "pendientes": 1}', contenido)
+
+    def test_lista_embebe_cursor(self):
+        response = self.client.get(reverse('tareas:lista_tareas'))
+        self.assertContains(response, reverse('tareas:cambios_tareas') + '?ultimo=')
+        self.assertContains(response, 'id="plantilla-tarea"')
+
+    @override_settings(ROOT_URLCONF='gestor_tareas.urls_async', TAREAS_CAMBIOS_LATIDO=0.05)
+    async def test_flujo_async(self):
+        """La conexión queda abierta y recibe cada cambio; al cerrarla se libera su lugar"""
+        from tareas.cambios import feed_cambios
+        await self.async_client.alogin(username='ana', password='pass123')
+        conexiones = feed_cambios.conexiones
+        response = await self.async_client.get(reverse('tareas:cambios_tareas'))
+        flujo = aiter(response.streaming_content)
+        self.assertIn(b'retry: ', await anext(flujo))
+        self.assertEqual(feed_cambios.conexiones, conexiones + 1)
+        self.assertEqual(await anext(flujo), b': latido\n\n')
+
+        await storage.aagregar_tarea('En vivo', 'D', 'ana')
+        self.assertIn(b'event: crear', await anext(flujo))
+
+        # Al desconectarse el cliente, ASGIHandler cancela la tarea que espera
+        import asyncio
+        espera = asyncio.ensure_future(anext(flujo))
+        await asyncio.sleep(0.01)
+        espera.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await espera
+        self.assertEqual(feed_cambios.conexiones, conexiones)
+
+    @override_settings(ROOT_URLCONF='gestor_tareas.urls_async')
+    async def test_limite_de_conexiones(self):
+        from unittest import mock
+        from tareas.cambios import feed_cambios
+        await self.async_client.alogin(username='ana', password='pass123')
+        with mock.patch.object(feed_cambios, 'max_conexiones', 0):
+            response = await self.async_client.get(reverse('tareas:cambios_tareas'))
+        self.assertEqual(response.status_code, 503)
+
+
+class EstaticosTests(TestCase):
+    """Pruebas de los estáticos propios: hash, gzip precalculado, caché y compresión del HTML"""
+
+    def setUp(self):
+        import tempfile
+        from django.core.management import call_command
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        configuracion = self.settings(STATIC_ROOT=directorio.name)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(f'{directorio.name}/staticfiles.json') as manifest:
+            self.js = json.load(manifest)['paths']['tareas/js/cambios.js']
+        with open(f'{directorio.name}/{self.js}', 'rb') as archivo:
+            self.contenido = archivo.read()
+
+    def test_collectstatic_escribe_variante_gzip(self):
+        """Cada archivo con hash tiene al lado su .gz con el mismo contenido"""
+        import gzip
+        from django.conf import settings
+        self.assertRegex(self.js, r'^tareas/js/cambios\.[0-9a-f]{12}\.js$')
+        with open(f'{settings.STATIC_ROOT}/{self.js}.gz', 'rb') as archivo:
+            self.assertEqual(gzip.decompress(archivo.read()), self.contenido)
+
+    def test_nombre_con_hash_inmutable(self):
+        """Con hash: caché por un año y el .gz precalculado si el cliente lo acepta"""
+        import gzip
+        response = self.client.get(f'/static/{self.js}', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/javascript; charset=utf-8')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.contenido)
+
+        response = self.client.get(f'/static/{self.js}')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), self.contenido)
+
+    def test_nombre_sin_hash_revalida(self):
+        """Sin hash: se revalida con ETag y responde 304 sin cuerpo"""
+        response = self.client.get('/static/tareas/js/cambios.js')
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+        response = self.client.get('/static/tareas/js/cambios.js', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        # Otra codificación es otra representación, con otro ETag
+        response = self.client.get('/static/tareas/js/cambios.js', HTTP_IF_NONE_MATCH=response['ETag'],
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+
+    def test_fuera_de_static_root(self):
+        """Lo que no está en STATIC_ROOT no se sirve: sigue de largo hasta el 404"""
+        from tareas.estaticos import indice_estaticos
+        self.assertIsNone(indice_estaticos.buscar('../settings.py'))
+        self.assertIsNone(indice_estaticos.buscar('tareas/js'))
+        self.assertEqual(self.client.get('/static/tareas/js/no-existe.js').status_code, 404)
+
+    def test_falta_en_el_manifest(self):
+        """Con manifest, enlazar un archivo que no está en él falla en lugar de usar la URL sin hash"""
+        from django.templatetags.static import static
+        with self.assertRaises(ValueError):
+            static('tareas/js/no-existe.js')
+
+    def test_paginas_enlazan_nombre_con_hash(self):
+        """Las páginas enlazan los estáticos propios por su nombre con hash"""
+        User.objects.create_user(username='ana', password='pass123')
+        self.client.login(username='ana', password='pass123')
+        self.assertContains(self.client.get(reverse('tareas:lista_tareas')), f'/static/{self.js}')
+
+    def test_paginas_sin_cdn(self):
+        """Bootstrap y sus íconos salen de STATIC_ROOT con hash: ninguna página depende del CDN"""
+        paginas = [reverse('tareas:home'), reverse('tareas:login'), reverse('tareas:registro')]
+        for pagina in paginas:
+            self.assertNotContains(self.client.get(pagina), 'cdn.jsdelivr.net')
+
+        User.objects.create_user(username='ana', password='pass123')
+        self.client.login(username='ana', password='pass123')
+        tarea = storage.agregar_tarea('Tarea', 'Descripción', 'ana')
+        paginas = [reverse('tareas:lista_tareas'), reverse('tareas:crear_tarea'),
+                   reverse('tareas:editar_tarea', args=[tarea['id']]),
+                   reverse('tareas:detalle_tarea', args=[tarea['id']]),
+                   reverse('tareas:buscar_tareas') + '?q=tarea', reverse('tareas:importar_tareas')]
+        for pagina in paginas:
+            response = self.client.get(pagina)
+            self.assertEqual(response.status_code, 200, pagina)
+            self.assertNotContains(response, 'cdn.jsdelivr.net')
+            self.assertRegex(response.content.decode(),
+                             r'/static/tareas/vendor/bootstrap/css/bootstrap\.min\.[0-9a-f]{12}\.css')
+
+    def test_fuentes_de_iconos_con_hash(self):
+        """El CSS de los íconos apunta a las fuentes por su nombre con hash, y estas se sirven"""
+        from django.conf import settings
+        with open(f'{settings.STATIC_ROOT}/staticfiles.json') as manifest:
+            rutas = json.load(manifest)['paths']
+        with open(f"{settings.STATIC_ROOT}/{rutas['tareas/vendor/bootstrap-icons/bootstrap-icons.min.css']}") as css:
+            css = css.read()
+        for fuente in ('bootstrap-icons.woff2', 'bootstrap-icons.woff'):
+            nombre = rutas[f'tareas/vendor/bootstrap-icons/fonts/{fuente}']
+            self.assertIn(f'url("fonts/{nombre.rsplit("/", 1)[1]}?', css)
+            response = self.client.get(f'/static/{nombre}')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('immutable', response['Cache-Control'])
+
+    def test_html_comprimido(self):
+        """Las páginas HTML salen comprimidas y el ETag débil sigue sirviendo para el 304"""
+        import gzip
+        User.objects.create_user(username='ana', password='pass123')
+        self.client.login(username='ana', password='pass123')
+        storage.agregar_tarea('Tarea', 'Descripción', 'ana')
+        response = self.client.get(reverse('tareas:lista_tareas'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'Tarea', gzip.decompress(response.content))
+        self.assertTrue(response['ETag'].startswith('W/'))
+        response = self.client.get(reverse('tareas:lista_tareas'), HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        # El feed de cambios no se comprime: debe llegar evento por evento
+        response = self.client.get(reverse('tareas:cambios_tareas'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(ROOT_URLCONF='gestor_tareas.urls_async')
+    async def test_async(self):
+        """Bajo ASGI el middleware responde sin bloquear el event loop"""
+        import gzip
+        response = await self.async_client.get(f'/static/{self.js}', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(gzip.decompress(response.content), self.contenido)
+
+
+class ParticionadoTests(TestCase):
+    """Pruebas del almacenamiento particionado por usuario (particiones SQLite en archivos temporales)"""
+
+    def setUp(self):
+        import tempfile
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+        configuracion = self.settings(TAREAS_STORAGE=self.config('p0', 'p1'))
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+    def config(self, *nombres):
+        particiones = {nombre: {'BACKEND': 'tareas.storage.sqlite.AlmacenSQLite',
+                                'OPTIONS': {'ruta': f'{self.directorio}/{nombre}.sqlite3'}}
+                       for nombre in nombres}
+        return {'BACKEND': 'tareas.storage.particionado.AlmacenParticionado',
+                'OPTIONS': {'particiones': particiones, 'ranuras': 64,
+                            'mapa': f'{self.directorio}/particiones.json', 'gracia': 0.01}}
+
+    def test_ruteo_por_usuario_e_id(self):
+        """Las tareas de un usuario viven en una sola partición y el ID dice cuál"""
+        from tareas.storage.base import ranura
+        almacen = storage.tareas_storage
+        tareas = [storage.agregar_tarea(f'T{i}', 'D', f'usuario{i % 10}') for i in range(40)]
+        for tarea in tareas:
+            self.assertEqual(tarea['id'] % 64, ranura(tarea['usuario'], 64))
+            self.assertEqual(storage.obtener_tarea_por_id(tarea['id']), tarea)
+        self.assertEqual(sum(len(particion) for particion in almacen.particiones.values()), 40)
+        self.assertTrue(all(len(particion) for particion in almacen.particiones.values()))
+
+        # Las tareas de un usuario siguen ordenadas por ID, en su partición
+        ids = [t['id'] for t in storage.obtener_tareas_usuario('usuario3')]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(storage.contar_tareas_usuario('usuario3'), 4)
+
+    def test_lote_con_id_de_otro_usuario(self):
+        """Un ID de otra ranura se rechaza sin tocar la partición del usuario"""
+        ajena = storage.agregar_tarea('Ajena', 'D', 'luis')
+        propia = storage.agregar_tarea('Propia', 'D', 'ana')
+        resultados = storage.aplicar_lote_usuario('ana', [('eliminar', ajena['id']), ('marcar', propia['id'], True),
+                                                          ('eliminar', ajena['id'] + 64 * 1000)])
+        self.assertEqual([estado for estado, _ in resultados], ['sin_permiso', 'ok', 'no_existe'])
+        self.assertIsNotNone(storage.obtener_tarea_por_id(ajena['id']))
+
+    def test_rebalancear_al_agregar_particion(self):
+        """Una partición nueva recibe solo sus ranuras; las tareas conservan su ID"""
+        from io import StringIO
+        from django.core.management import call_command
+        tareas = [storage.agregar_tarea(f'T{i}', 'D', f'usuario{i % 20}') for i in range(60)]
+        with self.settings(TAREAS_STORAGE=self.config('p0', 'p1', 'p2')):
+            almacen = storage.tareas_storage
+            pendientes = almacen.pendientes()
+            self.assertTrue(pendientes)
+            self.assertTrue(all(destino == 'p2' for _, destino in pendientes))
+            call_command('rebalancear_particiones', stdout=StringIO())
+            self.assertEqual(almacen.pendientes(), {})
+            self.assertEqual(len(almacen), 60)
+            self.assertTrue(len(almacen.particiones['p2']))
+            for tarea in tareas:
+                self.assertEqual(storage.obtener_tarea_por_id(tarea['id']), tarea)
+            nueva = storage.agregar_tarea('Nueva', 'D', 'usuario1')
+            self.assertGreater(nueva['id'], max(t['id'] for t in storage.obtener_tareas_usuario('usuario1')[:-1]))
+
+    def test_rebalancear_no_reutiliza_ids_borrados(self):
+        """Tras mover una ranura, el destino no vuelve a asignar IDs borrados en el origen"""
+        from tareas.storage.base import ranura
+        from tareas.storage.particionado import AlmacenParticionado, anillo
+        antes, despues = anillo(['p0', 'p1'], 64), anillo(['p0', 'p1', 'p2'], 64)
+        usuario = next(u for u in (f'usuario{i}' for i in range(1000))
+                       if antes[ranura(u, 64)] != despues[ranura(u, 64)])
+        storage.agregar_tarea('T1', 'D', usuario)
+        borrada = storage.agregar_tarea('T2', 'D', usuario)
+        storage.eliminar_tarea(borrada['id'])
+        with self.settings(TAREAS_STORAGE=self.config('p0', 'p1', 'p2')):
+            storage.tareas_storage.rebalancear()
+            nueva = storage.agregar_tarea('T3', 'D', usuario)
+            self.assertGreater(nueva['id'], borrada['id'])
+            # Un proceso nuevo lee la marca del mapa y tampoco la reutiliza
+            config = self.config('p0', 'p1', 'p2')['OPTIONS']
+            otro = AlmacenParticionado(**config)
+            self.addCleanup(otro.cerrar)
+            self.assertGreater(otro.agregar('T4', 'D', usuario)['id'], nueva['id'])
+
+    def test_escritura_espera_ranura_congelada(self):
+        """Mientras su ranura se mueve, una escritura espera y las lecturas siguen"""
+        from tareas.storage.base import ranura
+        from tareas.storage.particionado import RanuraOcupada
+        almacen = storage.tareas_storage
+        tarea = storage.agregar_tarea('T', 'D', 'ana')
+        almacen.espera = 0.05
+        almacen._guardar(almacen._mapa, [ranura('ana', 64)])
+        with self.assertRaises(RanuraOcupada):
+            storage.editar_tarea(tarea['id'], 'X', 'Y')
+        self.assertEqual(storage.obtener_tarea_por_id(tarea['id']), tarea)
+        # Las demás ranuras no se enteran
+        self.assertNotEqual(ranura('luis', 64), ranura('ana', 64))
+        self.assertIsNotNone(storage.agregar_tarea('Otra', 'D', 'luis'))
+
+
+@override_settings(TAREAS_STORAGE={'BACKEND': 'tareas.storage.escalonado.AlmacenEscalonado',
+                                   'OPTIONS': {'presupuesto': 40_000}})
+class AlmacenEscalonadoTests(TestCase):
+    """Pruebas del almacén con presupuesto de memoria y usuarios inactivos en disco"""
+
+    def setUp(self):
+        storage.tareas_storage.clear()
+        self.tareas = [storage.agregar_tarea(f'Tarea {i}', 'Descripción ' * 5, f'usuario{i % 20}')
+                       for i in range(400)]
+
+    def test_desaloja_a_los_menos_recientes(self):
+        """Superado el presupuesto, los usuarios menos usados bajan a disco con sus contadores en memoria"""
+        almacen = storage.tareas_storage
+        niveles = almacen.niveles()
+        self.assertLessEqual(niveles['memoria']['bytes'], 40_000)
+        self.assertGreater(niveles['disco']['usuarios'], 0)
+        self.assertEqual(niveles['memoria']['tareas'] + niveles['disco']['tareas'], 400)
+        self.assertEqual(len(almacen), 400)
+        self.assertIn('usuario0', almacen._frios)
+        self.assertNotIn('usuario19', almacen._frios)
+
+        # Contadores y versión no tocan el disco
+        version = storage.version_tareas_usuario('usuario0')
+        self.assertEqual(storage.estadisticas_tareas_usuario('usuario0')['total'], 20)
+        self.assertEqual(storage.contar_tareas_usuario('usuario0'), 20)
+        self.assertIn('usuario0', almacen._frios)
+
+        # El primer acceso lo trae de vuelta, con la misma versión
+        propias = [t for t in self.tareas if t['usuario'] == 'usuario0']
+        self.assertEqual(storage.obtener_tareas_usuario('usuario0'), propias)
+        self.assertNotIn('usuario0', almacen._frios)
+        self.assertEqual(storage.version_tareas_usuario('usuario0'), version)
+
+    def test_obtener_por_id_desde_disco(self):
+        """Una tarea en disco se encuentra por su ID y se puede editar"""
+        tarea = self.tareas[0]
+        self.assertIn(tarea['usuario'], storage.tareas_storage._frios)
+        self.assertEqual(storage.obtener_tarea_por_id(tarea['id']), tarea)
+        self.assertIsNone(storage.obtener_tarea_por_id(10_000))
+
+        otra = self.tareas[1]
+        self.assertIn(otra['usuario'], storage.tareas_storage._frios)
+        self.assertEqual(storage.editar_tarea(otra['id'], 'Editada', 'D')['titulo'], 'Editada')
+        self.assertEqual(storage.obtener_tarea_por_id(otra['id'])['titulo'], 'Editada')
+
+    def test_lote_con_tarea_ajena_en_disco(self):
+        """Una tarea en disco de otro usuario se rechaza sin traerla a memoria"""
+        ajena = self.tareas[2]
+        self.assertIn(ajena['usuario'], storage.tareas_storage._frios)
+        resultados = storage.aplicar_lote_usuario('usuario19', [('eliminar', ajena['id'])])
+        self.assertEqual(resultados, [('sin_permiso', None)])
+        self.assertIn(ajena['usuario'], storage.tareas_storage._frios)
+
+    def test_compactar_y_metricas(self):
+        """Aciertos, fallos y desalojos quedan en /metrics; el segmento se compacta"""
+        from unittest import mock
+        from tareas import metricas
+        from tareas.storage import escalonado
+        antes = metricas.ACCESOS_ALMACEN.valores().get(('disco',), 0)
+        for _ in range(3):
+            for n in range(20):
+                storage.obtener_tareas_usuario(f'usuario{n}')
+        self.assertGreater(metricas.ACCESOS_ALMACEN.valores()[('disco',)], antes)
+        texto = metricas.exportar()
+        self.assertIn('tareas_almacen_desalojos_total{tipo="usuarios"}', texto)
+        self.assertIn('tareas_almacen_bytes{nivel="disco"}', texto)
+
+        almacen = storage.tareas_storage
+        segmento = almacen._segmento
+        with mock.patch.object(escalonado, 'COMPACTAR_DESDE', 0):
+            almacen.desalojar()
+            storage.obtener_tareas_usuario('usuario0')
+            almacen.presupuesto = 0
+            almacen.desalojar()
+        self.assertIsNot(almacen._segmento, segmento)
+        self.assertEqual(sorted(storage.obtener_todas_tareas(), key=lambda t: t['id']), self.tareas)
+
+    async def test_async_carga_en_hilo(self):
+        """La API async trae a memoria a un usuario en disco sin bloquear el event loop"""
+        tarea = self.tareas[0]
+        tareas, _ = await storage.aobtener_pagina_usuario(tarea['usuario'], limite=100)
+        self.assertEqual(tareas[0], tarea)
+
+    async def test_async_desaloja_fuera_del_loop(self):
+        """Ni las escrituras async ni las lecturas en el event loop desalojan (escriben a disco) en el loop"""
+        import asyncio
+        import threading
+        from unittest import mock
+        almacen = storage.tareas_storage
+        loop = threading.get_ident()
+        hilos = []
+        original = almacen.desalojar
+
+        def desalojar():
+            hilos.append(threading.get_ident())
+            original()
+
+        with mock.patch.object(almacen, 'desalojar', desalojar):
+            await storage.aagregar_tarea('Nueva', 'Descripción ' * 50, 'usuario19')
+            almacen.presupuesto = 0
+            await storage.aobtener_pagina_usuario('usuario19')
+            await storage.aobtener_tarea_por_id(self.tareas[19]['id'])
+            await asyncio.sleep(0.1)
+        self.assertTrue(hilos)
+        self.assertNotIn(loop, hilos)
+
+
+class PerfiladoTests(TestCase):
+    """Pruebas del perfilado de requests a pedido y por muestreo"""
+
+    def setUp(self):
+        import tempfile
+        storage.tareas_storage.clear()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+        configuracion = override_settings(TAREAS_PERFILADO_DIR=self.directorio)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        User.objects.create_user(username='ana', password='pass123', is_staff=True)
+        User.objects.create_user(username='luis', password='pass123')
+
+    def _archivos(self):
+        import os
+        return sorted(os.listdir(self.directorio))
+
+    def _leer(self, nombre):
+        import os
+        with open(os.path.join(self.directorio, nombre), encoding='utf-8') as archivo:
+            return archivo.read().splitlines()
+
+    @override_settings(TAREAS_STORAGE={'BACKEND': 'tareas.storage.orm.AlmacenORM'})
+    def test_perfil_a_pedido_de_staff(self):
+        # Con el ORM la vista consulta la base: el perfil a pedido empieza en la vista
+        storage.agregar_tarea('T', 'D', 'ana')
+        self.client.login(username='ana', password='pass123')
+        response = self.client.get(reverse('tareas:lista_tareas'), HTTP_X_PERFILAR='1')
+        self.assertEqual(response.status_code, 200)
+        nombre = response['X-Perfil']
+        self.assertIn('tareas_lista_tareas', nombre)
+        self.assertEqual(self._archivos(), [f'{nombre}.collapsed', f'{nombre}.sql.collapsed'])
+        pilas = self._leer(f'{nombre}.collapsed')
+        # Formato de pilas colapsadas: "marco;marco;... microsegundos"
+        self.assertTrue(all(linea.rsplit(' ', 1)[1].isdigit() for linea in pilas))
+        self.assertTrue(any('lista_tareas (' in linea.split(';')[-2] for linea in pilas if ';' in linea))
+        self.assertTrue(any(linea.startswith('default;SELECT') for linea in self._leer(f'{nombre}.sql.collapsed')))
+
+    def test_encabezado_de_quien_no_es_staff(self):
+        """Ni un anónimo ni un usuario sin staff llegan a iniciar cProfile con el encabezado"""
+        from unittest import mock
+        from tareas import middleware
+        with mock.patch.object(middleware, 'Perfil', wraps=middleware.Perfil) as perfil:
+            response = self.client.get(reverse('tareas:lista_tareas'), HTTP_X_PERFILAR='1')
+            self.assertEqual(response.status_code, 302)
+            self.client.login(username='luis', password='pass123')
+            response = self.client.get(reverse('tareas:lista_tareas'), HTTP_X_PERFILAR='1')
+            self.assertEqual(response.status_code, 200)
+            perfil.assert_not_called()
+        self.assertFalse(response.has_header('X-Perfil'))
+        self.assertEqual(self._archivos(), [])
+
+    @override_settings(TAREAS_PERFILADO_MUESTREO=1, TAREAS_PERFILADO_MAX_ARCHIVOS=2)
+    def test_muestreo_con_rotacion(self):
+        for _ in range(3):
+            response = self.client.get(reverse('tareas:home'))
+            self.assertFalse(response.has_header('X-Perfil'))
+        self.assertEqual(len(self._archivos()), 4)
+
+    @override_settings(TAREAS_PERFILADO_DIR='')
+    def test_desactivado(self):
+        self.client.login(username='ana', password='pass123')
+        response = self.client.get(reverse('tareas:lista_tareas'), HTTP_X_PERFILAR='1')
+        self.assertFalse(response.has_header('X-Perfil'))
+
+    @override_settings(ROOT_URLCONF='gestor_tareas.urls_async')
+    async def test_async(self):
+        await self.async_client.alogin(username='ana', password='pass123')
+        response = await self.async_client.get(reverse('tareas:lista_tareas'), headers={'X-Perfilar': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'{response["X-Perfil"]}.collapsed', self._archivos())
+
+        await self.async_client.alogout()
+        response = await self.async_client.get(reverse('tareas:lista_tareas'), headers={'X-Perfilar': '1'})
+        self.assertFalse(response.has_header('X-Perfil'))
+        self.assertEqual(len(self._archivos()), 2)
+
+
+@override_settings(TAREAS_POR_PAGINA=2)
+class OrdenesTests(TestCase):
+    """Pruebas de las páginas por título, estado y fecha de edición"""
+
+    TITULOS = ('b', 'A', 'c', 'a', 'B', 'd')
+
+    def setUp(self):
+        storage.tareas_storage.clear()
+        User.objects.create_user(username='ana', password='pass123')
+        User.objects.create_user(username='luis', password='pass123')
+
+    def recorrer(self, almacen, orden):
+        """Todas las tareas de ana, de a dos páginas por vez siguiendo el cursor"""
+        from tareas.storage.base import cursor_orden
+        tareas, despues_de = [], None
+        while True:
+            pagina = almacen.pagina_de_usuario('ana', despues_de, 2, orden=orden)
+            tareas += [t['id'] for t in pagina]
+            if len(pagina) < 2:
+                return tareas
+            despues_de = cursor_orden(orden, pagina[-1])
+
+    def esperado(self, almacen, orden):
+        from tareas.storage.base import clave_orden
+        return [t['id'] for t in sorted(almacen.de_usuario('ana'),
+                                        key=lambda t: clave_orden(orden, t[orden], t['id']))]
+
+    def test_ordenes_en_todos_los_backends(self):
+        """Todos los backends recorren los tres órdenes igual, también tras editar y eliminar"""
+        import tempfile
+        from tareas.storage.base import ORDENES
+        from tareas.storage.escalonado import AlmacenEscalonado
+        from tareas.storage.memoria import AlmacenMemoria
+        from tareas.storage.orm import AlmacenORM
+        from tareas.storage.sqlite import AlmacenSQLite
+
+        with tempfile.TemporaryDirectory() as directorio:
+            for almacen in (AlmacenMemoria(), AlmacenSQLite(ruta=f'{directorio}/t.sqlite3'), AlmacenORM(),
+                            AlmacenEscalonado(presupuesto=40_000)):
+                tareas = [almacen.agregar(titulo, 'D', 'ana') for titulo in self.TITULOS]
+                almacen.agregar('0', 'D', 'luis')
+                self.assertEqual(tareas[0]['creada'], tareas[0]['actualizada'])
+                for orden in ORDENES:
+                    self.assertEqual(self.recorrer(almacen, orden), self.esperado(almacen, orden), orden)
+
+                # Con los índices ya armados
+                self.assertGreater(almacen.editar(tareas[0]['id'], 'Z', 'D')['actualizada'], tareas[0]['creada'])
+                almacen.marcar(tareas[2]['id'], True)
+                almacen.eliminar(tareas[3]['id'])
+                almacen.aplicar_lote('ana', [('crear', 'aa', 'D'), ('marcar', tareas[4]['id'], True)])
+                for orden in ORDENES:
+                    self.assertEqual(self.recorrer(almacen, orden), self.esperado(almacen, orden), orden)
+                # Lo editado va antes que lo que no se tocó desde el alta
+                recientes = self.recorrer(almacen, 'actualizada')
+                self.assertEqual(sorted(recientes[-2:]), [tareas[1]['id'], tareas[5]['id']])
+                almacen.cerrar()
+
+    def test_sqlite_pagina_en_una_consulta(self):
+        """Con cursor, la página y la tarea extra que anuncia la siguiente salen de una sola consulta"""
+        import tempfile
+        from tareas.storage.base import cursor_orden
+        from tareas.storage.sqlite import AlmacenSQLite
+
+        with tempfile.TemporaryDirectory() as directorio:
+            almacen = AlmacenSQLite(ruta=f'{directorio}/t.sqlite3')
+            for titulo in ('a', 'a', 'a', 'b', 'c'):
+                almacen.agregar(titulo, 'D', 'ana')
+            primera = almacen.pagina_de_usuario('ana', limite=2, orden='titulo')
+            consultas = []
+            almacen._conexion().set_trace_callback(consultas.append)
+            tareas = almacen.pagina_de_usuario('ana', cursor_orden('titulo', primera[-1]), 3, orden='titulo')
+            self.assertEqual([tarea['titulo'] for tarea in tareas], ['a', 'b', 'c'])
+            self.assertEqual(len(consultas), 1)
+            almacen.cerrar()
+
+    def test_escalonado_sigue_tras_bajar_a_disco(self):
+        """Un usuario que baja a disco entre dos páginas sigue desde el mismo cursor"""
+        from tareas.storage.base import cursor_orden
+        from tareas.storage.escalonado import AlmacenEscalonado
+
+        almacen = AlmacenEscalonado(presupuesto=10_000)
+        for titulo in self.TITULOS:
+            almacen.agregar(titulo, 'D', 'ana')
+        primera = almacen.pagina_de_usuario('ana', limite=2, orden='titulo')
+        for i in range(200):
+            almacen.agregar(f'T{i}', 'Descripción ' * 5, f'usuario{i % 20}')
+        self.assertIn('ana', almacen._frios)
+        resto = almacen.pagina_de_usuario('ana', cursor_orden('titulo', primera[-1]), orden='titulo')
+        self.assertEqual([t['titulo'] for t in primera + resto], ['A', 'a', 'b', 'B', 'c', 'd'])
+        almacen.cerrar()
+
+    def test_vista_ordenada(self):
+        """La lista pagina en el orden elegido con el cursor [valor, id] y descarta cursores inválidos"""
+        from django.core.cache import caches
+        self.client.login(username='ana', password='pass123')
+        for titulo in self.TITULOS:
+            storage.agregar_tarea(titulo, 'D', 'ana')
+        url = reverse('tareas:lista_tareas')
+        titulos = []
+        parametros = {'orden': 'titulo'}
+        while True:
+            response = self.client.get(url, parametros)
+            titulos += [t['titulo'] for t in response.context['tareas']]
+            if response.context['siguiente'] is None:
+                break
+            self.assertContains(response, 'orden=titulo&amp;despues=')
+            parametros = {'orden': 'titulo', 'despues': response.context['siguiente']}
+        self.assertEqual(titulos, ['A', 'a', 'b', 'B', 'c', 'd'])
+        self.assertContains(response, 'data-ultima-pagina="0"')
+
+        for despues in ('x', '[1, 2]', '["a"]', '["a", "1"]', '7'):
+            # Todos son la primera página: sin vaciar la caché de fragmentos no se renderiza de nuevo
+            caches['fragmentos'].clear()
+            response = self.client.get(url, {'orden': 'titulo', 'despues': despues})
+            self.assertEqual([t['titulo'] for t in response.context['tareas']], ['A', 'a'], despues)
+        # Un orden desconocido es el orden por ID
+        caches['fragmentos'].clear()
+        response = self.client.get(url, {'orden': 'usuario'})
+        self.assertEqual([t['titulo'] for t in response.context['tareas']], ['b', 'A'])
+
+    @override_settings(ROOT_URLCONF='gestor_tareas.urls_async')
+    async def test_vista_async(self):
+        await self.async_client.alogin(username='ana', password='pass123')
+        for titulo in self.TITULOS:
+            await storage.aagregar_tarea(titulo, 'D', 'ana')
+        url = reverse('tareas:lista_tareas')
+        response = await self.async_client.get(url, {'orden': 'completada'})
+        siguiente = response.context['siguiente']
+        response = await self.async_client.get(url, {'orden': 'completada', 'despues': siguiente})
+        self.assertEqual([t['titulo'] for t in response.context['tareas']], ['c', 'a'])
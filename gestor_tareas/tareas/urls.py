@@ -1,23 +1,44 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'tareas'
 
-urlpatterns = [
-    # Página principal
-    path('', views.home_view, name='home'),
-    
-    # Lista de tareas
-    path('tareas/', views.lista_tareas, name='lista_tareas'),
-    
-    # Autenticación
-    path('login/', views.login_view, name='login'),
-    path('logout/', views.logout_view, name='logout'),
-    path('registro/', views.registro_view, name='registro'),
-    
-    # Gestión de tareas
-    path('tareas/crear/', views.crear_tarea, name='crear_tarea'),
-    path('tareas/editar/<int:tarea_id>/', views.editar_tarea, name='editar_tarea'),
-    path('tareas/eliminar/<int:tarea_id>/', views.eliminar_tarea, name='eliminar_tarea'),
-    path('tareas/detalle/<int:tarea_id>/', views.detalle_tarea, name='detalle_tarea'),
-]
+
+def rutas(vistas):
+    """Rutas de la app; ``vistas`` es el módulo con las vistas de tareas (sync o async)"""
+    return [
+        # Página principal
+        path('', views.home_view, name='home'),
+
+        # Lista de tareas
+        path('tareas/', vistas.lista_tareas, name='lista_tareas'),
+        path('tareas/buscar/', vistas.buscar_tareas, name='buscar_tareas'),
+        path('tareas/exportar/', vistas.exportar_tareas, name='exportar_tareas'),
+        path('tareas/cambios/', vistas.cambios_tareas, name='cambios_tareas'),
+        path('tareas/importar/', views.importar_tareas, name='importar_tareas'),
+
+        # Autenticación
+        path('login/', vistas.login_view, name='login'),
+        path('logout/', views.logout_view, name='logout'),
+        path('registro/', vistas.registro_view, name='registro'),
+
+        # Gestión de tareas
+        path('tareas/crear/', vistas.crear_tarea, name='crear_tarea'),
+        path('tareas/editar/<int:tarea_id>/', vistas.editar_tarea, name='editar_tarea'),
+        path('tareas/eliminar/<int:tarea_id>/', vistas.eliminar_tarea, name='eliminar_tarea'),
+        path('tareas/detalle/<int:tarea_id>/', vistas.detalle_tarea, name='detalle_tarea'),
+        path('tareas/marcar/<int:tarea_id>/', vistas.marcar_tarea, name='marcar_tarea'),
+        path('tareas/marcar/', vistas.marcar_tareas, name='marcar_tareas'),
+
+        # API JSON por lotes
+        path('api/tareas/crear/', api.crear_tareas, name='api_crear_tareas'),
+        path('api/tareas/editar/', api.editar_tareas, name='api_editar_tareas'),
+        path('api/tareas/eliminar/', api.eliminar_tareas, name='api_eliminar_tareas'),
+        path('api/tareas/marcar/', api.marcar_tareas, name='api_marcar_tareas'),
+
+        # Métricas (Prometheus)
+        path('metrics', views.metricas, name='metricas'),
+    ]
+
+
+urlpatterns = rutas(views)
@@ -0,0 +1,5 @@
+"""Rutas de la app con las vistas async (ver ``gestor_tareas/settings_asgi.py``)"""
+from . import views_async
+from .urls import app_name, rutas
+
+urlpatterns = rutas(views_async)
@@ -1,17 +1,119 @@
+import csv
+import json
+import math
+
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponseForbidden
-from .forms import TareaForm, RegistroForm
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_POST
+from .cambios import (
+    CONTENT_TYPE as CONTENT_TYPE_SSE,
+    RECARGAR,
+    a_sse,
+    encabezado_sse,
+    evento_sse,
+    feed_cambios,
+    ultimo_evento,
+)
+from .exportacion import comprimir_gzip, en_bloques, lineas_csv, lineas_ndjson
+from .forms import TareaForm, RegistroForm, ImportarForm
+from .fragmentos import clave_lista, etag_lista, obtener_fragmento
+from .importacion import detectar_formato, importar, leer
+from .metricas import CONTENT_TYPE as CONTENT_TYPE_METRICAS, exportar as exportar_metricas
 from .storage import (
-    obtener_tareas_usuario,
+    iterar_tareas_usuario,
+    obtener_pagina_usuario,
+    estadisticas_tareas_usuario,
+    buscar_tareas_usuario,
     obtener_tarea_por_id,
     agregar_tarea,
-    editar_tarea,
-    eliminar_tarea as eliminar_tarea_storage
+    editar_tarea as editar_tarea_storage,
+    eliminar_tarea as eliminar_tarea_storage,
+    marcar_tarea as marcar_tarea_storage,
+    marcar_tareas_usuario,
+)
+from .storage.base import ORDENES
+
+# Columnas que renderiza lista_tareas_contenido.html
+CAMPOS_LISTA = ('id', 'titulo', 'descripcion', 'usuario', 'completada')
+
+# Tarea de la <template> que la lista clona para las altas del feed de cambios
+TAREA_MODELO = {'id': 0, 'titulo': '', 'descripcion': '', 'usuario': '', 'completada': False}
+
+
+def contexto_estadisticas(estadisticas):
+    """Contadores del usuario para el encabezado de lista_tareas_contenido.html"""
+    return {
+        'total_tareas': estadisticas['total'],
+        'tareas_completadas': estadisticas['completadas'],
+        'tareas_pendientes': estadisticas['pendientes'],
+    }
+
+
+# Órdenes del selector de lista_tareas ('': por ID, el de alta)
+ORDENES_LISTA = (
+    ('', 'Creación'),
+    ('titulo', 'Título'),
+    ('completada', 'Pendientes primero'),
+    ('actualizada', 'Modificadas recientemente'),
 )
 
+
+def leer_pagina(request):
+    """
+    Retorna ``(orden, despues_de)`` de los parámetros de lista_tareas.
+    Sin orden el cursor es un ID; con orden, el JSON ``[valor, id]`` de
+    la última tarea de la página anterior. Un cursor inválido es la
+    primera página.
+    """
+    orden = request.GET.get('orden')
+    if orden not in ORDENES:
+        orden = None
+    try:
+        if orden is None:
+            return None, int(request.GET['despues'])
+        valor, tarea_id = json.loads(request.GET['despues'])
+    except (KeyError, ValueError, TypeError):
+        return orden, None
+    if type(tarea_id) is not int or not _valor_de_orden(orden, valor):
+        return orden, None
+    return orden, (valor, tarea_id)
+
+
+def _valor_de_orden(orden, valor):
+    if orden == 'titulo':
+        return isinstance(valor, str)
+    if orden == 'completada':
+        return isinstance(valor, bool)
+    return type(valor) in (int, float) and math.isfinite(valor)
+
+
+def contexto_pagina(orden, despues_de, siguiente):
+    """Orden y cursores para la paginación de lista_tareas_contenido.html"""
+    if siguiente is not None and orden is not None:
+        siguiente = json.dumps(siguiente, ensure_ascii=False, separators=(',', ':'))
+    return {
+        'orden': orden or '',
+        'ordenes': ORDENES_LISTA,
+        'siguiente': siguiente,
+        'es_primera_pagina': despues_de is None,
+    }
+
+
+def leer_marcado(request):
+    """Retorna ``(completada, ids)`` del POST de marcar_tarea/marcar_tareas"""
+    ids = [int(i) for i in request.POST.getlist('ids')[:settings.TAREAS_API_MAX_LOTE] if i.isdigit()]
+    return request.POST.get('completada') == '1', ids
+
+
+def estado(completada):
+    return 'completada' if completada else 'pendiente'
+
 # Vista de registro
 def registro_view(request):
     # Si el usuario ya está autenticado, redirigir a lista de tareas
@@ -63,13 +165,123 @@ def logout_view(request):
 # Vista de lista de tareas
 @login_required
 def lista_tareas(request):
-    # Obtener solo las tareas del usuario autenticado
-    tareas = obtener_tareas_usuario(request.user.username)
-    context = {
-        'tareas': tareas,
-        'total_tareas': len(tareas)
-    }
-    return render(request, 'tareas/lista_tareas.html', context)
+    # Paginación por cursor: la página empieza después de la tarea indicada
+    orden, despues_de = leer_pagina(request)
+
+    username = request.user.username
+    # El cursor se toma antes de leer: la página no pierde cambios posteriores
+    ultimo = feed_cambios.ultimo_id(username)
+    clave = clave_lista(username, despues_de, orden)
+    # Con mensajes pendientes la página no es la misma que tiene el navegador
+    con_etag = clave is not None and not len(messages.get_messages(request))
+    if con_etag:
+        etag = etag_lista(request, clave)
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            response['ETag'] = etag
+            return response
+
+    def renderizar():
+        # Obtener solo las tareas del usuario autenticado
+        tareas, siguiente = obtener_pagina_usuario(username, despues_de, campos=CAMPOS_LISTA, orden=orden)
+        context = {
+            'tareas': tareas,
+            **contexto_estadisticas(estadisticas_tareas_usuario(username)),
+            **contexto_pagina(orden, despues_de, siguiente),
+            'tarea_modelo': TAREA_MODELO,
+        }
+        return render_to_string('tareas/lista_tareas_contenido.html', context, request)
+
+    response = render(request, 'tareas/lista_tareas.html', {
+        'contenido': obtener_fragmento(clave, renderizar),
+        'ultimo_evento': ultimo,
+    })
+    if con_etag:
+        response['ETag'] = etag
+        # Cada visita revalida con If-None-Match; la página es de un usuario
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+# Vista del feed de cambios (server-sent events)
+@login_required
+def cambios_tareas(request):
+    # Bajo WSGI una conexión abierta ocuparía un hilo: se envía lo pendiente
+    # y se cierra, y el navegador se reconecta a los TAREAS_CAMBIOS_REINTENTO ms.
+    # La vista async (ASGI) mantiene la conexión abierta
+    username = request.user.username
+    ultimo = feed_cambios.propio(ultimo_evento(request))
+    if ultimo is None:
+        cuerpo = encabezado_sse(settings.TAREAS_CAMBIOS_REINTENTO, feed_cambios.ultimo_id(username))
+    else:
+        cuerpo = encabezado_sse(settings.TAREAS_CAMBIOS_REINTENTO)
+        eventos = feed_cambios.pendientes(username, ultimo)
+        if eventos == RECARGAR:
+            cuerpo += evento_sse(RECARGAR, {}, feed_cambios.ultimo_id(username))
+        elif eventos:
+            cuerpo += a_sse(eventos, feed_cambios.epoca)
+            cuerpo += evento_sse('estadisticas', estadisticas_tareas_usuario(username))
+    response = HttpResponse(cuerpo, content_type=CONTENT_TYPE_SSE)
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+# Vista de búsqueda de tareas
+@login_required
+def buscar_tareas(request):
+    consulta = request.GET.get('q', '').strip()
+    tareas = buscar_tareas_usuario(request.user.username, consulta) if consulta else []
+    return render(request, 'tareas/buscar_tareas.html', {'consulta': consulta, 'tareas': tareas})
+
+# Formatos de exportación: (generador de líneas, content type)
+FORMATOS_EXPORTACION = {
+    'csv': (lineas_csv, 'text/csv; charset=utf-8'),
+    'ndjson': (lineas_ndjson, 'application/x-ndjson'),
+}
+
+# Vista de exportación de tareas
+@login_required
+def exportar_tareas(request):
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACION:
+        messages.error(request, 'Formato de exportación no soportado.')
+        return redirect('tareas:lista_tareas')
+    lineas, content_type = FORMATOS_EXPORTACION[formato]
+
+    # Las tareas se leen, se formatean y se envían de a bloques
+    contenido = en_bloques(lineas(iterar_tareas_usuario(request.user.username)))
+    nombre = f'tareas-{request.user.username}.{formato}'
+    if request.GET.get('gzip') == '1':
+        contenido = comprimir_gzip(contenido)
+        content_type = 'application/gzip'
+        nombre += '.gz'
+    response = StreamingHttpResponse(contenido, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
+
+# Vista de importación de tareas
+@login_required
+def importar_tareas(request):
+    resultado = None
+    if request.method == 'POST':
+        form = ImportarForm(request.POST, request.FILES)
+        if form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            formato = form.cleaned_data['formato'] or detectar_formato(archivo.name)
+            if formato is None:
+                messages.error(request, 'No se reconoce el formato del archivo; indícalo en el formulario.')
+            else:
+                try:
+                    resultado = importar(request.user.username, leer(archivo, formato, archivo.name))
+                except (UnicodeDecodeError, OSError, csv.Error):
+                    messages.error(request, 'No se pudo leer el archivo; debe ser CSV o NDJSON en UTF-8.')
+                else:
+                    messages.success(request, f'Tareas importadas: {resultado.importadas}.')
+                    if not resultado.rechazadas:
+                        return redirect('tareas:lista_tareas')
+        else:
+            messages.error(request, 'Por favor corrige los errores en el formulario.')
+    else:
+        form = ImportarForm()
+    return render(request, 'tareas/importar_tareas.html', {'form': form, 'resultado': resultado})
 
 # Vista de detalle de tarea
 @login_required
@@ -126,7 +338,7 @@ def editar_tarea(request, tarea_id):
         if form.is_valid():
             titulo = form.cleaned_data['titulo']
             descripcion = form.cleaned_data['descripcion']
-            editar_tarea(tarea_id, titulo, descripcion)
+            editar_tarea_storage(tarea_id, titulo, descripcion)
             messages.success(request, f'La tarea "{titulo}" ha sido actualizada exitosamente.')
             return redirect('tareas:detalle_tarea', tarea_id=tarea_id)
         else:
@@ -163,9 +375,53 @@ def eliminar_tarea(request, tarea_id):
     
     return render(request, 'tareas/eliminar_tarea.html', {'tarea': tarea})
 
+# Vista para marcar una tarea como completada o pendiente
+@login_required
+@require_POST
+def marcar_tarea(request, tarea_id):
+    tarea = obtener_tarea_por_id(tarea_id)
+
+    # Verificar que la tarea existe
+    if not tarea:
+        messages.error(request, 'La tarea que intentas marcar no existe.')
+        return redirect('tareas:lista_tareas')
+
+    # Verificar que la tarea pertenece al usuario autenticado
+    if tarea['usuario'] != request.user.username:
+        messages.error(request, 'No tienes permiso para marcar esta tarea.')
+        return redirect('tareas:lista_tareas')
+
+    completada, _ = leer_marcado(request)
+    marcar_tarea_storage(tarea_id, completada)
+    messages.success(request, f'La tarea "{tarea["titulo"]}" quedó {estado(completada)}.')
+    if request.POST.get('volver') == 'detalle':
+        return redirect('tareas:detalle_tarea', tarea_id=tarea_id)
+    return redirect('tareas:lista_tareas')
+
+# Vista para marcar varias tareas a la vez
+@login_required
+@require_POST
+def marcar_tareas(request):
+    completada, ids = leer_marcado(request)
+    if not ids:
+        messages.error(request, 'No seleccionaste ninguna tarea.')
+        return redirect('tareas:lista_tareas')
+
+    # Una sola operación en el almacenamiento; las tareas ajenas se ignoran
+    marcadas = marcar_tareas_usuario(request.user.username, ids, completada)
+    messages.success(request, f'Tareas marcadas como {estado(completada)}: {len(marcadas)}.')
+    return redirect('tareas:lista_tareas')
+
 # Vista de página de inicio
 def home_view(request):
     """Vista de página de inicio"""
     if request.user.is_authenticated:
         return redirect('tareas:lista_tareas')
     return render(request, 'tareas/home.html')
+
+# Vista de métricas
+def metricas(request):
+    """Métricas de requests y del storage en el formato de texto de Prometheus"""
+    if request.META.get('REMOTE_ADDR') not in settings.TAREAS_METRICAS_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(exportar_metricas(), content_type=CONTENT_TYPE_METRICAS)
@@ -0,0 +1,320 @@
+"""
+Versiones async de las vistas de tareas, para despliegues ASGI.
+
+Bajo ASGI una vista sync ocupa un hilo (``sync_to_async``) durante toda
+la request. Estas vistas usan la API async del almacenamiento, así que
+con el backend en memoria una lectura corre entera en el event loop (las
+escrituras pasan un momento por un hilo) y un solo worker atiende muchas
+requests concurrentes. Las rutas de
+``tareas/urls_async.py`` las usan en lugar de las de ``views.py``; el
+comportamiento es el mismo.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth import aauthenticate, alogin
+from django.contrib.auth.views import redirect_to_login
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_POST
+
+from .cambios import (
+    CONTENT_TYPE as CONTENT_TYPE_SSE,
+    RECARGAR,
+    FeedSaturado,
+    a_sse,
+    encabezado_sse,
+    evento_sse,
+    feed_cambios,
+    ultimo_evento,
+)
+from .contrasenas import amake_password
+from .exportacion import abloques
+from .forms import RegistroForm, TareaForm
+from .fragmentos import aclave_lista, aobtener_fragmento, etag_lista
+from .storage import (
+    apaginas_tareas_usuario,
+    aobtener_pagina_usuario,
+    aestadisticas_tareas_usuario,
+    abuscar_tareas_usuario,
+    aobtener_tarea_por_id,
+    aagregar_tarea,
+    aeditar_tarea,
+    aeliminar_tarea,
+    amarcar_tarea,
+    amarcar_tareas_usuario,
+)
+from .views import (
+    CAMPOS_LISTA,
+    FORMATOS_EXPORTACION,
+    TAREA_MODELO,
+    contexto_estadisticas,
+    contexto_pagina,
+    estado,
+    leer_marcado,
+    leer_pagina,
+)
+
+
+def login_required_async(vista):
+    """
+    ``login_required`` para vistas async. El de Django evalúa la condición
+    con ``sync_to_async``; aquí se resuelve el usuario con ``auser()`` y se
+    deja en ``request.user`` para que las plantillas no lo vuelvan a cargar
+    de forma sync.
+    """
+    @wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        request.user = user
+        return await vista(request, *args, **kwargs)
+    return envoltura
+
+
+async def _tarea_propia(request, tarea_id, no_existe, sin_permiso):
+    """Retorna ``(tarea, None)`` o ``(None, redirect)`` con el mensaje correspondiente"""
+    tarea = await aobtener_tarea_por_id(tarea_id)
+    if not tarea:
+        messages.error(request, no_existe)
+        return None, redirect('tareas:lista_tareas')
+    if tarea['usuario'] != request.user.username:
+        messages.error(request, sin_permiso)
+        return None, redirect('tareas:lista_tareas')
+    return tarea, None
+
+
+# Vista de registro
+async def registro_view(request):
+    request.user = await request.auser()
+    if request.user.is_authenticated:
+        return redirect('tareas:lista_tareas')
+
+    if request.method == 'POST':
+        form = RegistroForm(request.POST)
+        # La validación consulta la base (usuario único): corre en un hilo
+        if await sync_to_async(form.is_valid)():
+            # form.save() calcularía el hash en el event loop
+            user = form.instance
+            user.password = await amake_password(form.cleaned_data['password1'])
+            await user.asave()
+            await alogin(request, user)
+            messages.success(request, f'¡Bienvenido {user.username}! Tu cuenta ha sido creada exitosamente.')
+            return redirect('tareas:lista_tareas')
+        messages.error(request, 'Por favor corrige los errores en el formulario.')
+    else:
+        form = RegistroForm()
+    return render(request, 'tareas/registro.html', {'form': form})
+
+
+# Vista de login
+async def login_view(request):
+    request.user = await request.auser()
+    if request.user.is_authenticated:
+        return redirect('tareas:lista_tareas')
+
+    if request.method == 'POST':
+        username = request.POST.get('username')
+        password = request.POST.get('password')
+        user = await aauthenticate(request, username=username, password=password)
+        if user is not None:
+            await alogin(request, user)
+            messages.success(request, f'¡Bienvenido de nuevo, {username}!')
+            return redirect(request.GET.get('next', 'tareas:lista_tareas'))
+        messages.error(request, 'Usuario o contraseña incorrectos. Por favor intenta de nuevo.')
+    return render(request, 'tareas/login.html')
+
+
+# Vista de lista de tareas
+@login_required_async
+async def lista_tareas(request):
+    orden, despues_de = leer_pagina(request)
+
+    username = request.user.username
+    ultimo = feed_cambios.ultimo_id(username)
+    clave = await aclave_lista(username, despues_de, orden)
+    con_etag = clave is not None and not len(messages.get_messages(request))
+    if con_etag:
+        etag = etag_lista(request, clave)
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            response['ETag'] = etag
+            return response
+
+    async def renderizar():
+        tareas, siguiente = await aobtener_pagina_usuario(username, despues_de, campos=CAMPOS_LISTA, orden=orden)
+        context = {
+            'tareas': tareas,
+            **contexto_estadisticas(await aestadisticas_tareas_usuario(username)),
+            **contexto_pagina(orden, despues_de, siguiente),
+            'tarea_modelo': TAREA_MODELO,
+        }
+        return render_to_string('tareas/lista_tareas_contenido.html', context, request)
+
+    contenido = await aobtener_fragmento(clave, renderizar)
+    response = render(request, 'tareas/lista_tareas.html', {'contenido': contenido, 'ultimo_evento': ultimo})
+    if con_etag:
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+# Vista del feed de cambios (server-sent events)
+@login_required_async
+async def cambios_tareas(request):
+    # Cada conexión en espera es una corrutina y un cursor sobre el historial
+    # compartido del usuario (ver tareas/cambios.py), sin hilo propio
+    username = request.user.username
+    ultimo = feed_cambios.propio(ultimo_evento(request))
+    try:
+        suscripcion = feed_cambios.suscribir(username, ultimo)
+    except FeedSaturado:
+        response = HttpResponse('Hay demasiadas conexiones abiertas.', status=503,
+                                content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = str(settings.TAREAS_CAMBIOS_LATIDO)
+        return response
+
+    async def eventos():
+        try:
+            yield encabezado_sse(settings.TAREAS_CAMBIOS_REINTENTO, None if ultimo else suscripcion.ultimo_id)
+            while True:
+                nuevos = await suscripcion.siguientes(settings.TAREAS_CAMBIOS_LATIDO)
+                if nuevos == RECARGAR:
+                    yield evento_sse(RECARGAR, {}, suscripcion.ultimo_id)
+                elif nuevos:
+                    yield (a_sse(nuevos, feed_cambios.epoca)
+                           + evento_sse('estadisticas', await aestadisticas_tareas_usuario(username)))
+                else:
+                    # Latido: mantiene viva la conexión en proxies y detecta clientes idos
+                    yield ': latido\n\n'
+        finally:
+            suscripcion.cerrar()
+
+    response = StreamingHttpResponse(eventos(), content_type=CONTENT_TYPE_SSE)
+    response['Cache-Control'] = 'no-cache'
+    # Sin buffer en nginx: cada evento sale apenas se genera
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# Vista de búsqueda de tareas
+@login_required_async
+async def buscar_tareas(request):
+    consulta = request.GET.get('q', '').strip()
+    tareas = await abuscar_tareas_usuario(request.user.username, consulta) if consulta else []
+    return render(request, 'tareas/buscar_tareas.html', {'consulta': consulta, 'tareas': tareas})
+
+# Vista de exportación de tareas
+@login_required_async
+async def exportar_tareas(request):
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACION:
+        messages.error(request, 'Formato de exportación no soportado.')
+        return redirect('tareas:lista_tareas')
+    lineas, content_type = FORMATOS_EXPORTACION[formato]
+
+    # Un iterador async: con uno sync, ASGI lo consumiría entero antes de enviarlo
+    comprimir = request.GET.get('gzip') == '1'
+    contenido = abloques(apaginas_tareas_usuario(request.user.username), lineas, comprimir)
+    nombre = f'tareas-{request.user.username}.{formato}'
+    if comprimir:
+        content_type = 'application/gzip'
+        nombre += '.gz'
+    response = StreamingHttpResponse(contenido, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
+
+# Vista de detalle de tarea
+@login_required_async
+async def detalle_tarea(request, tarea_id):
+    tarea, response = await _tarea_propia(request, tarea_id, 'La tarea que buscas no existe.',
+                                          'No tienes permiso para ver esta tarea.')
+    if response:
+        return response
+    return render(request, 'tareas/detalle_tarea.html', {'tarea': tarea})
+
+# Vista para crear tarea
+@login_required_async
+async def crear_tarea(request):
+    if request.method == 'POST':
+        form = TareaForm(request.POST)
+        if form.is_valid():
+            titulo = form.cleaned_data['titulo']
+            await aagregar_tarea(titulo, form.cleaned_data['descripcion'], request.user.username)
+            messages.success(request, f'La tarea "{titulo}" ha sido creada exitosamente.')
+            return redirect('tareas:lista_tareas')
+        else:
+            messages.error(request, 'Por favor corrige los errores en el formulario.')
+    else:
+        form = TareaForm()
+    return render(request, 'tareas/crear_tarea.html', {'form': form})
+
+# Vista para editar tarea
+@login_required_async
+async def editar_tarea(request, tarea_id):
+    tarea, response = await _tarea_propia(request, tarea_id, 'La tarea que intentas editar no existe.',
+                                          'No tienes permiso para editar esta tarea.')
+    if response:
+        return response
+
+    if request.method == 'POST':
+        form = TareaForm(request.POST)
+        if form.is_valid():
+            titulo = form.cleaned_data['titulo']
+            await aeditar_tarea(tarea_id, titulo, form.cleaned_data['descripcion'])
+            messages.success(request, f'La tarea "{titulo}" ha sido actualizada exitosamente.')
+            return redirect('tareas:detalle_tarea', tarea_id=tarea_id)
+        else:
+            messages.error(request, 'Por favor corrige los errores en el formulario.')
+    else:
+        form = TareaForm(initial={
+            'titulo': tarea['titulo'],
+            'descripcion': tarea['descripcion']
+        })
+    return render(request, 'tareas/editar_tarea.html', {'form': form, 'tarea': tarea})
+
+# Vista para eliminar tarea
+@login_required_async
+async def eliminar_tarea(request, tarea_id):
+    tarea, response = await _tarea_propia(request, tarea_id, 'La tarea que intentas eliminar no existe.',
+                                          'No tienes permiso para eliminar esta tarea.')
+    if response:
+        return response
+
+    if request.method == 'POST':
+        await aeliminar_tarea(tarea_id)
+        messages.success(request, f'La tarea "{tarea["titulo"]}" ha sido eliminada exitosamente.')
+        return redirect('tareas:lista_tareas')
+    return render(request, 'tareas/eliminar_tarea.html', {'tarea': tarea})
+
+# Vista para marcar una tarea como completada o pendiente
+@login_required_async
+@require_POST
+async def marcar_tarea(request, tarea_id):
+    tarea, response = await _tarea_propia(request, tarea_id, 'La tarea que intentas marcar no existe.',
+                                          'No tienes permiso para marcar esta tarea.')
+    if response:
+        return response
+
+    completada, _ = leer_marcado(request)
+    await amarcar_tarea(tarea_id, completada)
+    messages.success(request, f'La tarea "{tarea["titulo"]}" quedó {estado(completada)}.')
+    if request.POST.get('volver') == 'detalle':
+        return redirect('tareas:detalle_tarea', tarea_id=tarea_id)
+    return redirect('tareas:lista_tareas')
+
+# Vista para marcar varias tareas a la vez
+@login_required_async
+@require_POST
+async def marcar_tareas(request):
+    completada, ids = leer_marcado(request)
+    if not ids:
+        messages.error(request, 'No seleccionaste ninguna tarea.')
+        return redirect('tareas:lista_tareas')
+
+    marcadas = await amarcar_tareas_usuario(request.user.username, ids, completada)
+    messages.success(request, f'Tareas marcadas como {estado(completada)}: {len(marcadas)}.')
+    return redirect('tareas:lista_tareas')
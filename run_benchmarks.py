@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+"""
+Suite de benchmarks de punta a punta para todas las vistas de tareas.
+
+Crea una base de datos de prueba con ``--usuarios`` usuarios y ``--tareas``
+tareas por usuario y ejecuta cada URL de ``tareas/urls.py`` a través del
+WSGIHandler de Django, dentro del proceso (con todo el middleware, CSRF y
+sesiones reales). Por vista reporta:
+
+    req_s        requests por segundo
+    p50/p90/p99  latencia en milisegundos
+    consultas    consultas SQL por request (promedio)
+    memoria_kib  pico de memoria asignada por request (mediana, tracemalloc)
+    errores      respuestas 4xx/5xx inesperadas
+
+Uso:
+    python run_benchmarks.py [--usuarios 10] [--tareas 1000] [--requests 200]
+                             [--salida resultados.json]
+                             [--comparar base.json] [--umbral 0.25] [--tolerancia-ms 1]
+
+Con ``--comparar`` sale con código 1 si alguna métrica empeora más que
+``--umbral`` (proporción) respecto de la línea base guardada con ``--salida``.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from http.cookies import SimpleCookie
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'benchmarks'))
+
+from _comun import base_de_datos_de_prueba, configurar_django, percentil  # noqa: E402
+
+CONTRASENA = 'bench-pass-123'
+# Secreto CSRF fijo: la cookie y la cabecera X-CSRFToken llevan el mismo valor
+CSRF = 'b' * 32
+
+# Métricas comparadas y si un valor mayor es mejor
+METRICAS = {
+    'req_s': True,
+    'p50_ms': False,
+    'p90_ms': False,
+    'p99_ms': False,
+    'consultas': False,
+    'memoria_kib': False,
+    'errores': False,
+}
+
+
+class Contexto:
+    """Datos sembrados que usan los escenarios para armar sus requests"""
+
+    def __init__(self, usuario, ids, sesion):
+        self.usuario = usuario
+        self.ids = ids
+        self.sesion = sesion
+
+    def nueva_sesion(self):
+        from django.test import Client
+        cliente = Client()
+        cliente.force_login(self.usuario)
+        return cliente.cookies[_nombre_cookie_sesion()].value
+
+    def nuevas_tareas(self, cantidad):
+        from tareas import storage
+        return [storage.agregar_tarea('Temporal', 'Para borrar', self.usuario.username)['id']
+                for _ in range(cantidad)]
+
+
+def _nombre_cookie_sesion():
+    from django.conf import settings
+    return settings.SESSION_COOKIE_NAME
+
+
+def peticion(metodo, ruta, datos=None, cuerpo_json=None, sesion=None):
+    return {'metodo': metodo, 'ruta': ruta, 'datos': datos, 'json': cuerpo_json, 'sesion': sesion}
+
+
+def escenarios():
+    """
+    ``(clave, nombre de la URL, requests máximas, armar)``; ``armar(ctx, i)``
+    prepara (fuera del cronómetro) la request número ``i``.
+    """
+    from django.urls import reverse
+
+    def url(nombre, *args):
+        return reverse(f'tareas:{nombre}', args=args)
+
+    def tarea(ctx, i):
+        return ctx.ids[i % len(ctx.ids)]
+
+    lote = [{'titulo': f'Tarea API {n}', 'descripcion': 'Creada por la API'} for n in range(10)]
+
+    return [
+        ('GET home', 'home', None, lambda ctx, i: peticion('get', url('home'), sesion=ctx.sesion)),
+        ('GET lista_tareas', 'lista_tareas', None,
+         lambda ctx, i: peticion('get', url('lista_tareas'), sesion=ctx.sesion)),
+        ('GET buscar_tareas', 'buscar_tareas', None,
+         lambda ctx, i: peticion('get', url('buscar_tareas'), {'q': f'tarea {i % 100}'}, sesion=ctx.sesion)),
+        ('GET exportar_tareas', 'exportar_tareas', None,
+         lambda ctx, i: peticion('get', url('exportar_tareas'), {'formato': 'csv'}, sesion=ctx.sesion)),
+        ('GET importar_tareas', 'importar_tareas', None,
+         lambda ctx, i: peticion('get', url('importar_tareas'), sesion=ctx.sesion)),
+        ('GET detalle_tarea', 'detalle_tarea', None,
+         lambda ctx, i: peticion('get', url('detalle_tarea', tarea(ctx, i)), sesion=ctx.sesion)),
+        ('GET login', 'login', None, lambda ctx, i: peticion('get', url('login'))),
+        ('GET registro', 'registro', None, lambda ctx, i: peticion('get', url('registro'))),
+        # WSGI: un sondeo sin cursor (retry + ID actual), como la primera conexión del EventSource
+        ('GET cambios_tareas', 'cambios_tareas', None,
+         lambda ctx, i: peticion('get', url('cambios_tareas'), sesion=ctx.sesion)),
+        ('GET metricas', 'metricas', None, lambda ctx, i: peticion('get', url('metricas'))),
+        ('POST crear_tarea', 'crear_tarea', None,
+         lambda ctx, i: peticion('post', url('crear_tarea'),
+                                 {'titulo': f'Nueva {i}', 'descripcion': 'Creada en el benchmark'},
+                                 sesion=ctx.sesion)),
+        ('POST editar_tarea', 'editar_tarea', None,
+         lambda ctx, i: peticion('post', url('editar_tarea', tarea(ctx, i)),
+                                 {'titulo': f'Editada {i}', 'descripcion': 'Editada en el benchmark'},
+                                 sesion=ctx.sesion)),
+        ('POST eliminar_tarea', 'eliminar_tarea', None,
+         lambda ctx, i: peticion('post', url('eliminar_tarea', ctx.nuevas_tareas(1)[0]), sesion=ctx.sesion)),
+        ('POST api_crear_tareas', 'api_crear_tareas', None,
+         lambda ctx, i: peticion('post', url('api_crear_tareas'), cuerpo_json={'tareas': lote},
+                                 sesion=ctx.sesion)),
+        ('POST api_editar_tareas', 'api_editar_tareas', None,
+         lambda ctx, i: peticion('post', url('api_editar_tareas'), sesion=ctx.sesion, cuerpo_json={
+             'tareas': [{**elemento, 'id': tarea(ctx, i * 10 + n)} for n, elemento in enumerate(lote)]})),
+        ('POST api_eliminar_tareas', 'api_eliminar_tareas', None,
+         lambda ctx, i: peticion('post', url('api_eliminar_tareas'), cuerpo_json={'ids': ctx.nuevas_tareas(10)},
+                                 sesion=ctx.sesion)),
+        ('POST marcar_tarea', 'marcar_tarea', None,
+         lambda ctx, i: peticion('post', url('marcar_tarea', tarea(ctx, i)), {'completada': str(i % 2)},
+                                 sesion=ctx.sesion)),
+        ('POST marcar_tareas', 'marcar_tareas', None,
+         lambda ctx, i: peticion('post', url('marcar_tareas'), sesion=ctx.sesion, datos={
+             'ids': [tarea(ctx, i * 10 + n) for n in range(10)], 'completada': str(i % 2)})),
+        ('POST api_marcar_tareas', 'api_marcar_tareas', None,
+         lambda ctx, i: peticion('post', url('api_marcar_tareas'), sesion=ctx.sesion, cuerpo_json={
+             'ids': [tarea(ctx, i * 10 + n) for n in range(10)], 'completada': i % 2 == 0})),
+        # Cada login calcula el hash de la contraseña: pocas requests alcanzan
+        ('POST login', 'login', 10,
+         lambda ctx, i: peticion('post', url('login'),
+                                 {'username': ctx.usuario.username, 'password': CONTRASENA})),
+        ('GET logout', 'logout', None, lambda ctx, i: peticion('get', url('logout'), sesion=ctx.nueva_sesion())),
+    ]
+
+
+def armar_environ(fabrica, datos):
+    from django.conf import settings
+    cookies = {settings.CSRF_COOKIE_NAME: CSRF}
+    if datos['sesion']:
+        cookies[settings.SESSION_COOKIE_NAME] = datos['sesion']
+    fabrica.cookies = SimpleCookie(cookies)
+    if datos['metodo'] == 'get':
+        return fabrica.get(datos['ruta'], datos['datos']).environ
+    if datos['json'] is not None:
+        return fabrica.post(datos['ruta'], json.dumps(datos['json']), content_type='application/json',
+                            headers={'X-CSRFToken': CSRF}).environ
+    return fabrica.post(datos['ruta'], datos['datos'], headers={'X-CSRFToken': CSRF}).environ
+
+
+def llamar(handler, environ):
+    """Ejecuta una request completa (incluido el cuerpo streaming); retorna el código"""
+    estado = []
+    respuesta = handler(environ, lambda status, headers, exc_info=None: estado.append(status))
+    try:
+        for _ in respuesta:
+            pass
+    finally:
+        respuesta.close()
+    return int(estado[0].split()[0])
+
+
+def medir(handler, environs, muestras_memoria):
+    from django.db import connection
+
+    consultas = 0
+
+    def contar(execute, sql, params, many, context):
+        nonlocal consultas
+        consultas += 1
+        return execute(sql, params, many, context)
+
+    latencias, errores = [], 0
+    with connection.execute_wrapper(contar):
+        for environ in environs[:-muestras_memoria or None]:
+            inicio = time.perf_counter()
+            codigo = llamar(handler, environ)
+            latencias.append(time.perf_counter() - inicio)
+            errores += codigo >= 400
+    medidas = len(latencias)
+
+    # Aparte: tracemalloc hace más lenta cada asignación
+    picos = []
+    tracemalloc.start()
+    try:
+        for environ in environs[-muestras_memoria:] if muestras_memoria else ():
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            errores += llamar(handler, environ) >= 400
+            picos.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'requests': medidas,
+        'req_s': round(medidas / sum(latencias), 1),
+        'p50_ms': round(percentil(latencias, 50) * 1e3, 3),
+        'p90_ms': round(percentil(latencias, 90) * 1e3, 3),
+        'p99_ms': round(percentil(latencias, 99) * 1e3, 3),
+        'consultas': round(consultas / medidas, 2),
+        'memoria_kib': round(statistics.median(picos) / 1024, 1) if picos else None,
+        'errores': errores,
+    }
+
+
+def sembrar(usuarios, tareas):
+    from django.contrib.auth.models import User
+    from tareas import storage
+
+    principal = User.objects.create_user(username='bench0', password=CONTRASENA)
+    # El hash se calcula una vez: los demás usuarios comparten la contraseña
+    User.objects.bulk_create(
+        User(username=f'bench{n}', password=principal.password) for n in range(1, usuarios)
+    )
+    ids = []
+    for n in range(usuarios):
+        for i in range(tareas):
+            tarea = storage.agregar_tarea(f'Tarea {i}', f'Descripción de la tarea {i} del usuario {n}', f'bench{n}')
+            if n == 0:
+                ids.append(tarea['id'])
+    return principal, ids
+
+
+def ejecutar(args):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import RequestFactory
+    from tareas import storage
+    from tareas.urls import urlpatterns
+
+    resultados = {}
+    with base_de_datos_de_prueba():
+        storage.tareas_storage.clear()
+        usuario, ids = sembrar(args.usuarios, args.tareas)
+        ctx = Contexto(usuario, ids, sesion=None)
+        ctx.sesion = ctx.nueva_sesion()
+
+        lista = escenarios()
+        cubiertas = {nombre for _, nombre, _, _ in lista}
+        sin_escenario = sorted(patron.name for patron in urlpatterns if patron.name not in cubiertas)
+        if sin_escenario:
+            sys.exit(f'URLs sin escenario de benchmark: {", ".join(sin_escenario)}')
+
+        handler = WSGIHandler()
+        fabrica = RequestFactory()
+        for clave, _, maximo, armar in lista:
+            if args.vistas and not any(filtro in clave for filtro in args.vistas):
+                continue
+            requests = min(args.requests, maximo or args.requests)
+            muestras_memoria = min(args.muestras_memoria, requests // 2)
+            # Calentamiento: cachés de plantillas, fragmentos, sesión y usuario
+            for i in range(min(args.calentamiento, requests)):
+                llamar(handler, armar_environ(fabrica, armar(ctx, i)))
+            environs = [armar_environ(fabrica, armar(ctx, i)) for i in range(requests + muestras_memoria)]
+            resultados[clave] = medir(handler, environs, muestras_memoria)
+            imprimir_fila(clave, resultados[clave])
+
+    import django
+    return {
+        'meta': {
+            'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'usuarios': args.usuarios,
+            'tareas_por_usuario': args.tareas,
+            'requests': args.requests,
+        },
+        'vistas': resultados,
+    }
+
+
+def imprimir_encabezado():
+    print(f'{"vista":<26} {"req/s":>9} {"p50 ms":>9} {"p90 ms":>9} {"p99 ms":>9} '
+          f'{"consultas":>9} {"KiB":>8} {"errores":>7}')
+
+
+def imprimir_fila(clave, r):
+    memoria = '-' if r['memoria_kib'] is None else f'{r["memoria_kib"]:,.1f}'
+    print(f'{clave:<26} {r["req_s"]:>9,.0f} {r["p50_ms"]:>9.3f} {r["p90_ms"]:>9.3f} {r["p99_ms"]:>9.3f} '
+          f'{r["consultas"]:>9.2f} {memoria:>8} {r["errores"]:>7}')
+
+
+def comparar(base, actual, umbral, tolerancia_ms=0):
+    """
+    Retorna las regresiones de ``actual`` respecto de ``base``. Las
+    latencias además deben empeorar más de ``tolerancia_ms``: en requests
+    de un milisegundo el ruido del sistema ya supera cualquier umbral.
+    """
+    regresiones = []
+    for clave, nuevo in actual['vistas'].items():
+        anterior = base['vistas'].get(clave)
+        if anterior is None:
+            continue
+        for metrica, mayor_es_mejor in METRICAS.items():
+            a, b = anterior.get(metrica), nuevo.get(metrica)
+            if a is None or b is None:
+                continue
+            if mayor_es_mejor:
+                empeoro = b < a / (1 + umbral)
+            else:
+                empeoro = b > a * (1 + umbral) if a else b > 0
+                if metrica.endswith('_ms'):
+                    empeoro = empeoro and b - a > tolerancia_ms
+            if empeoro:
+                regresiones.append((clave, metrica, a, b))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=10)
+    parser.add_argument('--tareas', type=int, default=1000, help='tareas por usuario')
+    parser.add_argument('--requests', type=int, default=200, help='requests medidas por vista')
+    parser.add_argument('--calentamiento', type=int, default=20)
+    parser.add_argument('--muestras-memoria', type=int, default=20)
+    parser.add_argument('--vistas', nargs='*', help='solo las vistas cuya clave contenga alguno de estos textos')
+    parser.add_argument('--salida', type=Path, help='guarda los resultados en este JSON')
+    parser.add_argument('--comparar', type=Path, help='JSON de línea base')
+    parser.add_argument('--umbral', type=float, default=0.25, help='regresión tolerada (0.25 = 25%%)')
+    parser.add_argument('--tolerancia-ms', type=float, default=1.0,
+                        help='empeoramiento absoluto de latencia que se ignora')
+    args = parser.parse_args()
+
+    configurar_django()
+    imprimir_encabezado()
+    actual = ejecutar(args)
+
+    if args.salida:
+        args.salida.write_text(json.dumps(actual, indent=2, ensure_ascii=False) + '\n')
+        print(f'\nResultados guardados en {args.salida}')
+
+    if args.comparar:
+        base = json.loads(args.comparar.read_text())
+        regresiones = comparar(base, actual, args.umbral, args.tolerancia_ms)
+        if regresiones:
+            print(f'\nREGRESIONES (umbral {args.umbral:.0%}):')
+            for clave, metrica, antes, ahora in regresiones:
+                print(f'  {clave:<26} {metrica:<12} {antes} -> {ahora}')
+            sys.exit(1)
+        print(f'\nSin regresiones respecto de {args.comparar} (umbral {args.umbral:.0%})')
+
+
+if __name__ == '__main__':
+    main()